@@ -102,6 +102,8 @@ import algorithms.constants
 import utils.iotools
 import time, calendar
 import copy
+import Queue
+from multiprocessing.pool import ThreadPool
 
 from numpy import array
 
@@ -139,6 +141,7 @@ AVERAGE_TUNE    = 0     #@IgnorePep8
 CALIBRATION     = None  #@IgnorePep8
 ERRORDEFS       = None  #@IgnorePep8
 NPROCESSES      = 16    #@IgnorePep8
+NTHREADS        = 1     #@IgnorePep8
 ONLYCOUPLING    = 0     #@IgnorePep8
 USE_ONLY_THREE_BPMS_FOR_BETA_FROM_PHASE   = 0    #@IgnorePep8
 DEFAULT_USE_ERROR_OF_MEAN = 0 #@IgnorePep8
@@ -214,6 +217,9 @@ def _parse_args():
     parser.add_option("--nprocesses", default=NPROCESSES, dest="nprocesses",
                       metavar="NPROCESSES", type="int",
                       help="Sets the number of processes used. -1: take the number of CPUs 0: run serially >1: take the specified number. default = {0:d}".format(NPROCESSES))
+    parser.add_option("--nthreads", default=NTHREADS, dest="nthreads",
+                      metavar="NTHREADS", type="int",
+                      help="Number of independent analysis steps (e.g. total phase, beta from phase and IP) run at the same time. If > 1, nprocesses is set to 0. default = {0:d}".format(NTHREADS))
     parser.add_option("--coupling", default=ONLYCOUPLING, dest="onlycoupling",
                       metavar="ONLYCOUPLING", type="int",
                       help="When enabled only coupling is calculated. ")
@@ -265,6 +271,7 @@ def main(outputpath,
          calibration_dir_path=CALIBRATION,
          errordefspath=ERRORDEFS,
          nprocesses=NPROCESSES,
+         nthreads=NTHREADS,
          onlycoupling=ONLYCOUPLING,
          use_error_of_mean=DEFAULT_USE_ERROR_OF_MEAN):
     '''
@@ -288,6 +295,8 @@ def main(outputpath,
     :param int number_of_bpms: Number of BPM-combos for beta from phase
     :param int range_of_bpms: Range of BPMs for beta from phase
     :param int use_average: Uses AVG_MUX and AVG_MUY in _analyse_src_files if 1
+    :param int nthreads: Number of independent analysis steps run at the same time, if > 1 the
+        steps themselves run serially (nprocesses = 0)
     :returns: int  -- 0 if the function run successfully otherwise !=0.
     '''
     return_code = 0
@@ -313,10 +322,15 @@ def main(outputpath,
     getllm_d.errordefspath = errordefspath
     getllm_d.accel = accel
     getllm_d.nprocesses = nprocesses
+    if nthreads > 1 and nprocesses != 0:
+        # forking the process pool of beta from phase while other steps run in threads can
+        # deadlock on locks (e.g. of logging or stdout) held by those threads
+        print "Running serially within the steps (nprocesses = 0), as nthreads > 1."
+        getllm_d.nprocesses = 0
     getllm_d.onlycoupling = onlycoupling
 
     algorithms.constants.USE_ERROR_OF_MEAN = bool(use_error_of_mean)
-    dinj = DepInjector()
+    dinj = DepInjector(lazy=True)
     dinj.initial("getllm_d", getllm_d)\
         .initial("bbthreshold", bbthreshold)\
         .initial("errthreshold", errthreshold)
@@ -455,9 +469,11 @@ def main(outputpath,
                          requires=("getllm_d", "twiss_d", "mad_twiss",
                                    "files_dict"))
 
+    dinj.run(nthreads=nthreads)
+
     # Write results to files in files_dict
     dinj.trigger(funct=write_files,
-                 requires=("files_dict", ))
+                 requires=("files_dict", )).run()
     return 0 if not dinj.something_raised else 1
 
 # END main() ---------------------------------------------------------------------------------------
@@ -473,10 +489,14 @@ class DepInjector(object):
 
     This class provides a shared namespace of dependencies between GetLLM
     operations.
+    If created as lazy, triggered functions are only collected and executed by
+    run(), following the dependency graph given by their requires and provides.
     """
-    def __init__(self):
+    def __init__(self, lazy=False):
         self.results = {}
         self.something_raised = False
+        self._lazy = lazy
+        self._steps = []
 
     def trigger(self, funct=None, requires=None, provides=None,
                 critical=False):
@@ -489,6 +509,8 @@ class DepInjector(object):
         otherwise a KeyError will be thrown. If at least one of the requieres
         is marked as unavailable (because its defining computation failed),
         this computation will mark its own "provides" as unavailable as well.
+        If the injector is lazy, the function is only registered to be run by
+        run().
 
         Arguments:
             funct: Callable to run.
@@ -500,30 +522,40 @@ class DepInjector(object):
         Returns:
             The same instance of DepInjector to allow method chaining.
         """
-        deps = [self._solve_dep(name) for name in requires]\
-            if requires is not None\
-            else []
-        provides = provides if provides is not None else []
-        if any(isinstance(dep, DepInjector.Unavailable) for dep in deps):
-            # Unavailable dependecies, so I cannot go on:
-            if critical:
-                raise DepInjector.MissingRequirementError()
-            self._set_provides_unavailable(provides)
-            return self
-        try:
-            # TODO: Lazy evaluation would be cooler, but this is GetLLM...
-            results = DepInjector._to_tuple(funct(*deps))
-        except:
-            self.something_raised = True
-            if critical:
-                raise
-            # Report exception and mark dependencies as Unavailable:
-            traceback.print_exc()
-            self._set_provides_unavailable(provides)
+        step = DepInjector._Step(funct,
+                                 tuple(requires) if requires is not None else (),
+                                 tuple(provides) if provides is not None else (),
+                                 critical)
+        if self._lazy:
+            self._steps.append(step)
+        else:
+            self._run_step(step)
+        return self
+
+    def run(self, targets=None, nthreads=1):
+        """Runs the functions registered since the last run.
+
+        A function depends on the last previously registered function
+        providing one of its requirements. A function providing a name also
+        waits for all previously registered functions using or providing that
+        name, as the value can be modified in place. Independent functions
+        are run concurrently in a pool of threads.
+
+        Arguments:
+            targets: Iterable of names to compute. Only the functions needed
+                for them are run. If None, all functions are run.
+            nthreads: Maximum number of functions running at the same time.
+        Returns:
+            The same instance of DepInjector to allow method chaining.
+        """
+        steps, self._steps = self._steps, []
+        dependencies = DepInjector._get_dependencies(steps)
+        needed = DepInjector._get_needed(steps, dependencies, targets)
+        if nthreads <= 1 or len(needed) <= 1:
+            for index in needed:
+                self._run_step(steps[index])
             return self
-        if provides:
-            self.results.update(dict(zip(provides,
-                                         DepInjector._to_tuple(results))))
+        self._run_concurrently(steps, dependencies, needed, nthreads)
         return self
 
     def initial(self, provides, value):
@@ -536,6 +568,93 @@ class DepInjector(object):
         self.results[provides] = value
         return self
 
+    def _run_step(self, step):
+        deps = [self._solve_dep(name) for name in step.requires]
+        if any(isinstance(dep, DepInjector.Unavailable) for dep in deps):
+            # Unavailable dependecies, so I cannot go on:
+            if step.critical:
+                raise DepInjector.MissingRequirementError()
+            self._set_provides_unavailable(step.provides)
+            return
+        try:
+            results = DepInjector._to_tuple(step.funct(*deps))
+        except:
+            self.something_raised = True
+            if step.critical:
+                raise
+            # Report exception and mark dependencies as Unavailable:
+            traceback.print_exc()
+            self._set_provides_unavailable(step.provides)
+            return
+        if step.provides:
+            self.results.update(dict(zip(step.provides, results)))
+
+    def _run_concurrently(self, steps, dependencies, needed, nthreads):
+        waiting = dict((index, set(dependencies[index]) & set(needed))
+                       for index in needed)
+        finished = Queue.Queue()
+        pool = ThreadPool(nthreads)
+
+        def run_and_report(index):
+            try:
+                self._run_step(steps[index])
+            except:
+                finished.put((index, sys.exc_info()))
+            else:
+                finished.put((index, None))
+        try:
+            running = 0
+            while waiting or running:
+                for index in sorted(index for index in waiting if not waiting[index]):
+                    del waiting[index]
+                    pool.apply_async(run_and_report, (index, ))
+                    running += 1
+                index, exc_info = finished.get()
+                running -= 1
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                for requirements in waiting.itervalues():
+                    requirements.discard(index)
+        finally:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def _get_dependencies(steps):
+        dependencies = []
+        last_provider = {}
+        users = {}
+        for index, step in enumerate(steps):
+            step_deps = set()
+            for name in step.requires:
+                name = name.split(".")[0]
+                if name in last_provider:
+                    step_deps.add(last_provider[name])
+            for name in step.provides:
+                step_deps.update(users.get(name, ()))
+            for name in step.requires:
+                users.setdefault(name.split(".")[0], set()).add(index)
+            for name in step.provides:
+                last_provider[name] = index
+                users.setdefault(name, set()).add(index)
+            step_deps.discard(index)
+            dependencies.append(step_deps)
+        return dependencies
+
+    @staticmethod
+    def _get_needed(steps, dependencies, targets):
+        if targets is None:
+            return range(len(steps))
+        needed = set()
+        stack = [index for index, step in enumerate(steps)
+                 if set(step.provides) & set(targets)]
+        while stack:
+            index = stack.pop()
+            if index not in needed:
+                needed.add(index)
+                stack.extend(dependencies[index])
+        return sorted(needed)
+
     def _solve_dep(self, name):
         if "." in name:  # Allowes attribute access
             parts = name.split(".")
@@ -558,6 +677,15 @@ class DepInjector(object):
             return thing
         return (thing, )
 
+    class _Step(object):
+        __slots__ = ("funct", "requires", "provides", "critical")
+
+        def __init__(self, funct, requires, provides, critical):
+            self.funct = funct
+            self.requires = requires
+            self.provides = provides
+            self.critical = critical
+
     class Unavailable(object):
         __slots__ = ()
 
@@ -1375,6 +1503,7 @@ def _start():
          calibration_dir_path=options.calibration_dir_path,
          errordefspath=options.errordefspath,
          nprocesses=options.nprocesses,
+         nthreads=options.nthreads,
          onlycoupling=options.onlycoupling,
          use_error_of_mean=options.use_error_of_mean)
      
@@ -29,6 +29,9 @@ import constants
 from utils import logging_tools
 LOGGER = logging_tools.get_logger(__name__)
 
+N_PAIRS = 10  # number of following monitors the phase advance is calculated to
+LAST_BPM_ON_TURN = {"LHCB1": "BPMSW.1L2.B1", "LHCB2": "BPMSW.1L8.B2", "PETRA": "BPM_SOR_46"}
+
 #===================================================================================================
 # main part
 #===================================================================================================
@@ -519,16 +522,14 @@ def _phi_last_and_last_but_one(phi, ftune):
     '''
     Shifts phase by tune.
     Apparently it is called only for the last and the last but one BPM, therefore  the awful name  
-    'phi': a phase advance
+    'phi': a phase advance or array of phase advances
     'ftune': tune 
     Author unknown
     '''
     if ftune <= 0:
         ftune += 1
-    phi += ftune
-    if phi > 1:
-        phi -= 1
-    return phi
+    phi = phi + ftune
+    return np.where(phi > 1, phi - 1, phi)
 
 def t_value_correction(num):
     ''' Calculations are based on Hill, G. W. (1970)
@@ -598,62 +599,91 @@ def calc_phase_std(phase0, norm):
         phase_std = 0
     return phase_std
 
+def calc_phase_mean_and_std(phases, norm):
+    ''' As calc_phase_mean and calc_phase_std, but for all rows of phases at once.
+    The phases of the single measurements are along the last axis, the results have the shape of the
+    other axes. phases must be in [0,1) or [0,2*pi), norm = 1 or 2*pi '''
+    phase0 = np.ascontiguousarray(phases) % norm
+    phase1 = (phase0 + .5*norm) % norm - .5*norm
+    phase0ave = np.mean(phase0, axis=-1)
+    phase1ave = np.mean(phase1, axis=-1)
+    phase0dev = phase0 - phase0ave[..., np.newaxis]
+    phase1dev = phase1 - phase1ave[..., np.newaxis]
+    # summed one measurement after the other, as the built-in sum in calc_phase_mean
+    mod_phase0std = sum(np.abs(phase0dev[..., i]) for i in range(phase0.shape[-1]))
+    mod_phase1std = sum(np.abs(phase1dev[..., i]) for i in range(phase0.shape[-1]))
+    use_phase0 = mod_phase0std < mod_phase1std
+    phase_mean = np.where(use_phase0, phase0ave, phase1ave % norm)
+
+    n_phases = phase0.shape[-1]
+    if n_phases < 2:
+        return phase_mean, np.zeros(phase_mean.shape)
+    min_phase_std = np.minimum(np.sum(phase0dev**2, axis=-1), np.sum(phase1dev**2, axis=-1))
+    phase_std = np.sqrt(min_phase_std/(n_phases-1))
+    phase_std = phase_std * t_value_correction(n_phases-1)
+    if constants.USE_ERROR_OF_MEAN:
+        phase_std = phase_std/math.sqrt(n_phases)
+    return phase_mean, phase_std
+
+def _get_phase_column(plane):
+    return "MUX" if plane == "H" else "MUY"
+
+def _get_columns(twiss_files, bpm_names, column):
+    ''' Returns (file x BPM) array with the values of column at bpm_names in each of twiss_files. '''
+    return np.array([np.asarray(getattr(twiss_file, column))[[twiss_file.indx[name] for name in bpm_names]]
+                     for twiss_file in twiss_files])
+
+def _get_s_lastbpm(mad_twiss, accel, lhc_phase):
+    ''' S of the last BPM on the same turn, None if there is no phase jump correction. '''
+    if lhc_phase != "1" or accel not in LAST_BPM_ON_TURN:
+        return None
+    return mad_twiss.S[mad_twiss.indx[LAST_BPM_ON_TURN[accel]]]
+
+def _avoid_zero_phase(phase, plane, bn1, bn2, source):
+    small = 1e-7
+    if abs(phase) < small:
+        print "Note: Phase advance (Plane" + plane + ") between " + bn1 + " and " + bn2 + " in " + source + " is EXACTLY n*pi. GetLLM slightly differ the phase advance here, artificially."
+        print "Beta from amplitude around this monitor will be slightly varied."
+        return small
+    return phase
+
 def _get_phases_total(mad_twiss, src_files, tune, plane, beam_direction, accel, lhc_phase):
     commonbpms = utils.bpm.intersect(src_files)
     commonbpms = utils.bpm.model_intersect(commonbpms, mad_twiss)
     #-- Last BPM on the same turn to fix the phase shift by tune for exp data of LHC
-    s_lastbpm = None
+    s_lastbpm = _get_s_lastbpm(mad_twiss, accel, lhc_phase)
     if lhc_phase == "1":
         print "phase jump correction"
         if accel == "JPARC":
             print "-- no total phase jump correction with JPARC"
-            #s_lastbpm = mad_twiss.S[mad_twiss.indx['MOH.3']]
-        elif accel == "LHCB1":
-            s_lastbpm = mad_twiss.S[mad_twiss.indx['BPMSW.1L2.B1']]
-            print "-> for LHC"
-        elif accel == "LHCB2":
-            s_lastbpm = mad_twiss.S[mad_twiss.indx['BPMSW.1L8.B2']]
+        elif accel in ("LHCB1", "LHCB2"):
             print "-> for LHC"
         elif accel == "PETRA":
-            s_lastbpm = mad_twiss.S[mad_twiss.indx['BPM_SOR_46']]
             print "-> for PETRA {0:f}".format(tune)
-    
-    bn1 = str.upper(commonbpms[0][1])
-    phase_t = {}
-    
-    LOGGER.debug("Reference BPM: %s Plane: %s", bn1, plane)
-    
-    for i in range(0, len(commonbpms)):
-        bn2 = str.upper(commonbpms[i][1])
-        if plane == 'H':
-            phmdl12 = (mad_twiss.MUX[mad_twiss.indx[bn2]]-mad_twiss.MUX[mad_twiss.indx[bn1]]) % 1
-        if plane == 'V':
-            phmdl12 = (mad_twiss.MUY[mad_twiss.indx[bn2]]-mad_twiss.MUY[mad_twiss.indx[bn1]]) % 1
 
-        phi12 = []
-        for twiss_file in src_files:
-            # Phase is in units of 2pi
-            if plane == 'H':
-                phm12 = (twiss_file.MUX[twiss_file.indx[bn2]]-twiss_file.MUX[twiss_file.indx[bn1]]) % 1
-            if plane == 'V':
-                phm12 = (twiss_file.MUY[twiss_file.indx[bn2]]-twiss_file.MUY[twiss_file.indx[bn1]]) % 1
-            #-- To fix the phase shift by tune in LHC
-            try:
-                if s_lastbpm is not None and commonbpms[i][0] > s_lastbpm:
-                    phm12 += beam_direction*tune
-            except:
-                traceback.print_exc()
-            phi12.append(phm12)
-        phi12 = np.array(phi12)
-        # for the beam circulating reversely to the model
-        if beam_direction == -1:
-            phi12 = 1 - phi12
+    bpm_names = [str.upper(bpm[1]) for bpm in commonbpms]
+    bn1 = bpm_names[0]
+
+    LOGGER.debug("Reference BPM: %s Plane: %s", bn1, plane)
 
-        #phstd12=math.sqrt(np.average(phi12*phi12)-(np.average(phi12))**2.0+2.2e-15)
-        #phi12=np.average(phi12)
-        phstd12 = calc_phase_std(phi12, 1.)
-        phi12   = calc_phase_mean(phi12, 1.)
-        phase_t[bn2] = [phi12, phstd12, phmdl12, bn1]
+    column = _get_phase_column(plane)
+    model_phases = _get_columns([mad_twiss], bpm_names, column)[0]
+    phmdl12 = (model_phases - model_phases[0]) % 1
+
+    # Phase is in units of 2pi, (file x BPM) array of the phase advances from the first BPM
+    phases = _get_columns(src_files, bpm_names, column)
+    phi12 = (phases - phases[:, :1]) % 1
+    #-- To fix the phase shift by tune in LHC
+    if s_lastbpm is not None:
+        phi12[:, np.array([bpm[0] for bpm in commonbpms]) > s_lastbpm] += beam_direction*tune
+    # for the beam circulating reversely to the model
+    if beam_direction == -1:
+        phi12 = 1 - phi12
+
+    phi12, phstd12 = calc_phase_mean_and_std(phi12.T, 1.)
+    phase_t = {}
+    for i, bn2 in enumerate(bpm_names):
+        phase_t[bn2] = [phi12[i], phstd12[i], phmdl12[i], bn1]
 
     return [phase_t, commonbpms]
 
@@ -666,16 +696,10 @@ def get_phases(getllm_d, mad_twiss, ListOfFiles, tune_q, plane):
     Calculates phase.
     tune_q will be used to fix the phase shift in LHC.
     For other accelerators use 'None'.
-    """
 
-    LOGGER.debug("")
-    LOGGER.debug("##############################################")
-    LOGGER.debug("##############################################")
-    LOGGER.debug("##############################################")
-    LOGGER.debug("##############################################")
-    LOGGER.debug("##############################################")
-    LOGGER.debug("")
-    
+    The phase advances from every BPM to the N_PAIRS following ones are calculated for all files at
+    once, as (BPM x pair x file) array.
+    """
     commonbpms = utils.bpm.intersect(ListOfFiles)
     commonbpms = utils.bpm.model_intersect(commonbpms, mad_twiss)
     commonbpms = JPARC_intersect(plane, getllm_d, commonbpms)
@@ -686,201 +710,122 @@ def get_phases(getllm_d, mad_twiss, ListOfFiles, tune_q, plane):
         return [{}, 0, 0, []]
 
     #-- Last BPM on the same turn to fix the phase shift by tune_q for exp data of LHC
-    # this would be the elegant way:
-    
-    if getllm_d.lhc_phase == "1":
-        if getllm_d.accel == "JPARC":
-            s_lastbpm = None
-        elif getllm_d.accel == "LHCB1":
-            s_lastbpm = mad_twiss.S[mad_twiss.indx['BPMSW.1L2.B1']]
-        elif getllm_d.accel == "LHCB2":
-            s_lastbpm = mad_twiss.S[mad_twiss.indx['BPMSW.1L8.B2']]
-        elif getllm_d.accel == "PETRA":
-            s_lastbpm = mad_twiss.S[mad_twiss.indx['BPM_SOR_46']]
- 
-    # this is the practical way:
-    
-#     if getllm_d.lhc_phase == "1":
-#         print "phase jump is compensated [get_phases]"
-#         if "MOH.3" in mad_twiss.NAME:
-#             getllm_d.beam_direction = 1.0
-#             s_lastbpm = mad_twiss.S[mad_twiss.indx['MOH.5']]
-#             tune_q = 0
-#             print "--> for JPARC (at S = {0:f} tune_q = {1:f}, bd = {2:f})".format(s_lastbpm, tune_q, getllm_d.beam_direction)
-#             #s_lastbpm = mad_twiss.S[mad_twiss.indx['MOH.5']]
-#         elif "BPMSW.1L2.B1" in mad_twiss.NAME:
-#             print "--> for LHC"
-#             if getllm_d.accel == "LHCB1":
-#                 s_lastbpm = mad_twiss.S[mad_twiss.indx['BPMSW.1L2.B1']]
-#             elif getllm_d.accel == "LHCB2":
-#                 s_lastbpm = mad_twiss.S[mad_twiss.indx['BPMSW.1L8.B2']]
-#     
+    s_lastbpm = _get_s_lastbpm(mad_twiss, getllm_d.accel, getllm_d.lhc_phase)
 
     mu = 0.
-    tunem = []
     phase = {} # Dictionary for the output containing [average phase, rms error]
+    bpm_names = [str.upper(bpm[1]) for bpm in commonbpms]
+    column = _get_phase_column(plane)
 
-    for i in range(length_commonbpms): # To calculate the tune
-        bpm = str.upper(commonbpms[i % length_commonbpms][1])
-        
-        
-        tunemi = []
-        for src_twiss in ListOfFiles:
-            # Phase is in units of 2pi
-            if plane == 'H':
-                src_twiss_tune_column = src_twiss.TUNEX
-            elif plane == 'V':
-                src_twiss_tune_column = src_twiss.TUNEY
-            tunemi.append(src_twiss_tune_column[src_twiss.indx[bpm]])
-        
-        LOGGER.debug("BPM %s tunes %s",bpm,str(tunemi))
+    # To calculate the tune, the last monitor is not used
+    tunes = _get_columns(ListOfFiles, bpm_names, "TUNEX" if plane == "H" else "TUNEY")
+    tunem = np.mean(np.ascontiguousarray(tunes[:, :-1].T), axis=1)
+    tune = np.average(tunem)
 
-        tunemi = np.array(tunemi)
-        if i < length_commonbpms-1:
-            tunem.append(np.average(tunemi))
-
-        # Note that the phase advance between the last monitor and the first monitor should be find by taking into account the fractional part of tune.
-        if i == length_commonbpms-2:
-            tunem = np.array(tunem)
-            tune = np.average(tunem)
-    
     LOGGER.debug("Global TUNE: %f",tune)
 
-    for i in range(length_commonbpms): # To find the integer part of tune as well, the loop is up to the last monitor
-        bpms = [str.upper(commonbpms[j % length_commonbpms][1]) for j in range(i, i+11)] # eleven consecutive monitors
-        # p_i elements start as lists
-        # but it will become first np.array
-        # and at the just floats!!!!!! Yummy.
-        p_i = {1:[], 2:[], 3:[], 4:[], 5:[], 6:[], 7:[], 8:[], 9:[], 10:[]} # dict for the six bpm pairs i.e. p_i[1] is for pair bpm[0], bpm[1]
-        
-        
-        if bpms[0] in getllm_d.important_pairs:
-            number = 1
-            for second_bpm in getllm_d.important_pairs[bpms[0]]:
-                p_i[10 + number] = []
-                bpms.append(second_bpm)
-                number += 1
-        
-        # For all files take phase adv diffences between this bpm (bpms[0]) and 9 following ones in list bpms             
-        for src_twiss in ListOfFiles:
-            # Phase is in units of 2pi
-            LOGGER.debug("Reading from file %s ",src_twiss.filename);
-            
-            p_m = {}
-            if plane == 'H':
-                twiss_column = src_twiss.MUX
-            elif plane == 'V':
-                twiss_column = src_twiss.MUY
-            for bpm_pair in p_i:
-                try:
-                    p_m[bpm_pair] = twiss_column[src_twiss.indx[bpms[bpm_pair]]] - twiss_column[src_twiss.indx[bpms[0]]]
-                    LOGGER.debug("Phase adv between  %s <--> %s = %f ",bpms[0],bpms[bpm_pair],p_m[bpm_pair])
-                except:
-                    p_m[bpm_pair] = 10000000000
-                    
-            #-- To fix the phase shift by tune_q in LHC
-            if tune_q is not None:
-                try:
-                    for bpm_pair in p_m:
-                        if mad_twiss.S[mad_twiss.indx[bpms[0]]] <= s_lastbpm and mad_twiss.S[mad_twiss.indx[bpms[bpm_pair]]] > s_lastbpm:
-                            p_m[bpm_pair] += getllm_d.beam_direction*tune_q
-                        if mad_twiss.S[mad_twiss.indx[bpms[0]]] > s_lastbpm and mad_twiss.S[mad_twiss.indx[bpms[bpm_pair]]]<=s_lastbpm:
-                            p_m[bpm_pair] += -getllm_d.beam_direction*tune_q
-                except:
-                    pass
-            
-            for bpm_pair in p_i:
-                if p_m[bpm_pair] < 0:
-                    p_m[bpm_pair] += 1
-                p_i[bpm_pair].append(p_m[bpm_pair])
-
-         
-        
-        
-        
-        # Here each p_i element becomes an np.array !!!!!!!!!!!!!!!
-        for bpm_pair in p_i:
-            LOGGER.debug('phase pair %d : %s',bpm_pair,str(p_i[1]))
-            p_i[bpm_pair] = np.array(p_i[bpm_pair])
-        
-        
-        
-        if getllm_d.beam_direction == -1: # for the beam circulating reversely to the model
-            for bpm_pair in p_i:
-                p_i[bpm_pair] = 1 - p_i[bpm_pair]
-        
-        
-        # calculate average and std for each pair
-        p_std = {}
-        for bpm_pair in p_i:
-            p_std[bpm_pair] = calc_phase_std(p_i[bpm_pair], 1.)
-            # Here each p_i element becomes a float !!!!!!!!!!!!!!!
-            p_i[bpm_pair] = calc_phase_mean(p_i[bpm_pair], 1.)
-        
-        # If the current BPM is less than 10 BPMs from the end
-        if i >= length_commonbpms-10:
-            # add tune to phase of the last pair 
-            p_i[10] = _phi_last_and_last_but_one(p_i[10], tune)
-            for j in range(1,10):
-                if i >= length_commonbpms-j:
-                    p_i[j] = _phi_last_and_last_but_one(p_i[j], tune)
-
-        p_mdl = {}
-        if plane == 'H':
-            twiss_column = mad_twiss.MUX
-        elif plane == 'V':
-            twiss_column = mad_twiss.MUY
-        for bpm_pair in p_i:
-            p_mdl[bpm_pair] = twiss_column[mad_twiss.indx[bpms[bpm_pair]]] - twiss_column[mad_twiss.indx[bpms[0]]]
-
-        if i >= length_commonbpms-10:
-            if plane == 'H':
-                madtune = mad_twiss.Q1 % 1
-            elif plane == 'V':
-                madtune = mad_twiss.Q2 % 1
-            if madtune > .5:
-                madtune -= 1
-
-            p_mdl[10] = p_mdl[10] % 1
-            p_mdl[10] = _phi_last_and_last_but_one(p_mdl[10], madtune)
-            for j in range(1, len(p_i)): # iterate only over the first 5 bpm pairs
-                if i >= length_commonbpms-j:
-                    p_mdl[j] = p_mdl[j] % 1
-                    p_mdl[j] = _phi_last_and_last_but_one(p_mdl[j], madtune)
-
-        small = 1e-7
-        phase_advances_all_bpms = np.zeros(len(p_i))
-        phase_advances_all_bpms_std = np.zeros(len(p_i))
-        for bpm_pair in p_i:
-            if abs(p_mdl[bpm_pair]) < small:
-                p_mdl[bpm_pair] = small
-                print "Note: Phase advance (Plane" + plane + ") between " + bpms[0] + " and " + bpms[bpm_pair] + " in MAD model is EXACTLY n*pi. GetLLM slightly differ the phase advance here, artificially."
-                print "Beta from amplitude around this monitor will be slightly varied."
-            if abs(p_i[bpm_pair]) < small:
-                p_i[bpm_pair] = small
-                print "Note: Phase advance (Plane" + plane + ") between " + bpms[0] + " and " + bpms[bpm_pair] + " in measurement is EXACTLY n*pi. GetLLM slightly differ the phase advance here, artificially."
-                print "Beta from amplitude around this monitor will be slightly varied."
-            phase["".join([plane,bpms[0],bpms[bpm_pair]])] = [p_i[bpm_pair], p_std[bpm_pair], p_mdl[bpm_pair]]
-
-        for i in range(len(p_i)):
-            phase_advances_all_bpms[i] = p_i[i+1]
-            phase_advances_all_bpms_std[i] = p_std[i+1]
-        
+    # (BPM x pair) indices of the eleven consecutive monitors, the first one is the BPM itself
+    # To find the integer part of tune as well, this goes up to the last monitor
+    window = (np.arange(length_commonbpms)[:, np.newaxis] + np.arange(N_PAIRS + 1)) % length_commonbpms
+    # pairs going beyond the last monitor, their phase advance is shifted by the tune
+    last_turn = np.arange(length_commonbpms)[:, np.newaxis] >= length_commonbpms - np.arange(1, N_PAIRS + 1)
+
+    # Phase is in units of 2pi, (file x BPM x pair) array
+    phases = _get_columns(ListOfFiles, bpm_names, column)
+    p_i = phases[:, window[:, 1:]] - phases[:, window[:, :1]]
+    #-- To fix the phase shift by tune_q in LHC
+    model_s = np.asarray(mad_twiss.S)[[mad_twiss.indx[name] for name in bpm_names]]
+    if tune_q is not None and s_lastbpm is not None:
+        s_first, s_second = model_s[window[:, :1]], model_s[window[:, 1:]]
+        jump = (((s_first <= s_lastbpm) & (s_second > s_lastbpm)).astype(int) -
+                ((s_first > s_lastbpm) & (s_second <= s_lastbpm)).astype(int))
+        p_i += jump * getllm_d.beam_direction * tune_q
+    p_i[p_i < 0] += 1
+    if getllm_d.beam_direction == -1: # for the beam circulating reversely to the model
+        p_i = 1 - p_i
+
+    # average and std for each pair
+    p_i, p_std = calc_phase_mean_and_std(np.transpose(p_i, (1, 2, 0)), 1.)
+    p_i = np.where(last_turn, _phi_last_and_last_but_one(p_i, tune), p_i)
+
+    model_phases = np.asarray(getattr(mad_twiss, column))[[mad_twiss.indx[name] for name in bpm_names]]
+    p_mdl = model_phases[window[:, 1:]] - model_phases[window[:, :1]]
+    madtune = (mad_twiss.Q1 if plane == "H" else mad_twiss.Q2) % 1
+    if madtune > .5:
+        madtune -= 1
+    p_mdl = np.where(last_turn, _phi_last_and_last_but_one(p_mdl % 1, madtune), p_mdl)
+
+    for i, bn1 in enumerate(bpm_names):
+        bpms = [bpm_names[j] for j in window[i]]
+        important_phases = []
+        if bn1 in getllm_d.important_pairs:
+            important_phases = _get_important_phases(getllm_d, mad_twiss, ListOfFiles, tune_q, plane,
+                                                     bn1, s_lastbpm, model_s[i])
+            if i >= length_commonbpms - N_PAIRS:
+                important_phases, p_mdl[i, -1] = _important_phases_at_last_turn(
+                    important_phases, p_mdl[i, -1], madtune)
+
+        for k in range(N_PAIRS):
+            p_mdl[i, k] = _avoid_zero_phase(p_mdl[i, k], plane, bn1, bpms[k + 1], "MAD model")
+            p_i[i, k] = _avoid_zero_phase(p_i[i, k], plane, bn1, bpms[k + 1], "measurement")
+            phase["".join([plane, bn1, bpms[k + 1]])] = [p_i[i, k], p_std[i, k], p_mdl[i, k]]
+        for bn2, phi, phstd, phmdl in important_phases:
+            phmdl = _avoid_zero_phase(phmdl, plane, bn1, bn2, "MAD model")
+            phi = _avoid_zero_phase(phi, plane, bn1, bn2, "measurement")
+            phase["".join([plane, bn1, bn2])] = [phi, phstd, phmdl]
+
         # find next bpm with 0.25 phase advance
-        
-        best_bpm_idx = (np.abs(phase_advances_all_bpms[:3]-0.25)).argmin()
+        best_bpm_idx = (np.abs(p_i[i, :3]-0.25)).argmin()
         best_90degrees_bpm = bpms[best_bpm_idx + 1]
-        best_90degrees_phase = phase_advances_all_bpms[best_bpm_idx]
-        best_90degrees_phase_std = phase_advances_all_bpms_std[best_bpm_idx]
-        
-        LOGGER.debug("%s Phase to i+1 (%s) = %f +/- %f ",bpms[0],bpms[1],p_i[1], p_std[1])
-        LOGGER.debug("%s Phase to i+2 (??) = %f +/- %f ",bpms[0],p_i[2], p_std[2])
-        LOGGER.debug("%s Phase Best90 to %s = %f +/- %f ",bpms[0],best_90degrees_bpm, best_90degrees_phase, best_90degrees_phase_std)
-        
-        phase[bpms[0]] = [p_i[1], p_std[1], p_i[2], p_std[2], p_mdl[1], p_mdl[2], bpms[1], best_90degrees_bpm, best_90degrees_phase, best_90degrees_phase_std]
+        best_90degrees_phase = p_i[i, best_bpm_idx]
+        best_90degrees_phase_std = p_std[i, best_bpm_idx]
+
+        phase[bn1] = [p_i[i, 0], p_std[i, 0], p_i[i, 1], p_std[i, 1], p_mdl[i, 0], p_mdl[i, 1], bpms[1], best_90degrees_bpm, best_90degrees_phase, best_90degrees_phase_std]
 
     return [phase, tune, mu, commonbpms]
 
+def _get_important_phases(getllm_d, mad_twiss, ListOfFiles, tune_q, plane, bn1, s_lastbpm, s_first):
+    '''
+    Phase advances from bn1 to its important pairs, as list of [bn2, phase, std, model phase].
+    The phase is 10000000000 in files without bn2.
+    '''
+    column = _get_phase_column(plane)
+    important_phases = []
+    for bn2 in getllm_d.important_pairs[bn1]:
+        phi12 = []
+        for src_twiss in ListOfFiles:
+            twiss_column = getattr(src_twiss, column)
+            try:
+                phi12.append(twiss_column[src_twiss.indx[bn2]] - twiss_column[src_twiss.indx[bn1]])
+            except KeyError:
+                phi12.append(10000000000)
+        phi12 = np.array(phi12, dtype=float)
+        if tune_q is not None and s_lastbpm is not None:
+            s_second = mad_twiss.S[mad_twiss.indx[bn2]]
+            if s_first <= s_lastbpm and s_second > s_lastbpm:
+                phi12 += getllm_d.beam_direction*tune_q
+            if s_first > s_lastbpm and s_second <= s_lastbpm:
+                phi12 += -getllm_d.beam_direction*tune_q
+        phi12[phi12 < 0] += 1
+        if getllm_d.beam_direction == -1:
+            phi12 = 1 - phi12
+        phi12, phstd12 = map(float, calc_phase_mean_and_std(phi12, 1.))
+        twiss_column = getattr(mad_twiss, column)
+        phmdl12 = twiss_column[mad_twiss.indx[bn2]] - twiss_column[mad_twiss.indx[bn1]]
+        important_phases.append([bn2, phi12, phstd12, phmdl12])
+    return important_phases
+
+def _important_phases_at_last_turn(important_phases, phmdl_last_pair, madtune):
+    '''
+    Model phases of a BPM with important pairs within the last N_PAIRS monitors, as in former
+    versions: all but the last important pair are shifted by the tune and the last regular pair
+    once more.
+    '''
+    phmdl_last_pair = float(_phi_last_and_last_but_one(phmdl_last_pair % 1, madtune))
+    for important_phase in important_phases[:-1]:
+        important_phase[3] = float(_phi_last_and_last_but_one(important_phase[3] % 1, madtune))
+    return important_phases, phmdl_last_pair
+
 #===================================================================================================
 # ac-dipole stuff
 #===================================================================================================
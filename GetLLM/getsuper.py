@@ -42,6 +42,9 @@ Usage cmd line::
       -d <deltapScalingFactor>, --deltapScalingFactor=<deltapScalingFactor>
                             Scaling factor for deltap, remember final value must
                             be in MAD units
+      -p <processes>, --processes=<processes>
+                            Number of dpp values analysed in parallel (model creation and GetLLM)
+      --weighted            Weight the chromatic regressions with the measurement errors
 
 Usage in another Python module::
 
@@ -52,8 +55,8 @@ Usage in another Python module::
 """
 
 import argparse
+import multiprocessing
 import shutil
-import math
 import re
 import numpy as np
 import sys
@@ -102,6 +105,12 @@ def _parse_args(args=None):
     parser.add_argument("-d", "--deltapScalingFactor",
             help="Scaling factor for deltap, remember final value must be in MAD units",
             metavar="<deltapScalingFactor>", default=1.0, type=float, dest="deltap_scaling_factor")
+    parser.add_argument("-p", "--processes",
+            help="Number of dpp values analysed in parallel (model creation and GetLLM)",
+            metavar="<processes>", default=multiprocessing.cpu_count(), type=int, dest="processes")
+    parser.add_argument("--weighted",
+            help="Weight the chromatic regressions with the measurement errors",
+            action="store_true", dest="weighted")
 
     # parse arguments
     accel_cls, remain_args = manager.get_accel_class_from_args(args)
@@ -148,6 +157,12 @@ def check_input(opt):
     if opt.algorithm not in ALGO_CHOICES:
         raise ValueError("Algorithm needs to be either one of  '" + ALGO_CHOICES + "'")
 
+    opt.processes = opt.get("processes", multiprocessing.cpu_count())
+    if opt.processes < 1:
+        raise ValueError("Number of processes needs to be at least 1.")
+
+    opt.weighted = opt.get("weighted", False)
+
     return opt
 
 
@@ -166,6 +181,8 @@ def main(**kwargs):
         accel_cls (accelerator): Accelerator class object
         deltap_scaling_factor (float): Scaling factor for deltap,
                                        remember final value must be in MAD units
+        processes (int): Number of dpp values analysed in parallel (model creation and GetLLM)
+        weighted (bool): Weight the chromatic regressions with the measurement errors
     """
 
     options = check_input(DotDict(kwargs))
@@ -200,13 +217,10 @@ def main(**kwargs):
     accel_inst = _create_accel_instance(options.accel_cls, files_dict, options.output_path,
                                         options.twissfile)
 
-    _create_models_by_madx(accel_inst, files_dict.keys())
+    _create_models_by_madx(accel_inst, files_dict.keys(), options.processes)
 
-    for dpp in files_dict:
-        files = files_dict[dpp]
-        twiss_dpp_path = _join_with_output_path(options.output_path, "twiss_{:f}.dat".format(dpp))
-        _rungetllm(twiss_dpp_path, files, dpp,
-                   options.output_path, accel_inst, options.algorithm)
+    _rungetllm_all(files_dict, options.output_path, accel_inst, options.algorithm,
+                   options.processes)
 
     # The GUI wants the default files to have the names without _0.0
     _copy_default_outfiles(options.output_path)
@@ -299,14 +313,16 @@ def main(**kwargs):
     fileobj = _chromFileWriter('beta', _join_with_output_path(options.output_path, "chrombetax" + _ext()), 'H')
     bpms = bpm_util.intersect(listx)
     bpms = bpm_util.model_intersect(bpms, modeld)
-    _do_lin_reg_bet(fileobj, files_dict.keys(), betalistx, bpms, "H", zerobx, modeld)
+    _do_lin_reg_bet(fileobj, files_dict.keys(), betalistx, bpms, "H", zerobx, modeld,
+                    options.weighted)
     del fileobj
 
     # V
     fileobj = _chromFileWriter('beta', _join_with_output_path(options.output_path, "chrombetay" + _ext()), 'V')
     bpms = bpm_util.intersect(listy)
     bpms = bpm_util.model_intersect(bpms, modeld)
-    _do_lin_reg_bet(fileobj, files_dict.keys(), betalisty, bpms, "V", zeroby, modeld)
+    _do_lin_reg_bet(fileobj, files_dict.keys(), betalisty, bpms, "V", zeroby, modeld,
+                    options.weighted)
     del fileobj
     LOG.debug("Driven beta finished")
 
@@ -315,7 +331,7 @@ def main(**kwargs):
     fileobj = _chromFileWriter('coupling', _join_with_output_path(options.output_path, "chromcoupling" + _ext()), '')
     bpms = bpm_util.intersect(listc)
     bpms = bpm_util.model_intersect(bpms, modeld)
-    _do_linreg_coupling(couplelist, bpms, files_dict.keys(), fileobj)
+    _do_linreg_coupling(couplelist, bpms, files_dict.keys(), fileobj, options.weighted)
     del fileobj
     LOG.debug("Driven coupling finished")
 
@@ -329,14 +345,16 @@ def main(**kwargs):
                                    _join_with_output_path(options.output_path, "chrombetax_free" + _ext()), 'H')
         bpms = bpm_util.intersect(listxf)
         bpms = bpm_util.model_intersect(bpms, modelf)
-        _do_lin_reg_bet(fileobj, files_dict.keys(), betalistxf, bpms, "H", zerobxf, modelf)
+        _do_lin_reg_bet(fileobj, files_dict.keys(), betalistxf, bpms, "H", zerobxf, modelf,
+                        options.weighted)
 
         # V
         fileobj = _chromFileWriter('beta',
                                    _join_with_output_path(options.output_path, "chrombetay_free" + _ext()), 'V')
         bpms = bpm_util.intersect(listyf)
         bpms = bpm_util.model_intersect(bpms, modelf)
-        _do_lin_reg_bet(fileobj, files_dict.keys(), betalistyf, bpms, "V", zerobyf, modelf)
+        _do_lin_reg_bet(fileobj, files_dict.keys(), betalistyf, bpms, "V", zerobyf, modelf,
+                        options.weighted)
         LOG.debug("Free beta finished")
 
 
@@ -345,7 +363,7 @@ def main(**kwargs):
                                    _join_with_output_path(options.output_path, "chromcoupling_free" + _ext()), '')
         bpms = bpm_util.intersect(listcf)
         bpms = bpm_util.model_intersect(bpms, modelf)
-        _do_linreg_coupling(couplelistf, bpms, files_dict.keys(), fileobj)
+        _do_linreg_coupling(couplelistf, bpms, files_dict.keys(), fileobj, options.weighted)
         LOG.debug("Free coupling finished")
 
 # ===================================================================================================
@@ -409,15 +427,37 @@ def _create_accel_instance(accel_cls, files_dict, output_path, twissfile):
     return accel_inst
 
 
-def _create_models_by_madx(accel_inst, dpps):
-    """ Creates the needed models """
+def _create_models_by_madx(accel_inst, dpps, processes=1):
+    """ Creates the needed models, one MAD-X run per dpp """
     model_creator = creator.CREATORS[accel_inst.NAME]["nominal"]
     model_creator.prepare_run(accel_inst, accel_inst.model_dir)
-    madx_script = accel_inst.get_multi_dpp_job(dpps)
-    model_creator.run_madx(madx_script,
-                           logfile=os.path.join(accel_inst.model_dir, "w_analysis_multidpp.log"),
-                           writeto=os.path.join(accel_inst.model_dir, "w_analysis_multidpp.madx"),
-                           )
+    jobs = []
+    for dpp in dpps:
+        model_name = "w_analysis_dpp_{:f}".format(dpp)
+        jobs.append((model_creator,
+                     accel_inst.get_multi_dpp_job([dpp]),
+                     os.path.join(accel_inst.model_dir, model_name + ".log"),
+                     os.path.join(accel_inst.model_dir, model_name + ".madx")))
+    _map(_run_madx_job, jobs, processes)
+
+
+def _run_madx_job(job):
+    """ Function for pool to run a single model creation """
+    model_creator, madx_script, logfile, writeto = job
+    model_creator.run_madx(madx_script, logfile=logfile, writeto=writeto)
+
+
+def _map(function, args_list, processes):
+    """ Maps function over args_list, in a pool of processes if processes > 1 """
+    processes = min(processes, len(args_list))
+    if processes <= 1:
+        return map(function, args_list)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(function, args_list)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def _get_output_filenames(output_path, dpp=None):
@@ -438,14 +478,11 @@ def _get_output_filenames(output_path, dpp=None):
     return ret
 
 
-def _rungetllm(twiss_filename, files, dpp, output_path, accel_inst, algorithm):
+def _rungetllm_all(files_dict, output_path, accel_inst, algorithm, processes=1):
     """
-    Running GetLLM...
+    Runs GetLLM for all dpps, each one in its own subdirectory of output_path.
+    The results are moved to output_path with the dpp in their names.
     """
-    import GetLLM
-
-    LOG.debug("Will run getllm for dpp {:f}".format(dpp))
-
     if "lhc" == accel_inst.NAME:
         lhcphase = "1"
         accel_name = "LHCB" + str(accel_inst.get_beam())
@@ -453,16 +490,40 @@ def _rungetllm(twiss_filename, files, dpp, output_path, accel_inst, algorithm):
         lhcphase = "0"
         accel_name = accel_inst.NAME.upper()  #TODO: TEST that! Should work for ESRF at least.
 
-    GetLLM.main(outputpath=output_path,
+    # GetLLM runs its own pool unless nprocesses is 0, pool workers cannot have children
+    nprocesses = 0 if min(processes, len(files_dict)) > 1 else None
+    jobs = []
+    for dpp in files_dict:
+        twiss_dpp_path = _join_with_output_path(output_path, "twiss_{:f}.dat".format(dpp))
+        jobs.append((twiss_dpp_path, files_dict[dpp], dpp, output_path, accel_name, lhcphase,
+                     algorithm, nprocesses))
+    _map(_rungetllm, jobs, processes)
+
+
+def _rungetllm(job):
+    """
+    Running GetLLM...
+    """
+    import GetLLM
+    (twiss_filename, files, dpp, output_path, accel_name, lhcphase, algorithm, nprocesses) = job
+
+    LOG.debug("Will run getllm for dpp {:f}".format(dpp))
+    dpp_output_path = _join_with_output_path(output_path, "getllm_{:f}".format(dpp))
+    if not os.path.isdir(dpp_output_path):
+        os.makedirs(dpp_output_path)
+
+    kwargs = {} if nprocesses is None else {"nprocesses": nprocesses}
+    GetLLM.main(outputpath=dpp_output_path,
             files_to_analyse=','.join(files),
             model_filename=twiss_filename,
             accel=accel_name,
             tbtana=algorithm,
-            lhcphase=lhcphase)
-    LOG.debug("GetLLM finished")
+            lhcphase=lhcphase,
+            **kwargs)
+    LOG.debug("GetLLM finished for dpp {:f}".format(dpp))
 
-    for fname in _get_output_filenames(output_path):
-        src_path = _join_with_output_path(output_path, fname)
+    for fname in _get_output_filenames(dpp_output_path):
+        src_path = _join_with_output_path(dpp_output_path, fname)
         dst_path = _join_with_output_path(output_path, fname.replace(_ext(), _ext(dpp)))
         shutil.move(src_path, dst_path)
 
@@ -483,7 +544,7 @@ def _ext(dpp=None):
 
 # for chromatic
 
-def _do_lin_reg_bet(fileobj, listx, listy, bpms, plane, zero, twiss):
+def _do_lin_reg_bet(fileobj, listx, listy, bpms, plane, zero, twiss, weighted=False):
     """
     Calculates stuff and writes to the file in a table
     Closes the file afterwards
@@ -496,66 +557,37 @@ def _do_lin_reg_bet(fileobj, listx, listy, bpms, plane, zero, twiss):
         plane: Which plane (H/V)
         zero: Twiss for dp/p = 0
         twiss: Twiss
+        weighted: Weight the regressions of the measurement with its errors
     """
-    for bpm in bpms:
-        name = bpm[1]
-        sloc = bpm[0]
-        indx = []
-        b = []
-        a = []
-        bm = []
-        am = []
-        if "H" in plane:
-            beta0 = zero.BETX[zero.indx[name]]
-            alfa0 = zero.ALFX[zero.indx[name]]
-            try:
-                alfa0err = zero.STDALFX[zero.indx[name]]
-            except AttributeError:
-                alfa0err = zero.ERRALFX[zero.indx[name]]
-
-
-            beta0m = twiss.BETX[twiss.indx[name]]
-            alfa0m = twiss.ALFX[twiss.indx[name]]
-
-            wmo = twiss.WX[twiss.indx[name]]
-            pmo = twiss.PHIX[twiss.indx[name]]
-        else:
-
-            beta0 = zero.BETY[zero.indx[name]]
-            alfa0 = zero.ALFY[zero.indx[name]]
-            try:
-                alfa0err = zero.STDALFY[zero.indx[name]]
-            except AttributeError:
-                alfa0err = zero.ERRALFY[zero.indx[name]]
-
-            beta0m = twiss.BETY[twiss.indx[name]]
-            alfa0m = twiss.ALFY[twiss.indx[name]]
-
-            wmo = twiss.WY[twiss.indx[name]]
-            pmo = twiss.PHIY[twiss.indx[name]]
-        for dpp in listx:
-            _file = listy[dpp]
-            ix = _file.indx[name]
-            indx.append(ix)
-            if "H" in plane:
-                b.append(_file.BETX[ix])
-                a.append(_file.ALFX[ix])
-
-                bm.append(_file.BETXMDL[_file.indx[name]])
-                am.append(_file.ALFXMDL[_file.indx[name]])
-            else:
-                b.append(_file.BETY[ix])
-                a.append(_file.ALFY[ix])
-
-                bm.append(_file.BETYMDL[_file.indx[name]])
-                am.append(_file.ALFYMDL[_file.indx[name]])
-
-        bfit = linreg(listx, b)
-        afit = linreg(listx, a)
-
-        bfitm = linreg(listx, bm)
-        afitm = linreg(listx, am)
-
+    names = [bpm[1] for bpm in bpms]
+    p = "X" if "H" in plane else "Y"
+
+    zero_indx = _get_indices(zero, names)
+    beta0 = getattr(zero, "BET" + p)[zero_indx]
+    alfa0 = getattr(zero, "ALF" + p)[zero_indx]
+    try:
+        alfa0err = getattr(zero, "STDALF" + p)[zero_indx]
+    except AttributeError:
+        alfa0err = getattr(zero, "ERRALF" + p)[zero_indx]
+
+    twiss_indx = _get_indices(twiss, names)
+    beta0m = getattr(twiss, "BET" + p)[twiss_indx]
+    alfa0m = getattr(twiss, "ALF" + p)[twiss_indx]
+    wmo = getattr(twiss, "W" + p)[twiss_indx]
+    pmo = getattr(twiss, "PHI" + p)[twiss_indx]
+
+    bweights, aweights = None, None
+    if weighted:
+        bweights = _get_weights(_get_values(listy, listx, names, "ERRBET" + p))
+        aweights = _get_weights(_get_values(listy, listx, names, "ERRALF" + p))
+
+    bfit = linreg_batch(listx, _get_values(listy, listx, names, "BET" + p), bweights)
+    afit = linreg_batch(listx, _get_values(listy, listx, names, "ALF" + p), aweights)
+
+    bfitm = linreg_batch(listx, _get_values(listy, listx, names, "BET" + p + "MDL"))
+    afitm = linreg_batch(listx, _get_values(listy, listx, names, "ALF" + p + "MDL"))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
         # measurement
         dbb = bfit[0]/beta0
         dbberr = bfit[3]/beta0
@@ -564,11 +596,11 @@ def _do_lin_reg_bet(fileobj, listx, listy, bpms, plane, zero, twiss):
         A = dbb
         Aerr = dbberr
         B = da-alfa0*dbb
-        Berr = math.sqrt(daerr**2 + (alfa0err*dbb)**2 + (alfa0*dbberr)**2)
-        w = 0.5*math.sqrt(A**2+B**2)
-        werr = 0.5*math.sqrt( (Aerr*A/w)**2 + (Berr*B/w)**2  )
-        phi = math.atan2(B,A)/2./math.pi
-        phierr = 1./(1.+(A/B)**2)*math.sqrt( (Aerr/B)**2 + (A/B**2*Berr)**2)/2./math.pi
+        Berr = np.sqrt(daerr**2 + (alfa0err*dbb)**2 + (alfa0*dbberr)**2)
+        w = 0.5*np.sqrt(A**2+B**2)
+        werr = 0.5*np.sqrt( (Aerr*A/w)**2 + (Berr*B/w)**2  )
+        phi = np.arctan2(B,A)/2./np.pi
+        phierr = 1./(1.+(A/B)**2)*np.sqrt( (Aerr/B)**2 + (A/B**2*Berr)**2)/2./np.pi
 
         #model
         dbbm = bfitm[0]/beta0m
@@ -578,16 +610,43 @@ def _do_lin_reg_bet(fileobj, listx, listy, bpms, plane, zero, twiss):
         Am = dbbm
         Aerrm = dbberrm
         Bm = dam-alfa0m*dbbm
-        Berrm = math.sqrt(daerrm**2 + (alfa0m*dbberrm)**2)
-        wm = 0.5*math.sqrt(Am**2+Bm**2)
-        werrm = 0.5*math.sqrt( (Aerrm*Am/wm)**2 + (Berrm*Bm/wm)**2  )
-        phim = math.atan2(Bm,Am)/2./math.pi
-        phierrm = 1./(1.+(Am/Bm)**2)*math.sqrt( (Aerrm/Bm)**2 + (Am/Bm**2*Berrm)**2)/2./math.pi
+        Berrm = np.sqrt(daerrm**2 + (alfa0m*dbberrm)**2)
+        wm = 0.5*np.sqrt(Am**2+Bm**2)
+        werrm = 0.5*np.sqrt( (Aerrm*Am/wm)**2 + (Berrm*Bm/wm)**2  )
+        phim = np.arctan2(Bm,Am)/2./np.pi
+        phierrm = 1./(1.+(Am/Bm)**2)*np.sqrt( (Aerrm/Bm)**2 + (Am/Bm**2*Berrm)**2)/2./np.pi
 
-        fileobj.writeLine(locals().copy())
+    _write_lines(fileobj, bpms, locals())
 
 
-def _get_f(couplelist, dpplist, bpm_name, value):
+def _get_indices(twiss, names):
+    """ Returns array of the row-indices of names in metaclass twiss """
+    return np.array([twiss.indx[name] for name in names], dtype=int)
+
+
+def _get_values(twiss_dict, dpplist, names, column):
+    """ Returns array (dpp x bpm) of column at names from the files in twiss_dict """
+    return np.array([getattr(twiss_dict[dpp], column)[_get_indices(twiss_dict[dpp], names)]
+                     for dpp in dpplist], dtype=float)
+
+
+def _get_weights(errors):
+    """ Inverse variance weights, invalid errors get the largest error of their BPM """
+    errors = np.where(np.isfinite(errors) & (errors > 0), errors, np.nan)
+    errors = np.where(np.isnan(errors), np.nanmax(errors, axis=0), errors)
+    return 1. / np.square(errors)
+
+
+def _write_lines(fileobj, bpms, columns):
+    """ Writes one line per bpm, columns contains arrays over the bpms """
+    for i, bpm in enumerate(bpms):
+        line = {"name": bpm[1], "sloc": bpm[0]}
+        for column in fileobj.columns[2:]:
+            line[column] = columns[column][i]
+        fileobj.writeLine(line)
+
+
+def _get_f(couplelist, dpplist, bpm_names, value, weights=None):
     """
     calculates the linear regression of 'value' for each
     dpp in dpplist
@@ -595,43 +654,41 @@ def _get_f(couplelist, dpplist, bpm_name, value):
     Args:
         couplelist: list of getcouple files (for each dpp)
         dpplist: list of all dpp values available
-        bpm_name: name of bpm
+        bpm_names: names of bpms
         value: name of column (e.g. F1001R)
-    """
-    lst = []
-    x = []
-    for dpp in dpplist:
-        x.append(dpp)
-        couplefile = couplelist[dpp]
-        lst.append(getattr(couplefile, value)[couplefile.indx[bpm_name]])
-
-    lreg = linreg(x, lst)
+        weights: array (dpp x bpm) of weights or None
 
+    Returns:
+        arrays of slopes and their errors
+    """
+    lreg = linreg_batch(dpplist, _get_values(couplelist, dpplist, bpm_names, value), weights)
     return lreg[0], lreg[3]
 
 
-def _do_linreg_coupling(couplelist, bpms, dpplist, fileobj):
+def _do_linreg_coupling(couplelist, bpms, dpplist, fileobj, weighted=False):
     """
     linreg for chromatic coupling
 
     Writes to fileobj the chromatic coupling.
     f1001, f1010 derivatives wrt dp/p, and errors.
     """
-    for bpm in bpms:
-        name = bpm[1]
-        sloc = bpm[0]
+    names = [bpm[1] for bpm in bpms]
+    w1001, w1010 = None, None
+    if weighted:
+        w1001 = _get_weights(_get_values(couplelist, dpplist, names, "FWSTD1"))
+        w1010 = _get_weights(_get_values(couplelist, dpplist, names, "FWSTD2"))
 
-        chr_f1001r, chr_err_f1001r = _get_f(couplelist, dpplist, name, 'F1001R')
-        chr_f1001i, chr_err_f1001i = _get_f(couplelist, dpplist, name, 'F1001I')
-        chr_f1010r, chr_err_f1010r = _get_f(couplelist, dpplist, name, 'F1010R')
-        chr_f1010i, chr_err_f1010i = _get_f(couplelist, dpplist, name, 'F1010I')
+    chr_f1001r, chr_err_f1001r = _get_f(couplelist, dpplist, names, 'F1001R', w1001)
+    chr_f1001i, chr_err_f1001i = _get_f(couplelist, dpplist, names, 'F1001I', w1001)
+    chr_f1010r, chr_err_f1010r = _get_f(couplelist, dpplist, names, 'F1010R', w1010)
+    chr_f1010i, chr_err_f1010i = _get_f(couplelist, dpplist, names, 'F1010I', w1010)
 
-        mdl_chr_f1001r, mdl_chr_err_f1001r = _get_f(couplelist, dpplist, name, 'MDLF1001R')
-        mdl_chr_f1001i, mdl_chr_err_f1001i = _get_f(couplelist, dpplist, name, 'MDLF1001I')
-        mdl_chr_f1010r, mdl_chr_err_f1010r = _get_f(couplelist, dpplist, name, 'MDLF1010R')
-        mdl_chr_f1010i, mdl_chr_err_f1010i = _get_f(couplelist, dpplist, name, 'MDLF1010I')
+    mdl_chr_f1001r, mdl_chr_err_f1001r = _get_f(couplelist, dpplist, names, 'MDLF1001R')
+    mdl_chr_f1001i, mdl_chr_err_f1001i = _get_f(couplelist, dpplist, names, 'MDLF1001I')
+    mdl_chr_f1010r, mdl_chr_err_f1010r = _get_f(couplelist, dpplist, names, 'MDLF1010R')
+    mdl_chr_f1010i, mdl_chr_err_f1010i = _get_f(couplelist, dpplist, names, 'MDLF1010I')
 
-        fileobj.writeLine(locals().copy())
+    _write_lines(fileobj, bpms, locals())
 
 
 def _get_tunes(model_file, fileslist):
@@ -704,6 +761,44 @@ def linreg(X, Y):
     return a, b, RR, np.sqrt(Var_a), np.sqrt(Var_b)
 
 
+def linreg_batch(X, Y, weights=None):
+    """
+    Weighted linear regressions y = ax + b of all columns of Y at once.
+
+    Same results as linreg for each column if no weights are given. The errors of a and b are
+    scaled by the residuals (s^2), as in linreg.
+
+    Args:
+        X: list or array of the N x-values
+        Y: array (N x M), M series to fit
+        weights: array (N x M) of weights, or None for equal weights
+
+    Returns:
+        arrays of a, b, R^2, error of a, error of b for all M series
+    """
+    x = np.asarray(X, dtype=float)[:, np.newaxis]
+    y = np.asarray(Y, dtype=float)
+    if y.shape[0] != x.shape[0]:
+        raise ValueError('unequal length')
+    n = x.shape[0]
+    w = np.ones_like(y) if weights is None else np.asarray(weights, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sw = np.sum(w, axis=0)
+        sx = np.sum(w * x, axis=0)
+        sy = np.sum(w * y, axis=0)
+        sxx = np.sum(w * x * x, axis=0)
+        sxy = np.sum(w * x * y, axis=0)
+        det = sxx * sw - sx * sx
+        a = (sxy * sw - sy * sx) / det
+        b = (sxx * sy - sx * sxy) / det
+        meanerror = np.sum(w * (y - sy / sw) ** 2, axis=0)
+        residual = np.sum(w * (y - a * x - b) ** 2, axis=0)
+        rr = np.where((residual == 0) & (meanerror == 0), 1.0, 1 - residual / meanerror)
+        ss = residual / (n - 2) if n > 2 else np.zeros_like(residual)
+        var_a, var_b = ss * sw / det, ss * sxx / det
+    return a, b, rr, np.sqrt(var_a), np.sqrt(var_b)
+
+
 def _join_with_output_path(output_path, *path_tokens):
     return os.path.join(output_path, *path_tokens)
 
@@ -10,6 +10,7 @@ from numpy import *
 import pickle
 
 from metaclass import twiss
+from orm_engine import CalibrationSolver
 from variableNames import *
 import datetime
 import time
@@ -88,34 +89,22 @@ def writeparams(deltafamily, variables, oldCal, iteration, app, path):
     return
 
 ####################################################################
-def correctbeatWei(ORMcalc, ORMmeas, minWei, beat_input, oldCal,  cut, iteration, app, path):
+def correctbeatWei(ORMcalc, ORMmeas, solver, beat_input, oldCal, iteration, app, path):
 ######################################################################
+	# solver: CalibrationSolver of the weighted sensitivity matrix, see beat_input.getSolver
 	
-	wei=beat_input.weightsList(ORMmeas, minWei)
+	wei=solver.weights
 	print 'wei = ',wei
-	
-	R=   transpose(beat_input.response_matrix)
-	print "dim R = ",shape(R)
 	print "dim wei = ",shape(wei)
-	RW=transpose(transpose(R)*wei)
+	RW=solver.weighted_response
 
-	D=[]
-	i=0
-	for vec in transpose(RW):
-		dLine=[]
-		for j in range(len(transpose(RW))):
-			if j==i:
-				dLine.append(linalg.norm(vec))
-			else:
-				dLine.append(0.0)
-		D.append(dLine)
-		i=i+1
+	D=diag(linalg.norm(RW, axis=0))
 	print "dim D = ",shape(D)
 	print "D = ",D
 	
 	vector=beat_input.computevectorEXP(ORMcalc, ORMmeas)
 	vWei=vector*wei
-	delta=dot(linalg.pinv(RW,cut),vWei) # sign - is removed for constructing error model
+	delta=solver.solve(vector) # sign - is removed for constructing error model
         
 	'''
 	if iteration==0:
@@ -201,6 +190,14 @@ class beat_input:
 				
 		return array(concatenate([orx,ory]))
 	
+	#############################################################################
+	def getSolver(self, ORMmeas, minWei, cut):	# weighted least-squares solver of the calibration fit, built once per sensitivity matrix
+	###############################################################################
+
+		R=transpose(self.response_matrix)
+		print "dim R = ",shape(R)
+		return CalibrationSolver(R, self.weightsList(ORMmeas, minWei), cut)
+
 	#############################################################################
 	def weightsList(self, ORMmeas, minWei):		# calculate weights for measured differences (based on uncertainty of measurement)
 	###############################################################################
@@ -39,11 +39,15 @@ parser.add_option("-e", "--errorcut",
 parser.add_option("-s", "--MinStr",
                   help="Minimum strength of correctors in SVD correction (default is 0.0001)",
                   metavar="MinStr", default=0.0001 , dest="MinStr")
+parser.add_option("-o", "--cachedir",
+                  help="Directory to cache the analytic orbit response matrices in (default is no cache)",
+                  metavar="CACHEDIR", default="" , dest="cachedir")
 
 (options, args) = parser.parse_args()
 MinStr = float(options.MinStr)
 minWei=float(options.errorcut) 
 svcut= float(options.svcut)
+ORMcache=options.cachedir	# read by calcORM.py and generateORM.py
 
 datafilename = options.path+options.file
 print 'ORM file = ', datafilename
@@ -92,7 +96,8 @@ for iteration in range(0,4):
     
     beat_inp=beat_input(varslist, mlist)
     sensitivity_matrix=beat_inp.computeResponseMatrix(FullResponse)
-    [deltas, varslist] = correctbeatWei(FullResponse, ORMmeas, minWei, beat_inp, oldCalb, svcut, iteration, 0, "results/")
+    solver=beat_inp.getSolver(ORMmeas, minWei, svcut)
+    [deltas, varslist] = correctbeatWei(FullResponse, ORMmeas, solver, beat_inp, oldCalb, iteration, 0, "results/")
     print deltas
 
     execfile('calcORM.py')
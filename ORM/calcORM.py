@@ -11,41 +11,49 @@ from numpy import dot as matrixmultiply
 import pickle
 
 from Python_Classes4MAD.metaclass import twiss
+import orm_engine
 
 ##############################
-def orbit(bpms, vc, twiss,twissall):
+def orbit(bpms, correctors, calibrations, twiss, twissall):
 ##############################
-    
-	u=0	
-	for bpm in bpms:
-		Qx=twiss.Q1
-		Qy=twiss.Q2
-		if vc[5]=='V':	# this condition will need to be changed if the corrector has a naming convention different from that in PSB
-			dy=(1+calY[u])/(1+calCV[d])*sqrt(twiss.BETY[twiss.indx[bpm]]*twiss.BETY[twiss.indx[vc]])/(2*sin(pi*Qy))*cos(2*pi*abs(twiss.MUY[twiss.indx[bpm]]-twiss.MUY[twiss.indx[vc]])-pi*Qy)
-			dx=0
-		else:
-			dx=(1+calX[u])/(1+calCH[d])*sqrt(twiss.BETX[twiss.indx[bpm]]*twiss.BETX[twiss.indx[vc]])/(2*sin(pi*Qx))*cos(2*pi*abs(twiss.MUX[twiss.indx[bpm]]-twiss.MUX[twiss.indx[vc]])-pi*Qx)
-			dy=0.0
-		s=twiss.S[twiss.indx[bpm]]
-		ft.write(vc+'-'+bpm+' '+str(s)+' '+str(dx)+' '+str(dy)+' '+str(Qx)+' '+str(Qy)+'\n')
-		u=u+1	
-	     
-	for j in twissall.NAME:
-		Qx=twiss.Q1
-		Qy=twiss.Q2
-		if j.split('_')[0]=='DRIFT':
-			continue
-		if vc[5]=='V':	# this condition will need to be changed if the corrector has a naming convention different from that in PSB
-			dy=sqrt(twissall.BETY[twissall.indx[j]]*twissall.BETY[twissall.indx[vc]])/(2*sin(pi*Qy))*cos(2*pi*abs(twissall.MUY[twissall.indx[j]]-twissall.MUY[twissall.indx[vc]])-pi*Qy)
-			dx=0
+	# response of the BPMs (with calibrations) and of all elements but drifts to all correctors
+	tunes=(twiss.Q1, twiss.Q2)
+	response_x, response_y=get_response('twiss.orbit.dat', twiss, bpms, correctors, (calX, calY), calibrations)
+	writeresponse(ft, twiss, bpms, bpms, correctors, response_x, response_y, tunes)
+
+	names=[j for j in twissall.NAME if j.split('_')[0]!='DRIFT']
+	labels=[twissall.NAME[twissall.indx[j]] for j in names]
+	response_x, response_y=get_response('twiss.all.dat', twissall, names, correctors, tunes=tunes)
+	writeresponse(gt, twissall, names, labels, correctors, response_x, response_y, tunes)
+
+
+##############################
+def get_response(twiss_path, twiss, names, correctors, bpm_calibrations=(None, None), calibrations=None, tunes=None):
+##############################
+	# analytic orbit response, cached in cache_dir if it is given
+	if cache_dir is None:
+		return orm_engine.get_orbit_response(twiss, names, correctors, bpm_calibrations, calibrations, tunes)
+	return orm_engine.get_cached_orbit_response(twiss_path, twiss, names, correctors, cache_dir,
+	                                            bpm_calibrations, calibrations, tunes)
+
+
+##############################
+def writeresponse(out, twiss, names, labels, correctors, response_x, response_y, tunes):
+##############################
+	s=[str(twiss.S[twiss.indx[name]]) for name in names]
+	tail=' '+str(tunes[0])+' '+str(tunes[1])+'\n'
+	lines=[]
+	for j, vc in enumerate(correctors):
+		if orm_engine.is_vertical(vc):
+			dxs=['0']*len(names)
+			dys=[str(dy) for dy in response_y[:, j]]
 		else:
-			dx=sqrt(twissall.BETX[twissall.indx[j]]*twissall.BETX[twissall.indx[vc]])/(2*sin(pi*Qx))*cos(2*pi*abs(twissall.MUX[twissall.indx[j]]-twissall.MUX[twissall.indx[vc]])-pi*Qx)
-			dy=0.0
-		s=twissall.S[twissall.indx[j]]
-		label=twissall.NAME[twissall.indx[j]]
-		gt.write(vc+'-'+label+' '+str(s)+' '+str(dx)+' '+str(dy)+' '+str(Qx)+' '+str(Qy)+'\n')
-	    
- 
+			dxs=[str(dx) for dx in response_x[:, j]]
+			dys=['0.0']*len(names)
+		for label, s_str, dx, dy in zip(labels, s, dxs, dys):
+			lines.append(vc+'-'+label+' '+s_str+' '+dx+' '+dy+tail)
+	out.write(''.join(lines))
+
 
 #########################
 def justtwiss():
@@ -83,6 +91,11 @@ calY=bpmCalbV()
 #print "calY = ",calY
 
 
+try:
+	cache_dir=ORMcache or None	# set by ORM.py
+except NameError:
+	cache_dir=None
+
 ft=open('results/ORM_calc_'+str(iteration+1)+'.dat','w')
 ft.write('* NAME S X Y QX QY\n')
 ft.write('$ %s %le %le %le %le %le\n')
@@ -95,15 +108,8 @@ g = open ('changeparametersORM', 'w')		# remove old values from this file
 g.close()
 MADtwiss=justtwiss()
     
-d=0	    
-for vc in varCH:
-	orbit(varU,vc,MADtwiss[0],MADtwiss[1])
-	d=d+1
-
-d=0	    
-for vc in varCV:
-	orbit(varU,vc,MADtwiss[0],MADtwiss[1])
-	d=d+1
+orbit(varU,varCH,calCH,MADtwiss[0],MADtwiss[1])
+orbit(varU,varCV,calCV,MADtwiss[0],MADtwiss[1])
 
 ft.close()
 gt.close()
@@ -11,35 +11,9 @@ from numpy import dot as matrixmultiply
 import pickle
 
 from Python_Classes4MAD.metaclass import twiss
+import orm_engine
 
 
-
-##############################
-def orbit(bpms, vc, twiss):	# calculate orbit response to dipole using analytical expression based on twiss parameters. Will meed to be adjusted for different machines, to determine which correctors are H or V
-##############################
-
-	ft=open('twiss.resp.dat','w')
-
-	ft.write('* NAME S X Y QX QY\n')
-	ft.write('$ %s %le %le %le %le %le\n')
-
-	u=0	
-	for bpm in bpms:
-		Qx=twiss.Q1
-		Qy=twiss.Q2
-		if vc[5]=='V':	# this condition will need to be changed if the corrector has a naming convention different from that in PSB
-			dy=(1+calY[u])/(1+calCV[d])*sqrt(twiss.BETY[twiss.indx[bpm]]*twiss.BETY[twiss.indx[vc]])/(2*sin(pi*Qy))*cos(2*pi*abs(twiss.MUY[twiss.indx[bpm]]-twiss.MUY[twiss.indx[vc]])-pi*Qy)
-			dx=0
-		else:
-			dx=(1+calX[u])/(1+calCH[d])*sqrt(twiss.BETX[twiss.indx[bpm]]*twiss.BETX[twiss.indx[vc]])/(2*sin(pi*Qx))*cos(2*pi*abs(twiss.MUX[twiss.indx[bpm]]-twiss.MUX[twiss.indx[vc]])-pi*Qx)
-			dy=0.0
-		s=twiss.S[twiss.indx[bpm]]
-		ft.write(bpm+' '+str(s)+' '+str(dx)+' '+str(dy)+' '+str(Qx)+' '+str(Qy)+'\n')
-		u=u+1
-	
-	ft.close()
-
-    
 ######################### For ORM
 def writeparams(variable, increment):
 #########################
@@ -84,6 +58,11 @@ print "xCal = ",calX
 print "yCal = ",calY
 
 
+try:
+	cache_dir=ORMcache or None	# set by ORM.py
+except NameError:
+	cache_dir=None
+
 incrQ=0.0001				# increment by which variable parameters will be changed
 FullResponse['incrQ']=incrQ		#Store this info for future use
 	
@@ -93,21 +72,13 @@ for vq in varQ: # loop over quads for strength; for dummy quad k0, loop over BPM
 	writeparams(vq, incrQ)
 	MADtwiss=justtwiss()
 
-	d=0
-	for vc in varCH:
-		var=vq+'-'+vc
-		orbit(varU,vc,MADtwiss)
-		FullResponse[var]=twiss('twiss.resp.dat')
-		print var
-		d=d+1
-
-	d=0
-	for vc in varCV:
+	# orbit response to all dipoles at once, calculated analytically from the twiss parameters
+	responses=orm_engine.get_responses(MADtwiss, varU, varCH+varCV, (calX, calY), list(calCH)+list(calCV),
+	                                   'twiss.orbit.dat', cache_dir)
+	for vc in varCH+varCV:
 		var=vq+'-'+vc
-		orbit(varU,vc,MADtwiss)
-		FullResponse[var]=twiss('twiss.resp.dat')
+		FullResponse[var]=responses[vc]
 		print var
-		d=d+1
 		   
 pickle.dump(FullResponse,open('FullResponse','w'),-1)
 
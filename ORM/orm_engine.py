@@ -0,0 +1,173 @@
+"""
+Module ORM.orm_engine
+----------------------
+
+Analytic orbit response matrix (ORM) of a twiss model and the calibration fit of the ORM tools.
+
+The response of all BPMs to all correctors is evaluated at once from the beta and phase
+arrays of the model,
+
+    R = (1 + cal_bpm) / (1 + cal_cor) * sqrt(beta_bpm * beta_cor) / (2 sin(pi Q))
+        * cos(2 pi |mu_bpm - mu_cor| - pi Q),
+
+horizontal correctors only act on the horizontal plane and vertical ones on the vertical plane.
+The matrices can be cached in a numpy file keyed by the model content, the names and the
+calibrations. The calibration fit factorizes the weighted sensitivity matrix once and solves
+any number of measurements with it.
+"""
+import os
+import hashlib
+import numpy as np
+
+CACHE_VERSION = 1
+
+
+def is_vertical(corrector):
+    """ True for vertical correctors (PSB naming convention, e.g. BR3.DVT2L4). """
+    return corrector[5] == 'V'
+
+
+class OrbitResponse(object):
+    """ In-memory replacement of the former twiss.resp.dat files.
+
+    Offers the NAME, S, X, Y, QX, QY columns and the indx dictionary of the metaclass twiss,
+    which GenMatrix accesses.
+    """
+    def __init__(self, names, s, x, y, qx, qy):
+        self.NAME = list(names)
+        self.S = np.asarray(s)
+        self.X = np.asarray(x)
+        self.Y = np.asarray(y)
+        self.QX = np.full(len(self.NAME), qx)
+        self.QY = np.full(len(self.NAME), qy)
+        self.indx = {}
+        for index, name in enumerate(self.NAME):
+            self.indx[name] = index
+            self.indx[name.upper()] = index
+            self.indx[name.lower()] = index
+
+
+def get_orbit_response(twiss, bpms, correctors, bpm_calibrations=(None, None),
+                       corrector_calibrations=None, tunes=None):
+    """ Returns the horizontal and vertical (BPM x corrector) orbit response matrices.
+
+    Args:
+        twiss: metaclass twiss of the model (needs indx, Q1, Q2, BETX, BETY, MUX and MUY).
+        bpms: names of the BPMs.
+        correctors: names of the correctors, horizontal and vertical ones mixed.
+        bpm_calibrations: horizontal and vertical calibrations of the BPMs, None for 0.
+        corrector_calibrations: calibrations of the correctors, None for 0.
+        tunes: horizontal and vertical tune, default Q1 and Q2 of twiss.
+    """
+    if tunes is None:
+        tunes = (twiss.Q1, twiss.Q2)
+    bpm_indices = [twiss.indx[bpm] for bpm in bpms]
+    cor_indices = [twiss.indx[corrector] for corrector in correctors]
+    vertical = np.array([is_vertical(corrector) for corrector in correctors], dtype=bool)
+    cor_calibrations = _get_calibrations(corrector_calibrations, len(correctors))
+    responses = []
+    for plane, tune, bpm_calibration, plane_correctors in (
+            ("X", tunes[0], bpm_calibrations[0], ~vertical),
+            ("Y", tunes[1], bpm_calibrations[1], vertical)):
+        beta = np.asarray(getattr(twiss, "BET" + plane))
+        phase = np.asarray(getattr(twiss, "MU" + plane))
+        calibration = ((1 + _get_calibrations(bpm_calibration, len(bpms)))[:, np.newaxis] /
+                       (1 + cor_calibrations)[np.newaxis, :])
+        response = (calibration *
+                    np.sqrt(np.outer(beta[bpm_indices], beta[cor_indices])) /
+                    (2 * np.sin(np.pi * tune)) *
+                    np.cos(2 * np.pi * np.abs(phase[bpm_indices][:, np.newaxis] -
+                                              phase[cor_indices][np.newaxis, :]) - np.pi * tune))
+        response[:, ~plane_correctors] = 0.
+        responses.append(response)
+    return tuple(responses)
+
+
+def get_cached_orbit_response(twiss_path, twiss, bpms, correctors, cache_dir,
+                              bpm_calibrations=(None, None), corrector_calibrations=None,
+                              tunes=None):
+    """ get_orbit_response, read from or written to an npz-file in cache_dir.
+
+    The file is keyed by the content of the twiss file, the names, the calibrations and the tunes.
+    """
+    key = _get_cache_key(twiss_path, bpms, correctors, bpm_calibrations,
+                         corrector_calibrations, tunes)
+    cache_path = os.path.join(cache_dir, "orm_{}.npz".format(key))
+    if os.path.isfile(cache_path):
+        cached = np.load(cache_path)
+        return cached["X"], cached["Y"]
+    response_x, response_y = get_orbit_response(twiss, bpms, correctors, bpm_calibrations,
+                                                 corrector_calibrations, tunes)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    np.savez(cache_path, X=response_x, Y=response_y)
+    return response_x, response_y
+
+
+def get_responses(twiss, bpms, correctors, bpm_calibrations=(None, None),
+                  corrector_calibrations=None, twiss_path=None, cache_dir=None):
+    """ Orbit responses of every corrector as OrbitResponse, by corrector name.
+
+    With cache_dir, the matrices are cached by get_cached_orbit_response, keyed by the file
+    twiss_path the twiss was read from.
+    """
+    if cache_dir is None:
+        response_x, response_y = get_orbit_response(twiss, bpms, correctors, bpm_calibrations,
+                                                     corrector_calibrations)
+    else:
+        response_x, response_y = get_cached_orbit_response(
+            twiss_path, twiss, bpms, correctors, cache_dir, bpm_calibrations,
+            corrector_calibrations)
+    s = np.asarray(twiss.S)[[twiss.indx[bpm] for bpm in bpms]]
+    return {corrector: OrbitResponse(bpms, s, response_x[:, index], response_y[:, index],
+                                     twiss.Q1, twiss.Q2)
+            for index, corrector in enumerate(correctors)}
+
+
+class CalibrationSolver(object):
+    """ Weighted least-squares solution of the calibration fit.
+
+    Equivalent to dot(pinv(response * weights, cut), vector * weights), the singular value
+    decomposition of the weighted response is done once and reused by every solve.
+
+    Args:
+        response: (measurement x calibration) sensitivity matrix.
+        weights: weights of the measurements.
+        cut: relative singular value cutoff, as rcond of numpy.linalg.pinv.
+    """
+    def __init__(self, response, weights, cut):
+        self.weights = np.asarray(weights, dtype=float)
+        self.weighted_response = np.asarray(response, dtype=float) * self.weights[:, np.newaxis]
+        u, s, vt = np.linalg.svd(self.weighted_response, full_matrices=False)
+        keep = s > cut * np.max(s)
+        self._u = u[:, keep]
+        self._inverse_s = 1. / s[keep]
+        self._vt = vt[keep]
+
+    def solve(self, vectors):
+        """ Calibration changes for one or, as columns, several measured differences. """
+        vectors = np.asarray(vectors, dtype=float)
+        weighted = vectors * (self.weights if vectors.ndim == 1 else
+                              self.weights[:, np.newaxis])
+        projected = np.dot(self._u.T, weighted)
+        if vectors.ndim == 1:
+            return np.dot(self._vt.T, projected * self._inverse_s)
+        return np.dot(self._vt.T, projected * self._inverse_s[:, np.newaxis])
+
+
+def _get_calibrations(calibrations, length):
+    if calibrations is None:
+        return np.zeros(length)
+    return np.asarray(calibrations, dtype=float)
+
+
+def _get_cache_key(twiss_path, bpms, correctors, bpm_calibrations, corrector_calibrations,
+                   tunes):
+    key = hashlib.sha1()
+    with open(twiss_path, "rb") as twiss_file:
+        key.update(twiss_file.read())
+    key.update(repr((CACHE_VERSION, list(bpms), list(correctors))))
+    for calibrations in tuple(bpm_calibrations) + (corrector_calibrations,):
+        key.update(repr(None if calibrations is None else list(calibrations)))
+    key.update(repr(None if tunes is None else [float(tune) for tune in tunes]))
+    return key.hexdigest()
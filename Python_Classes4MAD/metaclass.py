@@ -10,7 +10,10 @@
 # - removed all trailing ";"
 # - tested it for getllm/lhc, produces exactly same results
 # (getllm called only Cmatrix and chiterms functions))
-# 
+# version 3 20181019:
+# - table is split once and converted column by column instead of cell by cell,
+#   falls back to the line by line parser for irregular tables
+#
 
 """
 Read the twiss class from the twiss file
@@ -100,11 +103,17 @@ class twiss:
             f = gzip.open(filename, 'rb')
         else:
             f = open(filename, 'r')
+        table_lines = []
         for line in f:
             is_line_parsed = False # Check if line was parsed otherwise print info (vimaier)
             
             if line.startswith("#"): # comment line
                 continue
+
+            if ("@" not in line and "*" not in line and "$" not in line and "#" not in line):
+            # Table-entry-line, parsed all at once below
+                table_lines.append(line)
+                continue
             
             if ("@ " not in line and "@" in line):
                 line = line.replace("@" , "@ ")
@@ -142,26 +151,6 @@ class twiss:
                 alltypes = split_line
                 is_line_parsed = True
 
-            if ("@" not in line and "*" not in line and "$" not in line and "#" not in line):
-            # Table-entry-line
-                values = split_line
-                for j in range(0,len(values)):
-                    if ("%hd" in alltypes[j + 1] or "%d" in alltypes[j + 1] ):
-                        getattr(self, alllabels[j + 1]).append(int(values[j]))
-                    if ("%le" in alltypes[j + 1]):
-                        getattr(self, alllabels[j + 1]).append(float(values[j]))
-                    if ("%im" in alltypes[j + 1]):
-                        getattr(self, alllabels[j + 1]).append(complex(values[j]))
-                    if ("s" in alltypes[j+1]):
-                        getattr(self, alllabels[j + 1]).append(values[j].replace("\"", ""))
-                        if "NAME" == alllabels[j + 1]:
-                            NAME = getattr(self, "NAME")
-                            self.indx[values[j].replace("\"", "")] = len(NAME) - 1
-                            self.indx[values[j].replace("\"", "").upper()] = len(NAME) - 1
-                            self.indx[values[j].replace("\"", "").lower()] = len(NAME) - 1
-                self.__has_parsed_a_table_row = True
-                is_line_parsed = True
-            
             if not is_line_parsed and self.debug:
                 LOGGER.debug("Did not parse line (%s) in %s"," ".join(split_line),filename)
                 #print >> sys.stderr,"Did not parse line ("," ".join(split_line),") in ",filename
@@ -173,6 +162,11 @@ class twiss:
             print >> sys.stderr, "From Metaclass: Bad format or empty file ", filename
             raise ValueError
 
+        if len(table_lines) > 0:
+            self.__has_parsed_a_table_row = True
+            if not self._parse_table(table_lines, alllabels, alltypes):
+                for line in table_lines:
+                    self._parse_table_line(line.split(), alllabels, alltypes)
 
         for j in range(1, len(alllabels)):
             if (("%le" in alltypes[j]) | ("%hd" in alltypes[j])):
@@ -181,6 +175,50 @@ class twiss:
         if len(dictionary) > 0:
             self.forknames(dictionary)
             
+    def _parse_table(self, table_lines, alllabels, alltypes):
+        """ Parses all table rows at once into the columns.
+        Returns False if the table is irregular (missing or additional cells), nothing is set then.
+        """
+        n_columns = len(alllabels) - 1
+        rows = [row for row in (line.split() for line in table_lines) if row]
+        if any(len(row) != n_columns for row in rows):
+            return False
+        columns = zip(*rows) if rows else [()] * n_columns
+        for label, column_type, values in zip(alllabels[1:], alltypes[1:], columns):
+            if ("%hd" in column_type or "%d" in column_type):
+                setattr(self, label, map(int, values))
+            elif ("%le" in column_type):
+                setattr(self, label, numpy.array(map(float, values)))
+            elif ("%im" in column_type):
+                setattr(self, label, map(complex, values))
+            elif ("s" in column_type):
+                names = [value.replace("\"", "") for value in values]
+                setattr(self, label, names)
+                if "NAME" == label:
+                    # same order of assignment as in _parse_table_line
+                    for row_index, name in enumerate(names):
+                        self.indx[name] = row_index
+                        self.indx[name.upper()] = row_index
+                        self.indx[name.lower()] = row_index
+        return True
+
+    def _parse_table_line(self, values, alllabels, alltypes):
+        """ Parses one table row, appending to the columns """
+        for j in range(0,len(values)):
+            if ("%hd" in alltypes[j + 1] or "%d" in alltypes[j + 1] ):
+                getattr(self, alllabels[j + 1]).append(int(values[j]))
+            if ("%le" in alltypes[j + 1]):
+                getattr(self, alllabels[j + 1]).append(float(values[j]))
+            if ("%im" in alltypes[j + 1]):
+                getattr(self, alllabels[j + 1]).append(complex(values[j]))
+            if ("s" in alltypes[j+1]):
+                getattr(self, alllabels[j + 1]).append(values[j].replace("\"", ""))
+                if "NAME" == alllabels[j + 1]:
+                    NAME = getattr(self, "NAME")
+                    self.indx[values[j].replace("\"", "")] = len(NAME) - 1
+                    self.indx[values[j].replace("\"", "").upper()] = len(NAME) - 1
+                    self.indx[values[j].replace("\"", "").lower()] = len(NAME) - 1
+
     def set_debug(self, flag):
         self.debug = flag 
 
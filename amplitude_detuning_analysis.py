@@ -9,7 +9,9 @@ additionally getting BBQ data from timber, averaging and filtering this data and
 subtracting it from the measurement data.
 
 Furthermore, the orthogonal distance regression is utilized to get a
-linear fit from the measurements.
+linear fit from the measurements. All fits (both tune planes, with and without BBQ correction)
+are solved together, optionally with bootstrap or jackknife resampling of the kicks for
+more robust uncertainties of the detuning.
 
 Also, plotting functionality is integrated, for the amplitude detuning as well as for the bbq data.
 
@@ -47,6 +49,8 @@ TIMEZONE = ta_const.get_experiment_timezone()
 
 DTIME = 60  # extra seconds to add to kickac times when extracting from timber
 
+RESAMPLING_METHODS = ("bootstrap", "jackknife")
+
 LOG = logging_tools.get_logger(__name__)
 
 # Get Parameters #############################################################
@@ -105,6 +109,26 @@ def _get_params():
         name="kickac_out",
         type=str,
     )
+    params.add_parameter(
+        flags="--resampling",
+        help="Resampling of the kicks for the uncertainty of the detuning.",
+        name="resampling",
+        choices=RESAMPLING_METHODS,
+        type=str,
+    )
+    params.add_parameter(
+        flags="--resamples",
+        help="Number of bootstrap samples.",
+        name="resamples",
+        type=int,
+        default=detuning_tools.RESAMPLES,
+    )
+    params.add_parameter(
+        flags="--seed",
+        help="Seed for the bootstrap samples.",
+        name="seed",
+        type=int,
+    )
     params.add_parameter(
         flags="--window",
         help="Length of the moving average window. (# data points)",
@@ -367,6 +391,14 @@ def analyse_with_bbq_corrections(opt):
                      **Flags**: --label
         logfile (str): Logfile if debug mode is active.
                        **Flags**: --logfile
+        resamples (int): Number of bootstrap samples.
+                         **Flags**: --resamples
+                         **Default**: ``1000``
+        resampling (str): Resampling of the kicks for the uncertainty of the detuning.
+                          **Flags**: --resampling
+                          **Choices**: ('bootstrap', 'jackknife')
+        seed (int): Seed for the bootstrap samples.
+                    **Flags**: --seed
         timber_in: Fill number of desired data or path to presaved tfs-file
                    **Flags**: --timberin
         timber_out (str): Output location to save fill as tfs-file
@@ -432,43 +464,42 @@ def analyse_with_bbq_corrections(opt):
                     two_plots=opt.bbq_plot_two,
                 )
 
-        # amplitude detuning odr and plotting
-        for tune_plane in PLANES:
-            for corr in [False, True]:
-                corr_label = "_corrected" if corr else ""
-
-                # get the proper data
-                data = kickac_modifiers.get_ampdet_data(kickac_df, opt.plane, tune_plane,
-                                                        corrected=corr)
-
-                # make the odr
-                odr_fit = detuning_tools.do_linear_odr(**data)
-                kickac_df = kickac_modifiers.add_odr(kickac_df, odr_fit, opt.plane, tune_plane,
-                                                     corrected=corr)
-
-                # plotting
-                labels = ta_const.get_paired_lables(opt.plane, tune_plane)
-                id_str = "J{:s}_Q{:s}{:s}".format(opt.plane.upper(), tune_plane.upper(), corr_label)
-
-                try:
-                    output = os.path.splitext(opt.ampdet_plot_out)
-                except AttributeError:
-                    output = None
-                else:
-                    output = "{:s}_{:s}{:s}".format(output[0], id_str, output[1])
-
-                figs[id_str] = detuning_tools.plot_detuning(
-                    odr_fit=odr_fit,
-                    odr_plot=detuning_tools.plot_linear_odr,
-                    labels={"x": labels[0], "y": labels[1], "line": opt.label},
-                    output=output,
-                    show=opt.ampdet_plot_show,
-                    xmin=opt.ampdet_plot_xmin,
-                    xmax=opt.ampdet_plot_xmax,
-                    ymin=opt.ampdet_plot_ymin,
-                    ymax=opt.ampdet_plot_ymax,
-                    **data
-                )
+        # amplitude detuning odr of all combinations at once
+        combinations = [(tune_plane, corr) for tune_plane in PLANES for corr in [False, True]]
+        datas = [kickac_modifiers.get_ampdet_data(kickac_df, opt.plane, tune_plane,
+                                                  corrected=corr)
+                 for tune_plane, corr in combinations]
+        odr_fits = detuning_tools.do_linear_odr_batch(datas, resampling=opt.resampling,
+                                                      n_resamples=opt.resamples, seed=opt.seed)
+
+        for (tune_plane, corr), data, odr_fit in zip(combinations, datas, odr_fits):
+            corr_label = "_corrected" if corr else ""
+            kickac_df = kickac_modifiers.add_odr(kickac_df, odr_fit, opt.plane, tune_plane,
+                                                 corrected=corr, resampling=opt.resampling)
+
+            # plotting
+            labels = ta_const.get_paired_lables(opt.plane, tune_plane)
+            id_str = "J{:s}_Q{:s}{:s}".format(opt.plane.upper(), tune_plane.upper(), corr_label)
+
+            try:
+                output = os.path.splitext(opt.ampdet_plot_out)
+            except AttributeError:
+                output = None
+            else:
+                output = "{:s}_{:s}{:s}".format(output[0], id_str, output[1])
+
+            figs[id_str] = detuning_tools.plot_detuning(
+                odr_fit=odr_fit,
+                odr_plot=detuning_tools.plot_linear_odr,
+                labels={"x": labels[0], "y": labels[1], "line": opt.label},
+                output=output,
+                show=opt.ampdet_plot_show,
+                xmin=opt.ampdet_plot_xmin,
+                xmax=opt.ampdet_plot_xmax,
+                ymin=opt.ampdet_plot_ymin,
+                ymax=opt.ampdet_plot_ymax,
+                **data
+            )
 
     # show plots if needed
     if opt.bbq_plot_show or opt.ampdet_plot_show:
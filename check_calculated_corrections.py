@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import re
 
@@ -13,6 +14,8 @@ from model import manager
 from utils import iotools
 from tfs_files import tfs_pandas
 from correction import getdiff
+from optics_measurements.io_filehandler import OpticsMeasurement
+from twiss_optics.optics_class import TwissOptics
 from global_correct_iterative import _get_measurment_data, _automate_modelcut, _get_measurement_filters
 
 LOG = logging_tools.get_logger(__name__)
@@ -121,6 +124,14 @@ def get_params():
         name="beta_file_name",
         default="getbeta",
     )
+    params.add_parameter(
+        flags="--processes",
+        help=("Number of MAD-X sessions to evaluate the corrections in parallel. "
+              "Defaults to the number of CPUs."),
+        name="processes",
+        type=int,
+        default=multiprocessing.cpu_count(),
+    )
     return params
 
 
@@ -172,6 +183,9 @@ def main(opt, accel_opt):
                            **Flags**: --optics_file
         params (basestring): Names of the parameter to cut. Only for specifying the cutting order.
                              **Flags**: --params_cut
+        processes (int): Number of MAD-X sessions to evaluate the corrections in parallel.
+                         Defaults to the number of CPUs.
+                         **Flags**: --processes
         show_plots: Show plots.
                     **Flags**: --show
                     **Action**: ``store_true``
@@ -205,8 +219,8 @@ def main(opt, accel_opt):
 
     # main functionality
     corrections = _get_all_corrections(opt.corrections_dir, opt.file_pattern)
-    _call_madx(accel_inst, corrections)
-    _get_diffs(corrections, opt.meas_dir, opt.file_pattern, opt.beta_file_name)
+    _evaluate_corrections(accel_inst, corrections, opt.meas_dir, opt.beta_file_name,
+                          opt.processes)
     figs = _plot(corrections, opt.corrections_dir, opt.show_plots, opt.change_marker, opt.auto_scale, masks)
 
     if opt.clean_up:
@@ -272,12 +286,51 @@ def _get_all_corrections(source_dir, file_pattern):
     return corrections
 
 
-def _get_diffs(corrections, meas_dir, file_pattern, betafile):
-    """ Creates the twissfiles before and after corrections. (Copied into Results folder) """
-    for folder in corrections:
-        dest = os.path.join(folder, RESULTS_DIR)
-        _copy_files(meas_dir, dest, file_pattern)
-        getdiff.getdiff(dest, betafile)
+def _evaluate_corrections(accel_inst, corrections, meas_dir, betafile, processes):
+    """ Runs the corrected models and writes their differences to the measurement.
+
+    Each correction folder (and the uncorrected model) is a MAD-X job of its own, the jobs are
+    run by (at most) processes workers. A failing job only loses the twiss of its own folder.
+    The differences are then computed from the measurement and the uncorrected twiss,
+    which are loaded only once.
+    """
+    if processes < 1:
+        raise ValueError("Number of processes needs to be at least 1.")
+    base_job = _get_madx_job(accel_inst)
+    folders = sorted(corrections)
+    # the uncorrected twiss is written into the results-folder of the first folder only
+    dir_out_no = os.path.join(folders[0], RESULTS_DIR)
+    jobs = [(base_job, dir_out_no, [], getdiff.TWISS_NOT_CORRECTED)]
+    jobs += [(base_job, os.path.join(dir_correct, RESULTS_DIR), sorted(corrections[dir_correct]),
+              getdiff.TWISS_CORRECTED) for dir_correct in folders]
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        succeeded = map(_call_madx, jobs)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            succeeded = pool.map(_call_madx, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    if not succeeded[0]:
+        raise IOError("MAD-X failed to run the uncorrected model, see '{:s}'.".format(
+            os.path.join(dir_out_no, MADXLOG_FILE)))
+
+    meas = OpticsMeasurement(meas_dir)
+    # the measurement is read in the background, while the uncorrected coupling is calculated
+    meas.prefetch(*getdiff.get_diff_attributes(betafile))
+    twiss_no = tfs_pandas.read_tfs(
+        os.path.join(dir_out_no, getdiff.TWISS_NOT_CORRECTED)).set_index("NAME")
+    coup_no = TwissOptics(twiss_no, quick_init=True).get_coupling(method='cmatrix')
+    for dir_correct, success in zip(folders, succeeded[1:]):
+        if not success:
+            continue
+        dir_out = os.path.join(dir_correct, RESULTS_DIR)
+        _copy_off_momentum_twiss(meas_dir, dir_out)
+        twiss_cor = tfs_pandas.read_tfs(
+            os.path.join(dir_out, getdiff.TWISS_CORRECTED)).set_index("NAME")
+        getdiff.write_diffs(dir_out, meas, twiss_cor, twiss_no, betafile, coup_no)
 
 
 def _plot(corrections, source_dir, show_plots, change_marker, auto_scale, masks):
@@ -348,25 +401,28 @@ def _clean_up(source_dir, corrections):
 # MADX-Related ###############################################################
 
 
-def _call_madx(accel_inst, corrections):
-    """ Create and call the madx jobs to apply the corrections """
-    original_content = _get_madx_job(accel_inst)
-    for dir_correct in sorted(corrections):
-        dir_out = os.path.join(dir_correct, RESULTS_DIR)
-        iotools.create_dirs(dir_out)
-        job_content = original_content
-        job_content += "twiss, file='{:s}';\n".format(os.path.join(dir_out,
-                                                                   getdiff.TWISS_NOT_CORRECTED))
-        for file in sorted(corrections[dir_correct]):
-            job_content += "call, file='{:s}';\n".format(file)
-        job_content += "twiss, file='{:s}';\n".format(os.path.join(dir_out,
-                                                                   getdiff.TWISS_CORRECTED))
+def _call_madx(job):
+    """ Create and call the madx job writing the twiss of one model.
 
+    job is a tuple of the base job, the results-folder, the correction files to call and
+    the name of the twiss file. Returns False if MAD-X failed.
+    """
+    base_job, dir_out, files, twiss_name = job
+    iotools.create_dirs(dir_out)
+    job_content = base_job
+    for file in files:
+        job_content += "call, file='{:s}';\n".format(file)
+    job_content += "twiss, file='{:s}';\n".format(os.path.join(dir_out, twiss_name))
+    try:
         madx_wrapper.resolve_and_run_string(
             job_content,
             output_file=os.path.join(dir_out, MADX_FILE),
             log_file=os.path.join(dir_out, MADXLOG_FILE),
         )
+    except madx_wrapper.MadxError as e:
+        LOG.error("MAD-X failed in '{:s}', skipping it: {:s}".format(dir_out, str(e)))
+        return False
+    return True
 
 
 def _get_madx_job(accel_inst):
@@ -403,13 +459,13 @@ def _create_base_file(source_dir, source_file, meas, error, expect, outname):
     return path_out
 
 
-def _copy_files(src, dst, ignore):
-    """ Copies files only from src to dst directories """
-    old_items = os.listdir(dst) + [getdiff.TWISS_CORRECTED, getdiff.TWISS_NOT_CORRECTED]
-    for item in os.listdir(src):
-        src_item = os.path.join(src, item)
-        if os.path.isfile(src_item) and not re.search(ignore, item) and not item in old_items:
-            iotools.copy_item(src_item, os.path.join(dst, item))
+def _copy_off_momentum_twiss(meas_dir, dir_out):
+    """ Copies the off-momentum twiss files, needed for the chromatic coupling, if present
+    in the measurement directory. """
+    for name in (getdiff.TWISS_CORRECTED_PLUS, getdiff.TWISS_CORRECTED_MINUS):
+        src_item = os.path.join(meas_dir, name)
+        if os.path.isfile(src_item):
+            iotools.copy_item(src_item, os.path.join(dir_out, name))
 
 
 def _log_rms(files, legends, column_name, mask):
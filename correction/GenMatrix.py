@@ -238,6 +238,37 @@ def correctbeat(a, beat_input, cut=0.01, app=0, path="./"):
 
 
 def correctbeatEXP(x, y, dx, beat_input, cut=0.01, app=0, path="./", xbet=[], ybet=[]):
+    Rnew, rhs = _get_weighted_system(x, y, dx, beat_input, xbet, ybet)
+    delta = -matrixmultiply(generalized_inverse(Rnew, cut), rhs)
+    
+    writeparams(delta, beat_input.varslist, beat_input.accel_path, app, path)
+    return [delta, beat_input.varslist]
+
+
+def correctbeatEXP_min_strength(x, y, dx, beat_input, min_strength, cut=0.01, app=0, path="./", xbet=[], ybet=[]):
+    """
+    As correctbeatEXP, but removes the correctors with strength below min_strength and
+    recalculates with the remaining ones until none is left below.
+    The weighted response is computed once, each iteration only inverts its remaining columns.
+    """
+    Rnew, rhs = _get_weighted_system(x, y, dx, beat_input, xbet, ybet)
+    columns = np.arange(len(beat_input.varslist))
+    delta = -matrixmultiply(generalized_inverse(Rnew, cut), rhs)
+    iteration = 0  # Let's remove too low useless correctors
+    while np.any(np.abs(delta) < min_strength):
+        iteration += 1
+        columns = columns[np.abs(delta) > min_strength]
+        if len(columns) == 0:
+            raise ValueError("You want to correct with too high cut on the corrector strength")
+        delta = -matrixmultiply(generalized_inverse(Rnew[:, columns], cut), rhs)
+        print "Initial correctors:", len(beat_input.varslist), ". Current: ", len(columns), ". Removed for being lower than:", min_strength, "Iteration:", iteration
+    varslist = [beat_input.varslist[i] for i in columns]
+
+    writeparams(delta, varslist, beat_input.accel_path, app, path)
+    return [delta, varslist]
+
+
+def _get_weighted_system(x, y, dx, beat_input, xbet, ybet):
     R =   np.transpose(beat_input.sensitivity_matrix)
     vector = beat_input.computevectorEXP(x, y, dx, xbet, ybet)
     errwg = beat_input.errwg
@@ -253,10 +284,7 @@ def correctbeatEXP(x, y, dx, beat_input, cut=0.01, app=0, path="./", xbet=[], yb
 							            wg[5]*np.ones(2)]))
 
     Rnew = np.transpose(np.transpose(R)*weisvec)
-    delta = -matrixmultiply(generalized_inverse(Rnew, cut), (vector-beat_input.zerovector)*weisvec/beat_input.normvector)
-    
-    writeparams(delta, beat_input.varslist, beat_input.accel_path, app, path)
-    return [delta, beat_input.varslist]
+    return Rnew, (vector-beat_input.zerovector)*weisvec/beat_input.normvector
 
 
 class beat_input:
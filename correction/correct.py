@@ -183,24 +183,11 @@ def _generate_changeparameters():
     sensitivity_matrix = beat_inp.computeSensitivityMatrix(full_response)  # @UnusedVariable sensitivity_matrix will be stored in beat_inp
 
     if _InputData.algorithm == "SVD":
-        [deltas, varslist] = correction.GenMatrix.correctbeatEXP(phase_x, phase_y, dx, beat_inp, cut=_InputData.singular_value_cut, app=0, path=_InputData.output_path, xbet=beta_x, ybet=beta_y)
-        iteration = 0  # Let's remove too low useless correctors
-        while len([x for x in deltas if abs(x) < _InputData.min_strength]) > 0:
-            iteration += 1
-            il = len(varslist)
-            varslist_t = []
-            for i in range(il):
-                if (abs(deltas[i]) > _InputData.min_strength):
-                    varslist_t.append(varslist[i])
-
-            varslist = varslist_t
-            if len(varslist) == 0:
-                print >> sys.stderr, "You want to correct with too high cut on the corrector strength"
-                sys.exit(1)
-            beat_inp = correction.GenMatrix.beat_input(varslist, _InputData.accel_path, phasexlist, phaseylist, betaxlist, betaylist, displist, _InputData.weights_list, _InputData.error_weights)
-            sensitivity_matrix = beat_inp.computeSensitivityMatrix(full_response)  # @UnusedVariable sensitivity_matrix will be stored in beat_inp
-            [deltas, varslist] = correction.GenMatrix.correctbeatEXP(phase_x, phase_y, dx, beat_inp, cut=_InputData.singular_value_cut, app=0, path=_InputData.output_path, xbet=beta_x, ybet=beta_y)
-            print "Initial correctors:", il, ". Current: ", len(varslist), ". Removed for being lower than:", _InputData.min_strength, "Iteration:", iteration
+        try:
+            [deltas, varslist] = correction.GenMatrix.correctbeatEXP_min_strength(phase_x, phase_y, dx, beat_inp, _InputData.min_strength, cut=_InputData.singular_value_cut, app=0, path=_InputData.output_path, xbet=beta_x, ybet=beta_y)
+        except ValueError as e:
+            print >> sys.stderr, str(e)
+            sys.exit(1)
         if PRINT_DEBUG:
             print deltas
 
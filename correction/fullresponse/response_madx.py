@@ -17,14 +17,17 @@ import numpy as np
 import pandas
 
 import madx_wrapper
-from twiss_optics.optics_class import TwissOptics
 from utils import logging_tools
 from tfs_files import tfs_pandas as tfs
-from utils.contexts import timeit, suppress_warnings
+from utils.contexts import timeit
+from utils.dict_tools import DotDict
 from utils.iotools import create_dirs
 
 LOG = logging_tools.get_logger(__name__)
 
+RESPONSE_COLUMNS = ["MUX", "MUY", "BETX", "BETY", "ALFX", "ALFY", "DX", "DY",
+                    "R11", "R12", "R21", "R22"]
+
 
 # Full Response Mad-X ##########################################################
 
@@ -65,8 +68,8 @@ def generate_fullresponse(accel_inst, variable_categories,
         _call_madx(process_pool, temp_dir, num_proc)
         _clean_up(temp_dir, num_proc)
 
-        var_to_twiss = _load_madx_results(variables, process_pool, incr_dict, temp_dir)
-        fullresponse = _create_fullresponse_from_dict(var_to_twiss)
+        results = _load_madx_results(variables, process_pool, incr_dict, temp_dir)
+        fullresponse = _create_fullresponse_from_arrays(results)
 
     return fullresponse
 
@@ -136,52 +139,108 @@ def _clean_up(temp_dir, num_proc):
 
 
 def _load_madx_results(variables, process_pool, incr_dict, temp_dir):
-    """ Load the madx results in parallel and return var-tfs dictionary """
+    """ Load the madx results in parallel into preallocated (column x BPM x variable) arrays.
+
+    Returns:
+        DotDict with
+            bpms: Index of the BPMs (as in the nominal twiss)
+            variables: list of variable names
+            data: array of RESPONSE_COLUMNS (column x BPM x variable)
+            nominal: array of RESPONSE_COLUMNS for the nominal model (column x BPM)
+            tunes, nominal_tunes: arrays of Q1 and Q2 (2 x variable) and (2,)
+            incr: increments per variable
+    """
     LOG.debug("Loading Madx Results.")
-    vars_and_paths = []
-    for value in variables + ['0']:
-        vars_and_paths.append((value, temp_dir))
-    var_to_twiss = {}
-    for var, tfs_data in process_pool.map(_load_and_remove_twiss, vars_and_paths):
-        tfs_data['incr'] = incr_dict[var]
-        var_to_twiss[var] = tfs_data
-    return var_to_twiss
-
-
-def _create_fullresponse_from_dict(var_to_twiss):
-    """ Convert var-tfs dictionary to fullresponse dictionary """
-    var_to_twiss = _add_coupling(var_to_twiss)
-    resp = pandas.Panel.from_dict(var_to_twiss)
-    resp = resp.transpose(2, 1, 0)
-    # After transpose e.g: resp[NDX, bpm12l1.b1, kqt3]
-    # The magnet called "0" is no change (nominal model)
-    resp['NDX'] = resp.xs('DX', axis=0).div(np.sqrt(resp.xs('BETX', axis=0)), axis="index")
-    resp['NDY'] = resp.xs('DY', axis=0).div(np.sqrt(resp.xs('BETY', axis=0)), axis="index")
-    resp['BBX'] = resp.xs('BETX', axis=0).div(resp.loc['BETX', :, '0'], axis="index")
-    resp['BBY'] = resp.xs('BETY', axis=0).div(resp.loc['BETY', :, '0'], axis="index")
-    resp = resp.subtract(resp.xs('0', axis=2), axis=2)
-    # Remove difference of nominal model with itself (bunch of zeros)
-    resp.drop('0', axis=2, inplace=True)
-    resp = resp.div(resp.loc['incr', :, :])
-
-    with suppress_warnings(np.ComplexWarning):  # raised as everything is complex-type now
-        df = {'MUX': resp.xs('MUX', axis=0).astype(np.float64),
-              'MUY': resp.xs('MUY', axis=0).astype(np.float64),
-              'BETX': resp.xs('BETX', axis=0).astype(np.float64),
-              'BETY': resp.xs('BETY', axis=0).astype(np.float64),
-              'BBX': resp.xs('BBX', axis=0).astype(np.float64),
-              'BBY': resp.xs('BBY', axis=0).astype(np.float64),
-              'DX': resp.xs('DX', axis=0).astype(np.float64),
-              'DY': resp.xs('DY', axis=0).astype(np.float64),
-              'NDX': resp.xs('NDX', axis=0).astype(np.float64),
-              'NDY': resp.xs('NDY', axis=0).astype(np.float64),
-              "F1001R": tfs.TfsDataFrame(resp.xs('1001', axis=0).apply(np.real).astype(np.float64)),
-              "F1001I": tfs.TfsDataFrame(resp.xs('1001', axis=0).apply(np.imag).astype(np.float64)),
-              "F1010R": tfs.TfsDataFrame(resp.xs('1010', axis=0).apply(np.real).astype(np.float64)),
-              "F1010I": tfs.TfsDataFrame(resp.xs('1010', axis=0).apply(np.imag).astype(np.float64)),
-              'Q': resp.loc[['Q1', 'Q2'], resp.major_axis[0], :].transpose().astype(np.float64),
-              }
-    return df
+    _, nominal_df, nominal_tunes = _load_and_remove_twiss(('0', temp_dir))
+    results = DotDict(
+        bpms=nominal_df.index,
+        variables=list(variables),
+        data=np.empty((len(RESPONSE_COLUMNS), len(nominal_df.index), len(variables))),
+        nominal=nominal_df.values.T,
+        tunes=np.empty((2, len(variables))),
+        nominal_tunes=np.array(nominal_tunes),
+        incr=np.array([incr_dict[var] - incr_dict['0'] for var in variables]),
+    )
+    var_to_idx = {var: idx for idx, var in enumerate(variables)}
+    vars_and_paths = [(var, temp_dir) for var in variables]
+    for var, tfs_data, tunes in process_pool.imap_unordered(_load_and_remove_twiss, vars_and_paths):
+        if not tfs_data.index.equals(results.bpms):
+            tfs_data = tfs_data.reindex(results.bpms)
+        idx = var_to_idx[var]
+        results.data[:, :, idx] = tfs_data.values.T
+        results.tunes[:, idx] = tunes
+    return results
+
+
+def _create_fullresponse_from_arrays(results):
+    """ Convert loaded madx results to fullresponse dictionary """
+    with timeit(lambda t: LOG.debug("  Time assembling fullresponse: {:f}s".format(t))):
+        data, nominal = results.data, results.nominal
+        col = {name: idx for idx, name in enumerate(RESPONSE_COLUMNS)}
+
+        def delta(varied, nominal_values):
+            # response: (varied - nominal) / increment, nominal broadcasts over variables
+            return (varied - nominal_values[..., np.newaxis]) / results.incr
+
+        def frame(values, frame_type=pandas.DataFrame):
+            return frame_type(values, index=results.bpms, columns=results.variables)
+
+        f1001, f1010 = _get_coupling(data, col)
+        f1001_nominal, f1010_nominal = _get_coupling(nominal, col)
+        df_f1001 = delta(f1001, f1001_nominal)
+        df_f1010 = delta(f1010, f1010_nominal)
+
+        fullresponse = {
+            "F1001R": frame(df_f1001.real, tfs.TfsDataFrame),
+            "F1001I": frame(df_f1001.imag, tfs.TfsDataFrame),
+            "F1010R": frame(df_f1010.real, tfs.TfsDataFrame),
+            "F1010I": frame(df_f1010.imag, tfs.TfsDataFrame),
+            "Q": pandas.DataFrame(delta(results.tunes, results.nominal_tunes),
+                                  index=["Q1", "Q2"], columns=results.variables),
+        }
+        for name in ("MUX", "MUY", "BETX", "BETY", "DX", "DY"):
+            fullresponse[name] = frame(delta(data[col[name]], nominal[col[name]]))
+        for plane in "XY":
+            # normalized dispersion: D / sqrt(BET)
+            disp, bet = col["D" + plane], col["BET" + plane]
+            fullresponse["ND" + plane] = frame(delta(data[disp] / np.sqrt(data[bet]),
+                                                     nominal[disp] / np.sqrt(nominal[bet])))
+            # beta-beating: BET / BET0 - 1
+            fullresponse["BB" + plane] = frame(
+                (data[bet] / nominal[bet][:, np.newaxis] - 1.) / results.incr)
+    return fullresponse
+
+
+def _get_coupling(values, col):
+    """ Coupling RDTs F1001 and F1010 from the C-matrix, for all BPMs and variables at once.
+
+    Same as TwissOptics.calc_cmatrix (see [#CalagaBetatroncouplingMerging2005]_),
+    with the 2x2 matrix products written out, so that any array shape is supported.
+
+    Args:
+        values: array (column x ...), columns given by col
+        col: dictionary column name -> index into values
+    """
+    r11, r12, r21, r22 = (values[col[name]] for name in ("R11", "R12", "R21", "R22"))
+    sqrt_betx, sqrt_bety = np.sqrt(values[col["BETX"]]), np.sqrt(values[col["BETY"]])
+    alfx, alfy = values[col["ALFX"]], values[col["ALFY"]]
+
+    # C = -J R^T J / sqrt(1 + det(R))
+    norm = 1. / np.sqrt(1. + r11 * r22 - r12 * r21)
+    c11, c12, c21, c22 = r22 * norm, -r12 * norm, -r21 * norm, r11 * norm
+
+    # C_bar = G_a C G_b^-1
+    m11, m12 = c11 / sqrt_betx, c12 / sqrt_betx
+    m21, m22 = alfx * m11 + sqrt_betx * c21, alfx * m12 + sqrt_betx * c22
+    cb11 = m11 * sqrt_bety - m12 * alfy / sqrt_bety
+    cb12 = m12 / sqrt_bety
+    cb21 = m21 * sqrt_bety - m22 * alfy / sqrt_bety
+    cb22 = m22 / sqrt_bety
+
+    gamma = np.sqrt(1. - (cb11 * cb22 - cb12 * cb21))
+    f1001 = ((cb11 + cb22) * 1j + (cb12 - cb21)) / 4 / gamma
+    f1010 = ((cb11 - cb22) * 1j - cb12 - cb21) / 4 / gamma
+    return f1001, f1010
 
 
 def _get_jobfiles(temp_dir, index):
@@ -201,21 +260,8 @@ def _load_and_remove_twiss(var_and_path):
     (var, path) = var_and_path
     twissfile = os.path.join(path, "twiss." + var)
     tfs_data = tfs.read_tfs(twissfile, index="NAME")
-    tfs_data['Q1'] = tfs_data.Q1
-    tfs_data['Q2'] = tfs_data.Q2
     os.remove(twissfile)
-    return var, tfs_data
-
-
-def _add_coupling(dict_of_tfs):
-    """ Adds coupling to the tfs. QUICK FIX VIA LOOP!"""
-    with timeit(lambda t: LOG.debug("  Time adding coupling: {:f}s".format(t))):
-        for var in dict_of_tfs:
-            twopt = TwissOptics(dict_of_tfs[var])
-            cpl = twopt.get_coupling("cmatrix")
-            dict_of_tfs[var]["1001"] = cpl["F1001"]
-            dict_of_tfs[var]["1010"] = cpl["F1010"]
-        return dict_of_tfs
+    return var, tfs_data.loc[:, RESPONSE_COLUMNS].astype(np.float64), (tfs_data.Q1, tfs_data.Q2)
 
 
 # Script Mode ##################################################################
@@ -35,7 +35,7 @@ from __future__ import print_function
 
 import re
 import sys
-from os.path import abspath, join, dirname, isdir, exists, split, pardir
+from os.path import abspath, join, dirname, isdir, exists, pardir
 
 import numpy as np
 import pandas as pd
@@ -44,7 +44,7 @@ new_path = abspath(join(dirname(abspath(__file__)), pardir))
 if new_path not in sys.path:
     sys.path.append(new_path)
 
-from optics_measurements.io_filehandler import OpticsMeasurement
+from optics_measurements.io_filehandler import OpticsMeasurement, BETA_ATTRIBUTES
 from twiss_optics.optics_class import TwissOptics
 from tfs_files.tfs_pandas import read_tfs, write_tfs
 from utils import logging_tools, beta_star_from_twiss as bsft
@@ -88,23 +88,53 @@ def getdiff(meas_path=None, beta_file_name="getbeta"):
     meas = OpticsMeasurement(meas_path)
     twiss_cor = read_tfs(corrected_model_path).set_index('NAME')
     twiss_no = read_tfs(uncorrected_model_path).set_index('NAME')
+    write_diffs(meas_path, meas, twiss_cor, twiss_no, beta_file_name)
+    LOG.debug("Finished 'getdiff'.")
+
+
+def write_diffs(output_path, meas, twiss_cor, twiss_no, beta_file_name="getbeta",
+                coup_no=None):
+    """ Writes the difference files from already loaded measurement and models.
+
+    Used by getdiff, and to compare many corrected models to the same measurement without
+    reloading it.
+
+    Args:
+        output_path (str): Path to write the diff-files into.
+            Chromatic coupling is only calculated if the off-momentum twiss files are found here.
+        meas (OpticsMeasurement): Measurement to compare to.
+        twiss_cor (DataFrame): Twiss of the corrected model, NAME as index.
+        twiss_no (DataFrame): Twiss of the uncorrected model, NAME as index.
+        beta_file_name (str): Prefix of the beta file to use.
+        coup_no (DataFrame): Coupling of the uncorrected model, calculated if not given.
+    """
+    # the measurement files are read while the coupling of the models is calculated
+    meas.prefetch(*get_diff_attributes(beta_file_name))
     coup_cor = TwissOptics(twiss_cor, quick_init=True).get_coupling(method='cmatrix')
-    coup_no = TwissOptics(twiss_no, quick_init=True).get_coupling(method='cmatrix')
+    if coup_no is None:
+        coup_no = TwissOptics(twiss_no, quick_init=True).get_coupling(method='cmatrix')
     model = pd.merge(twiss_cor, twiss_no, how='inner', left_index=True, right_index=True, suffixes=('_c', '_n'))
     coupling_model = pd.merge(coup_cor, coup_no, how='inner', left_index=True, right_index=True,
                               suffixes=('_c', '_n'))
     #coupling_model['NAME'] = coupling_model.index.values
 
     for plane in ['x', 'y']:
-        _write_betabeat_diff_file(meas_path, meas, model, plane, beta_file_name)
-        _write_phase_diff_file(meas_path, meas, model, plane)
-        _write_disp_diff_file(meas_path, meas, model, plane)
-        _write_closed_orbit_diff_file(meas_path, meas, model, plane)
-    _write_coupling_diff_file(meas_path, meas, coupling_model)
-    _write_norm_disp_diff_file(meas_path, meas, model)
-    _write_chromatic_coupling_files(meas_path, corrected_model_path)
-    _write_betastar_diff_file(meas_path, meas, twiss_cor, twiss_no)
-    LOG.debug("Finished 'getdiff'.")
+        _write_betabeat_diff_file(output_path, meas, model, plane, beta_file_name)
+        _write_phase_diff_file(output_path, meas, model, plane)
+        _write_disp_diff_file(output_path, meas, model, plane)
+        _write_closed_orbit_diff_file(output_path, meas, model, plane)
+    _write_coupling_diff_file(output_path, meas, coupling_model)
+    _write_norm_disp_diff_file(output_path, meas, model)
+    _write_chromatic_coupling_files(output_path, meas.directory)
+    _write_betastar_diff_file(output_path, meas, twiss_cor, twiss_no)
+
+
+def get_diff_attributes(beta_file_name="getbeta"):
+    """ Names of the OpticsMeasurement attributes read by write_diffs. """
+    attributes = ["phase", "disp", "orbit", "coupling", "norm_disp", "kmod_betastar"]
+    if beta_file_name in BETA_ATTRIBUTES:
+        attributes.insert(0, BETA_ATTRIBUTES[beta_file_name])
+    return attributes
 
 
 # Writing Functions ##########################################################
@@ -112,14 +142,9 @@ def getdiff(meas_path=None, beta_file_name="getbeta"):
 
 def _write_betabeat_diff_file(meas_path, meas, model, plane, betafile):
     LOG.debug("Calculating beta diff.")
-    if betafile == "getbeta":
-        meas_beta = meas.beta[plane]
-    elif betafile == "getampbeta":
-        meas_beta = meas.amp_beta[plane]
-    elif betafile == "getkmodbeta":
-        meas_beta = meas.kmod_beta[plane]
-    else:
+    if betafile not in BETA_ATTRIBUTES:
         raise KeyError("Unknown beta file name '{}'.".format(betafile))
+    meas_beta = getattr(meas, BETA_ATTRIBUTES[betafile])[plane]
 
     up = plane.upper()
     tw = pd.merge(meas_beta, model, how='inner', left_index=True, right_index=True)
@@ -221,14 +246,15 @@ def _write_coupling_diff_file(meas_path, meas, model):
     write_tfs(join(meas_path, get_diff_filename('couple')), tw.loc[:, out_columns])
 
 
-def _write_chromatic_coupling_files(meas_path, cor_path):
+def _write_chromatic_coupling_files(output_path, meas_path):
     LOG.debug("Calculating chromatic coupling diff.")
     # TODO: Add Cf1010
     try:
-        twiss_plus = read_tfs(join(split(cor_path)[0], TWISS_CORRECTED_PLUS), index='NAME')
-        twiss_min = read_tfs(join(split(cor_path)[0], TWISS_CORRECTED_MINUS), index='NAME')
+        twiss_plus = read_tfs(join(output_path, TWISS_CORRECTED_PLUS), index='NAME')
+        twiss_min = read_tfs(join(output_path, TWISS_CORRECTED_MINUS), index='NAME')
     except IOError:
-        LOG.debug("Chromatic coupling measurements not found. Skipped.")
+        LOG.info("Off-momentum twiss files not found in '{:s}', "
+                 "chromatic coupling skipped.".format(output_path))
     else:
         deltap = np.abs(twiss_plus.DELTAP - twiss_min.DELTAP)
         plus = TwissOptics(twiss_plus, quick_init=True).get_coupling(method='cmatrix')
@@ -246,7 +272,7 @@ def _write_chromatic_coupling_files(meas_path, cor_path):
         tw['Cf1001i_model'] = np.imag(cf1001)
         tw['Cf1001r_prediction'] = tw.loc[:, 'Cf1001r'] - tw.loc[:, 'Cf1001r_model']
         tw['Cf1001i_prediction'] = tw.loc[:, 'Cf1001i'] - tw.loc[:, 'Cf1001i_model']
-        write_tfs(join(meas_path, get_diff_filename('chromatic_coupling')),
+        write_tfs(join(output_path, get_diff_filename('chromatic_coupling')),
                   tw.loc[:, ['NAME', 'S',
                              'Cf1001r', 'Cf1001rERR',
                              'Cf1001i', 'Cf1001iERR',
@@ -52,15 +52,15 @@ import time
 
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import OrthogonalMatchingPursuit
 
 import madx_wrapper
 from correction.fullresponse import response_twiss
 from model import manager
-from optics_measurements.io_filehandler import OpticsMeasurement
+from optics_measurements.io_filehandler import OpticsMeasurement, BETA_ATTRIBUTES
 from twiss_optics.optics_class import TwissOptics
 from utils import logging_tools
 from utils import iotools
+from utils import tracing
 from tfs_files import tfs_pandas as tfs
 from utils.entrypoint import entrypoint, EntryPointParameters
 from utils.logging_tools import log_pandas_settings_with_copy
@@ -390,7 +390,8 @@ def global_correction(opt, accel_opt):
 
     LOG.info("Starting Iterative Global Correction.")
     with logging_tools.DebugMode(active=opt.debug,
-                                 log_file=os.path.join(opt.model_dir, "iterative_correction.log")):
+                                 log_file=os.path.join(opt.model_dir, "iterative_correction.log")),\
+            tracing.tracing("global_correction") as trace:
         not_implemented_params = [k for k in opt.optics_params
                                   if k not in _get_measurement_filters()]
         if any(not_implemented_params):
@@ -401,6 +402,7 @@ def global_correction(opt, accel_opt):
 
         # check on opt
         opt = _check_opt(opt)
+        trace.output_dir = opt.output_path
         meth_opt = _get_method_opt(opt)
 
         # get accelerator class
@@ -416,31 +418,35 @@ def global_correction(opt, accel_opt):
 
         # read data from files
         vars_list = _get_varlist(accel_cls, opt.variable_categories, opt.virt_flag)
-        optics_params, meas_dict = _get_measurment_data(
-            opt.optics_params,
-            opt.meas_dir, opt.beta_file_name,
-            w_dict,
-        )
+        with tracing.stage("read_measurement"):
+            optics_params, meas_dict = _get_measurment_data(
+                opt.optics_params,
+                opt.meas_dir, opt.beta_file_name,
+                w_dict,
+            )
         mcut_dict = _automate_modelcut(mcut_dict, meas_dict, opt.variable_categories)
 
-        if opt.fullresponse_path is not None:
-            resp_dict = _load_fullresponse(opt.fullresponse_path, vars_list)
-        else:
-            resp_dict = response_twiss.create_response(
-                accel_inst, opt.variable_categories, optics_params
-            )
+        with tracing.stage("response", variables=len(vars_list)):
+            if opt.fullresponse_path is not None:
+                resp_dict = _load_fullresponse(opt.fullresponse_path, vars_list)
+            else:
+                resp_dict = response_twiss.create_response(
+                    accel_inst, opt.variable_categories, optics_params
+                )
 
         # the model in accel_inst is modified later, so save nominal model here to variables
         nominal_model = _maybe_add_coupling_to_model(accel_inst.get_model_tfs(), optics_params)
 
         # apply filters to data
-        meas_dict = _filter_measurement(
-            optics_params, meas_dict, nominal_model,
-            opt.use_errorbars, w_dict, ecut_dict, mcut_dict
-        )
-        meas_dict = _append_model_to_measurement(nominal_model, meas_dict, optics_params)
-        resp_dict = _filter_response_index(resp_dict, meas_dict, optics_params)
-        resp_matrix = _join_responses(resp_dict, optics_params, vars_list)
+        with tracing.stage("filter_measurement") as filter_stage:
+            meas_dict = _filter_measurement(
+                optics_params, meas_dict, nominal_model,
+                opt.use_errorbars, w_dict, ecut_dict, mcut_dict
+            )
+            meas_dict = _append_model_to_measurement(nominal_model, meas_dict, optics_params)
+            resp_dict = _filter_response_index(resp_dict, meas_dict, optics_params)
+            resp_matrix = _join_responses(resp_dict, optics_params, vars_list)
+            filter_stage.count(measurements=resp_matrix.shape[0])
 
         # _dump(os.path.join(opt.output_path, "measurement_dict.bin"), meas_dict)
         delta = tfs.TfsDataFrame(0, index=vars_list, columns=["DELTA"])
@@ -455,8 +461,9 @@ def global_correction(opt, accel_opt):
                 LOG.debug("Updating model via MADX.")
                 corr_model_path = os.path.join(opt.output_path, "twiss_" + str(iteration) + ".dat")
 
-                _create_corrected_model(corr_model_path, opt.change_params_path,
-                                        accel_inst, opt.debug)
+                with tracing.stage("madx_model_{:d}".format(iteration)):
+                    _create_corrected_model(corr_model_path, opt.change_params_path,
+                                            accel_inst, opt.debug)
 
                 corr_model_elements = tfs.read_tfs(corr_model_path, index="NAME")
                 corr_model_elements = _maybe_add_coupling_to_model(
@@ -474,15 +481,19 @@ def global_correction(opt, accel_opt):
                     # please look away for the next two lines.
                     accel_inst._model = corr_model
                     accel_inst._elements = corr_model_elements
-                    resp_dict = response_twiss.create_response(
-                        accel_inst, opt.variable_categories, optics_params
-                    )
-                    resp_dict = _filter_response_index(resp_dict, meas_dict, optics_params)
-                    resp_matrix = _join_responses(resp_dict, optics_params, vars_list)
+                    with tracing.stage("update_response_{:d}".format(iteration),
+                                       variables=len(vars_list)):
+                        resp_dict = response_twiss.create_response(
+                            accel_inst, opt.variable_categories, optics_params
+                        )
+                        resp_dict = _filter_response_index(resp_dict, meas_dict, optics_params)
+                        resp_matrix = _join_responses(resp_dict, optics_params, vars_list)
 
             # ######### Actual optimization ######### #
-            delta += _calculate_delta(
-                resp_matrix, meas_dict, optics_params, vars_list, opt.method, meth_opt)
+            with tracing.stage("calculate_delta_{:d}".format(iteration),
+                               measurements=resp_matrix.shape[0], variables=len(vars_list)):
+                delta += _calculate_delta(
+                    resp_matrix, meas_dict, optics_params, vars_list, opt.method, meth_opt)
 
             delta, resp_matrix, vars_list = _filter_by_strength(delta, resp_matrix,
                                                                 opt.min_corrector_strength)
@@ -583,6 +594,7 @@ def _get_measurment_data(keys, meas_dir, beta_file_name, w_dict):
     filtered_keys = [k for k in keys if w_dict[k] != 0]
 
     getllm_data = OpticsMeasurement(meas_dir)
+    getllm_data.prefetch(*_get_measurement_attributes(filtered_keys, beta_file_name))
     for key in filtered_keys:
         if key == "MUX":
             measurement['MUX'] = getllm_data.phase_x
@@ -626,6 +638,28 @@ def _get_measurment_data(keys, meas_dir, beta_file_name, w_dict):
     return filtered_keys, measurement
 
 
+def _get_measurement_attributes(keys, beta_file_name):
+    """ Names of the OpticsMeasurement attributes needed for keys. """
+    attributes = []
+    for key in keys:
+        if key in ("MUX", "MUY"):
+            new = ["phase_" + key[-1].lower()]
+        elif key in ("DX", "DY"):
+            new = ["disp_" + key[-1].lower()]
+        elif key == "NDX":
+            new = ["norm_disp"]
+        elif key in ('F1001R', 'F1001I', 'F1010R', 'F1010I'):
+            new = ["coupling"]
+        elif key == "Q":
+            new = ["phase_x", "phase_y"]
+        elif key in ("BBX", "BETX", "BBY", "BETY") and beta_file_name in BETA_ATTRIBUTES:
+            new = [BETA_ATTRIBUTES[beta_file_name] + "_" + key[-1].lower()]
+        else:
+            new = []
+        attributes.extend(attr for attr in new if attr not in attributes)
+    return attributes
+
+
 def _automate_modelcut(mcut_dict, meas_dict, vars_categories):
     """ Automatic calculation of model-cut
 
@@ -944,6 +978,7 @@ def _orthogonal_matching_pursuit(response_mat, diff_vec, opt):
     """ Calculated n_correctors via orthogonal matching pursuit"""
     if opt.n_correctors is None:
         raise ValueError("n_correctors setting needed for orthogonal matching pursuit.")
+    from sklearn.linear_model import OrthogonalMatchingPursuit  # slow import, only needed here
 
     # return orthogonal_mp(response_mat, diff_vec, opt.n_correctors)
     res = OrthogonalMatchingPursuit(opt.n_correctors).fit(response_mat, diff_vec)
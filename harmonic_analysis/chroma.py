@@ -8,27 +8,70 @@ from utils import outliers
 LOGGER = logging.getLogger(__name__)
 
 PI2I = 2 * np.pi * complex(0, 1)
-
-
-def get_chroma(harpy_input, plane, bpm_names, bpm_samples, panda):
-    arc_bpm_names, arc_bpm_samples = _get_lhc_arc_bpms(bpm_names, bpm_samples)
-    tunez = np.mean(panda.set_index("NAME").loc[arc_bpm_names, "TUNEZ"])
-    tunez_phase = _phase_mean(panda.set_index("NAME").loc[arc_bpm_names, "MUZ"])
-    dpoverp_amp, pos, neg = get_dpoverp_amp(tunez, tunez_phase, bpm_samples)
-    for bin in pos:
-        mini, maxi = bin
-        coefficients = panda[:, "AMP" + plane] * np.exp(PI2I * panda[:, "MU" + plane])
-        frequencies = panda[:, "TUNE" + plane]
-        new_signal = coefficients * np.exp(PI2I * np.outer(frequencies, np.arange(bpm_samples.shape[1])))
-        # Remove synchro-betatron line?
-        bpm_int = (bpm_samples - new_signal)[:, mini:maxi]
-        # or subtract the synchrotron line? should be about the same
-        bpm_int = (bpm_int.T-np.mean(bpm_int, axis=1)).T
-        length = length + maxi - mini
-    for bin in neg:
-        mini, maxi = bin
-        co = co - np.sum(bpm_samples[:, mini:maxi], axis=1)
-        length = length + maxi - mini
+HALFWIDTH = 0.1  # of the dp/p intervals in synchrotron periods, at 90 % of the maximum
+
+
+def get_chroma(lin_frame, bpm_samples, plane, dpp_amp, pos, neg):
+    """
+    Chromatic tune shifts of every BPM from the turn-by-turn data of a synchrotron oscillation.
+
+    The main line (TUNE and MU of lin_frame) is reconstructed once, for the turns of all
+    dp/p intervals. Within an interval the measured signal drifts in phase against this line by
+    the chromatic tune shift, the drift is taken between the two halves of every interval.
+
+    Args:
+        lin_frame: harpy results of the plane, indexed by BPM.
+        bpm_samples: turn-by-turn DataFrame of the plane (BPMs x turns).
+        plane: "x" or "y".
+        dpp_amp: amplitude of dp/p in the intervals, as from get_dpoverp_amp.
+        pos, neg: lists of (first turn, last turn + 1) of the positive and negative dp/p
+            intervals, as from get_dpoverp_amp.
+    Returns:
+        DataFrame indexed as lin_frame with the mean tune shifts in the positive and in the
+        negative intervals (DQPOS<PLANE>, DQNEG<PLANE>) and the chromaticity (CHROMA<PLANE>).
+    """
+    plane = plane.upper()
+    pos_halves = _get_half_intervals(pos)
+    neg_halves = _get_half_intervals(neg)
+    result = pd.DataFrame(index=lin_frame.index)
+    if not pos_halves or not neg_halves:
+        LOGGER.warning("No positive or negative dp/p intervals, chromaticity is not computed.")
+        return result
+    halves = pos_halves + neg_halves
+    lengths = np.array([end - start for start, end in halves])
+    starts = np.cumsum(lengths) - lengths
+    turns = np.concatenate([np.arange(start, end) for start, end in halves])
+
+    samples = bpm_samples.loc[lin_frame.index].values[:, turns]
+    conj_main_line = np.exp(-PI2I * (np.outer(lin_frame.loc[:, "TUNE" + plane].values, turns) +
+                                     lin_frame.loc[:, "MU" + plane].values[:, np.newaxis]))
+    phasors = np.add.reduceat(samples * conj_main_line, starts, axis=1)
+    # the orbit offset is large within the intervals, it is removed for every half
+    offsets = np.add.reduceat(samples, starts, axis=1) / lengths
+    phasors = phasors - offsets * np.add.reduceat(conj_main_line, starts, axis=1)
+
+    centres = np.array([(start + end - 1) / 2. for start, end in halves])
+    tune_shifts = (np.angle(phasors[:, 1::2] * np.conj(phasors[:, ::2])) /
+                   (2 * np.pi * (centres[1::2] - centres[::2])))
+    n_pos = len(pos_halves) // 2
+    result["DQPOS" + plane] = np.mean(tune_shifts[:, :n_pos], axis=1)
+    result["DQNEG" + plane] = np.mean(tune_shifts[:, n_pos:], axis=1)
+    # dpp_amp is the mean dp/p of the intervals, whereas the phase drift between the halves
+    # weights the dp/p with a triangle over the interval
+    weighted_dpp_amp = dpp_amp * np.sinc(HALFWIDTH) ** 2 / np.sinc(2 * HALFWIDTH)
+    result["CHROMA" + plane] = ((result.loc[:, "DQPOS" + plane] - result.loc[:, "DQNEG" + plane]) /
+                                (2 * weighted_dpp_amp))
+    return result
+
+
+def _get_half_intervals(intervals):
+    """ Splits every interval of at least two turns into its two halves. """
+    halves = []
+    for mini, maxi in intervals:
+        if maxi - mini > 1:
+            middle = (mini + maxi) // 2
+            halves.extend([(mini, middle), (middle, maxi)])
+    return halves
 
 
 def get_raw_chroma(panda, dpp_amp, plane, delta=None):
@@ -45,15 +88,12 @@ def get_raw_chroma(panda, dpp_amp, plane, delta=None):
     return panda
 
 def _get_positive_dpoverp_intervals(tunez, tunez_phase, turns):
-    halfwidth = 0.1  # at 90 % of the maximum
-    intervals = []
-    start = (-halfwidth - tunez_phase) / tunez
-    end = (halfwidth - tunez_phase) / tunez
-    for i in range(int(turns * tunez) + 1):
-        start_i = start + float(i) / tunez
-        end_i = end + float(i) / tunez
-        if start_i > 0 and end_i < turns:
-            intervals.append((int(start_i), int(end_i)))
+    start = (-HALFWIDTH - tunez_phase) / tunez
+    end = (HALFWIDTH - tunez_phase) / tunez
+    periods = np.arange(int(turns * tunez) + 1) / tunez
+    starts, ends = start + periods, end + periods
+    inside = (starts > 0) & (ends < turns)
+    intervals = zip(starts[inside].astype(int).tolist(), ends[inside].astype(int).tolist())
     print("Intervals are: {}".format(intervals))
     return intervals
 
@@ -68,24 +108,20 @@ def get_dpoverp_amp(model_tfs, panda, bpm_samples):
     # and around halfes for the negative dpoverp
     bpm_data = bpm_samples.loc[panda.index, :].values
     mask = manager.get_accel_class(accel="lhc").get_element_types_mask(panda.index, types=["arc_bpm"])
-    #arc_bpm_names, arc_bpm_samples = _get_lhc_arc_bpms(panda.index.values, bpm_data)
     tunez = np.mean(panda.loc[mask, "TUNEZ"])
     tunez_phase = _phase_mean(panda.loc[mask, "MUZ"])
     turns = bpm_samples.shape[1]
     pos = _get_positive_dpoverp_intervals(tunez, tunez_phase, turns)
     neg = _get_negative_dpoverp_intervals(tunez, tunez_phase, turns)
     # We assume 3D kicks only happen in LHC for now.
-    co = np.zeros_like(mask, dtype=float)
     model_dx = model_tfs.set_index("NAME").loc[panda.index.values[mask], "DX"]
-    length = 0
-    for bin in pos:
-        mini, maxi = bin
-        co = co + np.sum(bpm_data[:, mini:maxi], axis=1)
-        length = length + maxi - mini
-    for bin in neg:
-        mini, maxi = bin
-        co = co - np.sum(bpm_data[:, mini:maxi], axis=1)
-        length = length + maxi - mini
+    # sum over the positive minus sum over the negative intervals, all at once
+    signs = np.zeros(turns)
+    for intervals, sign in ((pos, 1.), (neg, -1.)):
+        for mini, maxi in intervals:
+            signs[mini:maxi] += sign
+    co = bpm_data.dot(signs)
+    length = sum(maxi - mini for mini, maxi in pos + neg)
     print("ORBIT: {} {}".format(np.max(bpm_data[mask]), np.min(bpm_data[mask])))
     co = co / 1e3  # Going from mm to m.
     codx = co[mask] * model_dx / length
@@ -94,14 +130,6 @@ def get_dpoverp_amp(model_tfs, panda, bpm_samples):
     return np.sum(codx) / np.sum(dx2), pos, neg
 
 
-def _get_lhc_arc_bpms(bpm_names, bpm_samples):
-    accel_cls = manager.get_accel_class(accel="lhc")
-    arc_bpms_mask = accel_cls.get_element_types_mask(bpm_names, types=["arc_bpm"])
-    #arc_bpm_samples = bpm_samples[arc_bpms_mask]
-    #arc_bpm_names = bpm_names[arc_bpms_mask]
-    return arc_bpm_names, arc_bpm_samples
-
-
 def _phase_mean(phases):
     return np.angle(np.sum(np.exp(PI2I * phases))) / (2 * np.pi)
 
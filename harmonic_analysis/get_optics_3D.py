@@ -11,6 +11,7 @@ it uses the model with AC-Dipole element in, i. e. there is no compensation for
 
 import sys
 import os
+import multiprocessing
 from optparse import OptionParser
 import numpy as np
 import pandas as pd
@@ -38,139 +39,127 @@ def _parse_args():
     parser.add_option("--ndx",
                     help="""If present, it calculates the normalized dispersion.""",
                     dest="ndx", action="store_true")
+    parser.add_option("--processes",
+                    help="Number of processes reading the lin files.",
+                    metavar="PROCESSES", default=1, dest="processes", type=int)
     options, _ = parser.parse_args()
 
-    return options.files, options.model, options.output, options.phase, options.ndx
+    return (options.files, options.model, options.output, options.phase, options.ndx,
+            options.processes)
 
 
-def get_optics(files,model,output,phase,ndx):
+def get_optics(files, model, output, phase, ndx, processes=1):
     if phase:
-        get_phases(files,model,output)
+        get_phases(files, model, output, processes=processes)
     if ndx:
-        getNDX(files,model,output)
+        getNDX(files, model, output, processes=processes)
 
 
-def getNDX(files,model,output):
-    #getting the list of BPMs and arcBPMs
+def getNDX(files, model, output, processes=1):
     file_list = [(file_name.strip() + ".linx") for file_name in files.strip("\"").split(",")]
-    file_dict = {}
-    model_tfs=tfs.read_tfs(model)
-    bpms=model_tfs.loc[:,"NAME"].values
-    for file_name in file_list:
-        filetfs = tfs.read_tfs(file_name)
-        bpms = intersect(bpms,filetfs.loc[:,"NAME"].values)
-    bpms=np.array(bpms)
-    arc_bpms=get_arc_bpms(model_tfs, bpms)
-    
-    #merging the Dataframes
-    model_panda=load_panda(model)
-    for i,file_name in enumerate(file_list):
-        file_panda = load_panda(file_name)
-        model_panda = pd.merge(model_panda, file_panda, how='inner', on='NAME', suffixes=('', str(i+1)))
-    model_panda['NDXMDL'] = (model_panda.loc[:, 'DX'].values / np.sqrt(model_panda.loc[:, 'BETX'].values))
-    columns=['NAME','S', 'NDXMDL']
-    for c in model_panda.columns.values:
-        if c.startswith('AMPZ') or c.startswith('MUZ'):
-            columns.append(c)
-    results = model_panda.loc[:,columns]
-    results.set_index("NAME", inplace=True, drop=False)
-    columns=['S', 'NDXMDL']
-    cols=[]
+    model_tfs = tfs.read_tfs(model)
+    bpms, (amps, mus) = _get_aligned_columns(model_tfs, _read_lin_files(file_list, processes),
+                                             ["AMPZ", "MUZ"])
+    arc_bpms = np.in1d(bpms, get_arc_bpms(model_tfs, bpms))
+    bpm_model = model_tfs.set_index("NAME").loc[bpms, :]
+    ndx_model = bpm_model.loc[:, "DX"].values / np.sqrt(bpm_model.loc[:, "BETX"].values)
+
     # scaling to the model, and getting the synchrotron phase in the arcs
-    for c in results.columns.values:
-        if c.startswith('MUZ'):
-            results['sc'+c.replace('MU','AMP')]=results.loc[:,c.replace('MU','AMP')].values * np.sum(results.loc[arc_bpms,'NDXMDL']) / np.sum(results.loc[arc_bpms,c.replace('MU','AMP')])
-            results['s'+c]=np.angle(np.exp(PI2I*results.loc[:,c].values))/(2*np.pi)
-            field = results.loc[:,'s'+c].values- np.angle(np.sum(np.exp(PI2I * results.loc[arc_bpms,'s'+c])))/(2*np.pi)
-            results['sc'+c]=np.abs(np.where(np.abs(field)>0.5,field-np.sign(field),field))
-            d='sc'+c
-            cols.append(d)
-    #resolving the sign of dispersion
-    for c in cols:
-        results[c.replace('scMUZ','fNDX')]=results.loc[:,c.replace('MU','AMP')] * np.sign(0.25 - np.abs(np.angle(np.sum(np.exp(PI2I * results.loc[:,cols]),axis=1)))/(2*np.pi))
-        columns.append(c.replace('scMUZ','fNDX'))
-    forfile=results.loc[:,columns]
-    f=[]
-    #averaging over files and error calculation
-    for c in forfile.columns.values:
-        if c.startswith('fNDX'):
-            f.append(c)
-    if len(f)>1:
-        forfile['STDNDX']=np.std(forfile.loc[:,f],axis=1)*t_value_correction(len(f))
-    else:
-        forfile['STDNDX']=0.0
-    forfile['NDX']=np.mean(forfile.loc[:,f],axis=1)
-    forfile['DNDX']=forfile.loc[:,'NDX']-forfile.loc[:,'NDXMDL']
-    forfile['NAME']=results.index
-    tfs.write_tfs(os.path.join(output, "getNDx.out"), forfile)
-    return 
-
-
-def get_phases(files, model, output):
-    for plane in ["X","Y"]:
-        file_list = [(file_name.strip() + ".lin" + plane.lower()) for file_name in files.strip("\"").split(",")]
-        #merging the Dataframes
-        model_panda = load_panda(model)
-        tune=0.0
-        for i,file_name in enumerate(file_list):
-            file_panda = tfs.read_tfs(file_name)
-            if plane =="X":
-                tune = tune + file_panda.headers['Q1']
-            else:
-                tune = tune + file_panda.headers['Q2']
-            file_panda = pd.DataFrame(file_panda)
-            model_panda = pd.merge(model_panda, file_panda, how='inner', on='NAME', suffixes=('', str(i+1)))
-        tune = tune / len(file_list)
-        model_panda.rename(columns={'MU'+plane:'MU'+plane+'MDL'}, inplace=True)
-        columns=['NAME','S']
-        for c in model_panda.columns.values:
-            if c.startswith('MU'+plane):
-                columns.append(c)
-
-        all_data = model_panda.loc[:,columns]
-        all_data.set_index("NAME", inplace=True, drop=False)
-        #Here is what we need from the model and all the measured phases for the intersected BPMs
-        bpms = all_data.loc[:,'NAME'].values
-        columns = ['NAME', 'S', 'MU' + plane + 'MDL']
-        results = all_data.loc[bpms[:-1], columns]
+    scaled_amps = amps * np.sum(ndx_model[arc_bpms]) / np.sum(amps[arc_bpms], axis=0)
+    mus = np.angle(np.exp(PI2I * mus)) / (2 * np.pi)
+    arc_phases = np.angle(np.sum(np.exp(PI2I * mus[arc_bpms]), axis=0)) / (2 * np.pi)
+    synchrotron_phases = np.abs(_wrap(mus - arc_phases))
+
+    # resolving the sign of dispersion
+    signs = np.sign(
+        0.25 - np.abs(np.angle(np.sum(np.exp(PI2I * synchrotron_phases), axis=1))) / (2 * np.pi))
+    ndxs = scaled_amps * signs[:, np.newaxis]
+
+    # averaging over files and error calculation
+    results = pd.DataFrame(index=bpms)
+    results['S'] = bpm_model.loc[:, "S"].values
+    results['NDXMDL'] = ndx_model
+    for i in range(ndxs.shape[1]):
+        results['fNDX' + _file_suffix(i)] = ndxs[:, i]
+    results['STDNDX'] = _std(ndxs)
+    results['NDX'] = np.mean(ndxs, axis=1)
+    results['DNDX'] = results.loc[:, 'NDX'] - results.loc[:, 'NDXMDL']
+    results['NAME'] = bpms
+    tfs.write_tfs(os.path.join(output, "getNDx.out"), results)
+    return
+
+
+def get_phases(files, model, output, processes=1):
+    model_tfs = tfs.read_tfs(model)
+    for plane in ["X", "Y"]:
+        file_list = [(file_name.strip() + ".lin" + plane.lower())
+                     for file_name in files.strip("\"").split(",")]
+        lin_frames = _read_lin_files(file_list, processes)
+        tune_header = "Q1" if plane == "X" else "Q2"
+        tune = sum(lin_frame.headers[tune_header] for lin_frame in lin_frames) / len(lin_frames)
+        bpms, (mus,) = _get_aligned_columns(model_tfs, lin_frames, ["MU" + plane])
+        bpm_model = model_tfs.set_index("NAME").loc[bpms, :]
+        # Here is what we need from the model and all the measured phases for the intersected BPMs
+        results = pd.DataFrame(index=bpms[:-1])
+        results['NAME'] = bpms[:-1]
         results['NAME2'] = bpms[1:]
-        results['S2'] = all_data.loc[bpms[1:],'S'].values
-        cols=[]
-        
-        for c in all_data.columns.values:
-            if c.startswith('MU'):
-                field = all_data.loc[bpms[1:],c].values - all_data.loc[bpms[:-1],c].values
-                results[c.replace('MU','PHASE')] = np.where(np.abs(field)>0.5,field-np.sign(field),field)
-                d = c.replace('MU','PHASE')
-                cols.append(d)
-        cols.remove('PHASE' + plane + 'MDL')
-        results.rename(columns={'PHASE' + plane + 'MDL':'PH' + plane + 'MDL'}, inplace=True)
-        
-        results['PHASE'+plane]= np.angle(np.sum(np.exp(PI2I * results.loc[:,cols]),axis=1))/(2*np.pi)
-        f =[]
-        for c in cols:
-            field = results.loc[:,c] - results.loc[:,'PHASE'+plane]
-            results['d'+ c] = np.where(np.abs(field)>0.5,field-np.sign(field),field)
-            f.append('d'+ c)
-        if len(f)>1:
-            results['STDPH' + plane]=np.std(results.loc[:,f],axis=1)*t_value_correction(len(f))
-        else:
-            results['STDPH' + plane]=0.0
-        if plane =="X":
-            header = {'Q1': tune}
-        else:
-            header = {'Q2': tune}
-        heads = ['NAME', 'NAME2', 'S', 'S2', 'PHASE'+plane, 'STDPH' + plane, 'PH' + plane+'MDL', 'MU' + plane+'MDL']
-        tfs.write_tfs(os.path.join(output, "getphase" + plane.lower() + ".out"), results.loc[:, heads], header)
-    return 
-
-
-def load_panda(model):
-    return pd.DataFrame(tfs.read_tfs(model))
-    
+        results['S'] = bpm_model.loc[:, 'S'].values[:-1]
+        results['S2'] = bpm_model.loc[:, 'S'].values[1:]
+        mu_model = bpm_model.loc[:, 'MU' + plane].values
+        phases = _wrap(np.diff(mus, axis=0))
+        results['PHASE' + plane] = np.angle(np.sum(np.exp(PI2I * phases), axis=1)) / (2 * np.pi)
+        results['STDPH' + plane] = _std(
+            _wrap(phases - results.loc[:, 'PHASE' + plane].values[:, np.newaxis]))
+        results['PH' + plane + 'MDL'] = _wrap(np.diff(mu_model))
+        results['MU' + plane + 'MDL'] = mu_model[:-1]
+        tfs.write_tfs(os.path.join(output, "getphase" + plane.lower() + ".out"), results,
+                      {tune_header: tune})
+    return
+
+
+def _read_lin_files(file_list, processes):
+    if processes > 1 and len(file_list) > 1:
+        pool = multiprocessing.Pool(min(processes, len(file_list)))
+        try:
+            return pool.map(tfs.read_tfs, file_list)
+        finally:
+            pool.close()
+            pool.join()
+    return [tfs.read_tfs(file_name) for file_name in file_list]
+
+
+def _get_aligned_columns(model_tfs, lin_frames, columns):
+    """ Returns the BPMs present in the model and all files (in model order) and for each
+    column a (BPM x file) array. """
+    bpms = model_tfs.loc[:, "NAME"].values
+    for lin_frame in lin_frames:
+        bpms = bpms[np.in1d(bpms, lin_frame.loc[:, "NAME"].values)]
+    arrays = [np.empty((len(bpms), len(lin_frames))) for _ in columns]
+    for i, lin_frame in enumerate(lin_frames):
+        lin_frame = lin_frame.set_index("NAME").loc[bpms, columns]
+        for array, column in zip(arrays, columns):
+            array[:, i] = lin_frame.loc[:, column].values
+    return bpms, arrays
+
+
+def _wrap(phases):
+    return np.where(np.abs(phases) > 0.5, phases - np.sign(phases), phases)
+
+
+def _std(values):
+    """ Standard deviation over the files (columns) with the t-value correction. """
+    if values.shape[1] > 1:
+        return np.std(values, axis=1) * t_value_correction(values.shape[1])
+    return 0.0
+
+
+def _file_suffix(index):
+    """ Suffix of the columns of the index-th file, as given by the former merges. """
+    return "" if index == 0 else str(index + 1)
+
 
 def get_arc_bpms(model_twiss, bpm_names):  # twiss_ac, intersected BPM names 
-    model_twiss.set_index("NAME", inplace=True)
+    model_twiss = model_twiss.set_index("NAME")
     sequence = model_twiss.headers["SEQUENCE"].lower().replace("b1", "").replace("b2", "")
     AccelClass = manager.get_accel_class(accel=sequence)
     arc_bpms_mask = AccelClass.get_element_types_mask(bpm_names, types=["arc_bpm"])
@@ -194,10 +183,6 @@ def t_value_correction(num):
     return t_factor
 
 
-def intersect(a, b):
-    return list(set(a) & set(b))
-
-
 if __name__ == "__main__":
-    _files, _model, _output, _phase, _ndx = _parse_args()
-    get_optics(_files, _model, _output, _phase, _ndx )
+    _files, _model, _output, _phase, _ndx, _processes = _parse_args()
+    get_optics(_files, _model, _output, _phase, _ndx, processes=_processes)
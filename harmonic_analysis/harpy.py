@@ -18,15 +18,8 @@ try:
 except ImportError:
     from numpy.fft import fft as _fft
 
-NUMBA_AVAILABLE = True
-try:
-    from numba import jit
-except ImportError:
-    NUMBA_AVAILABLE = False
-
 
 LOGGER = logging.getLogger(__name__)
-LOGGER.addHandler(logging.NullHandler())  # avoid 'no handler' warn from _which_compute_coef() on import
 
 PI2I = 2 * np.pi * complex(0, 1)
 
@@ -45,6 +38,7 @@ NUM_HARMS = 300
 NUM_HARMS_SVD = 100
 
 PROCESSES = multiprocessing.cpu_count()
+_COMPUTE_COEF = None
 
 
 def harpy(harpy_input, bpm_matrix_x, usv_x, bpm_matrix_y, usv_y):
@@ -291,15 +285,17 @@ def _parallel_laskar(samples, sequential, num_harms):
         freqs.loc[bpm_name] = freq
         coefs.loc[bpm_name] = coef
 
+    if sequential:
+        for bpm_name in samples.index:
+            _collect_results(bpm_name, _laskar_per_mode(samples.loc[bpm_name, :], num_harms))
+        return freqs, coefs
+    _get_compute_coef()
     pool = multiprocessing.Pool(np.min([PROCESSES, samples.shape[0]]))
     for bpm_name in samples.index:
         args = (samples.loc[bpm_name, :], num_harms)
         callback = partial(_collect_results, bpm_name)
-        if sequential:
-            callback(_laskar_per_mode(*args))
-        else:
-            pool.apply_async(_laskar_per_mode, args,
-                             callback=callback)
+        pool.apply_async(_laskar_per_mode, args,
+                         callback=callback)
     pool.close()
     pool.join()
     return freqs, coefs
@@ -430,11 +426,12 @@ def _laskar_method(tbt, num_harmonics):
     int_range = np.arange(n)
     coefficients = []
     frequencies = []
+    compute_coef = _get_compute_coef()
     for _ in range(num_harmonics):
         # Compute this harmonic frequency and coefficient.
         dft_data = _fft(samples)
         frequency = _jacobsen(dft_data, n)
-        coefficient = _compute_coef(samples, frequency * n) / n
+        coefficient = compute_coef(samples, frequency * n) / n
 
         # Store frequency and amplitude
         coefficients.append(coefficient)
@@ -518,14 +515,21 @@ def _get_resonance_tolerance(resonance, n_turns):
 
 
 def _which_compute_coef():
-    if not NUMBA_AVAILABLE:
+    try:
+        from numba import jit  # slow import, only done on the first use
+    except ImportError:
         LOGGER.warn("Cannot import numba, using numpy functions.")
         return _compute_coef_simple
     LOGGER.debug("Using compiled Numba functions.")
     return jit(_compute_coef_goertzel, nopython=True, nogil=True)
 
 
-_compute_coef = _which_compute_coef()
+def _get_compute_coef():
+    """ Chooses the coefficient function on the first call, forked workers inherit it. """
+    global _COMPUTE_COEF
+    if _COMPUTE_COEF is None:
+        _COMPUTE_COEF = _which_compute_coef()
+    return _COMPUTE_COEF
 
 
 def windowed_padded_fft(matrix, svd, turn_bits, harpy_input):
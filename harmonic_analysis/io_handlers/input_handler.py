@@ -59,6 +59,8 @@ class MainInput(object):
         "startturn": 0,
         "endturn": 50000,
         "skip_files": False,
+        "processes": 1,
+        "max_memory": None,
     }
 
     def __init__(self):
@@ -69,6 +71,8 @@ class MainInput(object):
         self.startturn = MainInput.DEFAULTS["startturn"]
         self.endturn = MainInput.DEFAULTS["endturn"]
         self.skip_files = MainInput.DEFAULTS["skip_files"]
+        self.processes = MainInput.DEFAULTS["processes"]
+        self.max_memory = MainInput.DEFAULTS["max_memory"]
 
     @staticmethod
     def init_from_options(options):
@@ -83,6 +87,8 @@ class MainInput(object):
             self.outputdir = outdir
         self.startturn = options.startturn
         self.endturn = options.endturn
+        self.processes = options.processes
+        self.max_memory = options.max_memory
         return self
 
 
@@ -137,6 +143,20 @@ def _get_main_parser():
         default=MainInput.DEFAULTS["endturn"],
         dest="endturn", type=int
     )
+    parser.add_argument(
+        "--processes",
+        help="""Number of files (or bunches) analysed in parallel, the harmonic analysis
+                of each file then runs in a single process. Default: %(default)s""",
+        default=MainInput.DEFAULTS["processes"],
+        dest="processes", type=int
+    )
+    parser.add_argument(
+        "--max_memory",
+        help="""Memory budget in MB for the parallel analysis of files,
+                limits the number of --processes.""",
+        default=MainInput.DEFAULTS["max_memory"],
+        dest="max_memory", type=float
+    )
     return parser
     ################################
 
@@ -273,6 +293,7 @@ class HarpyInput(object):
         "no_tune_clean": False,
         "tune_clean_limit": 1e-5,
         "is_free_kick": False,
+        "chroma": False,
     }
 
     def __init__(self):
@@ -288,6 +309,7 @@ class HarpyInput(object):
         self.no_tune_clean = HarpyInput.DEFAULTS["no_tune_clean"]
         self.tune_clean_limit = HarpyInput.DEFAULTS["tune_clean_limit"]
         self.is_free_kick = HarpyInput.DEFAULTS["is_free_kick"]
+        self.chroma = HarpyInput.DEFAULTS["chroma"]
 
     @staticmethod
     def init_from_options(options):
@@ -311,10 +333,14 @@ class HarpyInput(object):
         self.no_tune_clean = options.no_tune_clean
         self.tune_clean_limit = options.tune_clean_limit
         self.is_free_kick = options.is_free_kick
+        self.chroma = options.chroma
 
         # Check there's no overlap for the tune and nattune
         check_tune_overlap(self.tunex, self.nattunex, 'x', self.tolerance)
         check_tune_overlap(self.tuney, self.nattuney, 'y', self.tolerance)
+        if self.chroma and self.tunez <= 0.0:
+            LOGGER.warning("The chromaticity needs the synchrotron tune (tunez), it will not "
+                           "be computed.")
 
         return self
 
@@ -385,5 +411,11 @@ def _get_harpy_parser():
         help="If present, it will perform the free kick phase correction",
         dest="is_free_kick", action="store_true",
     )
+    parser.add_argument(
+        "--chroma",
+        help="If present, the chromatic tune shifts and the chromaticity are computed from "
+             "the synchrotron oscillation (needs tunez).",
+        dest="chroma", action="store_true",
+    )
     ################################
     return parser
@@ -12,21 +12,26 @@ DEF_LIMIT = 1e-5
 
 
 def clean_tunes(files, limit=DEF_LIMIT):
-    for file in files:
-        file_df = tfs_pandas.read_tfs(file)
-        mask = _get_mask(file_df, limit)
+    file_dfs = [tfs_pandas.read_tfs(file) for file in files]
+    masks = _get_masks(file_dfs, limit)
+    for file, file_df, mask in zip(files, file_dfs, masks):
         file_df = file_df.loc[mask, :]
         _recompute_tune_stats(file_df)
         tfs_pandas.write_tfs(file, file_df)
 
 
-def _get_mask(file_df, limit):
-    tune_col = _choose_name(file_df, "TUNEX", "TUNEY")
-    mask = outliers.get_filter_mask(
-        file_df.loc[:, tune_col],
-        limit=limit,
-    )
-    return mask
+def _get_masks(file_dfs, limit):
+    """ Cleans the tunes of all files in one pass, padding them to equal length. """
+    if not file_dfs:
+        return []
+    lengths = [len(file_df.index) for file_df in file_dfs]
+    tunes = np.full((len(file_dfs), max(lengths)), np.nan)
+    padding = np.zeros(tunes.shape, dtype=bool)
+    for i, file_df in enumerate(file_dfs):
+        tunes[i, :lengths[i]] = file_df.loc[:, _choose_name(file_df, "TUNEX", "TUNEY")].values
+        padding[i, :lengths[i]] = True
+    masks = outliers.get_filter_masks(tunes, limit=limit, mask=padding)
+    return [mask[:length] for mask, length in zip(masks, lengths)]
 
 
 def _recompute_tune_stats(file_df):
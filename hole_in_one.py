@@ -1,6 +1,8 @@
 from __future__ import print_function
 import sys
+import copy
 import logging
+import multiprocessing
 from collections import OrderedDict
 import numpy as np
 import pandas as pd
@@ -10,36 +12,52 @@ from harmonic_analysis.io_handlers import input_handler, output_handler
 
 from tfs_files import tfs_pandas as tfs
 from utils.contexts import timeit
+from utils import tracing
 from model import manager
 from sdds_files import turn_by_turn_reader
 LOGGER = logging.getLogger(__name__)
 LOG_SUFFIX = ".log"
+# Estimated peak memory of the analysis of one file relative to the size of its raw data
+MEMORY_PER_DATA_SIZE = 8
+_FILE_JOBS = []
 
 
 from utils import iotools
-import measure_optics
 
 
 def run_all(main_input, clean_input, harpy_input, optics_input, to_log):
-    with timeit(lambda spanned: LOGGER.info("Total time for file: %s", spanned)):
+    with timeit(lambda spanned: LOGGER.info("Total time for file: %s", spanned)),\
+            tracing.tracing("hole_in_one", main_input.outputdir):
         if (not main_input.write_raw and
                 clean_input is None and harpy_input is None):
             LOGGER.error("No file has been choosen to be writen!")
             return
         _setup_file_log_handler(main_input)
         LOGGER.debug(to_log)
-        tbt_files = [turn_by_turn_reader.read_tbt_file(input_file.strip())
-                     for input_file in main_input.file.strip("\"").split(",")]
-        
-        lins = []
-        for tbt_file in tbt_files:
-            lins.extend(
-                [run_all_for_file(bunchfile, this_main_input, clean_input, harpy_input)
-                 for this_main_input, bunchfile in
-                 output_handler.handle_multibunch(main_input, tbt_file)]
-            )
+        input_files = [input_file.strip() for input_file in main_input.file.strip("\"").split(",")]
+        with tracing.stage("read", files=len(input_files)):
+            tbt_files = [turn_by_turn_reader.read_tbt_file(input_file)
+                         for input_file in input_files]
+        model_tfs = tfs.read_tfs(main_input.model).loc[:, ('NAME', 'S', 'DX')]
+
+        jobs = []
+        for input_file, tbt_file in zip(input_files, tbt_files):
+            file_main_input = main_input
+            if len(input_files) > 1:
+                file_main_input = copy.copy(main_input)
+                file_main_input.file = input_file
+            jobs.extend(output_handler.handle_multibunch(file_main_input, tbt_file))
+        del tbt_files
+        processes = _get_number_of_processes(main_input, jobs)
+        if processes > 1:
+            lins = _run_parallel(jobs, clean_input, harpy_input, model_tfs, processes)
+        else:
+            lins = [run_all_for_file(bunchfile, this_main_input, clean_input, harpy_input,
+                                     model_tfs)
+                    for this_main_input, bunchfile in jobs]
 
         if optics_input is not None:
+            import measure_optics  # the optics stack is only loaded when needed
             inputs = measure_optics.InputFiles(lins)
             iotools.create_dirs(optics_input.outputdir)
             calibrations = measure_optics._copy_calibration_files(optics_input.outputdir, optics_input.calibrationdir)
@@ -47,7 +65,8 @@ def run_all(main_input, clean_input, harpy_input, optics_input, to_log):
             measure_optics.measure_optics(inputs, optics_input)
 
 
-def run_all_for_file(tbt_file, main_input, clean_input, harpy_input):
+@tracing.traced("file")
+def run_all_for_file(tbt_file, main_input, clean_input, harpy_input, model_tfs=None):
     tbt_file = _cut_tbt_file(tbt_file,
                              main_input.startturn,
                              main_input.endturn)
@@ -66,7 +85,8 @@ def run_all_for_file(tbt_file, main_input, clean_input, harpy_input):
     bpm_ress = {"x": None, "y": None}
     dpp = 0.0
 
-    model_tfs = tfs.read_tfs(main_input.model).loc[:, ('NAME', 'S', 'DX')]
+    if model_tfs is None:
+        model_tfs = tfs.read_tfs(main_input.model).loc[:, ('NAME', 'S', 'DX')]
 
     if clean_input is not None:
         usvs, all_bad_bpms, bpm_ress, dpp = _do_clean(main_input, clean_input,
@@ -86,6 +106,72 @@ def run_all_for_file(tbt_file, main_input, clean_input, harpy_input):
     return lin
 
 
+def _get_number_of_processes(main_input, jobs):
+    processes = min(main_input.processes, len(jobs))
+    if processes > 1 and main_input.max_memory is not None:
+        data_size = max(tbt_file.samples_matrix_x.values.nbytes +
+                        tbt_file.samples_matrix_y.values.nbytes for _, tbt_file in jobs)
+        memory_per_job = MEMORY_PER_DATA_SIZE * data_size / 1024. ** 2
+        processes = max(1, min(processes, int(main_input.max_memory / memory_per_job)))
+        LOGGER.debug("Estimated memory per file: {:.0f} MB, analysing {} files in parallel."
+                     .format(memory_per_job, processes))
+    return processes
+
+
+def _run_parallel(jobs, clean_input, harpy_input, model_tfs, processes):
+    """ Analyses the files in forked workers, which share the read data and the model.
+
+    The harmonic analysis runs sequentially in the workers. Their log records are collected
+    and emitted here in the order of the files, together with the results.
+    """
+    global _FILE_JOBS
+    if harpy_input is not None:
+        harpy_input = copy.copy(harpy_input)
+        harpy_input.sequential = True
+    _FILE_JOBS = [(this_main_input, bunchfile, clean_input, harpy_input, model_tfs)
+                  for this_main_input, bunchfile in jobs]
+    lins = []
+    pool = multiprocessing.Pool(processes)
+    try:
+        with tracing.stage("parallel_files", files=len(jobs), processes=processes):
+            for lin, log_records in pool.imap(_run_file_index, range(len(jobs))):
+                for record in log_records:
+                    logging.getLogger(record.name).handle(record)
+                lins.append(lin)
+    finally:
+        pool.close()
+        pool.join()
+        _FILE_JOBS = []
+    return lins
+
+
+def _run_file_index(index):
+    main_input, tbt_file, clean_input, harpy_input, model_tfs = _FILE_JOBS[index]
+    collector = _RecordCollector()
+    root_logger = logging.getLogger("")
+    handlers = root_logger.handlers, LOGGER.handlers
+    root_logger.handlers, LOGGER.handlers = [collector], []
+    try:
+        lin = run_all_for_file(tbt_file, main_input, clean_input, harpy_input, model_tfs)
+    finally:
+        root_logger.handlers, LOGGER.handlers = handlers
+    return lin, collector.records
+
+
+class _RecordCollector(logging.Handler):
+    """ Keeps the log records of a worker to be emitted by the main process. """
+    def __init__(self):
+        super(_RecordCollector, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
 def _do_clean(main_input, clean_input, bpm_datas, file_date, model_tfs):
     usvs, all_bad_bpms, bpm_ress = {}, {}, {}
     clean_writer = output_handler.CleanedAsciiWritter(main_input, file_date)
@@ -97,9 +183,9 @@ def _do_clean(main_input, clean_input, bpm_datas, file_date, model_tfs):
     
         bad_bpms = []
 
-        with timeit(lambda spanned: LOGGER.debug("Time for filtering: %s", spanned)):
+        with tracing.stage("filtering_" + plane, bpms=bpm_data.shape[0], turns=bpm_data.shape[1]):
             bpm_data, bad_bpms_clean = clean.clean(bpm_data, clean_input, file_date,)
-        with timeit(lambda spanned: LOGGER.debug("Time for SVD clean: %s", spanned)):
+        with tracing.stage("svd_clean_" + plane, bpms=bpm_data.shape[0], turns=bpm_data.shape[1]):
             bpm_data, bpm_res, bad_bpms_svd, usv = clean.svd_clean(bpm_data, clean_input,)
         bpm_ress[plane] = bpm_res
         bad_bpms.extend(bpms_not_in_model)
@@ -109,7 +195,7 @@ def _do_clean(main_input, clean_input, bpm_datas, file_date, model_tfs):
         setattr(clean_writer, "samples_matrix_" + plane, bpm_data)
 
         if plane == "x":
-            dpp = _calc_dp_over_p(main_input, bpm_data)
+            dpp = _calc_dp_over_p(model_tfs, bpm_data)
         bpm_datas[plane] = bpm_data
         usvs[plane] = usv
 
@@ -120,6 +206,25 @@ def _do_clean(main_input, clean_input, bpm_datas, file_date, model_tfs):
 
 
 def _do_harpy(main_input, harpy_input, bpm_datas, usvs, model_tfs, bpm_ress, dpp, all_bad_bpms):
+    all_bad_bpms, lin, spectra = _analyse_harpy(harpy_input, bpm_datas, usvs, model_tfs,
+                                                bpm_ress, dpp, all_bad_bpms)
+    with tracing.stage("write_harpy"):
+        _write_harpy_output(main_input, lin, spectra)
+    return all_bad_bpms, lin
+
+
+def _write_harpy_output(main_input, lin, spectra):
+    for plane in ("x", "y"):
+        output_handler.write_harpy_output(
+            main_input,
+            lin[plane],
+            lin[plane].headers,
+            spectra[plane],
+            plane
+        )
+
+
+def _analyse_harpy(harpy_input, bpm_datas, usvs, model_tfs, bpm_ress, dpp, all_bad_bpms):
     lin_frames = {}
     for plane in ("x", "y"):
         bpm_data, usv = bpm_datas[plane], usvs[plane]
@@ -130,18 +235,20 @@ def _do_harpy(main_input, harpy_input, bpm_datas, usvs, model_tfs, bpm_ress, dpp
                 ("S", model_tfs.set_index("NAME").loc[bpm_data.index, "S"])
             ])
         )
-        with timeit(lambda spanned: LOGGER.debug("Time for orbit_analysis: %s", spanned)):
+        with tracing.stage("orbit_analysis_" + plane, bpms=bpm_data.shape[0]):
             lin_frames[plane] = _get_orbit_data(lin_frames[plane], bpm_data, bpm_ress[plane])
         bpm_datas[plane], usvs[plane] = _prepare_data_for_harpy(bpm_data, usv)
 
-    with timeit(lambda spanned: LOGGER.debug("Time for harmonic_analysis: %s", spanned)):
-        harpy_iterator = harpy.harpy(
+    with tracing.stage("harmonic_analysis", bpms=bpm_datas["x"].shape[0] + bpm_datas["y"].shape[0],
+                       turns=bpm_datas["x"].shape[1]):
+        # harpy is a generator, consume it here to time the analysis
+        harpy_iterator = iter(list(harpy.harpy(
             harpy_input,
             bpm_datas["x"], usvs["x"],
             bpm_datas["y"], usvs["y"],
-        )
-    dpp_amp = None
-    lin = {}
+        )))
+    dpp_amp, dpp_intervals = None, None
+    lin, spectra = {}, {}
     for plane in ("x", "y"):
         harpy_results, spectr, bad_bpms_summaries = harpy_iterator.next()
         lin_frame = lin_frames[plane]
@@ -150,22 +257,21 @@ def _do_harpy(main_input, harpy_input, bpm_datas, usvs, model_tfs, bpm_ress, dpp
             bpm_data = bpm_datas[plane]
             lin_frame = _kick_phase_correction(bpm_data, lin_frame, plane)
         if harpy_input.tunez > 0.0 and plane == "x":
-            dpp_amp, _, _ = chroma.get_dpoverp_amp(model_tfs, lin_frame, bpm_datas["x"])
+            dpp_amp, pos, neg = chroma.get_dpoverp_amp(model_tfs, lin_frame, bpm_datas["x"])
+            dpp_intervals = (pos, neg)
+        if harpy_input.chroma and dpp_intervals is not None:
+            with tracing.stage("chroma_" + plane, bpms=lin_frame.shape[0]):
+                lin_frame = lin_frame.join(chroma.get_chroma(lin_frame, bpm_datas[plane], plane,
+                                                             dpp_amp, *dpp_intervals))
         lin_frame = _sync_phase(lin_frame, plane)
         lin_frame = _rescale_amps_to_main_line(lin_frame, plane)
         lin_frame = _add_resonances_noise(lin_frame, plane)
         lin_frame = lin_frame.sort_values('S', axis=0, ascending=True)
         headers = _compute_headers(lin_frame, plane, dpp, dpp_amp)
-        output_handler.write_harpy_output(
-            main_input,
-            lin_frame,
-            headers,
-            spectr,
-            plane
-        )
         all_bad_bpms[plane].extend(bad_bpms_summaries)
         lin[plane] = tfs.TfsDataFrame(lin_frame, headers=headers)
-    return all_bad_bpms, lin
+        spectra[plane] = spectr
+    return all_bad_bpms, lin, spectra
 
 
 def _prepare_data_for_harpy(bpm_data, usv):
@@ -312,9 +418,8 @@ def _get_spectral_phase_error(amplitude, noise):
     return np.where(error > 0.25, 0.3, error)
 
 
-def _calc_dp_over_p(main_input, bpm_data):
-    model_twiss = tfs.read_tfs(main_input.model)
-    model_twiss.set_index("NAME", inplace=True)
+def _calc_dp_over_p(model_tfs, bpm_data):
+    model_twiss = model_tfs.set_index("NAME")
     sequence = model_twiss.headers["SEQUENCE"].lower().replace("b1", "").replace("b2", "")
     if sequence != "lhc":
         return 0.0  # TODO: What do we do with other accels.
@@ -8,6 +8,8 @@ Original paper: Liu, Fei Tony, Ting, Kai Ming and Zhou, Zhi-Hua. “Isolation fo
 '''
 from __future__ import print_function
 import os
+import glob
+import multiprocessing
 import numpy as np
 from scipy import stats
 import matplotlib.pyplot as plt
@@ -15,6 +17,10 @@ import mpl_toolkits.mplot3d.axes3d as p3
 import pandas
 import argparse
 from sklearn.ensemble import IsolationForest
+try:
+    from sklearn.externals import joblib
+except ImportError:
+    import joblib
 from utils import logging_tools
 from tfs_files import tfs_pandas
 from model.accelerators import lhc
@@ -26,6 +32,9 @@ IRS_CONT = 0.01
 FEATURES = "TUNE{0},NOISE_SCALED,AMP{0}"
 FEATURES_WITH_NAME = "NAME,TUNE{0},NOISE_SCALED,AMP{0}"
 PLANE = ("x", "y")
+MODEL_VERSION = 1
+BATCH_REPORT_SUFFIX = ".bad_bpms_iforest.tfs"
+GROUPS = (("ARCS", ARCS_CONT), ("IRS", IRS_CONT))
 
 
 def get_bad_bpms(files, remove_bpms):
@@ -60,9 +69,6 @@ def get_bad_bpms_from_measurement(files, plane):
                                       (ir_bpm_data, IRS_CONT, "IRs")):
         bad_bpms, good_bpms, all_bpms_scores, bad_bpms_scores =\
              detect_anomalies(cont, data_for_clustering, uplane)
-        bpm_tfs_data, data_for_clustering, bad_bpms, good_bpms =\
-            [reassign_index(data)
-             for data in (bpm_tfs_data, data_for_clustering, bad_bpms, good_bpms)]
         signif_feature = get_significant_features(bpm_tfs_data, data_for_clustering, bad_bpms, good_bpms, plane)
         signif_feature.loc[:, "SCORE"] = bad_bpms_scores
         dataframes.append(signif_feature)
@@ -75,23 +81,136 @@ def get_bad_bpms_from_measurement(files, plane):
     return pandas.concat(dataframes)
 
 
-def reassign_index(data):
-    data["NEW_INDEX"] = range(len(data.NAME))
-    return data.set_index("NEW_INDEX")
+def get_bad_bpms_batch(meas_dirs, model_file=None, n_jobs=1, remove_bpms=False):
+    """
+    Screens the lin files of several measurement directories at once.
+    The Isolation Forests (one per plane and BPM group) are fitted once on the pooled features
+    of all files, or taken from model_file if it exists, and all BPMs are scored in one pass.
+    A report of the bad BPMs is written next to every lin file.
+
+    :param meas_dirs: list of measurement directories containing .linx/.liny files
+    :param model_file: file to store the fitted forests in, an existing model is reused
+    :param n_jobs: number of processes to read the files and to build the forests
+    :param remove_bpms: if True the bad BPMs are removed from the lin files
+    """
+    model = {"forests": {}}
+    if model_file is not None and os.path.isfile(model_file):
+        model = load_model(model_file)
+    refitted = False
+    for plane in PLANE:
+        files = _find_lin_files(meas_dirs, plane)
+        if not files:
+            LOGGER.warning("No lin%s files found in the given directories", plane)
+            continue
+        bpm_tfs_data = _create_tfs_data(files, plane, n_jobs=n_jobs)
+        if plane not in model["forests"]:
+            model["forests"][plane] = fit_forests(bpm_tfs_data, plane, n_jobs=n_jobs)
+            refitted = True
+        bad_bpms = score_bpms(bpm_tfs_data, model["forests"][plane], plane)
+        LOGGER.info("Found %d bad BPMs in %d lin%s files", len(bad_bpms.index), len(files), plane)
+        for file_number, filepath in enumerate(files):
+            file_bad_bpms = bad_bpms.loc[bad_bpms.FILE == file_number].drop("FILE", axis=1)
+            tfs_pandas.write_tfs(filepath + BATCH_REPORT_SUFFIX, file_bad_bpms)
+            if remove_bpms:
+                remove_bpms_from_file([filepath], set(file_bad_bpms.NAME), plane)
+    if refitted and model_file is not None:
+        save_model(model_file, model["forests"])
+
+
+def fit_forests(bpm_tfs_data, plane, n_jobs=1):
+    """
+    Fits one Isolation Forest per BPM group on the pooled features of all files.
+    The normalisation of the training data is kept to score other data consistently.
+    """
+    columns = FEATURES.format(plane.upper()).split(",")
+    forests = {}
+    for group, cont, mask in _get_group_masks(bpm_tfs_data):
+        features = bpm_tfs_data.loc[mask, columns]
+        minimum, maximum = features.min(), features.max()
+        iforest = IsolationForest(n_estimators=100, max_samples='auto',
+                                  contamination=cont, max_features=1.0,
+                                  bootstrap=False, n_jobs=n_jobs)
+        iforest.fit(_normalize_parameter(features, minimum, maximum))
+        forests[group] = {"FOREST": iforest, "MIN": minimum, "MAX": maximum}
+    return forests
+
+
+def score_bpms(bpm_tfs_data, forests, plane):
+    """
+    Scores all BPMs of all files and returns the bad ones with their most significant feature,
+    compared to the good BPMs of the same file.
+    """
+    columns = FEATURES.format(plane.upper()).split(",")
+    dataframes = []
+    for group, _, mask in _get_group_masks(bpm_tfs_data):
+        data = bpm_tfs_data.loc[mask]
+        normalized = _normalize_parameter(data.loc[:, columns],
+                                          forests[group]["MIN"], forests[group]["MAX"])
+        iforest = forests[group]["FOREST"]
+        is_bad = iforest.predict(normalized) == -1
+        scores = iforest.decision_function(normalized)
+        bad_files = data.FILE.values[is_bad]
+        good_files = data.FILE.values[~is_bad]
+        good_norm_means = normalized.loc[~is_bad].groupby(good_files).mean().reindex(bad_files)
+        good_means = data.loc[~is_bad, columns].groupby(good_files).mean().reindex(bad_files)
+        distances = np.abs(normalized.loc[is_bad].values - good_norm_means.values)
+        sig_index = np.argmax(np.nan_to_num(distances), axis=1)
+        rows = np.arange(len(bad_files))
+        dataframes.append(pandas.DataFrame(
+            data={"NAME": data.NAME.values[is_bad],
+                  "FEATURE": np.array(columns)[sig_index],
+                  "VALUE": data.loc[is_bad, columns].values[rows, sig_index],
+                  "AVG": good_means.values[rows, sig_index],
+                  "SCORE": scores[is_bad],
+                  "FILE": bad_files},
+            columns=["NAME", "FEATURE", "VALUE", "AVG", "SCORE", "FILE"]))
+    return pandas.concat(dataframes, ignore_index=True)
+
+
+def save_model(model_file, forests):
+    joblib.dump({"VERSION": MODEL_VERSION, "FEATURES": FEATURES, "forests": forests}, model_file)
+    LOGGER.info("Isolation Forest model written to: %s", model_file)
+
+
+def load_model(model_file):
+    model = joblib.load(model_file)
+    if model.get("VERSION") != MODEL_VERSION or model.get("FEATURES") != FEATURES:
+        raise ValueError("Isolation Forest model {} has version {}, expected {}. "
+                         "Remove it to refit.".format(model_file, model.get("VERSION"),
+                                                      MODEL_VERSION))
+    LOGGER.info("Isolation Forest model loaded from: %s", model_file)
+    return model
+
+
+def _get_group_masks(bpm_tfs_data):
+    arc_bpm_mask = np.asarray(
+        lhc.Lhc.get_element_types_mask(bpm_tfs_data.NAME, types=["arc_bpm"]), dtype=bool)
+    return ((GROUPS[0][0], GROUPS[0][1], arc_bpm_mask),
+            (GROUPS[1][0], GROUPS[1][1], ~arc_bpm_mask))
+
+
+def _find_lin_files(meas_dirs, plane):
+    return [filepath
+            for meas_dir in meas_dirs
+            for filepath in sorted(glob.glob(os.path.join(meas_dir, "*.lin" + plane)))]
 
 
 def get_significant_features(bpm_tfs_data, data_for_clustering, bad_bpms, good_bpms, plane):
-    features_df = pandas.DataFrame(index=bad_bpms.index)
+    """
+    Finds for every bad BPM the feature which is furthest away from the mean of the good BPMs.
+    All frames have to share the (unique) index of bpm_tfs_data.
+    """
     columns = FEATURES.format(plane.upper()).split(",")
-    for index in bad_bpms.index:
-        max_dist = max([(abs(data_for_clustering.loc[index, col] -
-                             good_bpms.loc[:, col].mean()), col)
-                        for col in columns])
-        max_dist, sig_col = max_dist
-        features_df.loc[index, "NAME"] = bad_bpms.loc[index, "NAME"]
-        features_df.loc[index, "FEATURE"] = sig_col
-        features_df.loc[index, "VALUE"] = bpm_tfs_data.loc[index, sig_col]
-        features_df.loc[index, "AVG"] = np.mean(bpm_tfs_data.loc[good_bpms.index][sig_col])
+    features_df = pandas.DataFrame(index=bad_bpms.index, columns=["NAME", "FEATURE", "VALUE", "AVG"])
+    if not len(bad_bpms.index):
+        return features_df
+    distances = abs(data_for_clustering.loc[bad_bpms.index, columns] -
+                    good_bpms.loc[:, columns].mean())
+    sig_cols = distances.idxmax(axis=1).values
+    features_df.loc[:, "NAME"] = bad_bpms.loc[:, "NAME"]
+    features_df.loc[:, "FEATURE"] = sig_cols
+    features_df.loc[:, "VALUE"] = bpm_tfs_data.lookup(bad_bpms.index, sig_cols)
+    features_df.loc[:, "AVG"] = bpm_tfs_data.loc[good_bpms.index, columns].mean().loc[sig_cols].values
     return features_df
 
 
@@ -120,17 +239,36 @@ def get_data_for_clustering(bpm_tfs_data, plane):
     return arc_bpm_data_for_clustering, ir_bpm_data_for_clustering
 
 
-def _create_tfs_data(filepaths, plane):
-    bpm_data_rows = []
-    for filepath in filepaths:
-        bpm_tfs_file = tfs_pandas.read_tfs(filepath)
-        bpms_tfs_data = bpm_tfs_file[FEATURES_WITH_NAME.format(plane.upper()).split(",")]
-        bpm_data_rows.append(bpms_tfs_data)
-    return pandas.concat(bpm_data_rows)
+def _create_tfs_data(filepaths, plane, n_jobs=1):
+    """
+    Reads the features of all given lin files, in n_jobs processes if n_jobs > 1.
+    The returned frame has a unique integer index and the file number in column FILE.
+    """
+    args = [(filepath, plane) for filepath in filepaths]
+    if n_jobs > 1 and len(filepaths) > 1:
+        pool = multiprocessing.Pool(min(n_jobs, len(filepaths)))
+        try:
+            bpm_data_rows = pool.map(_read_features, args)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        bpm_data_rows = [_read_features(arg) for arg in args]
+    for file_number, bpms_tfs_data in enumerate(bpm_data_rows):
+        bpms_tfs_data.loc[:, "FILE"] = file_number
+    return pandas.concat(bpm_data_rows, ignore_index=True)
 
 
-def _normalize_parameter(column_data):
-    return (column_data - column_data.min()) / (column_data.max() - column_data.min())
+def _read_features(filepath_and_plane):
+    filepath, plane = filepath_and_plane
+    bpm_tfs_file = tfs_pandas.read_tfs(filepath)
+    return pandas.DataFrame(bpm_tfs_file[FEATURES_WITH_NAME.format(plane.upper()).split(",")])
+
+
+def _normalize_parameter(column_data, minimum=None, maximum=None):
+    minimum = column_data.min() if minimum is None else minimum
+    maximum = column_data.max() if maximum is None else maximum
+    return (column_data - minimum) / (maximum - minimum)
 
 
 def separate_by_plane(files_list):
@@ -284,13 +422,30 @@ def _parse_args():
         dest="plot",
         action="store_true",
     )
-    options = parser.parse_args()
-    return options.files, options.remove_bpms, options.revert, options.plot
+    parser.add_argument(
+        "--measurements",
+        help="Comma separated measurement directories to screen in batch mode.",
+        dest="measurements", type=str,
+    )
+    parser.add_argument(
+        "--model_file",
+        help="Isolation Forest model for batch mode, fitted and written if it does not exist.",
+        dest="model_file", type=str,
+    )
+    parser.add_argument(
+        "--n_jobs",
+        dest="n_jobs", type=int, default=1,
+    )
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    _files, _remove_bpms, _revert, plot = _parse_args()
-    if(not _revert):
-        get_bad_bpms(_files, _remove_bpms)
+    _options = _parse_args()
+    plot = _options.plot
+    if _options.revert:
+        revert_forest_cleaning(_options.files)
+    elif _options.measurements is not None:
+        get_bad_bpms_batch(_options.measurements.split(","), _options.model_file,
+                           _options.n_jobs, _options.remove_bpms)
     else:
-        revert_forest_cleaning(_files)
+        get_bad_bpms(_options.files, _options.remove_bpms)
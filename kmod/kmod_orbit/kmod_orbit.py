@@ -74,6 +74,13 @@ def _parse_args():
         type=int,
         dest="ip",
     )
+    parser.add_argument(
+        "--cutoff",
+        help="BPMs with a larger weight in the first data SVD mode are ignored.",
+        type=float,
+        default=CUTOFF,
+        dest="cutoff",
+    )
     parser.add_argument(
         "--output",
         help="If present, will write the results to this path in a TFS table.",
@@ -84,14 +91,14 @@ def _parse_args():
     input = (options.model1_path, options.model2_path,
              options.orbit_path_left, options.orbit_path_right,
              options.kleft_path, options.kright_path,
-             options.ip)
+             options.ip, options.cutoff)
     return input, options.output
 
 
 def compute_offset(model1_path, model2_path,
                    orbit_path_left, orbit_path_right,
                    kleft_path, kright_path,
-                   ip):
+                   ip, cutoff=CUTOFF):
 
     ks, orbits = _collect_orbit_data(orbit_path_left, orbit_path_right,
                                      kleft_path, kright_path)
@@ -104,12 +111,7 @@ def compute_offset(model1_path, model2_path,
     bpm_names = _get_bpm_names(orbit_path_left, orbit_path_right)
     models = {BEAM1: model1, BEAM2: model2}
 
-    results = _apply_to_beam_side_plane(
-        lambda beam, side, plane: _compute_and_clean(
-            ip, beam, side, plane, models, bpm_names, ks, orbits
-        )
-    )
-    return results
+    return _compute_and_clean(ip, models, bpm_names, ks, orbits, cutoff)
 
 
 def _quad_name(side, ip):
@@ -173,48 +175,61 @@ def _get_bpm_names(orbit_path_left, orbit_path_right):
     }
 
 
-def _compute_and_clean(ip, beam, side, plane, models, bpm_names, ks, orbits):
-    this_orbit = orbits[(beam, side, plane)]
-    this_model = models[beam]
-    this_bpm_names = bpm_names[(beam, side)]
-    this_bpm_model = this_model.loc[this_bpm_names, :]
-
-    quadname = _quad_name(side, ip)
-    this_k = _compute_kl(ks[(beam, side, plane)], this_model, quadname)
-
-    orb = np.array(this_orbit)
-
-    # Work out transfer matrix for given beam and quad
-    model_data = _compute_transfer_matrix(this_model, this_bpm_model,
-                                          quadname, this_k, plane, beam)
+def _compute_and_clean(ip, models, bpm_names, ks, orbits, cutoff=CUTOFF):
+    """ Offsets and error bars of all beam/side/plane configurations at once.
 
-    # SVD on model and data
-    u, s, v = np.linalg.svd(model_data)
-    ud, sd, vd = np.linalg.svd(orb, full_matrices=False)
+    The orbits and models of all configurations are stacked into (configuration x k sample x
+    BPM) arrays padded with zeros, the masks mark the valid entries.
+    """
+    configs = sorted(orbits)
+    row_mask, col_mask, orb = _stack([np.array(orbits[config]) for config in configs])
+    model_data = _compute_transfer_matrices(ip, configs, models, bpm_names, ks, orb.shape)
 
     # Remove offset
-    sd[0] = 0
-    orb = np.dot(np.dot(ud, np.diag(sd)), vd)
-    ud, sd, vd = np.linalg.svd(orb)
+    ud, sd, vd = np.linalg.svd(orb, full_matrices=False)
+    orb = orb - sd[:, 0, None, None] * ud[:, :, :1] * vd[:, :1, :]
+
+    # SVD clean on data, only the gram matrix of the remaining BPMs is updated
+    gram = np.matmul(orb, np.transpose(orb, (0, 2, 1)))
+    while True:
+        eigenvalues, eigenvectors = np.linalg.eigh(gram)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            v_first = (np.einsum("ck,ckn->cn", eigenvectors[:, :, -1], orb) /
+                       np.sqrt(eigenvalues[:, -1, None]))
+        to_remove = col_mask & (np.abs(v_first) > cutoff)
+        if not np.any(to_remove):
+            break
+        removed = orb * to_remove[:, None, :]
+        gram -= np.matmul(removed, np.transpose(removed, (0, 2, 1)))
+        col_mask &= ~to_remove
+    orb = orb * col_mask[:, None, :]
+    model_data = model_data * col_mask[:, None, :]
 
-    # SVD clean on data
+    # Work out offset using matrix multiplication
+    u, s, v = np.linalg.svd(model_data, full_matrices=False)
+    offsets = np.einsum("ck,ckn,cn->c", u[:, :, 0], orb, v[:, 0, :]) / s[:, 0]
+    results = {}
+    for idx, config in enumerate(configs):
+        valid = row_mask[idx][:, None] & col_mask[idx][None, :]
+        N = ((orb[idx] - offsets[idx] * model_data[idx]) / orb[idx])[valid]
+        onesigma = np.std(N)
+        N = N[np.abs(N) < onesigma]
+        errorbars = np.abs(offsets[idx] * np.mean(N))
+        results[config] = offsets[idx], errorbars
+    return results
 
-    while max(vd[0, :]) > CUTOFF or min(vd[0, :]) < -CUTOFF:
-        for j in reversed(range(0, len(vd[0, :]))):
-            if abs(vd[0, j]) > CUTOFF:
-                orb = np.delete(orb, (j), axis=1)
-                model_data = np.delete(model_data, (j), axis=1)
-        u, s, v = np.linalg.svd(model_data)
-        ud, sd, vd = np.linalg.svd(orb)
 
-    # Work out offset using matrix multiplication
-    offset = np.dot(np.dot(np.transpose(u[:, 0]), orb),
-                    np.transpose(v[0, :])) / s[0]
-    N = (orb - offset * model_data) / orb
-    onesigma = np.std(N)
-    N = N[np.abs(N) < onesigma]
-    errorbars = np.abs(offset * np.mean(N))
-    return offset, errorbars
+def _stack(matrices):
+    """ Stacks the 2D matrices, zero padded, returns the row and column masks and the stack. """
+    shape = (len(matrices),) + tuple(np.max([matrix.shape for matrix in matrices], axis=0))
+    stack = np.zeros(shape)
+    row_mask = np.zeros(shape[:2], dtype=bool)
+    col_mask = np.zeros((shape[0], shape[2]), dtype=bool)
+    for idx, matrix in enumerate(matrices):
+        stack[idx, :matrix.shape[0], :matrix.shape[1]] = matrix
+        row_mask[idx, :matrix.shape[0]] = True
+        col_mask[idx, :matrix.shape[1]] = True
+    return row_mask, col_mask, stack
 
 
 def _compute_kl(ks, model, quadname):
@@ -225,32 +240,39 @@ def _compute_kl(ks, model, quadname):
     return sign * (ks - avg_k) * quad_length
 
 
-def _compute_transfer_matrix(model, bpm_model, quadname, ks, plane, beam):
-    mu_m = bpm_model.loc[:, "MU" + PLANE_STR[plane]]
-    b_m = bpm_model.loc[:, "BET" + PLANE_STR[plane]]
-
-    mu_q = model.loc[quadname, "MU" + PLANE_STR[plane]]
-    b_q = model.loc[quadname, "BET" + PLANE_STR[plane]]
-    a_q = model.loc[quadname, "ALF" + PLANE_STR[plane]]
-
-    tune = model.headers["Q" + BEAM_STR[beam]]
-
-    m11 = (np.sqrt(b_m / b_q) *
-           (np.cos((tune - np.abs(mu_m - mu_q)) * 2 * np.pi) +
-            a_q * np.sin((tune - np.abs(mu_m - mu_q)) * 2 * np.pi)))
-    m12 = (np.sqrt(b_m * b_q) *
-           np.sin((tune - np.abs(mu_m - mu_q)) * 2 * np.pi))
+def _compute_transfer_matrices(ip, configs, models, bpm_names, ks, shape):
+    """ Model orbit of 1m misalignment at each BPM for each k value of all configurations,
+    zero padded to shape. """
+    mu_m, b_m, k, quad_parameters = np.zeros(shape[::2]), np.ones(shape[::2]), \
+        np.zeros(shape[:2]), np.zeros((4, shape[0]))
+    for idx, (beam, side, plane) in enumerate(configs):
+        model = models[beam]
+        bpm_model = model.loc[bpm_names[(beam, side)], :]
+        quadname = _quad_name(side, ip)
+        n_bpms, n_ks = len(bpm_model.index), len(ks[(beam, side, plane)])
+        mu_m[idx, :n_bpms] = bpm_model.loc[:, "MU" + PLANE_STR[plane]]
+        b_m[idx, :n_bpms] = bpm_model.loc[:, "BET" + PLANE_STR[plane]]
+        k[idx, :n_ks] = _compute_kl(ks[(beam, side, plane)], model, quadname)
+        quad_parameters[:, idx] = (model.loc[quadname, "MU" + PLANE_STR[plane]],
+                                   model.loc[quadname, "BET" + PLANE_STR[plane]],
+                                   model.loc[quadname, "ALF" + PLANE_STR[plane]],
+                                   model.headers["Q" + BEAM_STR[beam]])
+    mu_q, b_q, a_q, tune = quad_parameters[:, :, None]
+
+    phase = (tune - np.abs(mu_m - mu_q)) * 2 * np.pi
+    m11 = np.sqrt(b_m / b_q) * (np.cos(phase) + a_q * np.sin(phase))
+    m12 = np.sqrt(b_m * b_q) * np.sin(phase)
 
     # F = change in orbit
-    F = -(b_q * ks / np.tan(tune * np.pi) /
-          (2 + b_q * ks / np.tan(tune * np.pi)))
+    F = -(b_q * k / np.tan(tune * np.pi) /
+          (2 + b_q * k / np.tan(tune * np.pi)))
 
     # G = kick for each k value in the data (for 1m misalignment)
-    G = (-(1 - a_q / np.tan(tune * np.pi)) * ks /
-         (2 + b_q * ks / np.tan(tune * np.pi)))
+    G = (-(1 - a_q / np.tan(tune * np.pi)) * k /
+         (2 + b_q * k / np.tan(tune * np.pi)))
 
     # Work out model data at each bpm for 1m misalignment
-    return np.outer(F, m11) + np.outer(G, m12)
+    return F[:, :, None] * m11[:, None, :] + G[:, :, None] * m12[:, None, :]
 
 
 def _apply_to_beam_side_plane(function):
@@ -11,9 +11,11 @@ Top-level script, which computes various lattice optics parameters from frequenc
 import os
 from os.path import isfile, join
 import sys
+import copy
+import multiprocessing
+from glob import glob
 import traceback
 import datetime
-from time import time
 import re
 from collections import OrderedDict
 import pandas as pd
@@ -22,7 +24,7 @@ from optics_measurements import optics_input, dpp, tune, phase
 from optics_measurements import (beta, beta_from_amplitude, coupling, dispersion,
                                  interaction_point, kick, resonant_driving_terms)
 from model.accelerators.accelerator import AccExcitationMode
-from utils import logging_tools, iotools
+from utils import logging_tools, iotools, tracing
 from tfs_files import tfs_pandas
 
 VERSION = '0.2.0'
@@ -30,6 +32,7 @@ DEBUG = sys.flags.debug  # True with python option -d! ("python -d measure_optic
 LOGGER = logging_tools.get_logger(__name__, level_console=logging_tools.INFO)
 PLANES = ('X', 'Y')
 LOG_FILE = "measure_optics.log"
+_BATCH_INPUTS = []
 
 
 def measure_optics(input_files, measure_input):
@@ -42,31 +45,41 @@ def measure_optics(input_files, measure_input):
     Returns:
     """
     LOGGER.info("Calculating optics parameters - code version " + VERSION)
-    global __start_time
-    __start_time = time()
     iotools.create_dirs(measure_input.outputdir)
-    logging_tools.add_module_handler(logging_tools.file_handler(
-            join(measure_input.outputdir, LOG_FILE)))
+    log_handler = logging_tools.file_handler(join(measure_input.outputdir, LOG_FILE))
+    logging_tools.add_module_handler(log_handler)
+    try:
+        with tracing.tracing("measure_optics", measure_input.outputdir):
+            _measure_optics(input_files, measure_input)
+    finally:
+        logging_tools.remove_module_handler(log_handler)
+
+
+def _measure_optics(input_files, measure_input):
     common_header = _get_header(measure_input)
     if sys.flags.debug:
         LOGGER.info("     DEBUG ON")
-    print_time()
+    counts = dict(files=len(input_files["X"]) + len(input_files["Y"]),
+                  bpms=max([len(df.index) for df in input_files["X"] + input_files["Y"]]))
     try:
-        tune_dict = tune.calculate_tunes(measure_input, input_files)
-        phase_dict = phase.calculate_phases(measure_input, input_files, tune_dict, common_header)
+        with tracing.stage("tune", **counts):
+            tune_dict = tune.calculate_tunes(measure_input, input_files)
+        with tracing.stage("phase", **counts):
+            phase_dict = phase.calculate_phases(measure_input, input_files, tune_dict, common_header)
     except:
         raise ValueError("Phase advance or tune calculation failed: No other calculation will run")
-    print_time()
     try:
-        coupling.calculate_coupling(measure_input, input_files, phase_dict, tune_dict, common_header)
+        with tracing.stage("coupling", **counts):
+            coupling.calculate_coupling(measure_input, input_files, phase_dict, tune_dict, common_header)
     except:
         _tb_()
     if measure_input.only_coupling:
         LOGGER.info("Finished as only coupling calculation was requested.")
         return
     try:
-        beta_df_x, driven_beta_df_x, beta_df_y, driven_beta_df_y = beta.calculate_beta_from_phase(
-            measure_input, tune_dict, phase_dict, common_header)
+        with tracing.stage("beta_from_phase", **counts):
+            beta_df_x, driven_beta_df_x, beta_df_y, driven_beta_df_y = beta.calculate_beta_from_phase(
+                measure_input, tune_dict, phase_dict, common_header)
         if driven_beta_df_x is None:
             beta_df_dict = {"X": beta_df_x, "Y": beta_df_y}
         else:
@@ -74,9 +87,10 @@ def measure_optics(input_files, measure_input):
     except:
         _tb_()
     try:
-        ratio = beta_from_amplitude.calculate_beta_from_amplitude(measure_input, input_files,
-                                                                  tune_dict, phase_dict,
-                                                                  beta_df_dict, common_header)
+        with tracing.stage("beta_from_amplitude", **counts):
+            ratio = beta_from_amplitude.calculate_beta_from_amplitude(measure_input, input_files,
+                                                                      tune_dict, phase_dict,
+                                                                      beta_df_dict, common_header)
     except:
         _tb_()
     # in the following functions, nothing should change, so we choose the models now
@@ -87,27 +101,91 @@ def measure_optics(input_files, measure_input):
     else:
         mad_ac = mad_twiss
     try:
-        interaction_point.write_betastar_from_phase(
-            interaction_point.betastar_from_phase(
-                measure_input.accelerator, phase_dict, mad_twiss
-            ), common_header, measure_input.outputdir)
+        with tracing.stage("interaction_point"):
+            interaction_point.write_betastar_from_phase(
+                interaction_point.betastar_from_phase(
+                    measure_input.accelerator, phase_dict, mad_twiss
+                ), common_header, measure_input.outputdir)
     except:
         _tb_()
     try:
-        dispersion.calculate_orbit_and_dispersion(measure_input, input_files, tune_dict, mad_twiss,
-                                                  beta_df_dict, common_header)
+        with tracing.stage("orbit_and_dispersion", **counts):
+            dispersion.calculate_orbit_and_dispersion(measure_input, input_files, tune_dict,
+                                                      mad_twiss, beta_df_dict, common_header)
     except:
         _tb_()
     try:
-        inv_x, inv_y = kick.calculate_kick(measure_input, input_files, mad_twiss, mad_ac, ratio, common_header)
+        with tracing.stage("kick", **counts):
+            inv_x, inv_y = kick.calculate_kick(measure_input, input_files, mad_twiss, mad_ac, ratio, common_header)
     except:
         _tb_()
     if measure_input.nonlinear:
         try:
-            resonant_driving_terms.calculate_RDTs(measure_input, input_files, mad_twiss, phase_dict, common_header, inv_x, inv_y)
+            with tracing.stage("rdt", **counts):
+                resonant_driving_terms.calculate_RDTs(measure_input, input_files, mad_twiss, phase_dict, common_header, inv_x, inv_y)
         except:
             _tb_()
-    print_time()
+
+
+def measure_optics_batch(measurement_dirs, measure_input, processes=1):
+    """
+    Analyses several measurements with the same model and settings.
+    The model-only quantities are computed once, in the analysis of the first measurement, and
+    reused for the others (measure_input.model_cache).
+
+    Args:
+        measurement_dirs: list of directories containing the frequency spectra files (linx/y)
+        measure_input: OpticsInput object containing analysis settings, the output of each
+            measurement is written to a subdirectory of measure_input.outputdir
+        processes: number of measurements analysed in parallel
+
+    Returns:
+        list of output directories
+    """
+    batch_inputs = [_get_batch_input(measurement_dir, measure_input)
+                    for measurement_dir in measurement_dirs]
+    if len(batch_inputs) == 0:
+        raise IOError("No measurements to analyse")
+    LOGGER.info("Analysing {} measurements".format(len(batch_inputs)))
+    _measure_one(batch_inputs[0])
+    LOGGER.debug("Model cache filled with {} entries".format(len(measure_input.model_cache or ())))
+    if processes > 1 and len(batch_inputs) > 1:
+        # forked workers inherit the filled cache, only the indices are sent to them
+        global _BATCH_INPUTS
+        _BATCH_INPUTS = batch_inputs
+        pool = multiprocessing.Pool(min(processes, len(batch_inputs) - 1))
+        try:
+            pool.map(_measure_batch_index, range(1, len(batch_inputs)))
+        finally:
+            pool.close()
+            pool.join()
+            _BATCH_INPUTS = []
+    else:
+        for batch_input in batch_inputs[1:]:
+            _measure_one(batch_input)
+    return [batch_input.outputdir for batch_input in batch_inputs]
+
+
+def _get_batch_input(measurement_dir, measure_input):
+    lin_files = sorted(glob(join(measurement_dir, "*.linx")) + glob(join(measurement_dir, "*_linx")))
+    if len(lin_files) == 0:
+        raise IOError("No frequency spectra files found in '{}'".format(measurement_dir))
+    batch_input = copy.copy(measure_input)  # shares accelerator and model cache
+    batch_input.files = ",".join([lin_file[:-len(".linx")] for lin_file in lin_files])
+    batch_input.outputdir = join(measure_input.outputdir,
+                                 os.path.basename(os.path.normpath(measurement_dir)))
+    return batch_input
+
+
+def _measure_batch_index(index):
+    _measure_one(_BATCH_INPUTS[index])
+
+
+def _measure_one(batch_input):
+    inputs = InputFiles(batch_input.files)
+    iotools.create_dirs(batch_input.outputdir)
+    inputs.calibrate(_copy_calibration_files(batch_input.outputdir, batch_input.calibrationdir))
+    measure_optics(inputs, batch_input)
 
 
 def _get_header(meas_input):
@@ -130,10 +208,6 @@ def _tb_():
         LOGGER.error(traceback.format_exc())
 
 
-def print_time():
-    LOGGER.debug(":::  Elapsed time  >>>>>>>>>> {:8.3f} s".format(time() - __start_time))
-
-
 class InputFiles(dict):
     """
     Stores the input files, provides methods to gather quantity specific data
@@ -263,6 +337,9 @@ def _copy_calibration_files(outputdir, calibrationdir):
 
 if __name__ == "__main__":
     arguments = optics_input.parse_args()
+    if arguments.batch:
+        measure_optics_batch(arguments.files.split(","), arguments, arguments.processes)
+        sys.exit(0)
     inputs = InputFiles(arguments.files)
     iotools.create_dirs(arguments.outputdir)
     calibrations = _copy_calibration_files(arguments.outputdir, arguments.calibrationdir)
@@ -1,14 +1,15 @@
+from importlib import import_module
 from utils.entrypoint import entrypoint, EntryPoint, EntryPointParameters, split_arguments
-from model.accelerators import lhc, ps, esrf, psbooster, skekb
 
 
+# accelerator modules are only imported when their class is requested
 ACCELS = {
-    lhc.Lhc.NAME: lhc.Lhc,
-    ps.Ps.NAME: ps.Ps,
-    esrf.Esrf.NAME: esrf.Esrf,
-    psbooster.Psbooster.NAME: psbooster.Psbooster,
-    skekb.SKekB.NAME: skekb.SKekB,
-    "JPARC": skekb.SKekB
+    "lhc": ("model.accelerators.lhc", "Lhc"),
+    "ps": ("model.accelerators.ps", "Ps"),
+    "esrf": ("model.accelerators.esrf", "Esrf"),
+    "psbooster": ("model.accelerators.psbooster", "Psbooster"),
+    "skekb": ("model.accelerators.skekb", "SKekB"),
+    "JPARC": ("model.accelerators.skekb", "SKekB"),
 }
 
 
@@ -83,12 +84,13 @@ def get_accel_class_from_args(args=None):
 
 def _get_parent_class(name):
     try:
-        return ACCELS[name]
+        module_name, class_name = ACCELS[name]
     except KeyError:
         raise ValueError(
             "name should be one of: " +
             str(ACCELS.keys())
         )
+    return getattr(import_module(module_name), class_name)
 
 
 # Script Mode ##################################################################
@@ -5,7 +5,12 @@ import numpy as np
 import pandas as pd
 from pandas import ExcelWriter
 from datetime import datetime
+new_path = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if new_path not in sys.path:
+    sys.path.append(new_path)
+from utils import logging_tools
 
+LOG = logging_tools.get_logger(__name__)
 
 
 def write_excel(outpath, data):
@@ -14,46 +19,32 @@ def write_excel(outpath, data):
     writer.save()
 
 
-def load_currents_csv(file_path):
-    data_frame = pd.read_csv(file_path, parse_dates=[0], infer_datetime_format=True)
-    data_frame.sort_values(by='time', ascending=True, inplace=True)
-    data_frame = data_frame.fillna(method='ffill')
-    data_frame = data_frame.fillna(method='bfill')
-    data_frame.index = pd.to_datetime(data_frame.pop('time'))
-    return data_frame
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+STORE_SUFFIX = ".pkl"
 
 
-def load_orbit_csv(file_path):
-    data_frame = pd.read_csv(file_path, parse_dates=[0], infer_datetime_format=True)
-    data_frame.columns = map(str.upper, data_frame.columns)
-    data_frame.sort_values(by='TIME', ascending=True, inplace=True)
-    data_frame.index = pd.to_datetime(data_frame.pop('TIME'))
-    return data_frame
+def load_currents_csv(file_path, start=None, end=None, columns=None):
+    return _load_time_indexed(file_path, 'currents', _convert_currents_csv, start, end, columns)
+
+
+def load_orbit_csv(file_path, start=None, end=None, columns=None):
+    return _load_time_indexed(file_path, 'orbit', _convert_orbit_csv, start, end, columns)
 
 
 def load_platteaus_csv(file_path):
-    data_frame = pd.read_csv(file_path, parse_dates=[0,1,2], infer_datetime_format=True)
+    data_frame = pd.read_csv(file_path)
+    for column in data_frame.columns[:3]:
+        data_frame[column] = _parse_times(data_frame[column])
     data_frame.sort_values(by='knob_plat', ascending=True, inplace=True)
     return data_frame
 
 
-def load_mcb_csv(file_path):
-    data_frame = pd.read_csv(file_path, parse_dates=[0], infer_datetime_format=True)
-    data_frame = data_frame.replace(to_replace='RUNNING', value=True)
-    data_frame = data_frame.replace(to_replace='ARMED', value=False)
-    data_frame = data_frame.replace(to_replace='IDLE', value=False)
-    data_frame = data_frame.set_index(['circuit', 'time'])
-    data_frame = data_frame.stack().unstack(0)
-    data_frame.index = data_frame.index.droplevel(level=1)
-    data_frame = data_frame.any(axis=1)
-    return data_frame
+def load_mcb_csv(file_path, start=None, end=None):
+    return _load_time_indexed(file_path, 'mcb', _convert_mcb_csv, start, end, None)
 
 
-def load_tune_coupling_csv(file_path):
-    data_frame = pd.read_csv(file_path, parse_dates=[0], infer_datetime_format=True)
-    data_frame.set_index(['time'], inplace=True)
-
-    return data_frame
+def load_tune_coupling_csv(file_path, start=None, end=None, columns=None):
+    return _load_time_indexed(file_path, 'tune', _convert_tune_coupling_csv, start, end, columns)
 
 
 def load_accepted_platteaus(file_path):
@@ -66,25 +57,99 @@ def load_knob_settings(file_path):
     return data_frame
 
 
-def load_csv(file_path, filetype=None):
+def load_csv(file_path, filetype=None, start=None, end=None, columns=None):
+    """ Loads the csv file of the given filetype.
+
+    The time series (currents, orbit, mcb and tune) are converted once into a time-sorted
+    binary store, start, end and columns select a time window and columns of them.
+    The store is written as <csv>.<filetype>.pkl next to the csv file, which needs the data
+    directory to be writable (otherwise a warning is logged and the csv is converted again
+    on every call).
+    """
     if filetype is None:
         raise RuntimeError('The filetype is not defined for loading this csv file: ', file_path)
-    elif filetype is 'currents':
-        return load_currents_csv(file_path)
-    elif filetype is 'orbit':
-        return load_orbit_csv(file_path)
-    elif filetype is 'platteaus':
+    elif filetype == 'currents':
+        return load_currents_csv(file_path, start, end, columns)
+    elif filetype == 'orbit':
+        return load_orbit_csv(file_path, start, end, columns)
+    elif filetype == 'platteaus':
         return load_platteaus_csv(file_path)
-    elif filetype is 'accepted_platteaus':
+    elif filetype == 'accepted_platteaus':
         return load_accepted_platteaus(file_path)
-    elif filetype is 'mcb':
-        return load_mcb_csv(file_path)
-    elif filetype is 'tune':
-        return load_tune_coupling_csv(file_path)
-    elif filetype is 'knob_settings':
+    elif filetype == 'mcb':
+        return load_mcb_csv(file_path, start, end)
+    elif filetype == 'tune':
+        return load_tune_coupling_csv(file_path, start, end, columns)
+    elif filetype == 'knob_settings':
         return load_knob_settings(file_path)
 
 
+def _load_time_indexed(file_path, filetype, converter, start, end, columns):
+    data_frame = _read_store(file_path, filetype, converter)
+    if columns is None:
+        return data_frame.loc[start:end]
+    return data_frame.loc[start:end, columns]
+
+
+def _read_store(file_path, filetype, converter):
+    store_path = "{}.{}{}".format(file_path, filetype, STORE_SUFFIX)
+    if (os.path.isfile(store_path) and
+            os.path.getmtime(store_path) >= os.path.getmtime(file_path)):
+        return pd.read_pickle(store_path)
+    data_frame = converter(file_path)
+    try:
+        data_frame.to_pickle(store_path)
+    except (IOError, OSError) as error:
+        LOG.warning('Could not write the store of {}: {}'.format(file_path, error))
+    return data_frame
+
+
+def _convert_currents_csv(file_path):
+    data_frame = _read_time_indexed_csv(file_path)
+    data_frame = data_frame.fillna(method='ffill')
+    data_frame = data_frame.fillna(method='bfill')
+    return data_frame
+
+
+def _convert_orbit_csv(file_path):
+    data_frame = _read_time_indexed_csv(file_path)
+    data_frame.columns = map(str.upper, data_frame.columns)
+    data_frame.index.name = data_frame.index.name.upper()
+    return data_frame
+
+
+def _convert_mcb_csv(file_path):
+    data_frame = pd.read_csv(file_path)
+    data_frame['time'] = _parse_times(data_frame['time'])
+    data_frame = data_frame.replace(to_replace='RUNNING', value=True)
+    data_frame = data_frame.replace(to_replace='ARMED', value=False)
+    data_frame = data_frame.replace(to_replace='IDLE', value=False)
+    data_frame = data_frame.set_index(['circuit', 'time'])
+    data_frame = data_frame.stack().unstack(0)
+    data_frame.index = data_frame.index.droplevel(level=1)
+    data_frame = data_frame.any(axis=1)
+    return data_frame.sort_index(kind='mergesort')
+
+
+def _convert_tune_coupling_csv(file_path):
+    return _read_time_indexed_csv(file_path)
+
+
+def _read_time_indexed_csv(file_path):
+    """ Reads the csv file with its first column as time index, sorted by time. """
+    data_frame = pd.read_csv(file_path, index_col=0)
+    data_frame.index = _parse_times(data_frame.index)
+    return data_frame.sort_index(kind='mergesort')
+
+
+def _parse_times(times):
+    """ Parses the times with TIME_FORMAT, falls back to inferring the format. """
+    try:
+        return pd.to_datetime(times, format=TIME_FORMAT)
+    except ValueError:
+        return pd.to_datetime(times, infer_datetime_format=True)
+
+
 if __name__ == "__main__":
     sys.exit(-1)
 
@@ -55,16 +55,17 @@ class IterateCleaning(object):
     IterateCleaning
     '''
     def __init__(self, filenames, output_cleaning_file, beam, source):
-        self.tune_df = load_csv(filenames[0], filetype='tune')
-        self.platteaus_df = load_csv(filenames[1], filetype='accepted_platteaus')
-        
-        self.data_summary = pd.DataFrame(index=np.arange(len(self.platteaus_df['B1_min'])), columns=['Qx_ave', 'Qx_std', 'Qy_ave', 'Qy_std', 'Coupl_ave', 'Coupl_std'])
-        self.output_cleaning_file = output_cleaning_file
         self.beam = beam
         if self.beam == 1:
             keys = KEYS_DICT_B1[source]
         elif self.beam == 2:
             keys = KEYS_DICT_B2[source]
+
+        self.tune_df = load_csv(filenames[0], filetype='tune', columns=keys)
+        self.platteaus_df = load_csv(filenames[1], filetype='accepted_platteaus')
+        
+        self.data_summary = pd.DataFrame(index=np.arange(len(self.platteaus_df['B1_min'])), columns=['Qx_ave', 'Qx_std', 'Qy_ave', 'Qy_std', 'Coupl_ave', 'Coupl_std'])
+        self.output_cleaning_file = output_cleaning_file
         
         self.data_keys = {  'top_left':     keys[0],
                             'middle_left':  keys[1], 
@@ -115,7 +116,7 @@ class IterateCleaning(object):
         
     def _get_data_frames(self):
         for key in ['top_left', 'middle_left', 'bottom_left']:
-            self.cropped_data[key] = self.tune_df[[self.data_keys[key]]].loc[self.start:self.end].dropna(how='all')
+            self.cropped_data[key] = self.tune_df.loc[self.start:self.end, [self.data_keys[key]]].dropna(how='all')
         
         self.cropped_data['top_left'] =  self.cropped_data['top_left'][(self.cropped_data['top_left'][self.data_keys['top_left']] < 0.278) & (self.cropped_data['top_left'][self.data_keys['top_left']] > 0.262)]
         self.cropped_data['middle_left'] =  self.cropped_data['middle_left'][(self.cropped_data['middle_left'][self.data_keys['middle_left']] < 0.303) & (self.cropped_data['middle_left'][self.data_keys['middle_left']] > 0.287)]
@@ -171,12 +171,15 @@ class IteratePlatteauPlots(object):
         self.axes['top_left'].set_title('Beam 1')
         self.axes['top_right'].set_title('Beam 2')
         
-        self.currents_df.loc[self.time_knob:self.time_max].plot(ax=self.axes['top_left'], marker='o', ms=3, legend=False)
-        self.currents_df.loc[self.time_knob:self.time_max].plot(ax=self.axes['top_right'], marker='o', ms=3, legend=False)
-        self.orbit_df[xing_keys_B1].loc[self.time_knob:self.time_max].plot(ax=self.axes['middle_left'])
-        self.orbit_df[xing_keys_B2].loc[self.time_knob:self.time_max].plot(ax=self.axes['middle_right'])
-        self.orbit_df[['HRMS_ARC_ORBIT_B1','VRMS_ARC_ORBIT_B1']].loc[self.time_knob:self.time_max].plot(ax=self.axes['bottom_left'])
-        self.orbit_df[['HRMS_ARC_ORBIT_B2','VRMS_ARC_ORBIT_B2']].loc[self.time_knob:self.time_max].plot(ax=self.axes['bottom_right'])
+        # slicing of the time-sorted indices, the columns are selected on the small windows
+        currents_df = self.currents_df.loc[self.time_knob:self.time_max]
+        orbit_df = self.orbit_df.loc[self.time_knob:self.time_max]
+        currents_df.plot(ax=self.axes['top_left'], marker='o', ms=3, legend=False)
+        currents_df.plot(ax=self.axes['top_right'], marker='o', ms=3, legend=False)
+        orbit_df[xing_keys_B1].plot(ax=self.axes['middle_left'])
+        orbit_df[xing_keys_B2].plot(ax=self.axes['middle_right'])
+        orbit_df[['HRMS_ARC_ORBIT_B1','VRMS_ARC_ORBIT_B1']].plot(ax=self.axes['bottom_left'])
+        orbit_df[['HRMS_ARC_ORBIT_B2','VRMS_ARC_ORBIT_B2']].plot(ax=self.axes['bottom_right'])
         self.fig.canvas.draw()
 
     def _normalize_data(self, df):
@@ -129,7 +129,12 @@ def calculate_beta_from_phase(getllm_d, tune_d, phase_d, header_dict):
             raise IOError("Error definition file '{}' could not be found"
                           .format(getllm_d.accelerator.get_errordefspath()))
 
-        elements = _assign_uncertainties(elements, error_defs_path)
+        if getattr(getllm_d, "model_cache", None) is None:
+            elements = _assign_uncertainties(elements, error_defs_path)
+        else:
+            elements = getllm_d.model_cache.get(
+                ("uncertainties", getllm_d.model_cache.token(elements), error_defs_path),
+                _assign_uncertainties, elements, error_defs_path)
         error_method = METH_A_NBPM
 
     # start the calculation per plane --------------------------------------------------------------
@@ -138,14 +143,16 @@ def calculate_beta_from_phase(getllm_d, tune_d, phase_d, header_dict):
     if phase_d["X"]["F"]:
         beta_df_x, compensated_beta_df_x = _beta_from_phase_for_plane(
             free_model, driven_model, free_bk_model, elements,
-            getllm_d.range_of_bpms, phase_d, error_method, tune_d, "X"
+            getllm_d.range_of_bpms, phase_d, error_method, tune_d, "X",
+            getattr(getllm_d, "model_cache", None)
         )
 
     # ------------- VERTICAL
     if phase_d["Y"]["F"]:
         beta_df_y, compensated_beta_df_y = _beta_from_phase_for_plane(
             free_model, driven_model, free_bk_model, elements,
-            getllm_d.range_of_bpms, phase_d, error_method, tune_d, "Y"
+            getllm_d.range_of_bpms, phase_d, error_method, tune_d, "Y",
+            getattr(getllm_d, "model_cache", None)
         )
 
     for df in [beta_df_x, compensated_beta_df_x, beta_df_y, compensated_beta_df_y]:
@@ -159,10 +166,13 @@ def calculate_beta_from_phase(getllm_d, tune_d, phase_d, header_dict):
 
 
 def _beta_from_phase_for_plane(free_model, driven_model, bk_model, elements, range_of_bpms,
-                               phases, error_method, tunes, plane):
+                               phases, error_method, tunes, plane, model_cache=None):
     """
     This function calculates and outputs the beta function measurement for the given plane.
+    If model_cache (ModelCache) is given, the model windows of the N-BPM method are cached.
     """
+    bk_model_key = (None if model_cache is None else model_cache.token(bk_model))
+    free_model_key = (None if model_cache is None else model_cache.token(free_model))
     plane_for_file = plane.lower()
     Q = tunes[plane]["Q"]
     Qf = tunes[plane]["QF"]
@@ -193,7 +203,7 @@ def _beta_from_phase_for_plane(free_model, driven_model, bk_model, elements, ran
         )
 
     beta_df = _beta_from_phase(bk_model, model, elements, phase_adv, plane, range_of_bpms,
-                               error_method, Qf, Qmdlf % 1.0)
+                               error_method, Qf, Qmdlf % 1.0, model_cache, bk_model_key)
 
     beta_df.headers["FILENAME"] = "getbeta{}.out".format(plane_for_file)
     if DEBUG:
@@ -210,7 +220,8 @@ def _beta_from_phase_for_plane(free_model, driven_model, bk_model, elements, ran
 
         compensated_beta_df = _beta_from_phase(
             comp_bk_model, comp_model, elements,
-            phase_adv_free, plane, range_of_bpms, error_method, Q, Qmdl % 1.0
+            phase_adv_free, plane, range_of_bpms, error_method, Q, Qmdl % 1.0,
+            model_cache, free_model_key
         )
         compensated_beta_df.headers["FILENAME"] = "getbeta{}_free.out".format(plane_for_file)
 
@@ -224,7 +235,7 @@ def _beta_from_phase_for_plane(free_model, driven_model, bk_model, elements, ran
 
 
 def _beta_from_phase(bk_model, model, madElements, phase, plane,
-                     range_of_bpms, errors_method, tune, mdltune):
+                     range_of_bpms, errors_method, tune, mdltune, model_cache=None, model_key=None):
     '''
     Calculate the beta function from phase advances.
 
@@ -237,6 +248,8 @@ def _beta_from_phase(bk_model, model, madElements, phase, plane,
         errors_method: 3BPM or N-BPM method
         tune: measured tune
         mdltune: model tune
+        model_cache: ModelCache for the model windows, or None
+        model_key: token of the full model bk_model was sliced from
     '''
     plane_bet = "BET" + plane
     plane_alf = "ALF" + plane
@@ -250,7 +263,7 @@ def _beta_from_phase(bk_model, model, madElements, phase, plane,
         beta_df = _scan_all_BPMs_withsystematicerrors(bk_model, madElements, phase, plane,
                                                       range_of_bpms,
                                                       tune, mdltune,
-                                                      beta_df)
+                                                      beta_df, model_cache, model_key)
     # ---- use the simulations
     else:
         beta_df = _scan_all_BPMs_3bpm(phase, plane, tune, mdltune, beta_df)
@@ -415,9 +428,13 @@ def _scan_all_BPMs_3bpm(phase, plane, tune, mdltune,
 # --------------------------------------------------------------------------------------------------
 
 def _scan_all_BPMs_withsystematicerrors(madTwiss, madElements,
-                                        phase, plane, range_of_bpms, tune, mdltune, beta_df):
+                                        phase, plane, range_of_bpms, tune, mdltune, beta_df,
+                                        model_cache=None, model_key=None):
     '''
     '''
+    if model_cache is not None:
+        model_key = (model_key, model_cache.token(madElements), plane, range_of_bpms, mdltune,
+                     len(madTwiss.index))
 
     LOGGER.debug("starting scan_all_BPMs_withsystematicerrors")
     # ---------- setup -----------------------------------------------------------------------------
@@ -447,7 +464,7 @@ def _scan_all_BPMs_withsystematicerrors(madTwiss, madElements,
                                                  plane, range_of_bpms,
                                                  i,
                                                  BBA_combo, ABB_combo, BAB_combo,
-                                                 tune, mdltune)
+                                                 tune, mdltune, model_cache, model_key)
         result[row[0]] = row[1:]
 
     beta_df["BET" + plane] = result["beti"]
@@ -482,18 +499,13 @@ def scan_several_BPMs_withsystematicerrors(madTwiss, madElements, cot_meas, phas
 def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
                                        phases_meas, phases_err,
                                        plane, range_of_bpms, Index, BBA_combo, ABB_combo, BAB_combo,
-                                       tune, mdltune):
+                                       tune, mdltune, model_cache=None, model_key=None):
     '''
     Scans the range of BPMs in order to get the final value for one BPM in the lattice
     '''
     probed_bpm_name = madTwiss.index[Index]
     s = madTwiss.at[probed_bpm_name, "S"]
 
-    betmdl1 = madTwiss.at[probed_bpm_name, "BET" + plane]
-    alfmdl1 = madTwiss.at[probed_bpm_name, "ALF" + plane]
-    mu_column = "MU" + plane
-    bet_column = "BET" + plane
-
     beti = DEFAULT_WRONG_BETA
     betstat = .0
     betsys = .0
@@ -506,13 +518,17 @@ def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
     m = int(range_of_bpms / 2)
     indx_first = Index - m
     indx_last = Index + m
-    name_first = madTwiss.index[indx_first]
-    name_last = madTwiss.index[indx_last % len(madTwiss.index)]
-    probed_bpm_name = madTwiss.index[Index]
     len_bpms_total = phases_meas.shape[0]
 
-    indx_el_first = madElements.index.get_loc(name_first)
-    indx_el_last = madElements.index.get_loc(name_last)
+    if model_cache is None:
+        window = _get_model_window(madTwiss, madElements, plane, range_of_bpms, Index, mdltune)
+    else:
+        window_names = tuple(madTwiss.index[np.arange(indx_first, indx_last + 1) % len_bpms_total])
+        window = model_cache.get(("beta_window", model_key, Index, window_names),
+                                 _get_model_window, madTwiss, madElements, plane, range_of_bpms,
+                                 Index, mdltune)
+    (outerMdlPh, sin_squared_elements, outerElmtsBet, outerElK2, indx_el_probed, cot_model,
+     model_diag, bpm_locs, n_elements, betmdl1, alfmdl1) = window
 
     if indx_first < 0:
         outerMeasPhaseAdv = pd.concat((
@@ -521,16 +537,6 @@ def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
         outerMeasErr = pd.concat((
             phases_err.iloc[Index, indx_first % len_bpms_total:],
             phases_err.iloc[Index, :indx_last+1]))
-        outerMdlPh = np.concatenate((
-            madTwiss.iloc[indx_first % len_bpms_total:][mu_column] - mdltune,
-            madTwiss.iloc[:indx_last+1][mu_column])) * TWOPI
-        outerElmts = pd.concat((
-            madElements.iloc[indx_el_first:],
-            madElements.iloc[:indx_el_last + 1]))
-        outerElmtsPh = np.concatenate((
-            madElements.iloc[indx_el_first:][mu_column] - mdltune,
-            madElements.iloc[:indx_el_last + 1][mu_column])) * TWOPI
-
     elif indx_last >= len_bpms_total:
         outerMeasPhaseAdv = pd.concat((
             phases_meas.iloc[Index, indx_first:],
@@ -538,43 +544,20 @@ def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
         outerMeasErr = pd.concat((
             phases_err.iloc[Index, indx_first:],
             phases_err.iloc[Index, :(indx_last + 1) % len_bpms_total]))
-        outerMdlPh = np.concatenate((
-            madTwiss.iloc[indx_first:][mu_column],
-            madTwiss.iloc[:(indx_last + 1) % len_bpms_total][mu_column] + mdltune)) * TWOPI
-        outerElmts = pd.concat((
-            madElements.iloc[indx_el_first:],
-            madElements.iloc[:indx_el_last + 1]))
-        outerElmtsPh = np.concatenate((
-            madElements.iloc[indx_el_first:][mu_column],
-            madElements.iloc[:indx_el_last + 1][mu_column] + mdltune)) * TWOPI
-
     else:
         outerMeasPhaseAdv = phases_meas.iloc[Index, indx_first: indx_last + 1]
         outerMeasErr = phases_err.iloc[Index, indx_first: indx_last + 1]
-        outerMdlPh = madTwiss.iloc[indx_first:indx_last + 1][mu_column].as_matrix() * TWOPI
-        outerElmts = madElements.iloc[indx_el_first:indx_el_last + 1]
-        outerElmtsPh = madElements.iloc[indx_el_first:indx_el_last + 1][mu_column] * TWOPI
 
     outerMeasErr = np.multiply(outerMeasErr, outerMeasErr)
 
-    outerElPhAdv = (outerElmtsPh[:, np.newaxis] - outerMdlPh[np.newaxis, :])
-    outerElK2 = outerElmts.loc[:, "K2L"].as_matrix()
-    indx_el_probed = outerElmts.index.get_loc(probed_bpm_name)
-    outerElmtsBet = outerElmts.loc[:][bet_column].as_matrix()
-
     with np.errstate(divide='ignore'):
         cot_meas = 1.0 / tan(outerMeasPhaseAdv.as_matrix())
-        cot_model = 1.0 / tan((outerMdlPh - outerMdlPh[m]))
-    outerElPhAdv = sin(outerElPhAdv)
-    sin_squared_elements = np.multiply(outerElPhAdv, outerElPhAdv)
 
     betas = np.empty(len(BBA_combo) + len(BAB_combo) + len(ABB_combo))
     alfas = np.empty(len(BBA_combo) + len(BAB_combo) + len(ABB_combo))
     beta_mask = np.empty(len(BBA_combo) + len(BAB_combo) + len(ABB_combo), dtype=bool)
 
-    diag = np.concatenate((outerMeasErr.as_matrix(), outerElmts.loc[:]["dK1"],
-                           outerElmts.loc[:]["dX"], outerElmts.loc[:]["KdS"],
-                           outerElmts.loc[:]["mKdS"]))
+    diag = np.concatenate((outerMeasErr.as_matrix(), model_diag))
     mask = diag != 0
 
     T_Beta = np.zeros((len(betas),
@@ -589,8 +572,8 @@ def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
         ix = combo[0] + m
         iy = combo[1] + m
         beta, alfa, betaline, alfaline = _calculate_beta_and_alfa_for_comb(
-            ix, iy, sin_squared_elements, outerElmts, outerElmtsBet, outerElK2, cot_model, cot_meas,
-            outerMeasPhaseAdv, combo, indx_el_probed, line_length, betmdl1, alfmdl1,
+            ix, iy, sin_squared_elements, bpm_locs, n_elements, outerElmtsBet, outerElK2,
+            cot_model, cot_meas, indx_el_probed, line_length, betmdl1, alfmdl1,
             range_of_bpms, m,
             1.0, -1.0, 1.0, -1.0)
         if beta > 0:
@@ -608,8 +591,8 @@ def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
         i = j + len(BBA_combo)
 
         beta, alfa, betaline, alfaline = _calculate_beta_and_alfa_for_comb(
-            ix, iy, sin_squared_elements, outerElmts, outerElmtsBet, outerElK2, cot_model, cot_meas,
-            outerMeasPhaseAdv, combo, indx_el_probed, line_length, betmdl1, alfmdl1,
+            ix, iy, sin_squared_elements, bpm_locs, n_elements, outerElmtsBet, outerElK2,
+            cot_model, cot_meas, indx_el_probed, line_length, betmdl1, alfmdl1,
             range_of_bpms, m,
             1.0, 1.0, 1.0, 1.0)
         if beta > 0:
@@ -628,8 +611,8 @@ def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
         i = j + len(BBA_combo) + len(BAB_combo)
 
         beta, alfa, betaline, alfaline = _calculate_beta_and_alfa_for_comb(
-            ix, iy, sin_squared_elements, outerElmts, outerElmtsBet, outerElK2, cot_model, cot_meas,
-            outerMeasPhaseAdv, combo, indx_el_probed, line_length, betmdl1, alfmdl1,
+            ix, iy, sin_squared_elements, bpm_locs, n_elements, outerElmtsBet, outerElK2,
+            cot_model, cot_meas, indx_el_probed, line_length, betmdl1, alfmdl1,
             range_of_bpms, m,
             -1.0, +1.0, -1.0, 1.0)
 
@@ -712,9 +695,78 @@ def _scan_one_BPM_withsystematicerrors(madTwiss, madElements,
     )
 
 
-def _calculate_beta_and_alfa_for_comb(ix, iy, sin_squared_elements, outerElmts, outerElmtsBet,
-                                      outerElK2, cot_model, cot_meas, outerMeasPhaseAdv,
-                                      combo, indx_el_probed, line_length, betmdl1, alfmdl1,
+def _get_model_window(madTwiss, madElements, plane, range_of_bpms, Index, mdltune):
+    '''
+    Model-only quantities of the range of BPMs around the probed BPM, independent of the
+    measurement.
+    '''
+    probed_bpm_name = madTwiss.index[Index]
+    betmdl1 = madTwiss.at[probed_bpm_name, "BET" + plane]
+    alfmdl1 = madTwiss.at[probed_bpm_name, "ALF" + plane]
+    mu_column = "MU" + plane
+    bet_column = "BET" + plane
+
+    m = int(range_of_bpms / 2)
+    indx_first = Index - m
+    indx_last = Index + m
+    name_first = madTwiss.index[indx_first]
+    name_last = madTwiss.index[indx_last % len(madTwiss.index)]
+    len_bpms_total = len(madTwiss.index)
+
+    indx_el_first = madElements.index.get_loc(name_first)
+    indx_el_last = madElements.index.get_loc(name_last)
+
+    if indx_first < 0:
+        outerMdlPh = np.concatenate((
+            madTwiss.iloc[indx_first % len_bpms_total:][mu_column] - mdltune,
+            madTwiss.iloc[:indx_last+1][mu_column])) * TWOPI
+        outerElmts = pd.concat((
+            madElements.iloc[indx_el_first:],
+            madElements.iloc[:indx_el_last + 1]))
+        outerElmtsPh = np.concatenate((
+            madElements.iloc[indx_el_first:][mu_column] - mdltune,
+            madElements.iloc[:indx_el_last + 1][mu_column])) * TWOPI
+        window_names = np.concatenate((madTwiss.index[indx_first % len_bpms_total:],
+                                       madTwiss.index[:indx_last + 1]))
+
+    elif indx_last >= len_bpms_total:
+        outerMdlPh = np.concatenate((
+            madTwiss.iloc[indx_first:][mu_column],
+            madTwiss.iloc[:(indx_last + 1) % len_bpms_total][mu_column] + mdltune)) * TWOPI
+        outerElmts = pd.concat((
+            madElements.iloc[indx_el_first:],
+            madElements.iloc[:indx_el_last + 1]))
+        outerElmtsPh = np.concatenate((
+            madElements.iloc[indx_el_first:][mu_column],
+            madElements.iloc[:indx_el_last + 1][mu_column] + mdltune)) * TWOPI
+        window_names = np.concatenate((madTwiss.index[indx_first:],
+                                       madTwiss.index[:(indx_last + 1) % len_bpms_total]))
+
+    else:
+        outerMdlPh = madTwiss.iloc[indx_first:indx_last + 1][mu_column].as_matrix() * TWOPI
+        outerElmts = madElements.iloc[indx_el_first:indx_el_last + 1]
+        outerElmtsPh = madElements.iloc[indx_el_first:indx_el_last + 1][mu_column] * TWOPI
+        window_names = madTwiss.index[indx_first:indx_last + 1]
+
+    outerElPhAdv = (outerElmtsPh[:, np.newaxis] - outerMdlPh[np.newaxis, :])
+    outerElK2 = outerElmts.loc[:, "K2L"].as_matrix()
+    indx_el_probed = outerElmts.index.get_loc(probed_bpm_name)
+    outerElmtsBet = outerElmts.loc[:][bet_column].as_matrix()
+    bpm_locs = [outerElmts.index.get_loc(name) for name in window_names]
+
+    with np.errstate(divide='ignore'):
+        cot_model = 1.0 / tan((outerMdlPh - outerMdlPh[m]))
+    outerElPhAdv = sin(outerElPhAdv)
+    sin_squared_elements = np.multiply(outerElPhAdv, outerElPhAdv)
+    model_diag = np.concatenate((outerElmts.loc[:]["dK1"], outerElmts.loc[:]["dX"],
+                                 outerElmts.loc[:]["KdS"], outerElmts.loc[:]["mKdS"]))
+    return (outerMdlPh, sin_squared_elements, outerElmtsBet, outerElK2, indx_el_probed, cot_model,
+            model_diag, bpm_locs, len(outerElmts), betmdl1, alfmdl1)
+
+
+def _calculate_beta_and_alfa_for_comb(ix, iy, sin_squared_elements, bpm_locs, n_elements,
+                                      outerElmtsBet, outerElK2, cot_model, cot_meas,
+                                      indx_el_probed, line_length, betmdl1, alfmdl1,
                                       range_of_bpms, m, fac1, fac2, sfac1, sfac2):
     """Calculates beta and alpha function as well as the respective covariance matrix lines for the
     given combination
@@ -738,8 +790,8 @@ def _calculate_beta_and_alfa_for_comb(ix, iy, sin_squared_elements, outerElmts,
                     (cot_meas[ix] + cot_meas[iy]))
 
     # slice
-    xloc = outerElmts.index.get_loc(outerMeasPhaseAdv.index[ix])
-    yloc = outerElmts.index.get_loc(outerMeasPhaseAdv.index[iy])
+    xloc = bpm_locs[ix]
+    yloc = bpm_locs[iy]
 
     # get betas and sin for the elements in the slice
     elementPh_XA = sin_squared_elements[xloc:indx_el_probed, ix]
@@ -772,7 +824,7 @@ def _calculate_beta_and_alfa_for_comb(ix, iy, sin_squared_elements, outerElmts,
     alfaline[yloc+range_of_bpms:indx_el_probed+range_of_bpms] += fac2 * (
         .5 * (bet_sin_iy * denomalf + bet_sin_iy / betmdl1 * (cot_meas[ix] - cot_meas[iy])))
 
-    y_offset = range_of_bpms + len(outerElmts)
+    y_offset = range_of_bpms + n_elements
 
     # apply sextupole transverse misalignment
     betaline[xloc + y_offset: indx_el_probed + y_offset] += fac1 * elementK2_XA * bet_sin_ix
@@ -781,7 +833,7 @@ def _calculate_beta_and_alfa_for_comb(ix, iy, sin_squared_elements, outerElmts,
     alfaline[xloc + y_offset: indx_el_probed + y_offset] += sfac1 * elementK2_XA * bet_sin_ix
     alfaline[yloc + y_offset: indx_el_probed + y_offset] += sfac2 * elementK2_YA * bet_sin_iy
 
-    y_offset += len(outerElmts)
+    y_offset += n_elements
 
     # apply quadrupole longitudinal misalignments
     betaline[xloc + y_offset: indx_el_probed + y_offset] += fac1 * bet_sin_ix
@@ -794,7 +846,7 @@ def _calculate_beta_and_alfa_for_comb(ix, iy, sin_squared_elements, outerElmts,
         .5 * elementK2_YA * (bet_sin_iy * denomalf + bet_sin_iy / betmdl1 * (cot_meas[ix] -
                                                                              cot_meas[iy])))
 
-    y_offset += len(outerElmts)
+    y_offset += n_elements
 
     betaline[xloc + y_offset: indx_el_probed + y_offset] -= fac1 * bet_sin_ix
     betaline[yloc + y_offset: indx_el_probed + y_offset] -= fac2 * bet_sin_iy
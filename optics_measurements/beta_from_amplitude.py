@@ -13,6 +13,7 @@ import pandas as pd
 from tfs_files import tfs_pandas
 from model.accelerators.accelerator import AccExcitationMode
 from compensate_excitation import get_lambda
+from model_cache import arc_bpm_mask
 
 
 def calculate_beta_from_amplitude(measure_input, input_files, tune_dict, phase_dict, beta_phase, header_dict):
@@ -44,7 +45,7 @@ def calculate_beta_from_amplitude(measure_input, input_files, tune_dict, phase_d
         ratio['Ratio'] = ratio.loc[:, 'BET' + plane + 'phase'].values / ratio.loc[:, 'BET' + plane + 'amp'].values
         mask = (np.array(0.1 < np.abs(ratio.loc[:, 'Ratio'].values)) &
                 np.array(np.abs(ratio.loc[:, 'Ratio'].values) < 10.0) &
-                np.array(measure_input.accelerator.get_element_types_mask(ratio.index, ["arc_bpm"])))
+                np.array(arc_bpm_mask(measure_input, ratio.index)))
         x_ratio = np.mean(ratio.loc[mask,'Ratio'].values)
         beta_amp['BET' + plane + 'RES'] = beta_amp.loc[:, 'BET' + plane] * x_ratio
         beta_amp['BET' + plane + 'STDRES'] = beta_amp.loc[:, 'BET' + plane + 'STD'] * x_ratio
@@ -105,7 +106,7 @@ def beta_from_amplitude(meas_input, input_files, model, plane, compensate=None):
         phases_meas[k_bpmac:, :] = phases_meas[k_bpmac:, :] - driven_tune
         for_sqrt2j = input_files.get_data(df_amp_beta, 'AMP' + plane) / np.sqrt(
             df_amp_beta.loc[:, 'BET' + plane + 'MDL'].values[:, np.newaxis])
-        sqrt2j = np.mean(for_sqrt2j[meas_input.accelerator.get_element_types_mask(df_amp_beta.index, ["arc_bpm"])], axis=0)
+        sqrt2j = np.mean(for_sqrt2j[arc_bpm_mask(meas_input, df_amp_beta.index)], axis=0)
         betall = (np.square(
             (input_files.get_data(df_amp_beta, 'AMP' + plane).T / sqrt2j[:, np.newaxis]).T) *
                   (1 + r ** 2 + 2 * r * np.cos(4 * np.pi * phases_meas)) / (1 - r ** 2))
@@ -12,6 +12,7 @@ import pandas as pd
 import numpy as np
 from utils import stats
 from tfs_files import tfs_pandas
+from model_cache import arc_bpm_mask
 
 SCALES = {'um': 1.0e-6, 'mm': 1.0e-3, 'cm': 1.0e-2, 'm': 1.0}
 PLANES = ("X", "Y")
@@ -41,7 +42,7 @@ def calculate_orbit_and_dispersion(meas_input, input_files, tune_dict, model, be
         if plane == 'X':
             ndx_header = _get_header(header_dict, tune_dict, 'getNDx.out', orbit=False)
             _calculate_normalised_dispersion(model, input_files, beta_from_phase["X"], ndx_header,
-                                             meas_input.orbit_unit, meas_input.max_closed_orbit, meas_input.outputdir, meas_input.accelerator)
+                                             meas_input.orbit_unit, meas_input.max_closed_orbit, meas_input.outputdir, meas_input)
 
 
 def _get_header(header_dict, tune_dict, filename, orbit=False):
@@ -98,7 +99,7 @@ def _calculate_dispersion(model, input_files, plane, header, unit, cut, output,
     return output_df
 
 
-def _calculate_normalised_dispersion(model, input_files, beta, header, unit, cut, output, accelerator):
+def _calculate_normalised_dispersion(model, input_files, beta, header, unit, cut, output, meas_input):
     #TODO there are no errors from orbit
     df_orbit = pd.DataFrame(model).loc[:, ['S', 'MUX', 'DPX', 'DX', 'X', 'BETX']]
     df_orbit['NDXMDL'] = df_orbit.loc[:, 'DX'] / np.sqrt(df_orbit.loc[:, 'BETX'])
@@ -116,7 +117,7 @@ def _calculate_normalised_dispersion(model, input_files, beta, header, unit, cut
     df_orbit['NDX_unscaled'] = fit[0][-2, :].T / stats.weighted_mean(input_files.get_data(df_orbit, 'AMPX'), axis=1) # TODO there is no error from AMPX
     df_orbit['STDNDX_unscaled'] = np.sqrt(fit[1][-2, -2, :].T) / stats.weighted_mean(input_files.get_data(df_orbit, 'AMPX'), axis=1)
     df_orbit = df_orbit.loc[np.abs(fit[0][-1, :].T) < cut * SCALES[unit], :]
-    mask = accelerator.get_element_types_mask(df_orbit.index, ["arc_bpm"])
+    mask = arc_bpm_mask(meas_input, df_orbit.index)
     global_factor = np.sum(df_orbit.loc[mask, 'NDXMDL'].values) / np.sum(df_orbit.loc[mask, 'NDX_unscaled'].values)
     df_orbit['NDX'] = global_factor * df_orbit.loc[:, 'NDX_unscaled']
     df_orbit['STDNDX'] = global_factor * df_orbit.loc[:, 'STDNDX_unscaled']
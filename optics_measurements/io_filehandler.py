@@ -2,6 +2,9 @@ import os
 
 from tfs_files.tfs_collection import TfsCollection, Tfs
 
+# OpticsMeasurement attribute of the beta files by their prefix
+BETA_ATTRIBUTES = {"getbeta": "beta", "getampbeta": "amp_beta", "getkmodbeta": "kmod_beta"}
+
 
 class OpticsMeasurement(TfsCollection):
     """Class to hold and load the measurements from GetLLM.
@@ -12,6 +12,7 @@ import pandas as pd
 import numpy as np
 from model.accelerators.accelerator import AccExcitationMode
 from tfs_files import tfs_pandas
+from optics_measurements.model_cache import arc_bpm_mask
 
 
 def calculate_kick(measure_input, input_files, model, mad_ac, beta_d, header_dict):
@@ -55,8 +56,7 @@ def calculate_kick(measure_input, input_files, model, mad_ac, beta_d, header_dic
 
 
 def _get_model_arc_betas(measure_input, model):
-    return model.loc[:, ['S', 'BETX', 'BETY']].loc[
-           measure_input.accelerator.get_element_types_mask(model.index, ["arc_bpm"]), :]
+    return model.loc[:, ['S', 'BETX', 'BETY']].loc[arc_bpm_mask(measure_input, model.index), :]
 
 
 def _get_header(header_dict, beta_d, ac=False):
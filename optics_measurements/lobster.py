@@ -3,7 +3,6 @@
 
 """
 import numpy as np
-from numpy import sin
 import pandas as pd
 
 from beta import tilt_slice_matrix
@@ -15,102 +14,85 @@ NEARPI = 4.0e-4
 NEARDIST = 6  # maximal separation of BPMs until next pi
 ROB = 7  # range of BPMs
 
+# index pairs into the four combination BPMs (i, j, k, l) = (0, 1, 2, 3) used for the
+# sine ratios and the measured phase advance differences of the regional observable
+SIN_NUM = ((2, 0), (1, 0), (3, 0), (1, 0))
+SIN_DEN1 = ((2, 1), (2, 1), (3, 1), (3, 1))
+SIN_DEN2 = ((1, 0), (2, 0), (1, 0), (3, 0))
+PHADV_TERMS = ((1, 0, 1.), (2, 0, -1.), (1, 0, -1.), (3, 0, 1.))
+
+
 def get_local_observable(phase_d, free_model, tune):
     """Calculates local observable for pi separated BPMs
+
+    The next downstream BPM separated by (nearly) pi is searched within a band of ``NEARDIST``
+    BPMs of the tilted phase advance matrices, the regional observable is evaluated for all
+    BPM combinations within ``ROB`` at once.
     """
 
     LOGGER.info("Computing local observable")
 
     modl_phases = phase_d.phase_advances_free_x["MODEL"]
     meas_phases = phase_d.phase_advances_free_x["MEAS"]
-    err_phases = phase_d.phase_advances_free_x["ERRMEAS"]
-
-    diff_pi = modl_phases.values - .5
-    near_pi = abs(diff_pi) < NEARPI
-
-    data = np.empty((len(modl_phases.columns)),
-                    dtype=[('NAME', 'S64'),
-                           ('S', float),
-                           ('NEXT', 'S64'),
-                           ('DELTAPHI_NEAR', float)])
-
-    collected = []
-    for i, column in enumerate(modl_phases.columns):
-        # search only downstream
-        mask = near_pi[i]
-        mask[:i] = False
-        mask[i + NEARDIST:] = False
-
-        modl_column = modl_phases[column][mask]
-        meas_column = meas_phases[column][mask]
-        erro_column = err_phases[column][mask]
-        nextname = "---"
-        delta_phi = 0
-        err = 0
-        s = free_model.loc[column, "S"]
-
-        if len(meas_column) > 0:
-            mdl_phi = modl_column[0]
-            delta_phi = meas_column[0] - mdl_phi
-         #   if delta_phi > 1.0:
-         #       delta_phi -= 2.0
-         #   if delta_phi < -1.0:
-         #       delta_phi += 2.0
-            nextname = meas_column.index[0]
-            err = erro_column[0]
-
-            collected.append(column)
-
-        data[i] = (column, s, nextname, delta_phi)
-
-    df = pd.DataFrame(data, index=modl_phases.columns)
-                      #columns=["NAME", "S", "NEXT", "DELTAPHI"])
-
-    LOGGER.info("collected local observables: {}".format(len(collected)))
+    n_bpms = len(modl_phases.columns)
+    width = min(NEARDIST, n_bpms)
+
+    # band[d, i] refers to the pair (BPM i, BPM i + d), the band does not wrap around the ring
+    in_band = (np.arange(n_bpms)[np.newaxis, :] + np.arange(width)[:, np.newaxis]) < n_bpms
+    near_pi = (abs(tilt_slice_matrix(modl_phases.values, 0, width) - .5) < NEARPI) & in_band
+    # the observable takes the phase advance from the partner back to the BPM
+    band_modl = tilt_slice_matrix(modl_phases.values.T, 0, width)
+    band_meas = tilt_slice_matrix(meas_phases.values.T, 0, width)
+
+    collected = near_pi.any(axis=0)
+    first = np.argmax(near_pi, axis=0)
+    columns = np.arange(n_bpms)
+    delta_phi = np.where(collected,
+                         band_meas[first, columns] - band_modl[first, columns], 0)
+    nextname = np.where(collected,
+                        modl_phases.columns.values[(columns + first) % n_bpms], "---")
+
+    df = pd.DataFrame(index=modl_phases.columns,
+                      data={"NAME": modl_phases.columns.values,
+                            "S": free_model.loc[modl_phases.columns, "S"].values,
+                            "NEXT": nextname,
+                            "DELTAPHI_NEAR": delta_phi},
+                      columns=["NAME", "S", "NEXT", "DELTAPHI_NEAR"])
+
+    LOGGER.info("collected local observables: {}".format(np.sum(collected)))
 
     # regional
     LOGGER.info("calculating regional observable")
     LOGGER.debug("range of BPMs: {}".format(ROB))
 
-    combos = [(x,y,z,w)
-              for x in range(1, ROB)
-              for y in range(x + 1, ROB)
-              for z in range(y + 1, ROB)
-              for w in range(z + 1, ROB)]
-
-    tilted_meas = (tilt_slice_matrix(meas_phases.values, 0, len(meas_phases), tune))
-    tilted_modl = (tilt_slice_matrix(modl_phases.values, 0, len(modl_phases), tune))
-
-    reg_obs = pd.DataFrame(index=modl_phases.index,
-                               columns=[get_comb_pattern(co) for co in combos])
-
-    for (ix, iy, iz, iw) in combos:
-
-        patt = get_comb_pattern((ix, iy, iz, iw))
-        sinii = sin([
-        tilted_modl[iz] - tilted_modl[ix],
-        tilted_modl[iy] - tilted_modl[ix],
-        tilted_modl[iw] - tilted_modl[ix],
-        tilted_modl[iy] - tilted_modl[ix]]) / sin([
-            tilted_modl[iz] - tilted_modl[iy],
-            tilted_modl[iz] - tilted_modl[iy],
-            tilted_modl[iw] - tilted_modl[iy],
-            tilted_modl[iw] - tilted_modl[iy]]) / sin([
-                tilted_modl[iy] - tilted_modl[ix],
-                tilted_modl[iz] - tilted_modl[ix],
-                tilted_modl[iy] - tilted_modl[ix],
-                tilted_modl[iw] - tilted_modl[ix]])
-
-        phadvbeat = np.array([
-                tilted_meas[iy] - tilted_meas[ix],
-                -tilted_meas[iz] + tilted_meas[ix],
-                -tilted_meas[iy] + tilted_meas[ix],
-                tilted_meas[iw] - tilted_meas[ix]])
-
-        regobsmatr = np.dot(np.transpose(sinii), phadvbeat)
-        LOGGER.info(regobsmatr.shape)
-        reg_obs.loc[:, patt] = np.sum(regobsmatr, axis=1)
+    combos = np.array([(x, y, z, w)
+                       for x in range(1, ROB)
+                       for y in range(x + 1, ROB)
+                       for z in range(y + 1, ROB)
+                       for w in range(z + 1, ROB)])
+
+    tilted_meas = tilt_slice_matrix(meas_phases.values, 0, len(meas_phases), tune)
+    tilted_modl = tilt_slice_matrix(modl_phases.values, 0, len(modl_phases), tune)
+
+    # (combination x BPM in combination x BPM) stacks of the tilted phase advances
+    comb_modl = tilted_modl[combos]
+    comb_meas = tilted_meas[combos]
+
+    def _diffs(stack, pairs):
+        return np.stack([stack[:, a] - stack[:, b] for a, b in pairs], axis=1)
+
+    sinii = (np.sin(_diffs(comb_modl, SIN_NUM)) /
+             np.sin(_diffs(comb_modl, SIN_DEN1)) /
+             np.sin(_diffs(comb_modl, SIN_DEN2)))
+    phadvbeat = np.stack([sign * (comb_meas[:, a] - comb_meas[:, b])
+                          for a, b, sign in PHADV_TERMS], axis=1)
+
+    # equivalent to summing the rows of sinii^T . phadvbeat for every combination
+    regobsmatr = np.einsum("cti,ct->ic", sinii, np.sum(phadvbeat, axis=2))
+    LOGGER.debug("regional observable shape: {}".format(regobsmatr.shape))
 
+    reg_obs = pd.DataFrame(regobsmatr, index=modl_phases.index,
+                           columns=[get_comb_pattern(co) for co in combos])
     reg_obs.loc[:, "S"] = free_model.loc[modl_phases.index, "S"]
 
     return df.loc[collected], reg_obs
@@ -0,0 +1,82 @@
+"""
+.. module: model_cache
+
+Created on 19/10/18
+
+Keeps the measurement-independent parts of the optics analysis (model phase advances, element
+uncertainties, per-BPM model windows of the N-BPM method, BPM masks) so they are computed only once
+when many measurements are analysed with the same accelerator model.
+"""
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ModelCache(object):
+    """
+    Memoizes model quantities for one accelerator model.
+
+    Objects used as part of a key (via ``token``) are kept alive by the cache, their ``id`` can
+    therefore not be reused by another object while the cache exists.
+    The cache is filled in the first ``measure_optics`` call and is inherited by forked workers.
+
+    Public methods:
+        get(key, function, *args)
+        token(obj)
+        arc_bpm_mask(accelerator, index)
+        clear()
+    """
+    def __init__(self):
+        self._store = {}
+        self._refs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, function, *args):
+        """
+        Returns the value stored under key, computes it as function(*args) if it is missing.
+        """
+        try:
+            value = self._store[key]
+        except KeyError:
+            self.misses += 1
+            value = function(*args)
+            self._store[key] = value
+            return value
+        self.hits += 1
+        return value
+
+    def token(self, obj):
+        """
+        Returns a hashable identifier of obj, valid as long as the cache exists.
+        """
+        self._refs[id(obj)] = obj
+        return id(obj)
+
+    def arc_bpm_mask(self, accelerator, index):
+        """
+        Returns boolean mask of arc BPMs in index, as accelerator.get_element_types_mask.
+        """
+        return self.get(("arc_bpm", self.token(accelerator), tuple(index)),
+                        accelerator.get_element_types_mask, index, ["arc_bpm"])
+
+    def clear(self):
+        LOGGER.debug("Clearing model cache: {} entries, {} hits, {} misses".format(
+            len(self._store), self.hits, self.misses))
+        self._store.clear()
+        self._refs.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._store)
+
+
+def arc_bpm_mask(meas_input, index):
+    """
+    Arc BPM mask of index, cached in meas_input.model_cache if there is one.
+    """
+    cache = getattr(meas_input, "model_cache", None)
+    if cache is None:
+        return meas_input.accelerator.get_element_types_mask(index, ["arc_bpm"])
+    return cache.arc_bpm_mask(meas_input.accelerator, index)
@@ -10,6 +10,7 @@ Parses options and creates input object for measure_optics.py
 import argparse
 import sys
 from model import manager
+from optics_measurements.model_cache import ModelCache
 
 
 def parse_args(args=None):
@@ -32,7 +33,9 @@ class OpticsInput(object):
         "union": False,
         "nonlinear": False,
         "three_bpm_method": False,
-        "only_coupling": False
+        "only_coupling": False,
+        "batch": False,
+        "processes": 1
     }
 
     def __init__(self):
@@ -48,7 +51,10 @@ class OpticsInput(object):
         self.nonlinear = OpticsInput.DEFAULTS["nonlinear"]
         self.three_bpm_method = OpticsInput.DEFAULTS["three_bpm_method"]
         self.only_coupling = OpticsInput.DEFAULTS["only_coupling"]
+        self.batch = OpticsInput.DEFAULTS["batch"]
+        self.processes = OpticsInput.DEFAULTS["processes"]
         self.accelerator = None
+        self.model_cache = ModelCache()
 
     @staticmethod
     def init_from_options(options):
@@ -65,6 +71,8 @@ class OpticsInput(object):
         self.nonlinear = options.nonlinear
         self.three_bpm_method = options.three_bpm_method
         self.only_coupling = options.only_coupling
+        self.batch = options.batch
+        self.processes = options.processes
         self.accelerator = options.accelerator
         return self
 
@@ -101,4 +109,10 @@ def _get_optics_parser():
                         help="Use 3 BPM method only")  # TODO --no_systematic_errors option instead?
     parser.add_argument("--only_coupling", dest="only_coupling", action="store_true",
                         help="Only coupling is calculated. ")
+    parser.add_argument("--batch", dest="batch", action="store_true",
+                        help="Files are measurement directories, analysed one by one with the "
+                             "model computed only once. Output goes to subdirectories.")
+    parser.add_argument("--processes", dest="processes", type=int,
+                        default=OpticsInput.DEFAULTS["processes"],
+                        help="Number of measurements analysed in parallel in batch mode")
     return parser
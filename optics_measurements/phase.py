@@ -64,8 +64,9 @@ def calculate_phases(measure_input, input_files, tunes, header_dict):
                                       measure_input.accelerator, measure_input.outputdir, '_free')
             headers = _get_headers(header_dict, tunes, plane, free=True, two=True)
             phase_d[plane]["F2"] = _get_free_phase(phase_d[plane]["D"], phase_d[plane]["F"])
-            output_dfs = [_create_output_df(phase_d[plane]["F2"], model_free, plane),
-                          _create_output_df(phase_d[plane]["F2"], model_free, plane, tot=True)]
+            model_f2 = model_free.loc[phase_d[plane]["F2"]["MEAS"].index, :]
+            output_dfs = [_create_output_df(phase_d[plane]["F2"], model_f2, plane),
+                          _create_output_df(phase_d[plane]["F2"], model_f2, plane, tot=True)]
             _write_output(headers, output_dfs, measure_input.outputdir, plane)
             _write_special_phase_file(plane, phase_d[plane]["F2"], tunes[plane]["QF"],
                                       measure_input.accelerator, measure_input.outputdir, '_free2')
@@ -110,9 +111,8 @@ def get_phases(meas_input, input_files, model, plane, compensate=None, no_errors
                            input_files.joined_frame(plane, ['MU' + plane, 'ERR_MU' + plane],
                                                     zero_dpp=True, how=how),
                            how='inner', left_index=True, right_index=True)
-    phases_mdl = phase_frame.loc[:, 'MU' + plane].values
     phase_advances = {"MODEL": _get_square_data_frame(
-            (phases_mdl[np.newaxis, :] - phases_mdl[:, np.newaxis]) % 1.0, phase_frame.index)}
+            _get_model_phase_advances(meas_input, model, phase_frame, plane), phase_frame.index)}
     phases_meas = input_files.get_data(phase_frame, 'MU' + plane) * meas_input.accelerator.get_beam_direction()
     phases_errors = input_files.get_data(phase_frame, 'ERR_MU' + plane)
 
@@ -153,6 +153,23 @@ def get_phases(meas_input, input_files, model, plane, compensate=None, no_errors
                             _create_output_df(phase_advances, phase_frame, plane, tot=True)]
 
 
+def _get_model_phase_advances(meas_input, model, phase_frame, plane):
+    """
+    Model phase advance matrix of the BPMs in phase_frame, cached per model and set of BPMs.
+    A copy is returned as the users of the matrix may modify it in place.
+    """
+    phases_mdl = phase_frame.loc[:, 'MU' + plane].values
+    cache = getattr(meas_input, "model_cache", None)
+    if cache is None:
+        return _phase_advance_matrix(phases_mdl)
+    key = ("phase_model", cache.token(model), plane, tuple(phase_frame.index))
+    return cache.get(key, _phase_advance_matrix, phases_mdl).copy()
+
+
+def _phase_advance_matrix(phases):
+    return (phases[np.newaxis, :] - phases[:, np.newaxis]) % 1.0
+
+
 def _write_output(headers, dfs, output, plane):
     for head, df in zip(headers, dfs):
         tfs_pandas.write_tfs(join(output, head['FILENAME']), df, head)
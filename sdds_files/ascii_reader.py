@@ -5,41 +5,33 @@ import pandas as pd
 
 
 _ACQ_DATE_PREFIX = "#Acquisition date: "
+_LINE_END = np.finfo(float).max  # follows the samples of every line in the bulk parsing
 
 
 def read_ascii_file(file_path):
-    bpm_names_x = []
-    bpm_names_y = []
-    matrix_x = []
-    matrix_y = []
+    """
+    Reads the BPM names and the (BPM x turns) samples matrices of both planes.
+
+    The samples of all lines are parsed at once by numpy.
+    """
     date = None
+    data_lines = []
     with open(file_path, "r") as file_data:
         for line in file_data:
-            line = line.strip()
             # Empty lines and comments:
-            if line == "":
-                continue
             if _ACQ_DATE_PREFIX in line:
-                date = _parse_date(line)
+                date = _parse_date(line.strip())
                 continue
-            if "#" in line:
+            if "#" in line or line.isspace():
                 continue
-            # Samples:
-            parts = line.split()
-            bpm_plane = parts.pop(0)
-            bpm_name = parts.pop(0)
-            parts.pop(0)
-            bpm_samples = _get_samples_array(parts)
-            if bpm_plane == "0":
-                bpm_names_x.append(bpm_name)
-                matrix_x.append(bpm_samples)
-            elif bpm_plane == "1":
-                bpm_names_y.append(bpm_name)
-                matrix_y.append(bpm_samples)
-            else:
-                raise ValueError("Wrong plane found in: " + file_path)
-    matrix_x = pd.DataFrame(index=bpm_names_x, data=np.array(matrix_x))
-    matrix_y = pd.DataFrame(index=bpm_names_y, data=np.array(matrix_y))
+            data_lines.append(line)
+    planes, bpm_names, samples = _parse_data_lines(data_lines)
+    if not np.all((planes == "0") | (planes == "1")):
+        raise ValueError("Wrong plane found in: " + file_path)
+    bpm_names_x = bpm_names[planes == "0"].tolist()
+    bpm_names_y = bpm_names[planes == "1"].tolist()
+    matrix_x = pd.DataFrame(index=bpm_names_x, data=samples[planes == "0"])
+    matrix_y = pd.DataFrame(index=bpm_names_y, data=samples[planes == "1"])
     return (bpm_names_x, matrix_x,
             bpm_names_y, matrix_y, date)
 
@@ -64,7 +56,27 @@ def _parse_date(line):
         return datetime.datetime.today()
 
 
-def _get_samples_array(samples_strings):
-    return np.array(
-        [float(sample) for sample in samples_strings]
-    )
+def _parse_data_lines(data_lines):
+    """ Returns planes, BPM names and samples matrix of the data lines.
+
+    The samples of all lines are parsed at once, every line followed by the _LINE_END marker.
+    As numpy stops silently at the first sample which is not a number, the markers show
+    invalid samples as well as lines of different length.
+    """
+    planes, bpm_names, samples = [], [], []
+    for line in data_lines:
+        bpm_plane, bpm_name, _, bpm_samples = line.split(None, 3)
+        planes.append(bpm_plane)
+        bpm_names.append(bpm_name)
+        samples.append(bpm_samples)
+    if not samples:
+        return np.array(planes), np.array(bpm_names), np.empty((0, 0))
+    line_end = " {!r} ".format(_LINE_END)
+    parsed = np.fromstring(line_end.join(samples) + line_end, sep=" ")
+    ends = np.flatnonzero(parsed == _LINE_END)
+    if len(ends) != len(samples):
+        raise ValueError("Invalid samples in the BPM lines.")
+    if np.any(np.diff(ends) != ends[0] + 1):
+        raise ValueError("Different number of samples in the BPM lines.")
+    samples_matrix = parsed.reshape(len(samples), ends[0] + 1)[:, :-1]
+    return np.array(planes), np.array(bpm_names), samples_matrix
@@ -25,7 +25,8 @@ HOR, VER = 0, 1
 
 # Number of decimal digits to print in the ASCII file
 PRINT_PRECISION = 6
-FORMAT_STRING = " {:." + str(PRINT_PRECISION) + "f}"
+FORMAT_STRING = " %." + str(PRINT_PRECISION) + "f"
+WRITE_CHUNK_LINES = 100
 
 
 # Public ###################
@@ -247,20 +248,23 @@ class _TbtAsciiWriter(object):
             output_file.write("#" + name + ": " + str(value) + "\n")
 
     def _write_tbt_data(self, tbt_file, output_file, model_data):
-        row_format = "{} {} {}  " + FORMAT_STRING * tbt_file.num_turns + "\n"
-        for bpm_index in range(len(model_data.NAME)):
-            bpm_name = model_data.NAME[bpm_index]
-            bpm_s = str(np.frombuffer(model_data.S[bpm_index])[0])
-            bpm_samples_x = tbt_file.get_x_samples(bpm_name)
-            bpm_samples_y = tbt_file.get_y_samples(bpm_name)
-            if bpm_samples_x is not None:
-                output_str_x = row_format.format(str(HOR), bpm_name, bpm_s,
-                                                 *bpm_samples_x)
-                output_file.write(output_str_x)
-            if bpm_samples_y is not None:
-                output_str_y = row_format.format(str(VER), bpm_name, bpm_s,
-                                                 *bpm_samples_y)
-                output_file.write(output_str_y)
+        samples_format = FORMAT_STRING * tbt_file.num_turns + "\n"
+        bpm_names = model_data.NAME.values
+        bpm_positions = [str(np.frombuffer(bpm_s)[0]) for bpm_s in model_data.S.values]
+        plane_rows = []
+        for plane, matrix in ((HOR, tbt_file.samples_matrix_x),
+                              (VER, tbt_file.samples_matrix_y)):
+            plane_rows.append((plane, matrix.index.get_indexer(bpm_names), matrix.values))
+        lines = []
+        for bpm_index, (bpm_name, bpm_s) in enumerate(zip(bpm_names, bpm_positions)):
+            for plane, rows, samples in plane_rows:
+                if rows[bpm_index] != -1:
+                    lines.append("{} {} {}  ".format(plane, bpm_name, bpm_s) +
+                                 samples_format % tuple(samples[rows[bpm_index]].tolist()))
+            if len(lines) >= WRITE_CHUNK_LINES:
+                output_file.write("".join(lines))
+                lines = []
+        output_file.write("".join(lines))
 
 
 def _append_beta_beat_to_path():
@@ -8,7 +8,7 @@ from os.path import abspath, join, dirname, pardir
 sys.path.append(abspath(join(dirname(__file__), pardir)))
 
 from model import manager, creator
-from utils import logging_tools
+from utils import logging_tools, tracing
 from optics_measurements.io_filehandler import OpticsMeasurement
 from tfs_files.tfs_collection import TfsCollection, Tfs
 from tfs_files import tfs_pandas
@@ -73,13 +73,18 @@ def segment_by_segment(accel_cls, options):
         raise SbsDefinitionError("No segments or elements provided in the input.")
     if _there_are_duplicated_names(segments, elements):
         raise SbsDefinitionError("Duplicated names in segments and elements.")
-    model = tfs_pandas.read_tfs(options.model).set_index("NAME", drop=False)
-    meas = OpticsMeasurement(options.measurement)
-    elem_segments = [Segment.init_from_element(name) for name in elements]
-    for segment in elem_segments + segments:
-        propagable = run_for_segment(accel_cls, segment, model, meas,
-                                     options.optics, options.output)
-        write_beatings(segment, propagable, options.output)
+    with tracing.tracing("segment_by_segment", options.output):
+        meas = OpticsMeasurement(options.measurement)
+        # read in the background while the model is read
+        meas.prefetch("beta", "phasetot", "coupling")
+        model = tfs_pandas.read_tfs(options.model).set_index("NAME", drop=False)
+        elem_segments = [Segment.init_from_element(name) for name in elements]
+        for segment in elem_segments + segments:
+            with tracing.stage(segment.name):
+                propagable = run_for_segment(accel_cls, segment, model, meas,
+                                             options.optics, options.output)
+                with tracing.stage("write_beatings"):
+                    write_beatings(segment, propagable, options.output)
 
 
 def run_for_segment(accel_cls, segment, model, meas, optics, output):
@@ -87,10 +92,11 @@ def run_for_segment(accel_cls, segment, model, meas, optics, output):
     TODO
     """
     bpm_eval_funct = _bpm_is_in_beta_meas
-    new_segment = improve_segment(segment, model, meas, bpm_eval_funct)
-    propagables = [propg(new_segment, meas)
-                   for propg in sbs_propagables.get_all_propagables()]
-    propagables = [measbl for measbl in propagables if measbl]
+    with tracing.stage("improve_segment"):
+        new_segment = improve_segment(segment, model, meas, bpm_eval_funct)
+        propagables = [propg(new_segment, meas)
+                       for propg in sbs_propagables.get_all_propagables()]
+        propagables = [measbl for measbl in propagables if measbl]
     segment_inst = accel_cls.get_segment(
         new_segment.name, new_segment.start, new_segment.end,
         optics,
@@ -98,8 +104,10 @@ def run_for_segment(accel_cls, segment, model, meas, optics, output):
     LOGGER.info("Evaluating segment {} ({}, {}). Was input as {} ({}, {})."
                 .format(new_segment.name, new_segment.start, new_segment.end,
                         segment.name, segment.start, segment.end))
-    _prepare_for_madx(new_segment, propagables, optics, output)
-    _run_madx(new_segment, segment_inst, output)
+    with tracing.stage("prepare_madx", propagables=len(propagables)):
+        _prepare_for_madx(new_segment, propagables, optics, output)
+    with tracing.stage("madx"):
+        _run_madx(new_segment, segment_inst, output)
     seg_models = SegmentModels(output, new_segment)
     for propagable in propagables:
         propagable.segment_models = seg_models
@@ -0,0 +1,304 @@
+"""
+ :module: benchmark_optics
+
+Throughput benchmark of the optics pipeline (hole_in_one.py and measure_optics.py) on synthetic
+turn-by-turn data, runs offline without measurement data or MAD-X.
+
+Every stage (read, clean, harpy per mode, write, tune, phase, beta, coupling, ...) is timed
+separately and a JSON report with wall time, CPU time and peak memory per stage is written.
+
+Usage::
+
+    python tests/benchmark/benchmark_optics.py --model_dir=<model dir> --bpms=500 --turns=6600
+        --bunches=1 --files=1 --harpy_modes=svd,bpm --report=benchmark.json
+
+The model directory has to contain at least twiss.dat, twiss_ac.dat gives the AC-dipole
+compensation stages. Without twiss_elements.dat, a copy of the model directory with a
+synthetic one is created. If any stage fails, the benchmark exits with an error and no report
+is written.
+
+"""
+from __future__ import print_function
+import sys
+import os
+import time
+import json
+import copy
+import argparse
+import platform
+import tempfile
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
+from os.path import abspath, join, dirname, pardir
+import numpy as np
+import pandas as pd
+new_path = abspath(join(dirname(abspath(__file__)), pardir, pardir))
+if new_path not in sys.path:
+    sys.path.append(new_path)
+
+from tests.benchmark import synthetic_data
+import hole_in_one
+import measure_optics
+from harmonic_analysis.io_handlers import input_handler, output_handler
+from model import manager
+from model.accelerators.accelerator import AccExcitationMode
+from optics_measurements import (optics_input, tune, phase, beta, beta_from_amplitude, coupling,
+                                 dispersion, kick, resonant_driving_terms)
+from sdds_files import turn_by_turn_reader
+from utils import logging_tools, tracing
+
+LOGGER = logging_tools.get_logger(__name__)
+
+DEFAULT_MODEL_DIR = join(new_path, "tests", "inputs", "models", "25cm_beam1")
+ACCELERATOR = {"accel": "lhc", "lhc_mode": "lhc_runII_2018", "beam": 1}
+# exciter and important phase advance elements, to the BPMs they follow
+SPECIAL_ELEMENTS = OrderedDict([("MKQA.6L4.B1", "BPM.7L4.B1"),
+                                ("MKD.O5L6.B1", "BPMYA.5L6.B1"),
+                                ("TCTPH.4L1.B1", "BPMWB.4L1.B1"),
+                                ("TCTPH.4L5.B1", "BPMWB.4L5.B1")])
+EXCITER_BPMS = ("BPMYB.6L4.B1", "BPM.7L4.B1")
+HARPY_MODES = ("bpm", "svd", "fast", "window")
+REPORT_VERSION = 2
+
+
+class BenchmarkError(Exception):
+    """ Raised if stages of the benchmark failed or were skipped. """
+    pass
+
+
+@contextmanager
+def _stage(name, failures, **counts):
+    """ Traced stage, a failure is logged and added to failures, the benchmark continues. """
+    this_stage = tracing.stage(name, **counts)
+    try:
+        with this_stage:
+            yield this_stage
+    except Exception as e:
+        LOGGER.error("Stage {} failed: {}".format(name, e))
+        failures.append(name)
+
+
+def run_benchmark(model_dir=DEFAULT_MODEL_DIR, n_bpms=None, n_turns=6600, n_bunches=1,
+                  n_files=1, noise=0.1, harpy_modes=("svd",), nonlinear=False, seed=0,
+                  workdir=None):
+    """
+    Synthesizes the turn-by-turn data and runs all stages of the pipeline.
+
+    Returns:
+        OrderedDict of the report, stages in the order they were run
+
+    Raises:
+        BenchmarkError: if stages failed or were skipped
+    """
+    keep_workdir = workdir is not None
+    workdir = tempfile.mkdtemp(prefix="benchmark_optics_") if workdir is None else workdir
+    failures = []
+    try:
+        with tracing.tracing("benchmark_optics") as trace:
+            with _stage("synthesize", failures, files=n_files, bunches=n_bunches,
+                        turns=n_turns) as stage:
+                sdds_paths, bpm_model = synthetic_data.create_tbt_files(
+                    join(model_dir, "twiss.dat"), workdir, n_bpms=n_bpms, n_turns=n_turns,
+                    n_bunches=n_bunches, n_files=n_files, noise=noise, seed=seed,
+                    keep_bpms=EXCITER_BPMS)
+                run_model_dir = synthetic_data.create_model_dir(
+                    model_dir, join(workdir, "model"), SPECIAL_ELEMENTS)
+            if not stage.failed:
+                lins = []
+                for sdds_path in sdds_paths:
+                    lins.extend(_run_turn_by_turn_stages(sdds_path, bpm_model, workdir,
+                                                         harpy_modes, failures))
+                _run_optics_stages(lins, run_model_dir, join(workdir, "optics"), nonlinear,
+                                   failures)
+    finally:
+        if not keep_workdir:
+            shutil.rmtree(workdir)
+    if failures:
+        raise BenchmarkError("Failed or skipped stages: {}, no report is written.".format(
+            ", ".join(failures)))
+    stages = [record for record in trace.get_records() if record["DEPTH"] > 0]
+    for record in stages:
+        LOGGER.info("{:<40s}: {WALL_S:8.3f} s wall, {CPU_S:8.3f} s CPU, "
+                    "{PEAK_RSS_MB:8.1f} MB peak".format("  " * (record["DEPTH"] - 1) +
+                                                        record["STAGE"], **record))
+    return OrderedDict([
+        ("VERSION", REPORT_VERSION),
+        ("DATE", time.strftime("%Y-%m-%d %H:%M:%S")),
+        ("CONFIG", OrderedDict([("MODEL_DIR", abspath(model_dir)), ("BPMS", n_bpms),
+                                ("TURNS", n_turns), ("BUNCHES", n_bunches),
+                                ("FILES", n_files), ("NOISE", noise),
+                                ("HARPY_MODES", list(harpy_modes)),
+                                ("NONLINEAR", nonlinear), ("SEED", seed)])),
+        ("ENVIRONMENT", _get_environment()),
+        ("TOTAL_WALL_S", sum(record["WALL_S"] for record in stages
+                             if record["DEPTH"] == 1 and record["STAGE"] != "synthesize")),
+        ("STAGES", stages),
+    ])
+
+
+def write_report(report, path):
+    with open(path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    LOGGER.info("Benchmark report written to: {}".format(path))
+
+
+def _run_turn_by_turn_stages(sdds_path, bpm_model, workdir, harpy_modes, failures):
+    main_input = input_handler.MainInput()
+    main_input.file = sdds_path
+    main_input.model = bpm_model
+    main_input.outputdir = workdir
+    clean_input = input_handler.CleanInput()
+    tunes = synthetic_data.get_tunes(bpm_model)
+
+    with _stage("read", failures, file=os.path.basename(sdds_path)) as stage:
+        tbt_files = turn_by_turn_reader.read_tbt_file(sdds_path)
+    if stage.failed:
+        return []
+    lins = []
+    for this_main_input, tbt_file in output_handler.handle_multibunch(main_input, tbt_files):
+        this_main_input.outputdir = workdir
+        tbt_file = hole_in_one._cut_tbt_file(tbt_file, this_main_input.startturn,
+                                             this_main_input.endturn)
+        counts = dict(bpms=tbt_file.samples_matrix_x.shape[0], turns=tbt_file.num_turns)
+        model_tfs = hole_in_one.tfs.read_tfs(bpm_model).loc[:, ('NAME', 'S', 'DX')]
+        bpm_datas = {"x": tbt_file.samples_matrix_x, "y": tbt_file.samples_matrix_y}
+        with _stage("clean", failures, **counts) as clean_stage:
+            usvs, all_bad_bpms, bpm_ress, dpp = hole_in_one._do_clean(
+                this_main_input, clean_input, bpm_datas, tbt_file.date, model_tfs)
+        if clean_stage.failed:
+            continue
+        harpy_results = None
+        for mode in harpy_modes:
+            harpy_input = _get_harpy_input(tunes, mode)
+            with _stage("harpy_" + mode, failures, **counts) as harpy_stage:
+                results = hole_in_one._analyse_harpy(
+                    harpy_input, dict(bpm_datas), dict(usvs), model_tfs, bpm_ress, dpp,
+                    copy.deepcopy(all_bad_bpms))
+            if not harpy_stage.failed:
+                harpy_results = results  # the last successful mode is written
+        if harpy_results is None:
+            continue
+        bad_bpms, lin, spectra = harpy_results
+        with _stage("write", failures, **counts):
+            hole_in_one._write_harpy_output(this_main_input, lin, spectra)
+            for plane in ("x", "y"):
+                output_handler.write_bad_bpms(this_main_input.file, bad_bpms[plane],
+                                              this_main_input.outputdir, plane)
+        lins.append(lin)
+    return lins
+
+
+def _run_optics_stages(lins, model_dir, outputdir, nonlinear, failures):
+    if not lins:
+        LOGGER.error("No harmonic analysis results, optics stages are skipped.")
+        failures.append("optics")
+        return
+    measure_input = optics_input.OpticsInput()
+    measure_input.outputdir = outputdir
+    measure_input.nonlinear = nonlinear
+    with _stage("load_model", failures) as stage:
+        measure_input.accelerator = manager.get_accel_instance(
+            dict(ACCELERATOR, model_dir=model_dir))
+    if stage.failed:
+        return
+    os.makedirs(outputdir)
+    counts = dict(files=len(lins), bpms=len(lins[0]["x"].index))
+    input_files = measure_optics.InputFiles(lins)
+    header = measure_optics._get_header(measure_input)
+    accelerator = measure_input.accelerator
+
+    with _stage("tune", failures, **counts) as stage:
+        tune_dict = tune.calculate_tunes(measure_input, input_files)
+    if stage.failed:
+        return
+    with _stage("phase", failures, **counts) as stage:
+        phase_dict = phase.calculate_phases(measure_input, input_files, tune_dict, header)
+    if stage.failed:
+        return
+    with _stage("coupling", failures, **counts):
+        coupling.calculate_coupling(measure_input, input_files, phase_dict, tune_dict, header)
+    with _stage("beta_from_phase", failures, **counts) as stage:
+        betas = beta.calculate_beta_from_phase(measure_input, tune_dict, phase_dict, header)
+    if stage.failed:
+        return
+    beta_df_dict = ({"X": betas[0], "Y": betas[2]} if betas[1] is None else
+                    {"X": betas[1], "Y": betas[3]})
+    with _stage("beta_from_amplitude", failures, **counts) as amplitude_stage:
+        ratio = beta_from_amplitude.calculate_beta_from_amplitude(
+            measure_input, input_files, tune_dict, phase_dict, beta_df_dict, header)
+    mad_twiss = accelerator.get_model_tfs()
+    mad_ac = (mad_twiss if accelerator.excitation == AccExcitationMode.FREE
+              else accelerator.get_driven_tfs())
+    with _stage("dispersion", failures, **counts):
+        dispersion.calculate_orbit_and_dispersion(measure_input, input_files, tune_dict,
+                                                  mad_twiss, beta_df_dict, header)
+    if amplitude_stage.failed:
+        return
+    with _stage("kick", failures, **counts) as stage:
+        inv_x, inv_y = kick.calculate_kick(measure_input, input_files, mad_twiss, mad_ac, ratio,
+                                           header)
+    if nonlinear and not stage.failed:
+        with _stage("rdt", failures, **counts):
+            resonant_driving_terms.calculate_RDTs(measure_input, input_files, mad_twiss,
+                                                  phase_dict, header, inv_x, inv_y)
+
+
+def _get_harpy_input(tunes, mode):
+    harpy_input = input_handler.HarpyInput()
+    harpy_input.tunex, harpy_input.nattunex = tunes["X"]
+    harpy_input.tuney, harpy_input.nattuney = tunes["Y"]
+    harpy_input.tolerance = 0.005
+    harpy_input.harpy_mode = mode
+    return harpy_input
+
+
+def _get_environment():
+    return OrderedDict([("PYTHON", platform.python_version()),
+                        ("NUMPY", np.__version__),
+                        ("PANDAS", pd.__version__),
+                        ("PLATFORM", platform.platform()),
+                        ("CPUS", hole_in_one.harpy.PROCESSES)])
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", dest="model_dir", default=DEFAULT_MODEL_DIR,
+                        help="Model directory with (at least) twiss.dat.")
+    parser.add_argument("--bpms", dest="n_bpms", type=int, default=None,
+                        help="Number of BPMs, default are all BPMs of the model.")
+    parser.add_argument("--turns", dest="n_turns", type=int, default=6600)
+    parser.add_argument("--bunches", dest="n_bunches", type=int, default=1)
+    parser.add_argument("--files", dest="n_files", type=int, default=1)
+    parser.add_argument("--noise", dest="noise", type=float, default=0.1,
+                        help="BPM noise in mm.")
+    parser.add_argument("--harpy_modes", dest="harpy_modes", default="svd",
+                        help="Comma separated harpy modes out of {}.".format(HARPY_MODES))
+    parser.add_argument("--nonlinear", dest="nonlinear", action="store_true",
+                        help="If present, the RDT stage is run, as in measure_optics.py.")
+    parser.add_argument("--seed", dest="seed", type=int, default=0)
+    parser.add_argument("--workdir", dest="workdir", default=None,
+                        help="Keep all intermediate files in this directory.")
+    parser.add_argument("--report", dest="report", default="benchmark_optics.json",
+                        help="Path of the JSON report.")
+    options = parser.parse_args()
+    options.harpy_modes = [mode.strip() for mode in options.harpy_modes.split(",")]
+    unknown_modes = [mode for mode in options.harpy_modes if mode not in HARPY_MODES]
+    if unknown_modes:
+        parser.error("Unknown harpy modes: {}".format(unknown_modes))
+    return options
+
+
+if __name__ == "__main__":
+    _options = _parse_args()
+    try:
+        _report = run_benchmark(model_dir=_options.model_dir, n_bpms=_options.n_bpms,
+                                n_turns=_options.n_turns, n_bunches=_options.n_bunches,
+                                n_files=_options.n_files, noise=_options.noise,
+                                harpy_modes=_options.harpy_modes,
+                                nonlinear=_options.nonlinear, seed=_options.seed,
+                                workdir=_options.workdir)
+    except BenchmarkError as e:
+        LOGGER.error(str(e))
+        sys.exit(1)
+    write_report(_report, _options.report)
@@ -0,0 +1,130 @@
+"""
+ :module: synthetic_data
+
+Creates synthetic turn-by-turn SDDS files of configurable size from a model twiss,
+using the signal generator of tests/test_utils/twiss_to_tbt, and completes model directories
+without elements twiss for offline runs.
+
+"""
+from __future__ import print_function
+import sys
+import os
+import shutil
+from os.path import abspath, join, dirname, pardir
+import numpy as np
+import pandas as pd
+new_path = abspath(join(dirname(abspath(__file__)), pardir, pardir))
+if new_path not in sys.path:
+    sys.path.append(new_path)
+
+from tests.test_utils import twiss_to_tbt
+from tfs_files import tfs_pandas
+from sdds_files import turn_by_turn_writer
+from utils import logging_tools
+
+LOGGER = logging_tools.get_logger(__name__)
+
+MODEL_FILE = "model_bpms.tfs"
+ELEMENTS_FILE = "twiss_elements.dat"
+SDDS_FILE = "synthetic{:d}.sdds"
+DELTA_Q = -0.01  # driven minus natural tune of the generated AC-dipole signal
+
+
+def create_tbt_files(model_path, outputdir, n_bpms=None, n_turns=6600, n_bunches=1,
+                     n_files=1, noise=0.1, seed=None, keep_bpms=()):
+    """
+    Writes n_files SDDS files with n_bunches bunches of n_turns turns each, measured by
+    n_bpms BPMs evenly taken from the model.
+
+    Args:
+        model_path: twiss file containing (at least) the BPMs
+        outputdir: directory for the SDDS files and the reduced model
+        n_bpms: number of BPMs, default (None) uses all BPMs of the model
+        n_turns: number of turns
+        n_bunches: number of bunches per file
+        n_files: number of files
+        noise: BPM noise in mm
+        seed: seed of the random generator for reproducible data
+        keep_bpms: BPMs always kept in addition to the n_bpms, e.g. the ones at the exciter
+
+    Returns:
+        list of paths to the SDDS files and path to the reduced model
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    model_path = _write_reduced_model(model_path, outputdir, n_bpms, keep_bpms)
+    names = tfs_pandas.read_tfs(model_path).loc[:, "NAME"].values
+    paths = []
+    for file_number in range(n_files):
+        matrix = np.empty((2, len(names), n_bunches, n_turns))
+        for bunch in range(n_bunches):
+            for index, plane in enumerate(("X", "Y")):
+                matrix[index, :, bunch, :] = twiss_to_tbt.generate(
+                    model_path, nturns=n_turns, plane=plane, deltaQ=DELTA_Q, bpm_noise=noise)
+        paths.append(join(outputdir, SDDS_FILE.format(file_number)))
+        turn_by_turn_writer.write_tbt_file(names, matrix, paths[-1])
+    return paths, model_path
+
+
+def get_tunes(model_path):
+    """ Returns fractional (driven, natural) tunes of the generated signal per plane. """
+    headers = tfs_pandas.read_tfs(model_path).headers
+    tunes = {}
+    for plane, header in (("X", "Q1"), ("Y", "Q2")):
+        nattune = np.remainder(headers[header], 1)
+        tunes[plane] = (nattune + DELTA_Q, nattune)
+    return tunes
+
+
+def create_model_dir(model_dir, outputdir, elements):
+    """
+    Returns a model directory with elements twiss. If model_dir has none, it is copied to
+    outputdir and a twiss_elements.dat is created from the BPMs of its twiss.dat and the given
+    elements, each placed halfway to the next BPM with interpolated optics.
+
+    Args:
+        model_dir: model directory containing (at least) twiss.dat
+        outputdir: directory for the completed copy, must not exist
+        elements: dictionary of the non-BPM elements needed by the analysis to the BPMs
+            they follow
+
+    Returns:
+        path to the model directory
+    """
+    if os.path.isfile(join(model_dir, ELEMENTS_FILE)):
+        return model_dir
+    shutil.copytree(model_dir, outputdir)
+    _write_elements(join(outputdir, "twiss.dat"), join(outputdir, ELEMENTS_FILE), elements)
+    return outputdir
+
+
+def _write_elements(model_path, elements_path, elements):
+    model = tfs_pandas.read_tfs(model_path)
+    numeric = model.select_dtypes(include=[np.number]).columns
+    names = list(elements)
+    positions = np.array([model.NAME.tolist().index(elements[name]) for name in names])
+    rows = (model.iloc[positions].loc[:, numeric].values +
+            model.iloc[(positions + 1) % len(model.index)].loc[:, numeric].values) / 2.
+    inserted = pd.DataFrame(rows, columns=numeric)
+    inserted["NAME"] = names
+    if "KEYWORD" in model.columns:
+        inserted["KEYWORD"] = "MARKER"
+    elements_model = pd.concat([model, inserted], ignore_index=True).loc[:, model.columns]
+    elements_model = elements_model.sort_values("S", kind="mergesort").reset_index(drop=True)
+    tfs_pandas.write_tfs(elements_path, elements_model, model.headers)
+
+
+def _write_reduced_model(model_path, outputdir, n_bpms, keep_bpms):
+    model = tfs_pandas.read_tfs(model_path)
+    model = model.loc[model.NAME.str.startswith("BPM")]
+    if n_bpms is not None:
+        if n_bpms > len(model.index):
+            LOGGER.warning("Model contains only {} BPMs, using all of them.".format(
+                len(model.index)))
+        else:
+            selected = np.zeros(len(model.index), dtype=bool)
+            selected[np.linspace(0, len(model.index) - 1, n_bpms).astype(int)] = True
+            model = model.loc[selected | model.NAME.isin(keep_bpms).values]
+    reduced_path = join(outputdir, MODEL_FILE)
+    tfs_pandas.write_tfs(reduced_path, model, model.headers)
+    return reduced_path
@@ -0,0 +1,56 @@
+import sys
+import os
+import pytest
+import numpy as np
+from datetime import datetime
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from sdds_files import turn_by_turn_reader
+from tfs_files import tfs_pandas
+
+
+CURRENT_DIR = os.path.dirname(__file__)
+MODEL = join(CURRENT_DIR, pardir, "inputs", "models", "25cm_beam1", "twiss.dat")
+
+
+def test_ascii_write_read(_test_file):
+    bpm_names = tfs_pandas.read_tfs(MODEL).NAME.tolist()[:50]
+    samples_x = np.random.RandomState(0).normal(0, 1, (50, 100))
+    samples_x[0, :3] = [np.nan, -1e-9, 1e10]
+    samples_y = samples_x[::-1, ::-1]
+    date = datetime(2018, 1, 1, 10)
+    turn_by_turn_reader.write_ascii_file(MODEL, _test_file, bpm_names, samples_x,
+                                         bpm_names[5:], samples_y[5:], date, {"dpp": 0.1})
+    with open(_test_file) as ascii_file:
+        lines = ascii_file.readlines()
+    assert lines[-1].startswith("1 {} ".format(bpm_names[-1]))
+    assert lines[-1].endswith(" {:.6f}\n".format(samples_y[-1, -1]))
+
+    tbt_file = turn_by_turn_reader.read_tbt_file(_test_file)[0]
+    assert tbt_file.date == date
+    assert tbt_file.num_turns == 100
+    assert tbt_file.samples_matrix_x.index.tolist() == bpm_names
+    assert tbt_file.samples_matrix_y.index.tolist() == bpm_names[5:]
+    for matrix, samples in ((tbt_file.samples_matrix_x, samples_x),
+                            (tbt_file.samples_matrix_y, samples_y[5:])):
+        assert np.allclose(matrix.values, samples, atol=5e-7, equal_nan=True)
+
+
+def test_ascii_invalid_samples(_test_file):
+    with open(_test_file, "w") as ascii_file:
+        ascii_file.write("#SDDSASCIIFORMAT v1\n"
+                         "0 BPM1 0 1.0 2.0 abc\n"
+                         "1 BPM1 0 1.0 2.0 abc\n")
+    with pytest.raises(ValueError):
+        turn_by_turn_reader.read_tbt_file(_test_file)
+
+
+@pytest.fixture()
+def _test_file():
+    test_file = os.path.join(CURRENT_DIR, "test_file.sdds")
+    try:
+        yield test_file
+    finally:
+        if os.path.isfile(test_file):
+            os.remove(test_file)
@@ -0,0 +1,43 @@
+import sys
+import numpy as np
+import pandas as pd
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+from harmonic_analysis import chroma
+
+TUNE = 0.28
+SYNCHROTRON_TUNE = 0.0021
+DPP = 4e-4
+CHROMATICITY = 8.
+
+
+def test_chroma_from_synchrotron_oscillation():
+    lin_frame, bpm_samples = _get_synchrotron_oscillation(n_bpms=20, turns=6000)
+    pos = chroma._get_positive_dpoverp_intervals(SYNCHROTRON_TUNE, 0., 6000)
+    neg = chroma._get_negative_dpoverp_intervals(SYNCHROTRON_TUNE, 0., 6000)
+    # mean dp/p within the intervals
+    dpp_amp = DPP * np.sinc(2 * chroma.HALFWIDTH)
+    result = chroma.get_chroma(lin_frame, bpm_samples, "x", dpp_amp, pos, neg)
+    assert list(result.index) == list(lin_frame.index)
+    assert np.allclose(result.loc[:, "DQPOSX"], -result.loc[:, "DQNEGX"], rtol=1e-2)
+    assert np.allclose(result.loc[:, "CHROMAX"], CHROMATICITY, rtol=1e-2)
+
+
+def test_chroma_without_intervals():
+    lin_frame, bpm_samples = _get_synchrotron_oscillation(n_bpms=3, turns=100)
+    result = chroma.get_chroma(lin_frame, bpm_samples, "x", DPP, [], [(10, 20)])
+    assert result.empty and list(result.index) == list(lin_frame.index)
+
+
+def _get_synchrotron_oscillation(n_bpms, turns):
+    names = ["BPM{}".format(i) for i in range(n_bpms)]
+    phases = np.linspace(0, 5, n_bpms)
+    turn = np.arange(turns)
+    synchrotron_phase = 2 * np.pi * SYNCHROTRON_TUNE * turn
+    betatron_phase = 2 * np.pi * (TUNE * turn + CHROMATICITY * DPP * np.sin(synchrotron_phase) /
+                                  (2 * np.pi * SYNCHROTRON_TUNE))
+    dispersive_orbit = 1e3 * DPP * np.cos(synchrotron_phase)
+    bpm_samples = pd.DataFrame(index=names, data=np.array(
+        [np.cos(betatron_phase + 2 * np.pi * phase) + dispersive_orbit for phase in phases]))
+    lin_frame = pd.DataFrame(index=names, data={"TUNEX": TUNE, "MUX": phases % 1})
+    return lin_frame, bpm_samples
@@ -0,0 +1,54 @@
+import sys
+from os.path import abspath, join, dirname, pardir
+import numpy as np
+import pandas as pd
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from tune_analysis import detuning_tools, kickac_modifiers
+from tfs_files import tfs_pandas
+
+
+def test_batch_equals_odr():
+    datas = _get_datas()
+    for data, fit in zip(datas, detuning_tools.do_linear_odr_batch(datas)):
+        odr_fit = detuning_tools.do_linear_odr(**data)
+        assert np.allclose(fit.beta, odr_fit.beta, rtol=1e-6)
+        assert np.allclose(fit.sd_beta, odr_fit.sd_beta, rtol=1e-4)
+        assert fit.sd_beta_resampled is None
+
+
+def test_resampling():
+    datas = _get_datas()
+    bootstrap = detuning_tools.do_linear_odr_batch(datas, resampling="bootstrap",
+                                                   n_resamples=500, seed=1)
+    jackknife = detuning_tools.do_linear_odr_batch(datas, resampling="jackknife")
+    for boot_fit, jack_fit in zip(bootstrap, jackknife):
+        assert np.allclose(boot_fit.beta, jack_fit.beta)
+        for sd_resampled in (boot_fit.sd_beta_resampled, jack_fit.sd_beta_resampled):
+            assert np.all(sd_resampled > 0)
+            assert np.all(sd_resampled < 10 * boot_fit.sd_beta)
+
+
+def test_resampling_headers():
+    fit = detuning_tools.do_linear_odr_batch(_get_datas()[:1], resampling="jackknife")[0]
+    kickac_df = kickac_modifiers.add_odr(tfs_pandas.TfsDataFrame(), fit, "X", "Y",
+                                         resampling="jackknife")
+    assert kickac_df.headers["ODR_RESAMPLING"] == "jackknife"
+    assert kickac_df.headers["ODR_JXQY_SLOPE_STD_RESAMPLED"] == fit.sd_beta_resampled[1]
+    fit = detuning_tools.do_linear_odr_batch(_get_datas()[:1])[0]
+    kickac_df = kickac_modifiers.add_odr(tfs_pandas.TfsDataFrame(), fit, "X", "Y")
+    assert "ODR_RESAMPLING" not in kickac_df.headers
+
+
+def _get_datas():
+    rng = np.random.RandomState(0)
+    datas = []
+    for n_kicks, slope in ((8, 2.5), (12, -4.), (6, 0.5)):
+        action = np.linspace(0.002, 0.02, n_kicks)
+        datas.append({
+            "x": pd.Series(action + rng.normal(0, 1e-4, n_kicks)),
+            "y": pd.Series(0.31 + slope * action + rng.normal(0, 2e-4, n_kicks)),
+            "xerr": pd.Series(np.full(n_kicks, 1e-4)),
+            "yerr": pd.Series(np.full(n_kicks, 2e-4)),
+        })
+    return datas
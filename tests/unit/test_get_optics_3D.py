@@ -0,0 +1,205 @@
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import pytest
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from tfs_files import tfs_pandas as tfs
+from harmonic_analysis import get_optics_3D
+
+PI2I = get_optics_3D.PI2I
+BPMS = (["BPM.{}L1.B1".format(i) for i in range(30, 7, -1)] +
+        ["BPM.{}R1.B1".format(i) for i in range(8, 31)])
+
+
+def test_aligned_columns_with_missing_bpms():
+    model = pd.DataFrame({"NAME": ["A", "B", "C", "D", "E", "F"]})
+    lin_frames = [pd.DataFrame({"NAME": ["F", "C", "A", "B", "E"], "MUX": [6., 3., 1., 2., 5.],
+                                "AMPX": [60., 30., 10., 20., 50.]}),
+                  pd.DataFrame({"NAME": ["B", "E", "D", "C", "F"], "MUX": [.2, .5, .4, .3, .6],
+                                "AMPX": [2., 5., 4., 3., 6.]})]
+    bpms, (amps, mus) = get_optics_3D._get_aligned_columns(model, lin_frames, ["AMPX", "MUX"])
+    assert list(bpms) == ["B", "C", "E", "F"]
+    assert np.all(mus == [[2., .2], [3., .3], [5., .5], [6., .6]])
+    assert np.all(amps == mus * [10., 10.])
+
+
+@pytest.mark.parametrize("n_files, processes", ((1, 1), (3, 1), (3, 2)))
+def test_outputs_like_previous_implementation(_test_dir, n_files, processes):
+    files, model = _write_synthetic_files(_test_dir, n_files)
+    new_dir, old_dir = join(_test_dir, "new"), join(_test_dir, "old")
+    os.mkdir(new_dir)
+    os.mkdir(old_dir)
+    get_optics_3D.get_optics(files, model, new_dir, True, True, processes=processes)
+    _get_phases_previous(files, model, old_dir)
+    _get_ndx_previous(files, model, old_dir)
+    for out_file in ("getphasex.out", "getphasey.out", "getNDx.out"):
+        new, old = tfs.read_tfs(join(new_dir, out_file)), tfs.read_tfs(join(old_dir, out_file))
+        assert sorted(new.headers) == sorted(old.headers)
+        for header in new.headers:
+            if header != "filename":
+                assert np.isclose(new.headers[header], old.headers[header], rtol=1e-12, atol=0)
+        assert list(new.columns) == list(old.columns)
+        for column in new.columns:
+            if new[column].dtype == object:
+                assert list(new[column]) == list(old[column])
+            else:
+                assert np.allclose(new[column], old[column], rtol=1e-12, atol=1e-14)
+
+
+def _write_synthetic_files(directory, n_files):
+    rng = np.random.RandomState(n_files)
+    names = [name for bpm in BPMS for name in (bpm, bpm.replace("BPM", "MQ"))]
+    model = pd.DataFrame({"NAME": names, "S": np.cumsum(rng.uniform(1., 50., len(names))),
+                          "MUX": np.cumsum(rng.uniform(0., .4, len(names))),
+                          "MUY": np.cumsum(rng.uniform(0., .4, len(names))),
+                          "BETX": rng.uniform(20., 200., len(names)),
+                          "DX": rng.uniform(-.5, 2.5, len(names))},
+                         columns=["NAME", "S", "MUX", "MUY", "BETX", "DX"])
+    model_path = join(directory, "twiss_ac.dat")
+    tfs.write_tfs(model_path, model, {"SEQUENCE": "LHCB1"})
+    bpm_model = model.set_index("NAME").loc[BPMS, :]
+    ndx_model = bpm_model.loc[:, "DX"].values / np.sqrt(bpm_model.loc[:, "BETX"].values)
+    file_names = []
+    for i in range(n_files):
+        file_name = join(directory, "kick{}.sdds".format(i))
+        file_names.append(file_name)
+        # each file misses some BPMs and lists the others in its own order
+        order = rng.permutation(len(BPMS))[:len(BPMS) - 3]
+        bpms = np.array(BPMS)[order]
+        sync_phase = rng.uniform(0, 1)
+        muz = sync_phase + .5 * (ndx_model[order] < 0) + rng.normal(0, .02, len(order))
+        linx = pd.DataFrame({"NAME": bpms,
+                             "MUX": bpm_model.loc[bpms, "MUX"] + rng.normal(0, .01, len(order)),
+                             "AMPZ": np.abs(ndx_model[order]) * rng.uniform(.8, 1.2) +
+                                     rng.normal(0, .01, len(order)),
+                             "MUZ": muz},
+                            columns=["NAME", "MUX", "AMPZ", "MUZ"])
+        tfs.write_tfs(file_name + ".linx", linx, {"Q1": .28 + rng.normal(0, 1e-4)})
+        order = rng.permutation(len(BPMS))[:len(BPMS) - 2]
+        bpms = np.array(BPMS)[order]
+        liny = pd.DataFrame({"NAME": bpms,
+                             "MUY": bpm_model.loc[bpms, "MUY"] + rng.normal(0, .01, len(order))},
+                            columns=["NAME", "MUY"])
+        tfs.write_tfs(file_name + ".liny", liny, {"Q2": .31 + rng.normal(0, 1e-4)})
+    return ",".join(file_names), model_path
+
+
+@pytest.fixture()
+def _test_dir():
+    test_dir = tempfile.mkdtemp()
+    try:
+        yield test_dir
+    finally:
+        shutil.rmtree(test_dir)
+
+
+# The implementation before the lin files were aligned in one pass ###########
+
+def _get_ndx_previous(files, model, output):
+    file_list = [(file_name.strip() + ".linx") for file_name in files.strip("\"").split(",")]
+    model_tfs = tfs.read_tfs(model)
+    bpms = model_tfs.loc[:, "NAME"].values
+    for file_name in file_list:
+        filetfs = tfs.read_tfs(file_name)
+        bpms = list(set(bpms) & set(filetfs.loc[:, "NAME"].values))
+    bpms = np.array(bpms)
+    arc_bpms = get_optics_3D.get_arc_bpms(model_tfs, bpms)
+    model_panda = pd.DataFrame(tfs.read_tfs(model))
+    for i, file_name in enumerate(file_list):
+        file_panda = pd.DataFrame(tfs.read_tfs(file_name))
+        model_panda = pd.merge(model_panda, file_panda, how='inner', on='NAME',
+                               suffixes=('', str(i + 1)))
+    model_panda['NDXMDL'] = (model_panda.loc[:, 'DX'].values /
+                             np.sqrt(model_panda.loc[:, 'BETX'].values))
+    columns = ['NAME', 'S', 'NDXMDL']
+    for c in model_panda.columns.values:
+        if c.startswith('AMPZ') or c.startswith('MUZ'):
+            columns.append(c)
+    results = model_panda.loc[:, columns]
+    results.set_index("NAME", inplace=True, drop=False)
+    columns = ['S', 'NDXMDL']
+    cols = []
+    for c in results.columns.values:
+        if c.startswith('MUZ'):
+            results['sc' + c.replace('MU', 'AMP')] = (
+                results.loc[:, c.replace('MU', 'AMP')].values *
+                np.sum(results.loc[arc_bpms, 'NDXMDL']) /
+                np.sum(results.loc[arc_bpms, c.replace('MU', 'AMP')]))
+            results['s' + c] = np.angle(np.exp(PI2I * results.loc[:, c].values)) / (2 * np.pi)
+            field = (results.loc[:, 's' + c].values -
+                     np.angle(np.sum(np.exp(PI2I * results.loc[arc_bpms, 's' + c]))) / (2 * np.pi))
+            results['sc' + c] = np.abs(np.where(np.abs(field) > 0.5, field - np.sign(field), field))
+            cols.append('sc' + c)
+    for c in cols:
+        results[c.replace('scMUZ', 'fNDX')] = (
+            results.loc[:, c.replace('MU', 'AMP')] *
+            np.sign(0.25 - np.abs(np.angle(np.sum(np.exp(PI2I * results.loc[:, cols]), axis=1))) /
+                    (2 * np.pi)))
+        columns.append(c.replace('scMUZ', 'fNDX'))
+    forfile = results.loc[:, columns]
+    f = [c for c in forfile.columns.values if c.startswith('fNDX')]
+    if len(f) > 1:
+        forfile['STDNDX'] = (np.std(forfile.loc[:, f], axis=1) *
+                             get_optics_3D.t_value_correction(len(f)))
+    else:
+        forfile['STDNDX'] = 0.0
+    forfile['NDX'] = np.mean(forfile.loc[:, f], axis=1)
+    forfile['DNDX'] = forfile.loc[:, 'NDX'] - forfile.loc[:, 'NDXMDL']
+    forfile['NAME'] = results.index
+    tfs.write_tfs(os.path.join(output, "getNDx.out"), forfile)
+
+
+def _get_phases_previous(files, model, output):
+    for plane in ["X", "Y"]:
+        file_list = [(file_name.strip() + ".lin" + plane.lower())
+                     for file_name in files.strip("\"").split(",")]
+        model_panda = pd.DataFrame(tfs.read_tfs(model))
+        tune = 0.0
+        for i, file_name in enumerate(file_list):
+            file_panda = tfs.read_tfs(file_name)
+            tune = tune + file_panda.headers['Q1' if plane == "X" else 'Q2']
+            file_panda = pd.DataFrame(file_panda)
+            model_panda = pd.merge(model_panda, file_panda, how='inner', on='NAME',
+                                   suffixes=('', str(i + 1)))
+        tune = tune / len(file_list)
+        model_panda.rename(columns={'MU' + plane: 'MU' + plane + 'MDL'}, inplace=True)
+        columns = ['NAME', 'S']
+        for c in model_panda.columns.values:
+            if c.startswith('MU' + plane):
+                columns.append(c)
+        all_data = model_panda.loc[:, columns]
+        all_data.set_index("NAME", inplace=True, drop=False)
+        bpms = all_data.loc[:, 'NAME'].values
+        results = all_data.loc[bpms[:-1], ['NAME', 'S', 'MU' + plane + 'MDL']]
+        results['NAME2'] = bpms[1:]
+        results['S2'] = all_data.loc[bpms[1:], 'S'].values
+        cols = []
+        for c in all_data.columns.values:
+            if c.startswith('MU'):
+                field = all_data.loc[bpms[1:], c].values - all_data.loc[bpms[:-1], c].values
+                results[c.replace('MU', 'PHASE')] = np.where(np.abs(field) > 0.5,
+                                                             field - np.sign(field), field)
+                cols.append(c.replace('MU', 'PHASE'))
+        cols.remove('PHASE' + plane + 'MDL')
+        results.rename(columns={'PHASE' + plane + 'MDL': 'PH' + plane + 'MDL'}, inplace=True)
+        results['PHASE' + plane] = np.angle(
+            np.sum(np.exp(PI2I * results.loc[:, cols]), axis=1)) / (2 * np.pi)
+        f = []
+        for c in cols:
+            field = results.loc[:, c] - results.loc[:, 'PHASE' + plane]
+            results['d' + c] = np.where(np.abs(field) > 0.5, field - np.sign(field), field)
+            f.append('d' + c)
+        if len(f) > 1:
+            results['STDPH' + plane] = (np.std(results.loc[:, f], axis=1) *
+                                        get_optics_3D.t_value_correction(len(f)))
+        else:
+            results['STDPH' + plane] = 0.0
+        heads = ['NAME', 'NAME2', 'S', 'S2', 'PHASE' + plane, 'STDPH' + plane,
+                 'PH' + plane + 'MDL', 'MU' + plane + 'MDL']
+        tfs.write_tfs(os.path.join(output, "getphase" + plane.lower() + ".out"),
+                      results.loc[:, heads], {'Q1' if plane == "X" else 'Q2': tune})
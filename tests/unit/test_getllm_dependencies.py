@@ -0,0 +1,80 @@
+import sys
+import time
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from GetLLM.GetLLM import DepInjector
+
+
+def test_dependencies():
+    steps = [DepInjector._Step(None, requires, provides, False) for requires, provides in (
+        ((), ("x",)),               # 0
+        (("x",), ("y",)),           # 1
+        (("y.real",), ("z",)),      # 2
+        ((), ("x",)),               # 3, waits for the users of the first x
+        (("x",), ("w",)),           # 4, uses the second x
+    )]
+    dependencies = DepInjector._get_dependencies(steps)
+    assert dependencies == [set(), {0}, {1}, {0, 1}, {3}]
+    assert DepInjector._get_needed(steps, dependencies, None) == [0, 1, 2, 3, 4]
+    assert DepInjector._get_needed(steps, dependencies, ["z"]) == [0, 1, 2]
+    assert DepInjector._get_needed(steps, dependencies, ["w"]) == [0, 1, 3, 4]
+
+
+def test_run_targets():
+    calls = []
+    injector = _get_injector(calls)
+    injector.run(targets=["total"])
+    assert sorted(calls) == ["append", "start", "total"]
+    assert injector.results["total"] == 3
+    assert "count" not in injector.results
+
+
+def test_threads_like_serial():
+    serial = _get_injector([]).run(nthreads=1)
+    for _ in range(5):
+        threaded = _get_injector([]).run(nthreads=4)
+        assert _get_values(threaded) == _get_values(serial)
+    assert serial.something_raised and threaded.something_raised
+    assert isinstance(serial.results["after_broken"], DepInjector.Unavailable)
+    assert _get_values(serial) == {"values": [1, 2], "total": 3, "count": 2, "mean": 1.5,
+                                   "offset": 10}
+
+
+def _get_injector(calls):
+    def start():
+        calls.append("start")
+        return [1]
+
+    def append(values):
+        calls.append("append")
+        values.append(2)
+        return values
+
+    def total(values):
+        time.sleep(0.01)
+        calls.append("total")
+        return sum(values)
+
+    def count(values):
+        time.sleep(0.01)
+        calls.append("count")
+        return len(values)
+
+    def broken():
+        raise ValueError("Expected failure of the test.")
+
+    injector = DepInjector(lazy=True).initial("offset", 10)
+    return injector\
+        .trigger(start, provides=("values",))\
+        .trigger(append, requires=("values",), provides=("values",))\
+        .trigger(total, requires=("values",), provides=("total",))\
+        .trigger(count, requires=("values",), provides=("count",))\
+        .trigger(lambda t, c: float(t) / c, requires=("total", "count"), provides=("mean",))\
+        .trigger(broken, provides=("broken",))\
+        .trigger(lambda b: b, requires=("broken",), provides=("after_broken",))
+
+
+def _get_values(injector):
+    return {name: value for name, value in injector.results.items()
+            if not isinstance(value, DepInjector.Unavailable)}
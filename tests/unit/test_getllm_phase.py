@@ -0,0 +1,219 @@
+import sys
+import numpy as np
+import pytest
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+import utils.bpm
+from GetLLM.algorithms import phase
+
+
+def test_phase_mean_and_std_like_single_calculations():
+    rng = np.random.RandomState(0)
+    for n_files in (1, 3, 9, 25):
+        phases = rng.uniform(0, 1, (40, n_files))
+        phases[:20] = rng.normal(0, .02, (20, n_files)) % 1  # around the wrap at 0 and 1
+        means, stds = phase.calc_phase_mean_and_std(phases, 1.)
+        for row, mean, std in zip(phases, means, stds):
+            assert mean == phase.calc_phase_mean(row, 1.)
+            assert std == phase.calc_phase_std(row, 1.)
+
+
+def test_phase_mean_and_std_keeps_shape():
+    means, stds = phase.calc_phase_mean_and_std(np.full((5, 10, 3), .2), 1.)
+    assert means.shape == stds.shape == (5, 10)
+    assert np.allclose(means, .2)
+    assert np.allclose(stds, 0.)
+
+
+@pytest.mark.parametrize("accel, lhc_phase, beam_direction, plane", (
+    ("LHCB1", "1", 1, "H"),   # phase jump at the last BPM on the turn
+    ("LHCB1", "1", -1, "V"),
+    ("LHCB1", "0", 1, "V"),
+    ("ESRF", "1", -1, "H"),  # no last BPM on the turn
+))
+def test_phases_like_loop(accel, lhc_phase, beam_direction, plane):
+    model, files = _get_twiss_files(plane)
+    getllm_d = _GetllmData(accel, lhc_phase, beam_direction)
+    # the last two pairs of BPM.27 are beyond the last monitor, BPM.03 is missing in one file
+    getllm_d.important_pairs = {"BPM.01": ["BPM.15"], "BPM.27": ["BPM.03", "BPM.09"]}
+    tune_q = .31
+    _assert_same(phase.get_phases(getllm_d, model, files, tune_q, plane),
+                 _loop_get_phases(getllm_d, model, files, tune_q, plane))
+    _assert_same(
+        phase._get_phases_total(model, files, tune_q, plane, beam_direction, accel, lhc_phase),
+        _loop_get_phases_total(model, files, tune_q, plane, beam_direction, accel, lhc_phase))
+
+
+class _Twiss(object):
+    def __init__(self, names, s, mux, muy, q1, q2):
+        self.NAME, self.S, self.MUX, self.MUY = names, s, mux, muy
+        self.Q1, self.Q2 = q1, q2
+        self.TUNEX, self.TUNEY = np.full(len(names), q1 % 1), np.full(len(names), q2 % 1)
+        self.indx = {name: index for index, name in enumerate(names)}
+
+
+class _GetllmData(object):
+    def __init__(self, accel, lhc_phase, beam_direction):
+        self.accel, self.lhc_phase, self.beam_direction = accel, lhc_phase, beam_direction
+        self.important_pairs = {}
+
+
+def _get_twiss_files(plane):
+    rng = np.random.RandomState(3 if plane == "H" else 4)
+    names = ["BPM.{:02d}".format(i) for i in range(30)]
+    names[12] = "BPMSW.1L2.B1"
+    s = np.cumsum(rng.uniform(1, 10, len(names)))
+    advances = rng.uniform(0, .4, (2, len(names)))
+    advances[:, ::7] = rng.uniform(0, 1e-3, (2, 5))  # measured advances around zero
+    mux, muy = np.cumsum(advances, axis=1) - advances[:, :1]
+    model = _Twiss(names, s, mux, muy, 62.31, 60.32)
+    files = []
+    for index in range(5):
+        noise_x, noise_y = rng.normal(0, .005, (2, len(names)))
+        file_names = [name for name in names if index != 2 or name != "BPM.03"]
+        keep = [names.index(name) for name in file_names]
+        files.append(_Twiss(file_names, s[keep], (mux + noise_x)[keep], (muy + noise_y)[keep],
+                            .31 + rng.normal(0, 1e-3), .32 + rng.normal(0, 1e-3)))
+    return model, files
+
+
+def _assert_same(result, expected):
+    if isinstance(result, dict):
+        assert sorted(result) == sorted(expected)
+        for key in expected:
+            _assert_same(result[key], expected[key])
+    elif isinstance(result, (list, tuple)):
+        assert len(result) == len(expected)
+        for value, expected_value in zip(result, expected):
+            _assert_same(value, expected_value)
+    elif isinstance(expected, str):
+        assert result == expected
+    else:
+        assert np.isclose(result, expected, rtol=1e-10, atol=1e-12)
+
+
+# The phase calculation of GetLLM as it was before being vectorized, for comparison
+
+def _loop_phi_last_and_last_but_one(phi, ftune):
+    if ftune <= 0:
+        ftune += 1
+    phi += ftune
+    if phi > 1:
+        phi -= 1
+    return phi
+
+
+def _loop_s_lastbpm(mad_twiss, accel, lhc_phase):
+    if lhc_phase == "1" and accel in phase.LAST_BPM_ON_TURN:
+        return mad_twiss.S[mad_twiss.indx[phase.LAST_BPM_ON_TURN[accel]]]
+    return None
+
+
+def _loop_get_phases_total(mad_twiss, src_files, tune, plane, beam_direction, accel, lhc_phase):
+    commonbpms = utils.bpm.model_intersect(utils.bpm.intersect(src_files), mad_twiss)
+    s_lastbpm = _loop_s_lastbpm(mad_twiss, accel, lhc_phase)
+    column = "MUX" if plane == "H" else "MUY"
+    bn1 = str.upper(commonbpms[0][1])
+    phase_t = {}
+    for i in range(0, len(commonbpms)):
+        bn2 = str.upper(commonbpms[i][1])
+        model_column = getattr(mad_twiss, column)
+        phmdl12 = (model_column[mad_twiss.indx[bn2]] - model_column[mad_twiss.indx[bn1]]) % 1
+        phi12 = []
+        for twiss_file in src_files:
+            twiss_column = getattr(twiss_file, column)
+            phm12 = (twiss_column[twiss_file.indx[bn2]] - twiss_column[twiss_file.indx[bn1]]) % 1
+            if s_lastbpm is not None and commonbpms[i][0] > s_lastbpm:
+                phm12 += beam_direction*tune
+            phi12.append(phm12)
+        phi12 = np.array(phi12)
+        if beam_direction == -1:
+            phi12 = 1 - phi12
+        phase_t[bn2] = [phase.calc_phase_mean(phi12, 1.), phase.calc_phase_std(phi12, 1.),
+                        phmdl12, bn1]
+    return [phase_t, commonbpms]
+
+
+def _loop_get_phases(getllm_d, mad_twiss, ListOfFiles, tune_q, plane):
+    commonbpms = utils.bpm.model_intersect(utils.bpm.intersect(ListOfFiles), mad_twiss)
+    length_commonbpms = len(commonbpms)
+    s_lastbpm = _loop_s_lastbpm(mad_twiss, getllm_d.accel, getllm_d.lhc_phase)
+    column = "MUX" if plane == "H" else "MUY"
+    tunem = []
+    for i in range(length_commonbpms - 1):
+        bpm = str.upper(commonbpms[i][1])
+        tunem.append(np.average([getattr(src_twiss, "TUNEX" if plane == "H" else "TUNEY")[src_twiss.indx[bpm]]
+                                 for src_twiss in ListOfFiles]))
+    tune = np.average(np.array(tunem))
+
+    phase_dict = {}
+    for i in range(length_commonbpms):
+        bpms = [str.upper(commonbpms[j % length_commonbpms][1]) for j in range(i, i+11)]
+        p_i = {pair: [] for pair in range(1, 11)}
+        for number, second_bpm in enumerate(getllm_d.important_pairs.get(bpms[0], []), 1):
+            p_i[10 + number] = []
+            bpms.append(second_bpm)
+
+        for src_twiss in ListOfFiles:
+            p_m = {}
+            twiss_column = getattr(src_twiss, column)
+            for bpm_pair in p_i:
+                try:
+                    p_m[bpm_pair] = (twiss_column[src_twiss.indx[bpms[bpm_pair]]] -
+                                     twiss_column[src_twiss.indx[bpms[0]]])
+                except KeyError:
+                    p_m[bpm_pair] = 10000000000
+            if tune_q is not None and s_lastbpm is not None:
+                for bpm_pair in p_m:
+                    s_first = mad_twiss.S[mad_twiss.indx[bpms[0]]]
+                    s_second = mad_twiss.S[mad_twiss.indx[bpms[bpm_pair]]]
+                    if s_first <= s_lastbpm and s_second > s_lastbpm:
+                        p_m[bpm_pair] += getllm_d.beam_direction*tune_q
+                    if s_first > s_lastbpm and s_second <= s_lastbpm:
+                        p_m[bpm_pair] += -getllm_d.beam_direction*tune_q
+            for bpm_pair in p_i:
+                if p_m[bpm_pair] < 0:
+                    p_m[bpm_pair] += 1
+                p_i[bpm_pair].append(p_m[bpm_pair])
+
+        for bpm_pair in p_i:
+            p_i[bpm_pair] = np.array(p_i[bpm_pair])
+            if getllm_d.beam_direction == -1:
+                p_i[bpm_pair] = 1 - p_i[bpm_pair]
+        p_std = {}
+        for bpm_pair in p_i:
+            p_std[bpm_pair] = phase.calc_phase_std(p_i[bpm_pair], 1.)
+            p_i[bpm_pair] = phase.calc_phase_mean(p_i[bpm_pair], 1.)
+
+        if i >= length_commonbpms-10:
+            p_i[10] = _loop_phi_last_and_last_but_one(p_i[10], tune)
+            for j in range(1, 10):
+                if i >= length_commonbpms-j:
+                    p_i[j] = _loop_phi_last_and_last_but_one(p_i[j], tune)
+
+        model_column = getattr(mad_twiss, column)
+        p_mdl = {bpm_pair: model_column[mad_twiss.indx[bpms[bpm_pair]]] - model_column[mad_twiss.indx[bpms[0]]]
+                 for bpm_pair in p_i}
+        if i >= length_commonbpms-10:
+            madtune = (mad_twiss.Q1 if plane == "H" else mad_twiss.Q2) % 1
+            if madtune > .5:
+                madtune -= 1
+            p_mdl[10] = _loop_phi_last_and_last_but_one(p_mdl[10] % 1, madtune)
+            for j in range(1, len(p_i)):
+                if i >= length_commonbpms-j:
+                    p_mdl[j] = _loop_phi_last_and_last_but_one(p_mdl[j] % 1, madtune)
+
+        for bpm_pair in p_i:
+            if abs(p_mdl[bpm_pair]) < 1e-7:
+                p_mdl[bpm_pair] = 1e-7
+            if abs(p_i[bpm_pair]) < 1e-7:
+                p_i[bpm_pair] = 1e-7
+            phase_dict["".join([plane, bpms[0], bpms[bpm_pair]])] = [p_i[bpm_pair], p_std[bpm_pair], p_mdl[bpm_pair]]
+
+        advances = np.array([p_i[pair] for pair in range(1, len(p_i) + 1)])
+        best_bpm_idx = (np.abs(advances[:3]-0.25)).argmin()
+        phase_dict[bpms[0]] = [p_i[1], p_std[1], p_i[2], p_std[2], p_mdl[1], p_mdl[2], bpms[1],
+                               bpms[best_bpm_idx + 1], advances[best_bpm_idx],
+                               p_std[best_bpm_idx + 1]]
+    return [phase_dict, tune, 0., commonbpms]
@@ -0,0 +1,80 @@
+import sys
+import os
+import shutil
+import tempfile
+from os.path import abspath, join, dirname, pardir
+import numpy as np
+import pytest
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+import hole_in_one
+from harmonic_analysis.io_handlers import input_handler
+from utils import tracing
+from tests.benchmark import synthetic_data
+
+CURRENT_DIR = dirname(__file__)
+MODEL = join(CURRENT_DIR, pardir, "inputs", "models", "flat_beam1", "twiss.dat")
+
+
+def test_parallel_files_like_serial(_workdir):
+    sdds_paths, model = synthetic_data.create_tbt_files(MODEL, _workdir, n_bpms=40, n_turns=1000,
+                                                        n_files=2, seed=0)
+    tunes = synthetic_data.get_tunes(model)
+    outputs = {}
+    for processes in (1, 2):
+        outputdir = join(_workdir, "output{:d}".format(processes))
+        os.mkdir(outputdir)
+        args = ["--file", ",".join(sdds_paths), "--model", model, "--outputdir", outputdir,
+                "--processes", str(processes), "clean",
+                "harpy", "--tolerance", "0.005", "--harpy_mode", "bpm",
+                "--tunex", str(tunes["X"][0]), "--nattunex", str(tunes["X"][1]),
+                "--tuney", str(tunes["Y"][0]), "--nattuney", str(tunes["Y"][1])]
+        main_input, clean_input, harpy_input, optics_input, to_log = input_handler.parse_args(args)
+        assert hole_in_one._get_number_of_processes(main_input, [None, None]) == processes
+        hole_in_one.run_all(main_input, clean_input, harpy_input, optics_input, to_log)
+        outputs[processes] = {}
+        for name in os.listdir(outputdir):
+            if not name.endswith(hole_in_one.LOG_SUFFIX) and not name.startswith(tracing.TRACE_PREFIX):
+                with open(join(outputdir, name)) as output_file:
+                    outputs[processes][name] = output_file.read()
+    assert sorted(outputs[2]) == sorted(outputs[1])
+    assert any(name.endswith(".linx") for name in outputs[1])
+    for name in outputs[1]:
+        assert outputs[2][name] == outputs[1][name]
+
+
+def test_number_of_processes():
+    tbt_file = _TbtFile(np.zeros((100, 1000)), np.zeros((100, 1000)))  # 0.8 MB per plane
+    jobs = [(None, tbt_file)] * 6
+    main_input = input_handler.MainInput()
+    main_input.processes = 4
+    assert hole_in_one._get_number_of_processes(main_input, jobs) == 4
+    assert hole_in_one._get_number_of_processes(main_input, jobs[:3]) == 3
+    # about 12.2 MB per file with MEMORY_PER_DATA_SIZE = 8
+    memory_per_job = hole_in_one.MEMORY_PER_DATA_SIZE * 2 * 100 * 1000 * 8 / 1024. ** 2
+    main_input.max_memory = 2.5 * memory_per_job
+    assert hole_in_one._get_number_of_processes(main_input, jobs) == 2
+    main_input.max_memory = 0.5 * memory_per_job
+    assert hole_in_one._get_number_of_processes(main_input, jobs) == 1
+    main_input.max_memory = 10 * memory_per_job
+    assert hole_in_one._get_number_of_processes(main_input, jobs) == 4
+
+
+class _TbtFile(object):
+    def __init__(self, samples_x, samples_y):
+        self.samples_matrix_x = _Matrix(samples_x)
+        self.samples_matrix_y = _Matrix(samples_y)
+
+
+class _Matrix(object):
+    def __init__(self, values):
+        self.values = values
+
+
+@pytest.fixture()
+def _workdir():
+    directory = tempfile.mkdtemp()
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,125 @@
+import sys
+import numpy as np
+import pytest
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir, "kmod", "kmod_orbit")))
+
+from tfs_files import tfs_pandas
+import kmod_orbit
+
+IP = 1
+N_BPMS = {kmod_orbit.LEFT: 200, kmod_orbit.RIGHT: 170}
+N_KS = {kmod_orbit.LEFT: 12, kmod_orbit.RIGHT: 9}
+
+
+@pytest.mark.parametrize("outliers", (0, 1, 3))
+def test_compute_and_clean_like_single_configurations(outliers):
+    models, bpm_names, ks, orbits = _synthetic_data(outliers)
+    results = kmod_orbit._compute_and_clean(IP, models, bpm_names, ks, orbits)
+    assert sorted(results) == sorted(orbits)
+    total_removed = 0
+    for config in orbits:
+        offset, errorbars, n_removed = _compute_and_clean_single(
+            IP, config, models, bpm_names, ks, orbits)
+        total_removed += n_removed
+        assert np.isclose(results[config][0], offset, rtol=1e-9, atol=0)
+        assert np.isclose(results[config][1], errorbars, rtol=1e-6, atol=0)
+    assert (total_removed > 0) == (outliers > 0)
+
+
+def _synthetic_data(outliers):
+    rng = np.random.RandomState(outliers)
+    models = {beam: _synthetic_model(rng, beam) for beam in kmod_orbit.BEAMS}
+    bpm_names = {(beam, side): _bpm_names(beam, side)
+                 for beam in kmod_orbit.BEAMS for side in kmod_orbit.SIDES}
+    ks, orbits = {}, {}
+    for beam in kmod_orbit.BEAMS:
+        for side in kmod_orbit.SIDES:
+            for plane in kmod_orbit.PLANES:
+                config = (beam, side, plane)
+                ks[config] = 8.7e-3 + rng.uniform(-3e-5, 3e-5, N_KS[side])
+                model_data = _transfer_matrix(IP, config, models, bpm_names, ks)
+                # the reference orbit of every sample only shows up as the largest singular value
+                reference = rng.normal(0, 1e-3, N_BPMS[side])
+                orbit = (rng.uniform(-5e-4, 5e-4) * model_data +
+                         rng.uniform(1., 2., (N_KS[side], 1)) * reference +
+                         rng.normal(0, 1e-9, model_data.shape))
+                bad_bpms = rng.choice(N_BPMS[side], outliers, replace=False)
+                orbit[:, bad_bpms] *= 10.  # miscalibrated BPMs
+                orbits[config] = list(orbit)
+    return models, bpm_names, ks, orbits
+
+
+def _bpm_names(beam, side):
+    return ["BPM.{}{}{}.B{}".format(idx, kmod_orbit.SIDE_STR[side][0], IP,
+                                    kmod_orbit.BEAM_STR[beam])
+            for idx in range(N_BPMS[side])]
+
+
+def _synthetic_model(rng, beam):
+    names = (_bpm_names(beam, kmod_orbit.LEFT)[::-1] +
+             ["DRIFT.L", kmod_orbit._quad_name(kmod_orbit.LEFT, IP),
+              "DRIFT.R", kmod_orbit._quad_name(kmod_orbit.RIGHT, IP)] +
+             _bpm_names(beam, kmod_orbit.RIGHT))
+    n_elements = len(names)
+    s = np.cumsum(rng.uniform(5., 50., n_elements))
+    data = {"S": s, "K1L": rng.choice((-1., 1.), n_elements)}
+    for plane in "XY":
+        data["MU" + plane] = np.cumsum(rng.uniform(0.01, 0.5, n_elements))
+        data["BET" + plane] = rng.uniform(80., 120., n_elements)
+        data["ALF" + plane] = rng.uniform(-2., 2., n_elements)
+    headers = {"Q1": 64.31 + beam * 1e-3, "Q2": 59.32 - beam * 1e-3}
+    return tfs_pandas.TfsDataFrame(data, index=names, headers=headers)
+
+
+def _transfer_matrix(ip, config, models, bpm_names, ks):
+    beam, side, plane = config
+    model = models[beam]
+    bpm_model = model.loc[bpm_names[(beam, side)], :]
+    quadname = kmod_orbit._quad_name(side, ip)
+    k = kmod_orbit._compute_kl(ks[config], model, quadname)
+    plane_str = kmod_orbit.PLANE_STR[plane]
+    mu_m = bpm_model.loc[:, "MU" + plane_str]
+    b_m = bpm_model.loc[:, "BET" + plane_str]
+    mu_q = model.loc[quadname, "MU" + plane_str]
+    b_q = model.loc[quadname, "BET" + plane_str]
+    a_q = model.loc[quadname, "ALF" + plane_str]
+    tune = model.headers["Q" + kmod_orbit.BEAM_STR[beam]]
+    m11 = (np.sqrt(b_m / b_q) *
+           (np.cos((tune - np.abs(mu_m - mu_q)) * 2 * np.pi) +
+            a_q * np.sin((tune - np.abs(mu_m - mu_q)) * 2 * np.pi)))
+    m12 = (np.sqrt(b_m * b_q) *
+           np.sin((tune - np.abs(mu_m - mu_q)) * 2 * np.pi))
+    F = -(b_q * k / np.tan(tune * np.pi) /
+          (2 + b_q * k / np.tan(tune * np.pi)))
+    G = (-(1 - a_q / np.tan(tune * np.pi)) * k /
+         (2 + b_q * k / np.tan(tune * np.pi)))
+    return np.outer(F, m11) + np.outer(G, m12)
+
+
+def _compute_and_clean_single(ip, config, models, bpm_names, ks, orbits):
+    """ The previous per configuration fit, also returns the number of removed BPMs. """
+    cutoff = kmod_orbit.CUTOFF
+    orb = np.array(orbits[config])
+    model_data = _transfer_matrix(ip, config, models, bpm_names, ks)
+    n_bpms = orb.shape[1]
+    u, s, v = np.linalg.svd(model_data)
+    ud, sd, vd = np.linalg.svd(orb, full_matrices=False)
+    sd[0] = 0
+    orb = np.dot(np.dot(ud, np.diag(sd)), vd)
+    ud, sd, vd = np.linalg.svd(orb)
+    while max(vd[0, :]) > cutoff or min(vd[0, :]) < -cutoff:
+        for j in reversed(range(0, len(vd[0, :]))):
+            if abs(vd[0, j]) > cutoff:
+                orb = np.delete(orb, (j), axis=1)
+                model_data = np.delete(model_data, (j), axis=1)
+        u, s, v = np.linalg.svd(model_data)
+        ud, sd, vd = np.linalg.svd(orb)
+    offset = np.dot(np.dot(np.transpose(u[:, 0]), orb),
+                    np.transpose(v[0, :])) / s[0]
+    N = (orb - offset * model_data) / orb
+    onesigma = np.std(N)
+    N = N[np.abs(N) < onesigma]
+    errorbars = np.abs(offset * np.mean(N))
+    return offset, errorbars, n_bpms - orb.shape[1]
@@ -0,0 +1,56 @@
+import os
+import sys
+import shutil
+import tempfile
+from os.path import abspath, join, dirname, pardir
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from nl_gui import data_loader
+
+
+def test_time_indexed_loading(_csv_dir):
+    csv_path = join(_csv_dir, "data.BBQ.csv")
+    times = pd.date_range("2018-05-01 10:00:00", periods=300, freq="1s") + pd.Timedelta("0.25s")
+    data = pd.DataFrame({"time": times.strftime(data_loader.TIME_FORMAT),
+                         "Q1": np.linspace(0.26, 0.27, 300), "Q2": np.linspace(0.29, 0.3, 300)},
+                        columns=["time", "Q1", "Q2"])
+    data.iloc[::-1].to_csv(csv_path, index=False)
+
+    tune = data_loader.load_csv(csv_path, filetype="tune")
+    assert tune.index.is_monotonic_increasing
+    assert (tune.index == times).all()
+    assert np.allclose(tune["Q1"], data["Q1"])
+    assert os.path.isfile(csv_path + ".tune" + data_loader.STORE_SUFFIX)
+
+    window = data_loader.load_csv(csv_path, filetype="tune", columns=["Q2"],
+                                  start=times[10], end=times[19])
+    assert list(window.columns) == ["Q2"]
+    assert (window.index == times[10:20]).all()
+
+    data.iloc[:100].to_csv(csv_path, index=False)
+    store_time = os.path.getmtime(csv_path + ".tune" + data_loader.STORE_SUFFIX)
+    os.utime(csv_path, (store_time + 10, store_time + 10))
+    assert len(data_loader.load_csv(csv_path, filetype="tune")) == 100
+
+
+def test_currents_fill(_csv_dir):
+    csv_path = join(_csv_dir, "data.Imeas.csv")
+    with open(csv_path, "w") as csv_file:
+        csv_file.write("time,RCBX\n2018-05-01 10:00:02,\n2018-05-01 10:00:00,\n"
+                       "2018-05-01 10:00:01,1.5\n")
+    currents = data_loader.load_csv(csv_path, filetype="currents")
+    assert currents.index.name == "time"
+    assert currents["RCBX"].tolist() == [1.5, 1.5, 1.5]
+    assert currents.index[0] == pd.Timestamp("2018-05-01 10:00:00")
+
+
+@pytest.fixture()
+def _csv_dir():
+    directory = tempfile.mkdtemp()
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory)
@@ -185,6 +185,24 @@ def test_chromatic_beating(df, q):
     assert all([c in chrom_beat for c in ["S", "DBEATX", "DBEATY"]])
 
 
+@given(df=full_dataframes(), q=tunes())
+@settings(deadline=None, max_examples=50)
+def test_observation_points(df, q):
+    df = _pd_to_tfs(df, q)
+    observation_points = df.index[::2]
+    to_full = TwissOptics(df.copy(), quick_init=False)
+    to_obs = TwissOptics(df.copy(), observation_points=observation_points)
+    with suppress_warnings(RuntimeWarning):
+        for get_function in ("get_linear_dispersion", "get_chromatic_beating"):
+            full = getattr(to_full, get_function)().loc[observation_points, :]
+            obs = getattr(to_obs, get_function)()
+            assert all(obs.index == observation_points)
+            np.testing.assert_allclose(obs.values, full.values, rtol=1e-12)
+        full_rdts = to_full.get_rdts(["F1001", "F3000"]).loc[observation_points, :]
+        np.testing.assert_allclose(to_obs.get_rdts(["F1001", "F3000"]).values,
+                                   full_rdts.values, rtol=1e-12)
+
+
 # Utilities ##################################################################
 
 
@@ -0,0 +1,92 @@
+import sys
+import shutil
+import tempfile
+from os.path import abspath, join, dirname, pardir
+import numpy as np
+import pytest
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir, "ORM")))
+
+import orm_engine
+
+
+class _Twiss(object):
+    def __init__(self):
+        rng = np.random.RandomState(0)
+        self.NAME = (["BR3.BPM{:02d}".format(i) for i in range(20)] +
+                     ["BR3.DHZ{:02d}".format(i) for i in range(4)] +
+                     ["BR3.DVT{:02d}".format(i) for i in range(4)])
+        n_elements = len(self.NAME)
+        self.S = np.cumsum(rng.rand(n_elements))
+        self.BETX, self.BETY = 1 + 10 * rng.rand(2, n_elements)
+        self.MUX, self.MUY = 0.2 * np.cumsum(rng.rand(2, n_elements), axis=1)
+        self.Q1, self.Q2 = 4.172, 4.231
+        self.indx = {name: index for index, name in enumerate(self.NAME)}
+
+
+def test_orbit_response():
+    twiss = _Twiss()
+    bpms, correctors = twiss.NAME[:20], twiss.NAME[20:]
+    calibrations = np.linspace(0, 0.1, len(correctors))
+    response_x, response_y = orm_engine.get_orbit_response(
+        twiss, bpms, correctors, (np.full(20, 0.05), None), calibrations)
+    for j, corrector in enumerate(correctors):
+        i_cor = twiss.indx[corrector]
+        for i, bpm in enumerate(bpms):
+            if orm_engine.is_vertical(corrector):
+                expected_x = 0.
+                expected_y = (np.sqrt(twiss.BETY[i] * twiss.BETY[i_cor]) /
+                              (1 + calibrations[j]) / (2 * np.sin(np.pi * twiss.Q2)) *
+                              np.cos(2 * np.pi * abs(twiss.MUY[i] - twiss.MUY[i_cor]) -
+                                     np.pi * twiss.Q2))
+            else:
+                expected_x = (1.05 / (1 + calibrations[j]) *
+                              np.sqrt(twiss.BETX[i] * twiss.BETX[i_cor]) /
+                              (2 * np.sin(np.pi * twiss.Q1)) *
+                              np.cos(2 * np.pi * abs(twiss.MUX[i] - twiss.MUX[i_cor]) -
+                                     np.pi * twiss.Q1))
+                expected_y = 0.
+            assert np.isclose(response_x[i, j], expected_x)
+            assert np.isclose(response_y[i, j], expected_y)
+
+    responses = orm_engine.get_responses(twiss, bpms, correctors)
+    assert responses["BR3.DHZ01"].X[responses["BR3.DHZ01"].indx["BR3.BPM05"]] == (
+        orm_engine.get_orbit_response(twiss, bpms, correctors)[0][5, 1])
+
+
+def test_cached_orbit_response(_cache_dir):
+    twiss = _Twiss()
+    twiss_path = join(_cache_dir, "twiss.dat")
+    with open(twiss_path, "w") as twiss_file:
+        twiss_file.write("model")
+    args = (twiss_path, twiss, twiss.NAME[:20], twiss.NAME[20:], join(_cache_dir, "cache"))
+    first = orm_engine.get_cached_orbit_response(*args)
+    twiss.Q1 = 4.3  # not part of the key, the cached matrices have to be returned
+    second = orm_engine.get_cached_orbit_response(*args)
+    assert np.array_equal(first[0], second[0])
+    third = orm_engine.get_cached_orbit_response(*args, corrector_calibrations=np.ones(8))
+    assert np.allclose(third[1], first[1] / 2)
+    tunes = orm_engine.get_cached_orbit_response(*args, tunes=(twiss.Q1, twiss.Q2))
+    assert not np.array_equal(tunes[0], first[0])
+    responses = orm_engine.get_responses(twiss, twiss.NAME[:20], twiss.NAME[20:],
+                                         twiss_path=twiss_path, cache_dir=args[-1])
+    assert np.array_equal(responses["BR3.DHZ01"].X, first[0][:, 1])
+
+
+def test_calibration_solver():
+    rng = np.random.RandomState(1)
+    response = rng.rand(60, 12)
+    response[:, 11] = response[:, 0] + 1e-9 * response[:, 10]
+    weights, vector = rng.rand(2, 60)
+    solver = orm_engine.CalibrationSolver(response, weights, 1e-3)
+    expected = np.dot(np.linalg.pinv(response * weights[:, np.newaxis], 1e-3), vector * weights)
+    assert np.allclose(solver.solve(vector), expected)
+    assert np.allclose(solver.solve(np.column_stack((vector, 2 * vector)))[:, 1], 2 * expected)
+
+
+@pytest.fixture()
+def _cache_dir():
+    directory = tempfile.mkdtemp()
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,38 @@
+import sys
+import numpy as np
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from utils import outliers
+
+
+def test_batched_like_single_series():
+    data = _noisy_series(np.zeros(200), 50)
+    masks = outliers.get_filter_masks(data, limit=1e-4)
+    for series, mask in zip(data, masks):
+        assert np.all(mask == outliers.get_filter_mask(series, limit=1e-4))
+
+
+def test_batched_with_slope_and_axis():
+    x_data = np.linspace(-1., 1., 40)
+    data = _noisy_series(0.3 + 0.01 * x_data, 20)
+    masks = outliers.get_filter_masks(data.T, x_data=x_data[:, np.newaxis], axis=0)
+    for series, mask in zip(data, masks.T):
+        assert np.all(mask == outliers.get_filter_mask(series, x_data=x_data))
+
+
+def test_padded_series():
+    data = _noisy_series(np.zeros(100), 3)
+    padding = np.ones(data.shape, dtype=bool)
+    padding[0, 60:] = False
+    masks = outliers.get_filter_masks(data, mask=padding)
+    assert not np.any(masks[0, 60:])
+    assert np.all(masks[0, :60] == outliers.get_filter_mask(data[0, :60]))
+
+
+def _noisy_series(signal, n_series):
+    rng = np.random.RandomState(1234)
+    data = signal + 1e-4 * rng.randn(n_series, len(signal))
+    outlier_mask = rng.rand(*data.shape) < 0.03
+    data[outlier_mask] += 1e-2
+    return data
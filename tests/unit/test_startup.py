@@ -0,0 +1,38 @@
+import sys
+import time
+import subprocess
+from os.path import abspath, join, dirname, pardir
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+ROOT = abspath(join(dirname(__file__), pardir, pardir))
+STARTUP_BUDGET_S = 3.0
+ENTRY_POINTS = ("hole_in_one", "measure_optics", "global_correct_iterative")
+LAZY_MODULES = ("sklearn", "numba", "model.accelerators.lhc")
+
+
+def test_no_lazy_modules_on_import():
+    for entry_point in ENTRY_POINTS:
+        assert _get_loaded(entry_point, LAZY_MODULES) == []
+    assert _get_loaded("hole_in_one", ("measure_optics",)) == []
+
+
+def test_startup_budget():
+    for entry_point in ENTRY_POINTS:
+        wall_time = min(_time_help(entry_point) for _ in range(2))
+        assert wall_time < STARTUP_BUDGET_S, "{} took {:.2f} s to parse the arguments".format(
+            entry_point, wall_time)
+
+
+def _get_loaded(entry_point, modules):
+    output = subprocess.check_output(
+        [sys.executable, "-W", "ignore", "-c",
+         "import sys; import {}; print(','.join(m for m in {} if m in sys.modules))".format(
+             entry_point, modules)], cwd=ROOT)
+    return [module for module in output.strip().split(",") if module]
+
+
+def _time_help(entry_point):
+    start = time.time()
+    subprocess.check_output([sys.executable, "-W", "ignore", entry_point + ".py", "--help"],
+                            cwd=ROOT, stderr=subprocess.STDOUT)
+    return time.time() - start
@@ -0,0 +1,66 @@
+import os
+import sys
+import shutil
+import tempfile
+from os.path import abspath, join, dirname, pardir
+import pandas as pd
+import pytest
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from tfs_files import tfs_pandas, tfs_collection
+from tfs_files.tfs_collection import TfsCollection, Tfs
+
+
+class _Collection(TfsCollection):
+    beta = Tfs("beta_{}.tfs")
+    orbit = Tfs("orbit.tfs", two_planes=False)
+    missing = Tfs("missing.tfs", two_planes=False)
+    reads = 0
+
+    def read_tfs(self, filename):
+        _Collection.reads += 1
+        return super(_Collection, self).read_tfs(filename)
+
+    def get_filename(self, template, plane=""):
+        filename = template.format(plane)
+        if not os.path.isfile(join(self.directory, filename)):
+            raise IOError("No file {} in {}.".format(filename, self.directory))
+        return filename
+
+
+@pytest.fixture()
+def tfs_dir():
+    directory = tempfile.mkdtemp()
+    _Collection.reads = 0
+    for name in ("beta_x.tfs", "beta_y.tfs", "orbit.tfs"):
+        tfs_pandas.write_tfs(join(directory, name),
+                             pd.DataFrame({"NAME": ["BPM1", "BPM2"], "VALUE": [1., 2.]}),
+                             {"FILE": name})
+    yield directory
+    shutil.rmtree(directory)
+
+
+def test_prefetch(tfs_dir):
+    collection = _Collection(tfs_dir)
+    assert sorted(collection.prefetch("beta", "orbit", "missing")) == [
+        "beta_x.tfs", "beta_y.tfs", "orbit.tfs"]
+    assert collection.beta_y.headers["FILE"] == "beta_y.tfs"
+    assert list(collection.orbit.index) == ["BPM1", "BPM2"]
+    assert collection.prefetch("orbit") == []
+    with pytest.raises(IOError):
+        collection.missing
+    with pytest.raises(AttributeError):
+        collection.prefetch("nothing")
+
+
+def test_shared_cache(tfs_dir):
+    with tfs_collection.shared_cache():
+        first = _Collection(tfs_dir)
+        first.prefetch(wait=True)
+        first.orbit.loc["BPM1", "VALUE"] = 5.
+        second = _Collection(tfs_dir)
+        assert second.orbit.loc["BPM1", "VALUE"] == 1.
+        assert second.beta_x.headers["FILE"] == "beta_x.tfs"
+        assert _Collection.reads == 3
+    _Collection(tfs_dir).beta_x
+    assert _Collection.reads == 4
@@ -0,0 +1,53 @@
+import sys
+import json
+import shutil
+import tempfile
+from os.path import abspath, join, dirname, pardir, isfile
+sys.path.append(abspath(join(dirname(__file__), pardir, pardir)))
+
+from utils import tracing
+
+
+def test_nested_traces():
+    with tracing.tracing("outer") as outer:
+        with tracing.stage("a", bpms=10) as stage:
+            stage.count(files=2)
+        with tracing.tracing("inner") as inner:
+            _work()
+    assert [rec["NAME"] for rec in outer.get_records()] == ["outer", "outer/a", "outer/inner",
+                                                           "outer/inner/_work"]
+    assert [rec["NAME"] for rec in inner.get_records()] == ["outer/inner", "outer/inner/_work"]
+    assert outer.get_records()[1]["BPMS"] == 10
+    assert outer.get_records()[1]["FILES"] == 2
+    assert not tracing.is_active()
+
+
+def test_failed_stage_and_write():
+    output_dir = tempfile.mkdtemp()
+    try:
+        with tracing.tracing("test", output_dir):
+            try:
+                with tracing.stage("bad") as stage:
+                    raise ValueError("broken")
+            except ValueError:
+                pass
+            assert stage.failed
+        with open(join(output_dir, "trace_test.json")) as json_file:
+            records = json.load(json_file)["STAGES"]
+        assert records[1]["STATUS"] == "FAILED"
+        assert "broken" in records[1]["ERROR"]
+        assert isfile(join(output_dir, "trace_test.tfs"))
+    finally:
+        shutil.rmtree(output_dir)
+
+
+def test_inactive_stage():
+    with tracing.stage("nothing") as stage:
+        pass
+    assert not stage.failed
+    assert _work() == 3
+
+
+@tracing.traced()
+def _work():
+    return 3
@@ -3,11 +3,40 @@ Module tfs_files.tfs_collection
 ---------------------------------
 
 Easy access to tfs-file contents via ``tfs_pandas``.
+
+The files of a collection can be read ahead in background threads (``prefetch``) and, while
+``shared_cache`` is active, files read by one collection are reused by all others as long as
+they did not change on disk.
 """
 from __future__ import print_function
 import os
+import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from tfs_files import tfs_pandas
 
+PREFETCH_THREADS = 8
+
+_shared_cache = None  # {(path, mtime, size, reader): DataFrame} while shared_cache is active
+_shared_cache_lock = threading.Lock()
+
+
+@contextmanager
+def shared_cache():
+    """ Context manager sharing the read files between all TfsCollections in the process.
+
+    The files are identified by their absolute path, modification time and size, every
+    collection gets its own copy of the DataFrame. Nested uses keep the outer cache.
+    """
+    global _shared_cache
+    previous = _shared_cache
+    if previous is None:
+        _shared_cache = {}
+    try:
+        yield
+    finally:
+        _shared_cache = previous
+
 
 class _MetaTfsCollection(type):
     """
@@ -18,6 +47,7 @@ class _MetaTfsCollection(type):
     def __new__(mcs, cls_name, bases, dct):
         new_dict = dict(dct)
         new_dict["_two_plane_names"] = []
+        new_dict["_tfs_attributes"] = {}
         for name in dct:
             value = dct[name]
             try:
@@ -32,8 +62,12 @@ class _MetaTfsCollection(type):
                 new_dict["_two_plane_names"].append(name)
                 new_dict[name + "_x"] = prop_x
                 new_dict[name + "_y"] = prop_y
+                for plane in ("x", "y"):
+                    new_dict["_tfs_attributes"][name + "_" + plane] = (
+                        args, dict(kwargs, plane=plane))
             except TypeError:
                 new_dict[name] = new_props
+                new_dict["_tfs_attributes"][name] = (args, kwargs)
         return super(_MetaTfsCollection, mcs).__new__(mcs, cls_name, bases, new_dict)
 
 
@@ -77,6 +111,9 @@ class TfsCollection(object):
     the loaded DataFrame will be buffered, thus the user should expect an
     IOError if the requested file is not in the provided directory (only the
     first time but is better to always take it into account!).
+    To read several files at once, prefetch(...) starts reading them in
+    background threads, the attribute access then waits for the result:
+    example.prefetch("beta", "coupling").
     When a DataFrame is assigned to one attribute it will be set as the buffer
     value. If the self.allow_write attribute is set to true, an assignment on
     one of the attributes will trigger the corresponding file write.
@@ -88,6 +125,8 @@ class TfsCollection(object):
         self.allow_write = allow_write
         self.maybe_call = _MaybeCall(self)
         self._buffer = {}
+        self._pending = {}
+        self._prefetch_pool = None
 
     def get_filename(self, *args, **kwargs):
         """Returns the filename to be loaded or written.
@@ -121,6 +160,45 @@ class TfsCollection(object):
         again.
         """
         self._buffer = {}
+        self._pending = {}
+
+    def prefetch(self, *names, **kwargs):
+        """Starts reading the files of the given Tfs attributes in background threads.
+
+        Returns immediately, accessing one of the attributes waits until its file is
+        read. Files that can not be found or read raise their IOError on attribute
+        access as without prefetch.
+
+        Arguments:
+            names: Names of Tfs attributes, as "beta" (both planes), "beta_x" or
+                "coupling". All Tfs attributes if none is given.
+            threads: Maximum number of reading threads, default PREFETCH_THREADS.
+            wait: If True, returns only after all files are read.
+        Returns:
+            The names of the files being read.
+        """
+        threads = kwargs.pop("threads", PREFETCH_THREADS)
+        wait = kwargs.pop("wait", False)
+        filenames = []
+        for attr in self._get_tfs_attributes(names):
+            args, attr_kwargs = self._tfs_attributes[attr]
+            try:
+                filename = self.get_filename(*args, **attr_kwargs)
+            except IOError:
+                continue
+            if (filename not in self._buffer and filename not in self._pending and
+                    filename not in filenames):
+                filenames.append(filename)
+        if not filenames:
+            return filenames
+        self._prefetch_pool = ThreadPool(min(threads, len(filenames)))
+        for filename in filenames:
+            self._pending[filename] = self._prefetch_pool.apply_async(
+                self._read_tfs_shared, (filename,))
+        self._prefetch_pool.close()
+        if wait:
+            self._prefetch_pool.join()
+        return filenames
 
     def read_tfs(self, filename):
         """Actually reads the TFS file from self.directory with filename.
@@ -144,17 +222,60 @@ class TfsCollection(object):
         raise AttributeError("{} object has no attribute {}"
                              .format(self.__class__.__name__, attr))
 
+    def _get_tfs_attributes(self, names):
+        if not names:
+            return sorted(self._tfs_attributes)
+        attributes = []
+        for name in names:
+            if name in self._two_plane_names:
+                attributes.extend([name + "_x", name + "_y"])
+            elif name in self._tfs_attributes:
+                attributes.append(name)
+            else:
+                raise AttributeError("{} object has no Tfs attribute {}"
+                                     .format(self.__class__.__name__, name))
+        return attributes
+
     def _load_tfs(self, filename):
         try:
             return self._buffer[filename]
         except KeyError:
-            tfs_data = self.read_tfs(filename)
-            if "NAME" in tfs_data:
-                tfs_data = tfs_data.set_index("NAME", drop=False)
+            pending = self._pending.pop(filename, None)
+            if pending is not None:
+                tfs_data = pending.get()
+            else:
+                tfs_data = self._read_tfs_shared(filename)
             self._buffer[filename] = tfs_data
             return self._buffer[filename]
 
+    def _read_tfs_indexed(self, filename):
+        tfs_data = self.read_tfs(filename)
+        if "NAME" in tfs_data:
+            tfs_data = tfs_data.set_index("NAME", drop=False)
+        return tfs_data
+
+    def _read_tfs_shared(self, filename):
+        """ Reads the file, through the shared cache if it is active. """
+        cache = _shared_cache
+        if cache is None:
+            return self._read_tfs_indexed(filename)
+        path = os.path.abspath(os.path.join(self.directory, filename))
+        try:
+            stat = os.stat(path)
+        except OSError:  # read_tfs gives the usual error
+            return self._read_tfs_indexed(filename)
+        # different readers (overwritten read_tfs) do not share their files
+        key = (path, stat.st_mtime, stat.st_size, type(self).read_tfs.__func__)
+        with _shared_cache_lock:
+            tfs_data = cache.get(key)
+        if tfs_data is None:
+            tfs_data = self._read_tfs_indexed(filename)
+            with _shared_cache_lock:
+                cache[key] = tfs_data
+        return _copy(tfs_data)
+
     def _write_tfs(self, filename, data_frame):
+        self._pending.pop(filename, None)
         if self.allow_write:
             tfs_pandas.write_tfs(os.path.join(self.directory, filename), data_frame)
         self._buffer[filename] = data_frame
@@ -222,6 +343,14 @@ def _define_property_two_planes(dct, args, kwargs):
     return property_x, property_y
 
 
+def _copy(tfs_data):
+    tfs_copy = tfs_data.copy()
+    headers = getattr(tfs_data, "headers", None)
+    if headers is not None:
+        tfs_copy.headers = headers.copy()
+    return tfs_copy
+
+
 def _getter(self, *args, **kwargs):
     filename = self.get_filename(*args, **kwargs)
     return self._load_tfs(filename)
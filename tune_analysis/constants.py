@@ -52,6 +52,11 @@ def get_odr_header_slope_std(j_plane, q_plane):
     return "ODR_J{:s}Q{:s}_SLOPE_STD".format(j_plane, q_plane)
 
 
+def get_odr_header_slope_std_resampled(j_plane, q_plane):
+    """ Header key for odr slope standard deviation from resampling the kicks """
+    return "ODR_J{:s}Q{:s}_SLOPE_STD_RESAMPLED".format(j_plane, q_plane)
+
+
 def get_odr_header_offset_corr(j_plane, q_plane):
     """ Header key for corrected odr offset (i.e. beta[0]) """
     return "ODR_J{:s}Q{:s}_OFFSET_CORR".format(j_plane, q_plane)
@@ -67,6 +72,16 @@ def get_odr_header_slope_std_corr(j_plane, q_plane):
     return "ODR_J{:s}Q{:s}_SLOPE_STD_CORR".format(j_plane, q_plane)
 
 
+def get_odr_header_slope_std_resampled_corr(j_plane, q_plane):
+    """ Header key for corrected odr slope standard deviation from resampling the kicks """
+    return "ODR_J{:s}Q{:s}_SLOPE_STD_RESAMPLED_CORR".format(j_plane, q_plane)
+
+
+def get_resampling_head():
+    """ Label for the resampling method of the odr from header. """
+    return "ODR_RESAMPLING"
+
+
 # Kickac Columns ###############################################################
 
 
@@ -24,6 +24,10 @@ from plotshop import plot_style as ps
 
 LOG = logging_tools.get_logger(__name__)
 
+RESAMPLES = 1000  # default number of bootstrap samples
+ODR_MAX_ITERATIONS = 100
+ODR_TOLERANCE = 1e-12
+
 
 # Linear ODR ###################################################################
 
@@ -57,6 +61,152 @@ def do_linear_odr(x, y, xerr, yerr):
     return odr_fit
 
 
+class LinearOdrFit(object):
+    """ Result of a linear odr fit from ``do_linear_odr_batch()``.
+
+    Has the same beta, sd_beta, cov_beta and res_var attributes as the scipy odr output.
+    sd_beta_resampled holds the standard deviations of the betas from resampling the data
+    points, None if no resampling was done.
+    """
+    def __init__(self, beta, sd_beta, cov_beta, res_var, sd_beta_resampled=None):
+        self.beta = beta
+        self.sd_beta = sd_beta
+        self.cov_beta = cov_beta
+        self.res_var = res_var
+        self.sd_beta_resampled = sd_beta_resampled
+
+
+def do_linear_odr_batch(datas, resampling=None, n_resamples=RESAMPLES, seed=None):
+    """ Returns the linear odr fits of several data sets, all solved at once.
+
+    The fits are the same as from ``do_linear_odr()``. With resampling, the data points of
+    every data set are resampled (e.g. the kicks) and the spread of the resampled fits is
+    given as sd_beta_resampled.
+
+    Args:
+        datas: List of dictionaries with the Series x, y, xerr and yerr
+               (e.g. from ``kickac_modifiers.get_ampdet_data()``)
+        resampling: None, "bootstrap" or "jackknife"
+        n_resamples: Number of bootstrap samples per data set
+        seed: Seed of the bootstrap random generator
+
+    Returns: List of LinearOdrFit, one per data set.
+    """
+    arrays = _get_padded_arrays(datas)
+    beta, cov_beta, res_var = _solve_linear_odr(*arrays)
+    sd_beta = np.sqrt(np.diagonal(cov_beta, axis1=1, axis2=2) * res_var[:, None])
+    sd_resampled = [None] * len(datas)
+    if resampling is not None:
+        sd_resampled = _get_resampled_std(arrays, resampling, n_resamples, seed)
+    fits = []
+    for idx in range(len(datas)):
+        fits.append(LinearOdrFit(beta[idx], sd_beta[idx], cov_beta[idx], res_var[idx],
+                                 sd_resampled[idx]))
+        print_odr_result(LOG.debug, fits[-1])
+        if resampling is not None:
+            LOG.debug("Beta Std Error ({}): {}".format(resampling, sd_resampled[idx]))
+    return fits
+
+
+def _get_padded_arrays(datas):
+    """ Data sets as 2D arrays of x, y, xerr and yerr, padded with NaN. """
+    n_points = max(len(data["x"]) for data in datas)
+    arrays = np.full((4, len(datas), n_points), np.nan)
+    for idx, data in enumerate(datas):
+        for row, key in enumerate(("x", "y", "xerr", "yerr")):
+            arrays[row, idx, :len(data[key])] = data[key]
+    return arrays
+
+
+def _get_resampled_std(arrays, resampling, n_resamples, seed):
+    """ Standard deviation of the betas of the resampled data sets. """
+    valid = ~np.isnan(arrays[0])
+    indices, n_samples = [], []
+    rng = np.random.RandomState(seed)
+    for mask in valid:
+        valid_idx = np.flatnonzero(mask)
+        n_valid = len(valid_idx)
+        if resampling == "bootstrap":
+            samples = valid_idx[rng.randint(n_valid, size=(n_resamples, n_valid))]
+        elif resampling == "jackknife":
+            samples = np.tile(valid_idx, (n_valid, 1))[~np.eye(n_valid, dtype=bool)].reshape(
+                n_valid, n_valid - 1)
+        else:
+            raise ValueError("Unknown resampling method '{}'.".format(resampling))
+        indices.append(samples)
+        n_samples.append(len(samples))
+    n_points = max(samples.shape[1] for samples in indices)
+    resampled = np.full((4, sum(n_samples), n_points), np.nan)
+    start = 0
+    for idx, samples in enumerate(indices):
+        end = start + len(samples)
+        resampled[:, start:end, :samples.shape[1]] = arrays[:, idx, samples]
+        start = end
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = _solve_linear_odr(*resampled)[0]
+    sd_resampled = []
+    for samples_beta in np.split(beta, np.cumsum(n_samples)[:-1]):
+        if resampling == "jackknife":
+            n_valid = len(samples_beta)
+            sd_resampled.append(np.sqrt((n_valid - 1) * np.nanvar(samples_beta, axis=0)))
+        else:
+            sd_resampled.append(np.nanstd(samples_beta, axis=0, ddof=1))
+    return sd_resampled
+
+
+def _solve_linear_odr(x, y, xerr, yerr):
+    """ Solves the linear odr of all data sets (rows, NaN-padded) at once.
+
+    The linear model allows the iterative solution of York et al.
+    (Am. J. Phys. 72, 367 (2004)) instead of the general odr. The covariance of the betas
+    is not scaled by the residual variance, as in scipy odr.
+
+    Returns:
+        beta, cov_beta and res_var of all data sets
+    """
+    valid = ~np.isnan(x)
+    n_points = valid.sum(axis=1)
+    x, y = np.where(valid, x, 0.), np.where(valid, y, 0.)
+    var_x = np.where(valid, np.square(xerr), 0.)
+    var_y = np.where(valid, np.square(yerr), 1.)
+
+    def weighted_mean(weights, values):
+        return np.sum(weights * values, axis=1) / np.sum(weights, axis=1)
+
+    # start from the weighted least squares slope
+    weights = valid / var_y
+    u = x - weighted_mean(weights, x)[:, None]
+    slope = np.sum(weights * u * y, axis=1) / np.sum(weights * u * u, axis=1)
+    for _ in range(ODR_MAX_ITERATIONS):
+        weights = valid / (var_y + slope[:, None] ** 2 * var_x)
+        x_mean, y_mean = weighted_mean(weights, x), weighted_mean(weights, y)
+        u, v = x - x_mean[:, None], y - y_mean[:, None]
+        adjustment = weights * (u * var_y + slope[:, None] * v * var_x)
+        new_slope = np.sum(weights * adjustment * v, axis=1) / np.sum(
+            weights * adjustment * u, axis=1)
+        converged = np.abs(new_slope - slope) <= ODR_TOLERANCE * np.abs(new_slope)
+        slope = new_slope
+        if np.all(converged | np.isnan(slope)):
+            break
+    weights = valid / (var_y + slope[:, None] ** 2 * var_x)
+    x_mean, y_mean = weighted_mean(weights, x), weighted_mean(weights, y)
+    u, v = x - x_mean[:, None], y - y_mean[:, None]
+    adjustment = weights * (u * var_y + slope[:, None] * v * var_x)
+    offset = y_mean - slope * x_mean
+
+    x_adjusted = x_mean[:, None] + adjustment
+    x_adjusted_mean = weighted_mean(weights, x_adjusted)
+    var_slope = 1. / np.sum(weights * (x_adjusted - x_adjusted_mean[:, None]) ** 2, axis=1)
+    cov_beta = np.empty((len(slope), 2, 2))
+    cov_beta[:, 0, 0] = 1. / np.sum(weights, axis=1) + x_adjusted_mean ** 2 * var_slope
+    cov_beta[:, 0, 1] = cov_beta[:, 1, 0] = -x_adjusted_mean * var_slope
+    cov_beta[:, 1, 1] = var_slope
+
+    chi_square = np.sum(weights * (y - offset[:, None] - slope[:, None] * x) ** 2, axis=1)
+    res_var = chi_square / (n_points - 2)
+    return np.stack([offset, slope], axis=1), cov_beta, res_var
+
+
 def print_odr_result(printer, odr_out):
         """ Logs the odr output results.
 
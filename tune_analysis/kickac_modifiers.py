@@ -31,10 +31,13 @@ COL_BBQ = const.get_bbq_col
 HEADER_CORR_OFFSET = const.get_odr_header_offset_corr
 HEADER_CORR_SLOPE = const.get_odr_header_slope_corr
 HEADER_CORR_SLOPE_STD = const.get_odr_header_slope_std_corr
+HEADER_CORR_SLOPE_STD_RES = const.get_odr_header_slope_std_resampled_corr
 
 HEADER_OFFSET = const.get_odr_header_offset
 HEADER_SLOPE = const.get_odr_header_slope
 HEADER_SLOPE_STD = const.get_odr_header_slope_std
+HEADER_SLOPE_STD_RES = const.get_odr_header_slope_std_resampled
+HEADER_RESAMPLING = const.get_resampling_head
 
 PLANES = const.get_planes()
 
@@ -126,7 +129,7 @@ def add_corrected_natural_tunes(kickac_df):
     return kickac_df
 
 
-def add_odr(kickac_df, odr_fit, action_plane, tune_plane, corrected=False):
+def add_odr(kickac_df, odr_fit, action_plane, tune_plane, corrected=False, resampling=None):
     """ Adds the odr fit of the (un)corrected data to the header of the kickac.
 
     Args:
@@ -134,6 +137,7 @@ def add_odr(kickac_df, odr_fit, action_plane, tune_plane, corrected=False):
         odr_fit: odr-fit data (definitions see ``detuning_tools.py``)
         action_plane: Plane of the action
         tune_plane: Plane of the tune
+        resampling: Resampling method of the odr-fit uncertainty ("bootstrap" or "jackknife")
 
     Returns:
         Modified kick_ac
@@ -143,6 +147,11 @@ def add_odr(kickac_df, odr_fit, action_plane, tune_plane, corrected=False):
     kickac_df.headers[header_offset(action_plane, tune_plane)] = odr_fit.beta[0]
     kickac_df.headers[header_slope(action_plane, tune_plane)] = odr_fit.beta[1]
     kickac_df.headers[header_slope_std(action_plane, tune_plane)] = odr_fit.sd_beta[1]
+    if getattr(odr_fit, "sd_beta_resampled", None) is not None:
+        header_slope_std_res = HEADER_CORR_SLOPE_STD_RES if corrected else HEADER_SLOPE_STD_RES
+        kickac_df.headers[header_slope_std_res(action_plane, tune_plane)] = \
+            odr_fit.sd_beta_resampled[1]
+        kickac_df.headers[HEADER_RESAMPLING()] = resampling
     return kickac_df
 
 
@@ -40,12 +40,11 @@ import numpy as np
 import pandas as pd
 
 from twiss_optics.twiss_functions import assertion, get_all_rdts
-from twiss_optics.twiss_functions import get_phase_advances, tau, dphi
+from twiss_optics.twiss_functions import get_phase_advances, get_phase_advances_block, tau, dphi
 from utils import logging_tools as logtool
 from tfs_files import tfs_pandas as tfs
 from utils.contexts import timeit
 from utils.dict_tools import DotDict
-from plotshop import plot_style as pstyle
 
 LOG = logtool.get_logger(__name__)
 
@@ -68,20 +67,28 @@ class TwissOptics(object):
     Args:
         model_path_or_df: Path to twissfile of model or DataFrame of model.
         quick_init: Initializes without calculating phase advances. Default: False
+        observation_points: Names of the elements (e.g. BPMs) at which the optics are evaluated.
+            Only the phase advances from the sources to these elements are then calculated,
+            instead of the full element x element matrices. Default: all elements.
     """
 
     ################################
     #       init Functions
     ################################
 
-    def __init__(self, model_path_or_df, quick_init=True):
+    def __init__(self, model_path_or_df, quick_init=True, observation_points=None):
         self.twiss_df = self._get_model_df(model_path_or_df)
         self._ip_pos = self._find_ip_positions()
+        self._observation_points = self._get_observation_points(observation_points)
 
         self._results_df = self._make_results_dataframe()
+        # terms of the sources (e.g. the chromatic terms) are needed at all elements
+        self._elements_df = self._results_df
+        if self._observation_points is not None:
+            self._elements_df = tfs.TfsDataFrame(index=self.twiss_df.index)
 
         self._phase_advance = None
-        if not quick_init:
+        if not quick_init and self._observation_points is None:
             self._phase_advance = self.get_phase_adv()
 
         self._plot_options = DotDict(PLOT_DEFAULTS)
@@ -110,10 +117,23 @@ class TwissOptics(object):
         tw = self.twiss_df
         return tw.loc[tw.index.str.match(r"IP\d$", case=False), 'S']
 
+    def _get_observation_points(self, observation_points):
+        """ Returns the observation points as index, in the order of the model. """
+        if observation_points is None:
+            return None
+        mask = self.twiss_df.index.isin(observation_points)
+        if sum(mask) != len(set(observation_points)):
+            raise KeyError("Observation points not found in model: {:s}".format(str(
+                sorted(set(observation_points) - set(self.twiss_df.index)))))
+        return self.twiss_df.index[mask]
+
     def _make_results_dataframe(self):
         """ Creating a dataframe used for storing results. """
         LOG.debug("Creating Results Dataframes.")
-        results_df = tfs.TfsDataFrame(index=self.twiss_df.index)
+        index = self.twiss_df.index
+        if self._observation_points is not None:
+            index = self._observation_points
+        results_df = tfs.TfsDataFrame(index=index)
         results_df["S"] = self.twiss_df["S"]
         return results_df
 
@@ -134,11 +154,31 @@ class TwissOptics(object):
     ################################
 
     def get_phase_adv(self):
-        """ Wrapper for returning the matrix of phase-advances. """
+        """ Wrapper for returning the matrix of phase-advances between all elements. """
         if self._phase_advance is None:
             self._phase_advance = get_phase_advances(self.twiss_df)
         return self._phase_advance
 
+    def _get_phase_adv_block(self, plane, sources, targets=None):
+        """ Phase-advances from sources to targets, default targets are the observation points.
+
+        Without observation points they are sliced from the full matrices,
+        otherwise only this block is calculated.
+        """
+        if self._observation_points is None:
+            if targets is None:
+                return self.get_phase_adv()[plane].loc[sources, :]
+            return self.get_phase_adv()[plane].loc[sources, targets]
+        if targets is None:
+            targets = self._observation_points
+        return get_phase_advances_block(self.twiss_df, plane, sources, targets)
+
+    def _get_observed_twiss(self):
+        """ Twiss at the observation points. """
+        if self._observation_points is None:
+            return self.twiss_df
+        return self.twiss_df.loc[self._observation_points, :]
+
     def get_coupling(self, method='rdt'):
         """ Returns the coupling term.
 
@@ -175,7 +215,7 @@ class TwissOptics(object):
         """ Calculates C matrix and Coupling and Gamma from it.
         See [#CalagaBetatroncouplingMerging2005]_
         """
-        tw = self.twiss_df
+        tw = self._get_observed_twiss()
         res = self._results_df
 
         LOG.debug("Calculating CMatrix.")
@@ -271,7 +311,8 @@ class TwissOptics(object):
 
             i2pi = 2j * np.pi
             tw = self.twiss_df
-            phs_adv = self.get_phase_adv()
+            if self._observation_points is None:
+                self.get_phase_adv()  # fails early on missing phase columns
             res = self._results_df
 
             for rdt in rdt_list:
@@ -311,8 +352,8 @@ class TwissOptics(object):
                         # the next three lines determine the main order of speed, hence
                         # - mask as much as possible
                         # - additions are faster than multiplications (-> applymap last)
-                        phx = dphi(phs_adv['X'].loc[mask_in, :], tw.Q1)
-                        phy = dphi(phs_adv['Y'].loc[mask_in, :], tw.Q2)
+                        phx = dphi(self._get_phase_adv_block('X', mask_in), tw.Q1)
+                        phy = dphi(self._get_phase_adv_block('Y', mask_in), tw.Q2)
                         phase_term = ((j-k) * phx + (l-m) * phy).applymap(lambda p: np.exp(i2pi*p))
 
                         beta_term = (tw.loc[mask_in, src] *
@@ -366,9 +407,10 @@ class TwissOptics(object):
 
             i2pi = 2j * np.pi
             tw = self.twiss_df
-            LOG.debug('STARTING phase advance calculation...')
-            phs_adv = self.get_phase_adv()
-            LOG.debug('phase advance calculation done...')
+            if self._observation_points is None:
+                LOG.debug('STARTING phase advance calculation...')
+                self.get_phase_adv()
+                LOG.debug('phase advance calculation done...')
             res = self._results_df
 
             for rdt in rdt_list:
@@ -473,13 +515,14 @@ class TwissOptics(object):
                         # the next three lines determine the main order of speed, hence
                         # - mask as much as possible
                         # - additions are faster than multiplications (-> applymap last)
-                        phx = dphi(phs_adv['X'].loc[mask_in, :], tw.Q1)
-                        phy = dphi(phs_adv['Y'].loc[mask_in, :], tw.Q2)
+                        phs_adv_x = self._get_phase_adv_block('X', mask_in)
+                        phx = dphi(phs_adv_x, tw.Q1)
+                        phy = dphi(self._get_phase_adv_block('Y', mask_in), tw.Q2)
                         
-                        phs_acd = pd.DataFrame(columns=phs_adv['X'].loc[mask_in, :].columns,
-                                               index=phs_adv['X'].loc[mask_in, :].index)
+                        phs_acd = pd.DataFrame(columns=phs_adv_x.columns,
+                                               index=phs_adv_x.index)
                         phs_acd[:] = acd_ph
-                        mk_acd = phs_adv['X'].loc[mask_in, :] > 0
+                        mk_acd = phs_adv_x > 0
                         phs_acd.where(mk_acd, 1., inplace=True) 
 
                         phase_term = ((j-k) * phx + (l-m) * phy).applymap(lambda p: np.exp(i2pi*p))
@@ -517,6 +560,7 @@ class TwissOptics(object):
     def plot_rdts(self, rdt_names=None, apply_fun=np.abs, combined=True):
         """ Plot Resonance Driving Terms """
         LOG.debug("Plotting Resonance Driving Terms")
+        from plotshop import plot_style as pstyle
         rdts = self.get_rdts(rdt_names)
         is_s = rdts.columns.str.match(r'S$', case=False)
         rdts = rdts.dropna()
@@ -549,67 +593,12 @@ class TwissOptics(object):
         Eq. 24 in [#FranchiAnalyticformulasrapid2017]_
         """
         self._check_k_columns(["K0L", "K0SL", "K1SL"])
-        tw = self.twiss_df
-        phs_adv = self.get_phase_adv()
         res = self._results_df
-        coeff_fun = self._linear_dispersion_coeff
-        sum_fun = self._linear_dispersion_sum
 
         # Calculate
         LOG.debug("Calculate Linear Dispersion")
         with timeit(lambda t: LOG.debug("  Time needed: {:f}".format(t))):
-            # sources
-            k0_mask = tw['K0L'] != 0
-            k0s_mask = tw['K0SL'] != 0
-            k1s_mask = tw['K1SL'] != 0
-
-            mx_mask = k0_mask | k1s_mask  # magnets contributing to Dx,j (-> Dy,m)
-            my_mask = k0s_mask | k1s_mask  # magnets contributing to Dy,j (-> Dx,m)
-
-            if not any(mx_mask | my_mask):
-                LOG.warning("  No linear dispersion contributions found. Values will be zero.")
-                res['DX'] = 0.
-                res['DY'] = 0.
-                self._log_added('DX', 'DY')
-                return
-
-            # create temporary DataFrame for magnets with coefficients already in place
-            df = tfs.TfsDataFrame(index=tw.index).join(
-                coeff_fun(tw.loc[:, 'BETX'], tw.Q1)).join(
-                coeff_fun(tw.loc[:, 'BETY'], tw.Q2))
-            df.columns = ['COEFFX', 'COEFFY']
-
-            LOG.debug("  Calculate uncoupled linear dispersion")
-            df.loc[my_mask, 'DX'] = df.loc[my_mask, 'COEFFX'] * \
-                                    sum_fun(tw.loc[mx_mask, 'K0L'],
-                                            0,
-                                            0,
-                                            tw.loc[mx_mask, 'BETX'],
-                                            tau(phs_adv['X'].loc[mx_mask, my_mask], tw.Q1)
-                                            ).transpose()
-            df.loc[mx_mask, 'DY'] = df.loc[mx_mask, 'COEFFY'] * \
-                                    sum_fun(-tw.loc[my_mask, 'K0SL'],  # MINUS!
-                                            0,
-                                            0,
-                                            tw.loc[my_mask, 'BETY'],
-                                            tau(phs_adv['Y'].loc[my_mask, mx_mask], tw.Q2)
-                                            ).transpose()
-
-            LOG.debug("  Calculate full linear dispersion values")
-            res.loc[:, 'DX'] = df.loc[:, 'COEFFX'] * \
-                               sum_fun(tw.loc[mx_mask, 'K0L'],
-                                       tw.loc[mx_mask, 'K1SL'],
-                                       df.loc[mx_mask, 'DY'],
-                                       tw.loc[mx_mask, 'BETX'],
-                                       tau(phs_adv['X'].loc[mx_mask, :], tw.Q1)
-                                       ).transpose()
-            res.loc[:, 'DY'] = df.loc[:, 'COEFFY'] * \
-                               sum_fun(-tw.loc[my_mask, 'K0SL'],  # MINUS!
-                                       tw.loc[my_mask, 'K1SL'],
-                                       df.loc[my_mask, 'DX'],
-                                       tw.loc[my_mask, 'BETY'],
-                                       tau(phs_adv['Y'].loc[my_mask, :], tw.Q2)
-                                       ).transpose()
+            res['DX'], res['DY'] = self._linear_dispersion()
 
         LOG.debug("  Average linear dispersion Dx: {:g}".format(
                                                     np.mean(res['DX'])))
@@ -617,6 +606,66 @@ class TwissOptics(object):
                                                     np.mean(res['DY'])))
         self._log_added('DX', 'DY')
 
+    def _linear_dispersion(self, targets=None):
+        """ Returns the linear dispersion Dx, Dy at the targets (default: observation points). """
+        tw = self.twiss_df
+        coeff_fun = self._linear_dispersion_coeff
+        sum_fun = self._linear_dispersion_sum
+
+        # sources
+        k0_mask = tw['K0L'] != 0
+        k0s_mask = tw['K0SL'] != 0
+        k1s_mask = tw['K1SL'] != 0
+
+        mx_mask = k0_mask | k1s_mask  # magnets contributing to Dx,j (-> Dy,m)
+        my_mask = k0s_mask | k1s_mask  # magnets contributing to Dy,j (-> Dx,m)
+
+        if not any(mx_mask | my_mask):
+            LOG.warning("  No linear dispersion contributions found. Values will be zero.")
+            return 0., 0.
+
+        # create temporary DataFrame for magnets with coefficients already in place
+        df = tfs.TfsDataFrame(index=tw.index).join(
+            coeff_fun(tw.loc[:, 'BETX'], tw.Q1)).join(
+            coeff_fun(tw.loc[:, 'BETY'], tw.Q2))
+        df.columns = ['COEFFX', 'COEFFY']
+
+        LOG.debug("  Calculate uncoupled linear dispersion")
+        df.loc[my_mask, 'DX'] = df.loc[my_mask, 'COEFFX'] * \
+                                sum_fun(tw.loc[mx_mask, 'K0L'],
+                                        0,
+                                        0,
+                                        tw.loc[mx_mask, 'BETX'],
+                                        tau(self._get_phase_adv_block('X', mx_mask, my_mask),
+                                            tw.Q1)
+                                        ).transpose()
+        df.loc[mx_mask, 'DY'] = df.loc[mx_mask, 'COEFFY'] * \
+                                sum_fun(-tw.loc[my_mask, 'K0SL'],  # MINUS!
+                                        0,
+                                        0,
+                                        tw.loc[my_mask, 'BETY'],
+                                        tau(self._get_phase_adv_block('Y', my_mask, mx_mask),
+                                            tw.Q2)
+                                        ).transpose()
+
+        LOG.debug("  Calculate full linear dispersion values")
+        coeff_index = self._results_df.index if targets is None else targets
+        disp_x = df.loc[coeff_index, 'COEFFX'] * \
+                 sum_fun(tw.loc[mx_mask, 'K0L'],
+                         tw.loc[mx_mask, 'K1SL'],
+                         df.loc[mx_mask, 'DY'],
+                         tw.loc[mx_mask, 'BETX'],
+                         tau(self._get_phase_adv_block('X', mx_mask, targets), tw.Q1)
+                         ).transpose()
+        disp_y = df.loc[coeff_index, 'COEFFY'] * \
+                 sum_fun(-tw.loc[my_mask, 'K0SL'],  # MINUS!
+                         tw.loc[my_mask, 'K1SL'],
+                         df.loc[my_mask, 'DX'],
+                         tw.loc[my_mask, 'BETY'],
+                         tau(self._get_phase_adv_block('Y', my_mask, targets), tw.Q2)
+                         ).transpose()
+        return disp_x, disp_y
+
     def get_linear_dispersion(self):
         """ Return the Linear Dispersion.
 
@@ -635,6 +684,7 @@ class TwissOptics(object):
             combined (bool): If 'True' plots x and y into the same axes.
         """
         LOG.debug("Plotting Linear Dispersion")
+        from plotshop import plot_style as pstyle
         lin_disp = self.get_linear_dispersion().dropna()
         title = 'Linear Dispersion'
         pstyle.set_style(self._plot_options.style, self._plot_options.manual)
@@ -686,6 +736,7 @@ class TwissOptics(object):
         raise NotImplementedError('Plotting Phase Advance Shift is not Implemented yet.')
         #TODO: reimplement the phase-advance shift calculations (if needed??)
         LOG.debug("Plotting Phase Advance")
+        from plotshop import plot_style as pstyle
         tw = self.mad_twiss
         pa = self._phase_advance
         dpa = self._dphase_advance
@@ -733,7 +784,7 @@ class TwissOptics(object):
 
         Eq. 31 in [#FranchiAnalyticformulasrapid2017]_
         """
-        res = self._results_df
+        res = self._elements_df
 
         if 'CHROMX' not in res:
             self._calc_chromatic_term()
@@ -772,22 +823,22 @@ class TwissOptics(object):
         """
         tw = self.twiss_df
         res = self._results_df
-        phs_adv = self.get_phase_adv()
+        elements = self._elements_df
 
-        if 'CHROMX' not in res:
+        if 'CHROMX' not in elements:
             self._calc_chromatic_term()
 
         LOG.debug("Calculating Chromatic Beating")
         with timeit(lambda t: LOG.debug("  Time needed: {:f}".format(t))):
-            chromx = res['CHROMX'].dropna()
-            chromy = res['CHROMY'].dropna()
+            chromx = elements['CHROMX'].dropna()
+            chromy = elements['CHROMY'].dropna()
             res['DBEATX'] = self._chromatic_beating(
                 chromx,
-                tau(phs_adv['X'].loc[chromx.index, :], tw.Q1),
+                tau(self._get_phase_adv_block('X', chromx.index), tw.Q1),
                 tw.Q1).transpose() - 1
             res['DBEATY'] = - self._chromatic_beating(
                 chromy,
-                tau(phs_adv['Y'].loc[chromy.index, :], tw.Q2),
+                tau(self._get_phase_adv_block('Y', chromy.index), tw.Q2),
                 tw.Q2).transpose() - 1
 
         LOG.debug("  Pk2Pk chromatic beating DBEATX: {:g}".format(
@@ -814,6 +865,7 @@ class TwissOptics(object):
             combined (bool): If 'True' plots x and y into the same axes.
         """
         LOG.debug("Plotting Chromatic Beating")
+        from plotshop import plot_style as pstyle
         chrom_beat = self.get_chromatic_beating().dropna()
         title = 'Chromatic Beating'
         pstyle.set_style(self._plot_options.style, self._plot_options.manual)
@@ -896,7 +948,7 @@ class TwissOptics(object):
         """ Calculates the chromatic term which is common to all chromatic equations """
         LOG.debug("Calculating Chromatic Term.")
         self._check_k_columns(["K1L", "K2L", "K2SL"])
-        res = self._results_df
+        res = self._elements_df
         tw = self.twiss_df
 
         with timeit(lambda t: LOG.debug("  Time needed: {:f}".format(t))):
@@ -908,11 +960,16 @@ class TwissOptics(object):
                            (tw.loc[mask, 'K2SL'] * tw.loc[mask, 'DY'])
             else:
                 LOG.info("Dispersion values NOT found in model. Using analytic values.")
-                if "DX" not in res or "DY" not in res:
-                    self.calc_linear_dispersion()
+                if self._observation_points is None:
+                    if "DX" not in res or "DY" not in res:
+                        self.calc_linear_dispersion()
+                    disp_x, disp_y = res.loc[mask, 'DX'], res.loc[mask, 'DY']
+                else:
+                    self._check_k_columns(["K0L", "K0SL", "K1SL"])
+                    disp_x, disp_y = self._linear_dispersion(tw.index[mask])
                 sum_term = tw.loc[mask, 'K1L'] - \
-                           (tw.loc[mask, 'K2L'] * res.loc[mask, 'DX']) + \
-                           (tw.loc[mask, 'K2SL'] * res.loc[mask, 'DY'])
+                           (tw.loc[mask, 'K2L'] * disp_x) + \
+                           (tw.loc[mask, 'K2SL'] * disp_y)
 
             res['CHROMX'] = sum_term * tw.loc[mask, 'BETX']
             res['CHROMY'] = sum_term * tw.loc[mask, 'BETY']
@@ -928,6 +985,7 @@ class TwissOptics(object):
 
     def _nice_axes(self, ax):
         """ Makes the axes look nicer """
+        from plotshop import plot_style as pstyle
         ax.ticklabel_format(axis='y', style='sci', scilimits=(-2, 3))
         pstyle.set_xaxis_label(ax)
         try:
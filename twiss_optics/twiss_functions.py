@@ -92,6 +92,26 @@ def get_phase_advances(twiss_df):
     return phase_advance_dict
 
 
+def get_phase_advances_block(twiss_df, plane, sources, targets):
+    """
+    Calculate phase advances from the sources to the targets only
+
+    Args:
+        twiss_df: twiss DataFrame with the element names as index.
+        plane: 'X' or 'Y'.
+        sources, targets: element names or boolean masks of the rows of twiss_df.
+
+    Returns:
+        Matrix similar to DPhi(i,j) = Phi(j) - Phi(i), sources i as rows, targets j as columns
+    """
+    colmn_phase = "MU" + plane
+    phases_src = twiss_df.loc[sources, colmn_phase]
+    phases_trgt = twiss_df.loc[targets, colmn_phase]
+    return pd.DataFrame((phases_trgt.values[None, :] - phases_src.values[:, None]),
+                        index=phases_src.index,
+                        columns=phases_trgt.index)
+
+
 def dphi(data, q):
     """ Return dphi from phase advances in data, see Eq. 8 in [#FranchiAnalyticformulasrapid2017]_
     """
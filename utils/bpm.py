@@ -10,6 +10,10 @@ intersect BPMs in multiple files or with a given model file.
 '''
 
 import sys
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
 
 def filterbpm(list_of_bpms):
     '''Filter non-arc BPM.
@@ -36,7 +40,7 @@ def model_intersect(exp_bpms, model_twiss):
     '''
     try:
         # pandas way
-        return model_twiss.loc[exp_bpms.index, "S"]
+        return model_twiss.loc[exp_bpms.index.intersection(model_twiss.index), "S"]
     except AttributeError:
         # old way
         bpmsin = []
@@ -45,11 +49,11 @@ def model_intersect(exp_bpms, model_twiss):
             print >> sys.stderr, "Zero exp BPMs sent to model_intersect"
             return bpmsin
 
+        model_indx = model_twiss.indx
         for bpm in exp_bpms:
-            try:
-                model_twiss.indx[bpm[1].upper()]  # Check if bpm is in the model
+            if bpm[1].upper() in model_indx:  # Check if bpm is in the model
                 bpmsin.append(bpm)
-            except KeyError:
+            else:
                 print >> sys.stderr, bpm, "Not in Model"
 
         if len(bpmsin) == 0:
@@ -65,40 +69,67 @@ def intersect(list_of_twiss_files):
     '''
     Pure intersection of all bpm names in all files.
 
-    :param list list_of_twiss_files: List of metaclass.Twiss objects with columns NAME and S.
+    :param list list_of_twiss_files: List of metaclass.Twiss objects with columns NAME and S
+        or DataFrames with BPM names as index and column S.
+
+    :returns: list with tuples: (<S_value_i>,<bpm_i>) -- bpm_i is in every twiss of list_of_twiss_files,
+        sorted by S (of the first file). Series of S for DataFrames, sorted by S.
+    '''
+    return intersect_with_report(list_of_twiss_files)[0]
+
 
-    :returns: list with tuples: (<S_value_i>,<bpm_i>) -- bpm_i is in every twiss of list_of_twiss_files.
+def intersect_with_report(list_of_twiss_files):
+    '''
+    Intersection of all bpm names in all files, as intersect, reporting the dropped BPMs.
+
+    :param list list_of_twiss_files: List of metaclass.Twiss objects or DataFrames (see intersect)
+
+    :returns: tuple (intersection, dropped) -- intersection as returned by intersect,
+        dropped is a list with the names of the BPMs removed by each file (in order of the files),
+        i.e. BPMs in all previous files but not in this one.
     '''
     if len(list_of_twiss_files) == 0:
         print >> sys.stderr, "Nothing to intersect!!!!"
-        return []
+        return [], []
 
     try:
         names_list = list_of_twiss_files[0].index
     except AttributeError:
         # metaclass way
-        names_list = list_of_twiss_files[0].NAME
-        if len(names_list) == 0:
+        twiss_0 = list_of_twiss_files[0]
+        if len(twiss_0.NAME) == 0:
             print >> sys.stderr, "No exp BPMs..."
             sys.exit(1)
+        common = set(twiss_0.NAME)
+        dropped = []
         for twiss_file in list_of_twiss_files:
-            #TODO: have to use a set probably, does not detect duplicates! (vimaier)
-            names_list = [b for b in twiss_file.NAME if b in names_list]
-
-        result = [] # list of tupels (S, bpm_name)
-        twiss_0 = list_of_twiss_files[0]
-        for bpm in names_list:
-            result.append((twiss_0.S[twiss_0.indx[bpm]], bpm))
-
-        #SORT by S
-        result.sort()
-        return result
+            names = set(twiss_file.NAME)
+            dropped.append(common.difference(names))
+            common.intersection_update(names)
+
+        # list of tupels (S, bpm_name), SORT by S
+        result = sorted((twiss_0.S[twiss_0.indx[bpm]], bpm) for bpm in common)
+        s_of_bpm = dict(zip(twiss_0.NAME, twiss_0.S))
+        dropped = [sorted(lost, key=lambda bpm: (s_of_bpm[bpm], bpm)) for lost in dropped]
     else:
+        dropped = []
         for twiss_file in list_of_twiss_files:
+            dropped.append(names_list.difference(twiss_file.index))
             names_list = twiss_file.index.intersection(names_list)
 
-        result = list_of_twiss_files[0].loc[names_list, "S"]
-        return result
+        result = list_of_twiss_files[0].loc[names_list, "S"].sort_values(kind="mergesort")
+        s_values = list_of_twiss_files[0].loc[:, "S"]
+        dropped = [list(s_values.loc[lost].sort_values(kind="mergesort").index)
+                   for lost in dropped]
+    _log_dropped(dropped)
+    return result, dropped
+
+
+def _log_dropped(dropped):
+    for index, lost in enumerate(dropped):
+        if len(lost) > 0:
+            LOGGER.debug("File {:d} removed {:d} BPMs from the intersection: {:s}".format(
+                index, len(lost), ", ".join(lost)))
 
 
 def get_list_of_tuples(bpms):
@@ -116,10 +147,5 @@ def intersect_with_bpm_list(exp_bpms, bpm_list):
 
     :returns: list with tuples: (<S_value_i>,<bpm_i>) -- A list with BPMs which are both in exp_bpms and bpm_list.
     '''
-    result = []
-
-    for s_bpm_tupel in exp_bpms:
-        bpm_name = s_bpm_tupel[1]
-        if bpm_name in bpm_list:
-            result.append(s_bpm_tupel)
-    return result
+    bpm_set = set(bpm_list)
+    return [s_bpm_tupel for s_bpm_tupel in exp_bpms if s_bpm_tupel[1] in bpm_set]
@@ -264,6 +264,13 @@ def add_module_handler(handler):
     logging.getLogger(current_module).addHandler(handler)
 
 
+def remove_module_handler(handler):
+    """ Remove and close handler added by add_module_handler from the same module """
+    current_module = _get_current_module()
+    logging.getLogger(current_module).removeHandler(handler)
+    handler.close()
+
+
 def add_root_handler(handler):
     """ Add handler at root level """
     logging.getLogger("").addHandler(handler)
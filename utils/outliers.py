@@ -47,6 +47,80 @@ def get_filter_mask(data, x_data=None, limit=0.0, niter=20, nsig=None, mask = No
     return mask
 
 
+def get_filter_masks(data, x_data=None, limit=0.0, niter=20, nsig=None, mask=None, axis=-1):
+    """
+    Filters many independent series at once, as get_filter_mask does for each of them.
+    The series run along axis of data, x_data has to be broadcastable to data.
+    Series of different length can be padded, with the padding excluded by the initial mask.
+    Returns a filter mask of the shape of data
+    """
+    data = np.asarray(data, dtype=float)
+    if x_data is not None:
+        try:
+            x_data = np.broadcast_to(np.asarray(x_data, dtype=float), data.shape)
+        except ValueError:
+            raise ValueError("Datasets are not equally long.")
+    if mask is not None:
+        if not np.shape(mask) == data.shape:
+            raise ValueError("Mask is not equally long as dataset.")
+        mask = np.array(mask, dtype=bool)
+    else:
+        mask = np.ones_like(data, dtype=bool)
+
+    shape = np.moveaxis(data, axis, -1).shape
+    data = _as_series(data, axis)
+    mask = _as_series(mask, axis)
+    x_data = None if x_data is None else _as_series(x_data, axis)
+
+    if nsig is None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lengths = np.sum(mask, axis=1).astype(float)
+            nsig = t.ppf(1 - 0.5 / lengths, lengths)
+
+    active = np.ones(data.shape[0], dtype=bool)
+    prevlen = np.sum(mask, axis=1) + 1
+    for _ in range(niter):
+        lengths = np.sum(mask, axis=1)
+        active &= (lengths < prevlen) & (lengths > 2)
+        if not np.any(active):
+            break
+        prevlen = lengths
+        if x_data is None:
+            y_orig = data
+        else:
+            y_orig = _get_series_without_slope(mask, x_data, data)
+        avg, std = _get_series_moments(mask, y_orig)
+        max_dist = np.maximum(limit, nsig * std)
+        with np.errstate(invalid="ignore"):
+            new_mask = mask & (np.abs(y_orig - avg[:, np.newaxis]) < max_dist[:, np.newaxis])
+        mask[active] = new_mask[active]
+    return np.moveaxis(mask.reshape(shape), -1, axis)
+
+
+def _as_series(array, axis):
+    array = np.moveaxis(array, axis, -1)
+    return array.reshape(-1, array.shape[-1]).copy()
+
+
+def _get_series_moments(mask, data):
+    lengths = np.sum(mask, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = np.sum(np.where(mask, data, 0.), axis=1) / lengths
+        var = np.sum(np.where(mask, data - avg[:, np.newaxis], 0.) ** 2, axis=1) / lengths
+    return avg, np.sqrt(var)
+
+
+def _get_series_without_slope(mask, x, y):
+    x_avg, _ = _get_series_moments(mask, x)
+    y_avg, _ = _get_series_moments(mask, y)
+    dx = np.where(mask, x - x_avg[:, np.newaxis], 0.)
+    dy = np.where(mask, y - y_avg[:, np.newaxis], 0.)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m = np.sum(dx * dy, axis=1) / np.sum(dx ** 2, axis=1)
+    b = y_avg - m * x_avg
+    return y - b[:, np.newaxis] - m[:, np.newaxis] * x
+
+
 def _get_moments(data):
     return np.mean(data), np.std(data)
 
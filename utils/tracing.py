@@ -0,0 +1,240 @@
+"""
+Module utils.tracing
+---------------------
+
+Lightweight per-stage performance tracing.
+
+A Trace collects for every named stage the wall time, the CPU time of the process and of its
+children (e.g. MAD-X), the peak resident memory and item counts (BPMs, turns, files, ...).
+Stages are opened with the ``stage`` context manager or the ``traced`` decorator and are
+recorded into all traces activated by ``tracing``. Without an active trace they do nothing.
+Stages run in worker processes are not recorded, their time is part of the calling stage.
+
+Usage::
+
+    with tracing.tracing("measure_optics", output_dir) as trace:
+        with tracing.stage("phase", bpms=len(bpms)) as phase_stage:
+            ...
+            phase_stage.count(files=len(files))
+
+    @tracing.traced("harpy")
+    def harpy(...):
+        ...
+
+The trace is written as ``trace_<name>.json`` and ``trace_<name>.tfs`` into its output_dir,
+which can also be set (trace.output_dir) while the trace is active.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+from tfs_files import tfs_pandas
+from utils import logging_tools
+
+try:
+    import resource
+except ImportError:  # not available on Windows, no memory information
+    resource = None
+
+LOGGER = logging_tools.get_logger(__name__)
+
+TRACE_PREFIX = "trace_"
+SEPARATOR = "/"
+TIME_COLUMNS = ("START_S", "WALL_S", "CPU_S", "CPU_CHILDREN_S",
+                "PEAK_RSS_MB", "PEAK_RSS_CHILDREN_MB")
+
+_active_traces = []
+_local = threading.local()
+
+
+class Trace(object):
+    """ Collects the records of the stages run while it is active.
+
+    Public methods:
+        get_records()
+        to_dataframe()
+        write(output_dir)
+    """
+    def __init__(self, name, output_dir=None):
+        self.name = name
+        self.output_dir = output_dir
+        self.start_time = time.time()
+        self.records = []
+
+    def to_dataframe(self):
+        """ Returns the records as DataFrame, start times relative to the trace start. """
+        data_frame = pd.DataFrame.from_records(self.get_records())
+        columns = ["NAME", "STAGE", "DEPTH", "STATUS"] + list(TIME_COLUMNS)
+        columns += sorted(column for column in data_frame.columns
+                          if column not in columns + ["ERROR"])
+        if "ERROR" in data_frame.columns:
+            columns += ["ERROR"]
+        data_frame = data_frame.reindex(columns=columns)
+        for column in data_frame.columns:
+            if data_frame[column].dtype == object:
+                data_frame[column] = data_frame[column].fillna("")
+            else:
+                data_frame[column] = data_frame[column].fillna(0)
+                if column not in TIME_COLUMNS and (data_frame[column] % 1 == 0).all():
+                    data_frame[column] = data_frame[column].astype(int)
+        return data_frame
+
+    def write(self, output_dir):
+        """ Writes the trace as json and tfs file into output_dir, returns the json path. """
+        json_path = os.path.join(output_dir, TRACE_PREFIX + self.name + ".json")
+        with open(json_path, "w") as json_file:
+            json.dump(OrderedDict([
+                ("NAME", self.name),
+                ("DATE", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.start_time))),
+                ("COMMAND", " ".join(sys.argv)),
+                ("STAGES", self.get_records()),
+            ]), json_file, indent=2)
+        if self.records:
+            tfs_pandas.write_tfs(os.path.join(output_dir, TRACE_PREFIX + self.name + ".tfs"),
+                                 self.to_dataframe(), OrderedDict([("NAME", self.name)]))
+        LOGGER.debug("Trace written to: {}".format(json_path))
+        return json_path
+
+    def get_records(self):
+        """ Returns copies of the records in start order, start times relative to the trace start. """
+        records = []
+        for record in sorted(self.records, key=lambda rec: rec["START_S"]):
+            record = OrderedDict(record)
+            record["START_S"] = record["START_S"] - self.start_time
+            records.append(record)
+        return records
+
+
+@contextmanager
+def tracing(name, output_dir=None):
+    """ Activates a new Trace, recorded as stage in itself and in the enclosing traces.
+
+    Args:
+        name: name of the trace and its stage.
+        output_dir: if given, the trace is written there when leaving the context.
+    Yields:
+        the Trace
+    """
+    trace = Trace(name, output_dir)
+    _active_traces.append(trace)
+    try:
+        with _Stage(name, {}, list(_active_traces)):
+            yield trace
+    finally:
+        _active_traces.remove(trace)
+        if trace.output_dir is not None:
+            try:
+                trace.write(trace.output_dir)
+            except (IOError, OSError) as e:
+                LOGGER.warning("Could not write trace: {}".format(e))
+
+
+def stage(name, **counts):
+    """ Context manager recording a stage into all active traces.
+
+    The counts are given as keyword arguments or added later with count() on the returned
+    object, they are written in upper case.
+    """
+    return _Stage(name, counts, list(_active_traces))
+
+
+def traced(name=None, **counts):
+    """ Decorator recording every call of the function as stage, named as the function. """
+    def decorator(function):
+        stage_name = function.__name__ if name is None else name
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name, **counts):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_active():
+    return len(_active_traces) > 0
+
+
+class _Stage(object):
+    def __init__(self, name, counts, traces):
+        self._traces = traces
+        self._record = None
+        self._name = name
+        self._counts = counts
+        self._start = None
+
+    def count(self, **counts):
+        """ Adds or updates item counts of the stage. """
+        if self._record is not None:
+            self._record.update((key.upper(), value) for key, value in counts.items())
+        return self
+
+    @property
+    def failed(self):
+        return self._record is not None and self._record["STATUS"] != "OK"
+
+    def __enter__(self):
+        if not self._traces:
+            return self
+        path = _get_path()
+        path.append(self._name)
+        self._record = OrderedDict([("NAME", SEPARATOR.join(path)), ("STAGE", self._name),
+                                    ("DEPTH", len(path) - 1), ("STATUS", "OK")])
+        self.count(**self._counts)
+        self._start = (time.time(), _cpu_times())
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self._record is None:
+            return False
+        wall, (cpu, cpu_children) = self._start
+        end_cpu, end_cpu_children = _cpu_times()
+        self._record["START_S"] = wall
+        self._record["WALL_S"] = time.time() - wall
+        self._record["CPU_S"] = end_cpu - cpu
+        self._record["CPU_CHILDREN_S"] = end_cpu_children - cpu_children
+        self._record["PEAK_RSS_MB"] = _peak_rss_mb("RUSAGE_SELF")
+        self._record["PEAK_RSS_CHILDREN_MB"] = _peak_rss_mb("RUSAGE_CHILDREN")
+        if exc_type is not None:
+            self._record["STATUS"] = "FAILED"
+            self._record["ERROR"] = "".join(
+                traceback.format_exception_only(exc_type, exc_value)).strip()
+        _get_path().pop()
+        for trace in self._traces:
+            trace.records.append(self._record)
+        LOGGER.debug("Time for {}: {:.3f} s".format(self._record["NAME"], self._record["WALL_S"]))
+        return False
+
+
+def _get_path():
+    try:
+        return _local.path
+    except AttributeError:
+        _local.path = []
+        return _local.path
+
+
+def _cpu_times():
+    """ CPU time (user + system) of the process and of its finished children. """
+    if resource is None:
+        times = os.times()
+        return times[0] + times[1], times[2] + times[3]
+    return tuple(usage.ru_utime + usage.ru_stime for usage in
+                 (resource.getrusage(resource.RUSAGE_SELF),
+                  resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return 0.
+    # ru_maxrss is in kB on Linux, but in bytes on macOS
+    scale = 1024. ** 2 if sys.platform == "darwin" else 1024.
+    return resource.getrusage(getattr(resource, who)).ru_maxrss / scale